@@ -2,27 +2,27 @@
 # -*- coding: utf-8 -*-
 """
 API Principal - Sistema de Plantas Medicinais
+
+create_app(config) monta uma aplicação isolada, sem efeitos na importação
+(testes, benchmarks, `flask --app app`). Produção: wsgi.py com o gunicorn
+(gunicorn -c gunicorn.conf.py wsgi:app); `python app.py` só para desenvolvimento
 """
 import os
-from flask import Flask
+from flask import Flask, request
 from flask_cors import CORS
 from config import Config
 
-# Criar aplicação
-app = Flask(__name__)
-app.config.from_object(Config)
-
-# Inicializar CORS
-CORS(app, origins=Config.CORS_ORIGINS)
-
-# Criar pasta de uploads
-os.makedirs(Config.UPLOAD_FOLDER, exist_ok=True)
-
-# ===== INICIALIZAR DB ANTES de importar models =====
 from models.planta import db
-db.init_app(app)
-
-# ===== Importar models (APÓS inicializar db) =====
+from utils.pool_metricas import configurar_pool, registrar_metricas_pool, metricas_pool, metricas_prometheus
+from utils.sql_instrumentacao import registrar_instrumentacao_sql
+from utils.estado_partilhado import configurar_estado
+from utils.json_rapido import configurar_json
+from utils.compressao import registrar_compressao
+from utils.replicas import (
+    configurar_replicas, registrar_replicas, metricas_replicas, metricas_replicas_prometheus
+)
+
+# ===== Importar models (registam as tabelas em db.metadata) =====
 from models import *
 
 # ===== Importar Blueprints EXISTENTES =====
@@ -48,74 +48,192 @@ from routes.familias import admin_familias_bp
 # Depois dos outros imports de routes
 from routes.admin_autores_referencias import admin_autores_refs_bp
 
-# ===== Registrar Blueprints EXISTENTES =====
-app.register_blueprint(plantas_bp, url_prefix='/api')
-app.register_blueprint(busca_bp, url_prefix='/api')
-app.register_blueprint(auxiliares_bp, url_prefix='/api')
-app.register_blueprint(imagens_bp, url_prefix='/api')
-
-# ===== Registrar Blueprints NOVOS (Dashboard) =====
-app.register_blueprint(dashboard_stats_bp, url_prefix='/api/admin/dashboard')
-app.register_blueprint(dashboard_crud_bp, url_prefix='/api/admin')
-app.register_blueprint(dashboard_busca_bp, url_prefix='/api/admin/dashboard')
-app.register_blueprint(dashboard_imagens_bp, url_prefix='/api/admin')
-app.register_blueprint(dashboard_auxiliares_bp, url_prefix='/api/admin')
-
-# ===== Registrar Blueprint WIZARD (✅ NOVO) =====
-app.register_blueprint(wizard_bp, url_prefix='/api/wizard')
-
-# === Blueprint familias ===
-app.register_blueprint(admin_familias_bp, url_prefix='/api/admin')
-
-#==== Bluefprint Autores e Referências =====
-app.register_blueprint(admin_autores_refs_bp)
-
-# ===== Rota de health check =====
-@app.route('/health')
-def health_check():
-    return {'status': 'ok', 'message': 'API Plantas Medicinais - Nova Estrutura'}, 200
-
-@app.route('/')
-def index():
-    return {
-        'api': 'Plantas Medicinais de Moçambique',
-        'versao': '2.0',
-        'estrutura': 'modular',
-        'endpoints': {
-            'plantas': '/api/plantas',
-            'busca': '/api/busca',
-            'dashboard': '/api/admin/dashboard/stats',
-            'wizard': '/api/wizard/*',  # ✅ NOVO
-            'provincias': '/api/provincias',
-            'partes_usadas': '/api/partes-usadas',
-            'indicacoes': '/api/indicacoes',
-            'autores': '/api/autores',
-            'referencias': '/api/referencias'
-        }
-    }, 200
-
-# ===== Error handlers =====
-@app.errorhandler(404)
-def not_found(error):
-    return {'error': 'Endpoint não encontrado'}, 404
-
-@app.errorhandler(500)
-def internal_error(error):
-    db.session.rollback()
-    return {'error': 'Erro interno do servidor'}, 500
+# ===== Grafo de citações =====
+from routes.grafo import grafo_bp
+from utils.grafo_citacoes import registrar_eventos_grafo
+
+# ===== Dicionário de famílias =====
+from utils.familias_index import registrar_eventos_familias, registrar_comando_familias
+
+# ===== Rascunhos e bootstrap do wizard =====
+from utils.rascunhos import configurar_rascunhos
+from utils.wizard_bootstrap import registrar_eventos_bootstrap
+
+# ===== Pickers (typeahead) =====
+from routes.pickers import pickers_bp
+from utils.picker_index import registrar_eventos_picker
+
+# ===== Taxonomia =====
+from routes.taxonomia import taxonomia_bp
+from utils.taxonomia import registrar_eventos_taxonomia
+
+# ===== Fila de processamento de imagens =====
+from utils.imagens_fila import configurar_fila_imagens
+from utils.imagens_importacao import registrar_comando_importacao
+from utils.imagens_reconciliacao import registrar_comando_reconciliacao
+
+# ===== Migração do esquema =====
+from utils.migracoes import registrar_comando_migracao
+
+
+def create_app(config=None):
+    """
+    Criar e configurar uma aplicação
+
+    As caches do processo (dicionário de famílias, grafo, bootstrap do
+    wizard) são únicas por processo; entre workers mantêm-se coerentes pelo
+    estado partilhado (STATE_STORE)
+
+    Args:
+        config: classe/objeto de configuração (omissão: Config) ou dict com
+            valores que substituem os de Config (testes, benchmarks)
+
+    Returns:
+        Flask: aplicação com blueprints, eventos e comandos registados
+    """
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    if isinstance(config, dict):
+        app.config.update(config)
+    elif config is not None:
+        app.config.from_object(config)
+
+    # JSON (orjson) e compressão das respostas; o after_request da compressão corre depois dos outros
+    configurar_json(app)
+    registrar_compressao(app)
+
+    # Inicializar CORS
+    CORS(app, origins=app.config['CORS_ORIGINS'])
+
+    # ===== Base de dados =====
+    configurar_pool(app)  # Pool medido (SQLALCHEMY_ENGINE_OPTIONS)
+    configurar_replicas(app)  # Réplicas de leitura como binds 'replica_<n>'
+    db.init_app(app)
+    registrar_metricas_pool(app)
+    registrar_instrumentacao_sql(app)  # Server-Timing, N+1, orçamento de queries
+    registrar_replicas(app)  # GET nas réplicas, escritas e read-your-writes no primário
+
+    # ===== Estado partilhado entre workers (gerações das caches, jobs) =====
+    configurar_estado(app)
+
+    # ===== Registrar Blueprints EXISTENTES =====
+    app.register_blueprint(plantas_bp, url_prefix='/api')
+    app.register_blueprint(busca_bp, url_prefix='/api')
+    app.register_blueprint(auxiliares_bp, url_prefix='/api')
+    app.register_blueprint(imagens_bp, url_prefix='/api')
+
+    # ===== Registrar Blueprints NOVOS (Dashboard) =====
+    app.register_blueprint(dashboard_stats_bp, url_prefix='/api/admin/dashboard')
+    app.register_blueprint(dashboard_crud_bp, url_prefix='/api/admin')
+    app.register_blueprint(dashboard_busca_bp, url_prefix='/api/admin/dashboard')
+    app.register_blueprint(dashboard_imagens_bp, url_prefix='/api/admin')
+    app.register_blueprint(dashboard_auxiliares_bp, url_prefix='/api/admin')
+
+    # ===== Registrar Blueprint WIZARD (✅ NOVO) =====
+    app.register_blueprint(wizard_bp, url_prefix='/api/wizard')
+
+    # === Blueprint familias ===
+    app.register_blueprint(admin_familias_bp, url_prefix='/api/admin')
+
+    #==== Bluefprint Autores e Referências =====
+    app.register_blueprint(admin_autores_refs_bp)
+
+    # ===== Blueprint Grafo de citações =====
+    app.register_blueprint(grafo_bp, url_prefix='/api/grafo')
+    registrar_eventos_grafo(app)
+
+    # ===== Eventos do dicionário de famílias =====
+    registrar_eventos_familias(app)
+    registrar_comando_familias(app)  # flask verificar-familias
+
+    # ===== Armazém de rascunhos e cache do bootstrap do wizard =====
+    configurar_rascunhos(app)
+    registrar_eventos_bootstrap(app)
+
+    # ===== Blueprint Pickers =====
+    app.register_blueprint(pickers_bp, url_prefix='/api/pickers')
+    registrar_eventos_picker(app)
+
+    # ===== Blueprint Taxonomia =====
+    app.register_blueprint(taxonomia_bp, url_prefix='/api/taxonomia')
+    registrar_eventos_taxonomia(app)
+
+    # ===== Fila de processamento de imagens =====
+    configurar_fila_imagens(app)
+    registrar_comando_importacao(app)  # flask importar-imagens
+    registrar_comando_reconciliacao(app)  # flask reconciliar-imagens
+    registrar_comando_migracao(app)  # flask migrar-bd
+
+    # ===== Rota de health check =====
+    @app.route('/health')
+    def health_check():
+        return {'status': 'ok', 'message': 'API Plantas Medicinais - Nova Estrutura'}, 200
+
+    @app.route('/health/pool')
+    def pool_metrics():
+        """Pool de ligações deste worker (?formato=prometheus, ?reiniciar=1)"""
+        if request.args.get('formato') == 'prometheus':
+            return metricas_prometheus(), 200, {'Content-Type': 'text/plain; version=0.0.4'}
+        return metricas_pool(reiniciar=request.args.get('reiniciar') == '1'), 200
+
+    @app.route('/health/replicas')
+    def replicas_metrics():
+        """Atraso e estado das réplicas de leitura vistos por este worker (?formato=prometheus)"""
+        if request.args.get('formato') == 'prometheus':
+            return metricas_replicas_prometheus(), 200, {'Content-Type': 'text/plain; version=0.0.4'}
+        return metricas_replicas(db.engines), 200
+
+    @app.route('/')
+    def index():
+        return {
+            'api': 'Plantas Medicinais de Moçambique',
+            'versao': '2.0',
+            'estrutura': 'modular',
+            'endpoints': {
+                'plantas': '/api/plantas',
+                'busca': '/api/busca',
+                'dashboard': '/api/admin/dashboard/stats',
+                'wizard': '/api/wizard/*',  # ✅ NOVO
+                'grafo': '/api/grafo/*',
+                'taxonomia': '/api/taxonomia',
+                'pickers': '/api/pickers/<autores|referencias|locais|indicacoes>',
+                'provincias': '/api/provincias',
+                'partes_usadas': '/api/partes-usadas',
+                'indicacoes': '/api/indicacoes',
+                'autores': '/api/autores',
+                'referencias': '/api/referencias'
+            }
+        }, 200
+
+    # ===== Error handlers =====
+    @app.errorhandler(404)
+    def not_found(error):
+        return {'error': 'Endpoint não encontrado'}, 404
+
+    @app.errorhandler(500)
+    def internal_error(error):
+        db.session.rollback()
+        return {'error': 'Erro interno do servidor'}, 500
+
+    return app
+
 
 if __name__ == '__main__':
+    # Servidor de desenvolvimento (um processo; debug só com FLASK_DEBUG=1)
+    app = create_app()
     with app.app_context():
         db.create_all()
-    
+
+    porta = int(os.environ.get('PORT', 5000))
     print("=" * 60)
     print("🌿 API PLANTAS MEDICINAIS - NOVA ESTRUTURA")
     print("=" * 60)
-    print(f"🚀 Servidor: http://localhost:5000")
-    print(f"📊 Dashboard: http://localhost:5000/api/admin/dashboard/stats")
-    print(f"✨ Wizard: http://localhost:5000/api/wizard/health")  # ✅ NOVO
+    print(f"🚀 Servidor: http://localhost:{porta}")
+    print(f"📊 Dashboard: http://localhost:{porta}/api/admin/dashboard/stats")
+    print(f"✨ Wizard: http://localhost:{porta}/api/wizard/health")  # ✅ NOVO
     print(f"📁 Estrutura: Modular (arquivos separados)")
-    print(f"🗄️  Database: {Config.SQLALCHEMY_DATABASE_URI}")
+    print(f"🗄️  Database: {app.config['SQLALCHEMY_DATABASE_URI']}")
+    print(f"🏭 Produção: gunicorn -c gunicorn.conf.py wsgi:app")
     print("=" * 60)
-    
-    app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
+
+    app.run(debug=app.config['DEBUG'], host='0.0.0.0', port=porta)
@@ -0,0 +1,25 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Ponto de entrada ASGI das leituras públicas (modo assíncrono)
+
+    pip install uvicorn aiomysql
+    uvicorn asgi:app --workers 4 --port 8001
+    # ou, com o gestor de processos do gunicorn:
+    gunicorn -k uvicorn.workers.UvicornWorker -w 4 -b 0.0.0.0:8001 asgi:app
+
+Serve GET /api/plantas, /api/plantas/<id>, /api/busca e
+/api/busca/autocomplete (routes/leitura_async.py); o resto da API continua
+em wsgi.py. No nginx:
+
+    map $request_method $api_upstream { GET api_async; HEAD api_async; default api_wsgi; }
+    location ~ ^/api/(plantas(/[0-9]+)?|busca(/autocomplete)?)$ { proxy_pass http://$api_upstream; }
+    location / { proxy_pass http://api_wsgi; }
+
+Um worker assíncrono por core chega: a concorrência vem do event loop,
+limitada por ASYNC_DB_POOL_SIZE + ASYNC_DB_MAX_OVERFLOW ligações por worker
+"""
+from app import create_app
+from routes.leitura_async import AppLeiturasAsync
+
+app = AppLeiturasAsync(create_app())
@@ -0,0 +1,16 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmarks da API
+- gerador: base de dados sintética e reprodutível (mesma semente = mesmos
+  dados) com distribuições próximas das reais em todos os models
+- cenarios: pedidos aos endpoints principais (filtros de /api/plantas,
+  detalhe, busca, estatísticas do dashboard, listas do admin, wizard)
+- executar: latência (p50/p95/p99), queries por pedido e pico de memória
+  de cada cenário, comparados com uma baseline gravada em baselines/
+
+Uso (a partir de backend/, com DATABASE_URL a apontar para uma BD local):
+    python -m benchmarks.executar --gerar --limpar --escala pequena
+    python -m benchmarks.executar --gravar-baseline
+    python -m benchmarks.executar            # compara com a baseline
+"""
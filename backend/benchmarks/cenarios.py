@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cenários do Benchmark
+
+Cada cenário monta o pedido a partir de amostras reais da BD (ids de
+plantas, famílias, nomes comuns...), por isso corre sobre os dados do
+gerador ou sobre uma cópia da BD de produção
+"""
+from collections import namedtuple
+
+from sqlalchemy import func
+
+from models.planta import db, Planta_medicinal, Nome_comum
+from models.localizacao import Local_colheita
+from models.uso_medicinal import Parte_usada, Indicacao
+from models.referencia import Referencia, Referencia_autor
+
+# pedido(rng, amostras) -> (url, corpo json ou None)
+# dialetos: BDs onde o endpoint funciona (None: todas)
+Cenario = namedtuple('Cenario', 'nome metodo pedido dialetos', defaults=(None,))
+
+# Endpoints com SQL textual de MySQL (GROUP_CONCAT ... SEPARATOR)
+SO_MYSQL = ('mysql',)
+
+
+class Amostras:
+    """Valores reais da BD usados para montar os pedidos (lidos uma vez)"""
+
+    def __init__(self, rng):
+        self.plantas = [i for (i,) in db.session.query(Planta_medicinal.id_planta).all()]
+        if not self.plantas:
+            raise RuntimeError('Sem plantas na BD: gerar dados primeiro (--gerar)')
+        self.familias = [f for (f,) in db.session.query(Planta_medicinal.familia).group_by(
+            Planta_medicinal.familia).order_by(func.count().desc()).limit(50).all()]
+        nomes = [n for (n,) in db.session.query(Nome_comum.nome).limit(2000).all()]
+        self.fragmentos_nome = sorted({n[:4].lower() for n in nomes if len(n) >= 4}) or ['a']
+        self.fragmentos_cientifico = sorted({
+            n.split()[0][:5] for (n,) in db.session.query(Planta_medicinal.nome_cientifico).limit(2000).all()
+        })
+        self.provincias = [i for (i,) in db.session.query(Local_colheita.id_provincia).distinct().all()]
+        self.locais = [i for (i,) in db.session.query(Local_colheita.id_local).limit(500).all()]
+        self.partes = [i for (i,) in db.session.query(Parte_usada.id_parte).all()]
+        self.indicacoes = [i for (i,) in db.session.query(Indicacao.id_uso).limit(500).all()]
+        self.referencias = [i for (i,) in db.session.query(Referencia.id_referencia).limit(2000).all()]
+        # Autores com mais referências: o filtro por autor no pior caso realista
+        self.autores = [i for (i,) in db.session.query(Referencia_autor.id_autor).group_by(
+            Referencia_autor.id_autor).order_by(func.count().desc()).limit(50).all()]
+        self._sequencia = rng.randrange(10 ** 6)
+
+    def nome_unico(self):
+        self._sequencia += 1
+        return f'Benchmarkia sequentia{self._sequencia} Bench.'
+
+
+def _get(url):
+    return lambda rng, a: (url(rng, a) if callable(url) else url, None)
+
+
+def _corpo_wizard(rng, a):
+    return '/api/wizard/plantas', {
+        'nome_cientifico': a.nome_unico(),
+        'familia': rng.choice(a.familias),
+        'infos_adicionais': 'Criada pelo benchmark',
+        'nomes_comuns': [f'bench-{rng.randrange(10 ** 6)}' for _ in range(3)],
+        'locais': rng.sample(a.locais, min(2, len(a.locais))),
+        'partes_usadas': [{'id_parte': rng.choice(a.partes),
+                           'indicacoes': rng.sample(a.indicacoes, min(3, len(a.indicacoes)))}],
+        'referencias': rng.sample(a.referencias, min(2, len(a.referencias))),
+    }
+
+
+CENARIOS = (
+    # /api/plantas e cada filtro
+    Cenario('plantas', 'GET', _get('/api/plantas')),
+    Cenario('plantas_pagina_profunda', 'GET', _get(lambda r, a: f'/api/plantas?page={max(1, len(a.plantas) // 40)}')),
+    Cenario('plantas_search', 'GET', _get(lambda r, a: f'/api/plantas?search={r.choice(a.fragmentos_nome)}')),
+    Cenario('plantas_search_popular', 'GET',
+            _get(lambda r, a: f'/api/plantas?search_popular={r.choice(a.fragmentos_nome)}')),
+    Cenario('plantas_search_cientifico', 'GET',
+            _get(lambda r, a: f'/api/plantas?search_cientifico={r.choice(a.fragmentos_cientifico)}')),
+    Cenario('plantas_familia', 'GET', _get(lambda r, a: f'/api/plantas?familia={r.choice(a.familias).strip()}')),
+    Cenario('plantas_provincia', 'GET', _get(lambda r, a: f'/api/plantas?provincia_id={r.choice(a.provincias)}')),
+    Cenario('plantas_parte_usada', 'GET', _get(lambda r, a: f'/api/plantas?parte_usada={r.choice(a.partes)}')),
+    Cenario('plantas_indicacao', 'GET', _get(lambda r, a: f'/api/plantas?indicacao_id={r.choice(a.indicacoes)}')),
+    Cenario('plantas_autor', 'GET', _get(lambda r, a: f'/api/plantas?autor_id={r.choice(a.autores)}')),
+    Cenario('planta_detalhe', 'GET', _get(lambda r, a: f'/api/plantas/{r.choice(a.plantas)}')),
+    # Busca
+    Cenario('busca', 'GET', _get(lambda r, a: f'/api/busca?q={r.choice(a.fragmentos_nome)}')),
+    Cenario('busca_autocomplete', 'GET', _get(lambda r, a: f'/api/busca/autocomplete?q={r.choice(a.fragmentos_nome)}')),
+    # Dashboard
+    Cenario('dashboard_stats', 'GET', _get('/api/admin/dashboard/stats')),
+    Cenario('dashboard_plantas_por_familia', 'GET', _get('/api/admin/dashboard/plantas-por-familia')),
+    Cenario('dashboard_plantas_por_provincia', 'GET', _get('/api/admin/dashboard/plantas-por-provincia')),
+    Cenario('dashboard_referencias_stats', 'GET', _get('/api/admin/dashboard/referencias-stats')),
+    Cenario('dashboard_autores_stats', 'GET', _get('/api/admin/dashboard/autores-stats'), SO_MYSQL),
+    # Listas do admin
+    Cenario('admin_autores', 'GET', _get(lambda r, a: f'/api/admin/autores?page={r.randint(1, 20)}'), SO_MYSQL),
+    Cenario('admin_referencias', 'GET', _get(lambda r, a: f'/api/admin/referencias?page={r.randint(1, 20)}'),
+            SO_MYSQL),
+    # Escrita: as plantas criadas são apagadas no fim do cenário
+    Cenario('wizard_submit', 'POST', _corpo_wizard),
+)
+
+
+def selecionar(nomes=None):
+    """Cenários pela ordem de CENARIOS (nomes: lista ou None para todos)"""
+    if not nomes:
+        return list(CENARIOS)
+    desconhecidos = set(nomes) - {c.nome for c in CENARIOS}
+    if desconhecidos:
+        raise ValueError(f"Cenários desconhecidos: {', '.join(sorted(desconhecidos))}")
+    return [c for c in CENARIOS if c.nome in nomes]
+
+
+def separar_por_dialeto(cenarios, dialeto):
+    """
+    Returns:
+        tuple: (cenários que correm em `dialeto`, nomes dos que não correm)
+    """
+    suportados = [c for c in cenarios if not c.dialetos or dialeto in c.dialetos]
+    return suportados, [c.nome for c in cenarios if c not in suportados]
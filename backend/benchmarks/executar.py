@@ -0,0 +1,387 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Executar o Benchmark dos Endpoints
+
+Os pedidos passam pelo test client (WSGI no mesmo processo: mede a
+aplicação e a BD, sem rede nem servidor). Por cenário:
+- latência p50/p95/p99/máx. dos pedidos medidos (após o aquecimento, com
+  gc.collect() fora do tempo medido entre pedidos) e o menor p50 das
+  RONDAS em que os pedidos medidos se dividem. As rondas dos cenários
+  alternam: um período lento da máquina afeta uma ronda, não todas
+- queries por pedido e tempo de BD (utils.sql_instrumentacao), contra o
+  @orcamento_queries do endpoint: a aplicação corre com
+  SQL_ORCAMENTO_ESTRITO, como nos testes
+- pico de memória Python de um pedido (tracemalloc, em pedidos extra: o
+  tracemalloc atrasaria os pedidos medidos). O mesmo pedido corre antes
+  sem tracemalloc (caches da aplicação preenchidas) e fica o menor pico
+  de SONDAS_MEMORIA repetições
+
+Cada cenário usa o seu próprio gerador aleatório (semente + nome), por isso
+os pedidos não mudam quando se corre só uma parte dos cenários. Cenários de
+endpoints que só funcionam noutra BD (SQL de MySQL) são ignorados
+
+O processo termina com código 1 (utilizável no CI) se algum cenário
+exceder o orçamento de queries, tiver respostas 5xx ou, face à baseline
+(baselines/<dialeto>-<escala>.json), se o p50 das rondas e o p95 ou a
+memória passarem a tolerância, houver mais queries ou qualquer erro
+(4xx/5xx). Uma baseline com erros não é gravada
+
+Exemplos (a partir de backend/):
+    DATABASE_URL=sqlite:////tmp/bench.db python -m benchmarks.executar --gerar --limpar --escala media
+    python -m benchmarks.executar --escala media --gravar-baseline
+    python -m benchmarks.executar --escala media --cenarios plantas,planta_detalhe
+"""
+import argparse
+import contextlib
+import gc
+import io
+import json
+import math
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+PASTA_BASELINES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines')
+
+# Diferenças abaixo disto são ruído mesmo que ultrapassem a tolerância relativa
+RUIDO_MS = 2.0
+RUIDO_MEMORIA_KB = 64
+
+RONDAS = 5
+SONDAS_MEMORIA = 3
+
+
+def percentil(valores, p):
+    """Percentil pelo método nearest-rank (valores já ordenados)"""
+    if not valores:
+        return None
+    return round(valores[max(0, math.ceil(p / 100 * len(valores)) - 1)], 2)
+
+
+def erros_servidor(relatorio):
+    """
+    Returns:
+        dict: cenário -> estados, dos cenários com alguma resposta 5xx
+    """
+    return {
+        nome: r['estados'] for nome, r in relatorio['cenarios'].items()
+        if any(int(estado) >= 500 for estado in r['estados'])
+    }
+
+
+def acima_do_orcamento(relatorio):
+    """
+    Returns:
+        dict: cenário -> (pedidos acima do orçamento, orçamento)
+    """
+    return {
+        nome: (r['acima_orcamento'], r['orcamento']) for nome, r in relatorio['cenarios'].items()
+        if r['acima_orcamento']
+    }
+
+
+def orcamento_endpoint(app, url, metodo):
+    """@orcamento_queries do endpoint que serve `url` (ou SQL_ORCAMENTO_PADRAO)"""
+    from werkzeug.exceptions import HTTPException
+
+    try:
+        endpoint, _ = app.url_map.bind('localhost').match(url.split('?')[0], method=metodo)
+    except HTTPException:
+        return None
+    limite = getattr(app.view_functions.get(endpoint), 'orcamento_queries', None)
+    return limite if limite is not None else app.config.get('SQL_ORCAMENTO_PADRAO')
+
+
+class MedicaoCenario:
+    """
+    Pedidos de um cenário, acumulados ao longo das rondas
+
+    As rondas de todos os cenários alternam (ronda 1 de todos, depois a 2...):
+    um período lento da máquina cai numa ronda de cada cenário, não em todas
+    """
+
+    def __init__(self, cliente, cenario, amostras, rng):
+        self.cliente, self.cenario, self.amostras, self.rng = cliente, cenario, amostras, rng
+        self.rondas = []  # Latências de cada ronda
+        self.queries, self.tempo_db, self.estados, self.criadas = [], [], {}, []
+        self.erros = self.acima = 0
+        self.picos = []
+        self.orcamento = orcamento_endpoint(cliente.application, cenario.pedido(random.Random(0), amostras)[0],
+                                            cenario.metodo)
+
+    def pedido(self, url_corpo=None):
+        url, corpo = url_corpo or self.cenario.pedido(self.rng, self.amostras)
+        resposta = self.cliente.open(url, method=self.cenario.metodo, json=corpo)
+        resposta.get_data()  # Corpos em streaming também contam
+        if self.cenario.metodo == 'POST' and resposta.status_code == 201:
+            self.criadas.append(resposta.get_json().get('id_planta'))
+        return resposta
+
+    def ronda(self, iteracoes, aquecimento):
+        """`aquecimento` pedidos (caches de outros cenários) e depois `iteracoes` medidos"""
+        from utils.sql_instrumentacao import medir_queries
+
+        latencias = []
+        for i in range(aquecimento + iteracoes):
+            gc.collect()  # Lixo dos pedidos anteriores não é recolhido dentro do tempo medido
+            with medir_queries() as medicao:
+                inicio = time.perf_counter()
+                resposta = self.pedido()
+                ms = (time.perf_counter() - inicio) * 1000
+            if i < aquecimento:
+                continue
+            latencias.append(ms)
+            self.queries.append(medicao.total)
+            self.tempo_db.append(medicao.tempo_ms)
+            self.estados[resposta.status_code] = self.estados.get(resposta.status_code, 0) + 1
+            if resposta.status_code >= 400:
+                self.erros += 1
+            if self.orcamento is not None and medicao.total > self.orcamento:
+                self.acima += 1
+        self.rondas.append(latencias)
+
+    def memoria(self):
+        """
+        Pico de memória de um pedido fixo (POST: corpo novo, o nome científico
+        é único), primeiro sem tracemalloc para preencher as caches
+        """
+        fixo = None if self.cenario.metodo == 'POST' else self.cenario.pedido(self.rng, self.amostras)
+        self.pedido(fixo)
+        for _ in range(SONDAS_MEMORIA):
+            gc.collect()
+            tracemalloc.start()
+            try:
+                self.pedido(fixo)
+                self.picos.append(tracemalloc.get_traced_memory()[1])
+            finally:
+                tracemalloc.stop()
+
+    def limpar(self):
+        """Plantas criadas pelo wizard: a BD fica como estava para a próxima execução"""
+        for id_planta in self.criadas:
+            self.cliente.delete(f'/api/plantas/{id_planta}')
+        self.criadas = []
+
+    def resultado(self):
+        """
+        Returns:
+            dict: latências, queries, memória e erros do cenário
+        """
+        latencias = sorted(ms for ronda in self.rondas for ms in ronda)
+        return {
+            'pedidos': len(latencias),
+            'erros': self.erros,
+            'estados': {str(k): v for k, v in sorted(self.estados.items())},
+            'orcamento': self.orcamento,
+            'acima_orcamento': self.acima,
+            'p50_ms': percentil(latencias, 50),
+            'p50_ronda_min_ms': min(percentil(sorted(ronda), 50) for ronda in self.rondas if ronda),
+            'p95_ms': percentil(latencias, 95),
+            'p99_ms': percentil(latencias, 99),
+            'max_ms': round(latencias[-1], 2),
+            'media_ms': round(sum(latencias) / len(latencias), 2),
+            'queries_media': round(sum(self.queries) / len(self.queries), 1),
+            'queries_max': max(self.queries),
+            'tempo_db_media_ms': round(sum(self.tempo_db) / len(self.tempo_db), 2),
+            'pico_memoria_kb': round(min(self.picos) / 1024, 1),
+        }
+
+
+def executar(app, cenarios, iteracoes=30, aquecimento=3, semente=42, escala=None, silencioso=True):
+    """
+    Correr os cenários e devolver o relatório (dict serializável em JSON)
+
+    Os `iteracoes` pedidos medidos de cada cenário dividem-se por RONDAS
+    rondas alternadas, cada uma precedida de `aquecimento` pedidos
+    """
+    from sqlalchemy.engine import make_url
+
+    from benchmarks.cenarios import Amostras, separar_por_dialeto
+
+    url = make_url(app.config['SQLALCHEMY_DATABASE_URI'])
+    dialeto = url.get_backend_name()
+    cenarios, ignorados = separar_por_dialeto(cenarios, dialeto)
+    if ignorados:
+        print(f"ℹ️  Ignorados em {dialeto} (SQL de outra BD): {', '.join(ignorados)}")
+
+    with app.app_context():
+        amostras = Amostras(random.Random(semente))
+        total_plantas = len(amostras.plantas)
+    cliente = app.test_client()
+    medicoes = [
+        MedicaoCenario(cliente, cenario, amostras, random.Random(f'{semente}:{cenario.nome}'))
+        for cenario in cenarios
+    ]
+    por_ronda = max(math.ceil(iteracoes / RONDAS), 1)
+
+    resultados = {}
+    with contextlib.ExitStack() as pilha:
+        if silencioso:
+            # prints e tracebacks das rotas não se misturam com o relatório
+            pilha.enter_context(contextlib.redirect_stdout(io.StringIO()))
+            pilha.enter_context(contextlib.redirect_stderr(io.StringIO()))
+        for ronda in range(RONDAS):
+            for medicao in medicoes:
+                medicao.ronda(min(por_ronda, iteracoes - ronda * por_ronda), aquecimento)
+        for medicao in medicoes:
+            medicao.memoria()
+            medicao.limpar()
+            resultados[medicao.cenario.nome] = medicao.resultado()
+
+    for nome, resultado in resultados.items():
+        print(f"  {nome:<34} p50 {resultado['p50_ms']:>8} ms  p95 {resultado['p95_ms']:>8} ms  "
+              f"{resultado['queries_media']:>6} queries  {resultado['pico_memoria_kb']:>8} KB"
+              + (f"  ⚠️ {resultado['acima_orcamento']} acima do orçamento ({resultado['orcamento']})"
+                 if resultado['acima_orcamento'] else '')
+              + (f"  ⚠️ {resultado['erros']} erros {resultado['estados']}" if resultado['erros'] else ''))
+
+    return {
+        'gerado_em': datetime.utcnow().isoformat(),
+        'dialeto': dialeto,
+        'escala': escala,
+        'plantas': total_plantas,
+        'semente': semente,
+        'iteracoes': iteracoes,
+        'rondas': RONDAS,
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        'pico_rss_mb': (round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+                        if resource else None),
+        'cenarios': resultados,
+        'ignorados': ignorados,
+    }
+
+
+def _pior(valor, base, tolerancia):
+    return valor > base * (1 + tolerancia) and valor - base > RUIDO_MS
+
+
+def comparar(atual, baseline, tolerancia=0.25):
+    """
+    Returns:
+        list: descrições das regressões face à baseline
+    """
+    regressoes = []
+    for nome, r in atual['cenarios'].items():
+        b = baseline.get('cenarios', {}).get(nome)
+        # Qualquer erro conta, mesmo que a baseline já os tivesse ou não tenha o cenário
+        if r['erros']:
+            regressoes.append(f"{nome}: {r['erros']} erros {r['estados']} (baseline {b['erros'] if b else '-'})")
+        if not b:
+            continue
+        # p50 de TODAS as rondas E p95 piores: um pico isolado (GC, outro processo) não é regressão
+        p50_base = b.get('p50_ronda_min_ms', b['p50_ms'])  # Baselines anteriores às rondas
+        if _pior(r['p50_ronda_min_ms'], p50_base, tolerancia) and _pior(r['p95_ms'], b['p95_ms'], tolerancia):
+            regressoes.append(f"{nome}: p50 {p50_base} → {r['p50_ronda_min_ms']} ms (menor das rondas), "
+                              f"p95 {b['p95_ms']} → {r['p95_ms']} ms")
+        if r['queries_max'] > b['queries_max']:
+            regressoes.append(f"{nome}: queries {b['queries_max']} → {r['queries_max']}")
+        if (r['pico_memoria_kb'] > b['pico_memoria_kb'] * (1 + tolerancia) and
+                r['pico_memoria_kb'] - b['pico_memoria_kb'] > RUIDO_MEMORIA_KB):
+            regressoes.append(f"{nome}: memória {b['pico_memoria_kb']} → {r['pico_memoria_kb']} KB")
+    return regressoes
+
+
+def _gravar_json(caminho, dados):
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    with open(caminho, 'w', encoding='utf-8') as f:
+        json.dump(dados, f, ensure_ascii=False, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark dos endpoints da API (usa DATABASE_URL)')
+    parser.add_argument('--gerar', action='store_true', help='gerar dados sintéticos antes de medir')
+    parser.add_argument('--limpar', action='store_true', help='com --gerar: apagar e recriar TODAS as tabelas')
+    parser.add_argument('--so-gerar', action='store_true', help='gerar os dados e sair')
+    parser.add_argument('--escala', default='pequena', help='pequena, media ou grande (também nomeia a baseline)')
+    parser.add_argument('--semente', type=int, default=42)
+    parser.add_argument('--iteracoes', type=int, default=30)
+    parser.add_argument('--aquecimento', type=int, default=3)
+    parser.add_argument('--cenarios', help='lista separada por vírgulas (por omissão todos)')
+    parser.add_argument('--baseline', help='ficheiro da baseline (por omissão baselines/<dialeto>-<escala>.json)')
+    parser.add_argument('--gravar-baseline', action='store_true', help='gravar o resultado como nova baseline')
+    parser.add_argument('--tolerancia', type=float, default=0.25, help='aumento relativo aceite na latência e memória')
+    parser.add_argument('--saida', help='gravar o relatório completo em JSON')
+    parser.add_argument('--verboso', action='store_true', help='mostrar os prints da aplicação')
+    args = parser.parse_args(argv)
+
+    from app import create_app
+    from benchmarks.cenarios import selecionar
+    from benchmarks.gerador import GeradorDados
+
+    app = create_app()
+    # Como nos testes: uma rota acima do @orcamento_queries falha (500)
+    app.config['SQL_ORCAMENTO_ESTRITO'] = True
+
+    if args.gerar or args.so_gerar:
+        with app.app_context():
+            inicio = time.perf_counter()
+            totais = GeradorDados(semente=args.semente, escala=args.escala).gerar(limpar=args.limpar)
+            print(f"⏱️  {time.perf_counter() - inicio:.1f}s: "
+                  + ', '.join(f'{tabela} {n}' for tabela, n in sorted(totais.items())))
+        if args.so_gerar:
+            return 0
+
+    cenarios = selecionar(args.cenarios.split(',') if args.cenarios else None)
+    print(f"📊 {len(cenarios)} cenários × {args.iteracoes} pedidos")
+    relatorio = executar(app, cenarios, args.iteracoes, args.aquecimento, args.semente,
+                         args.escala, silencioso=not args.verboso)
+
+    if args.saida:
+        _gravar_json(args.saida, relatorio)
+
+    excedidos = acima_do_orcamento(relatorio)
+    if excedidos:
+        print(f"❌ {len(excedidos)} cenários acima do orçamento de queries:")
+        for nome, (pedidos, orcamento) in excedidos.items():
+            print(f"   - {nome}: {pedidos} pedidos com mais de {orcamento} queries")
+        return 1
+
+    falhas = erros_servidor(relatorio)
+    if falhas:
+        print(f"❌ {len(falhas)} cenários com erros 5xx (ver com --verboso):")
+        for nome, estados in falhas.items():
+            print(f"   - {nome}: {estados}")
+        return 1
+
+    caminho = args.baseline or os.path.join(PASTA_BASELINES, f"{relatorio['dialeto']}-{args.escala}.json")
+    if args.gravar_baseline:
+        com_erros = [nome for nome, r in relatorio['cenarios'].items() if r['erros']]
+        if com_erros:
+            print(f"❌ Baseline não gravada: cenários com erros ({', '.join(com_erros)})")
+            return 1
+        _gravar_json(caminho, relatorio)
+        print(f"💾 Baseline gravada: {caminho}")
+        return 0
+
+    if not os.path.exists(caminho):
+        print(f"ℹ️  Sem baseline em {caminho} (use --gravar-baseline)")
+        return 0
+    with open(caminho, encoding='utf-8') as f:
+        baseline = json.load(f)
+    if baseline.get('plantas') != relatorio['plantas']:
+        print(f"⚠️ A baseline foi medida com {baseline.get('plantas')} plantas, a BD tem {relatorio['plantas']}")
+
+    regressoes = comparar(relatorio, baseline, args.tolerancia)
+    if regressoes:
+        print(f"❌ {len(regressoes)} regressões face a {caminho}:")
+        for r in regressoes:
+            print(f"   - {r}")
+        return 1
+    print(f"✅ Sem regressões face a {caminho}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
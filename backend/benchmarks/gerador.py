@@ -0,0 +1,538 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Gerador de Dados Sintéticos (reprodutível: a mesma semente e escala geram
+exatamente os mesmos registos, com os mesmos ids)
+
+Distribuições próximas das de um herbário etnobotânico real:
+- Famílias e géneros com cauda longa (Zipf): poucas famílias com milhares
+  de plantas (Fabaceae, Asteraceae...) e muitas com uma ou duas
+- Nomes científicos com autoria, variedades/subespécies, híbridos e
+  grafias de família inconsistentes (exercitam a taxonomia e o dicionário)
+- Nomes comuns, referências, locais e imagens por planta com dispersão
+  (a maioria tem poucos, algumas têm muitos; algumas não têm nenhum)
+- Autores prolíficos (Zipf) e referências com 1 a 6 autores
+
+As linhas são inseridas em lote (executemany, sem eventos do ORM); no fim
+as tabelas derivadas - famílias, taxonomia, pickers - são reconstruídas
+pelas próprias rotinas de sincronização da aplicação
+"""
+import base64
+import random
+from datetime import datetime, timedelta
+
+from models.planta import (db, Planta_medicinal, Nome_comum, Imagem, Imagem_variante, Ficheiro_imagem,
+                           Planta_metodo_trad, Parte_metodo)
+from models.localizacao import Provincia, Local_colheita, Planta_local, Regiao
+from models.uso_medicinal import (Parte_usada, Indicacao, Planta_parte, Parte_indicacao,
+                                  Metodo_preparacao_trad, Metodo_extraccao_cientif)
+from models.referencia import Autor, Afiliacao, Autor_afiliacao, Referencia, Referencia_autor, Planta_referencia
+from models.usuario import PerfilUsuario, Usuario, SessaoUsuario, LogAcoesUsuario, LogPesquisas
+from utils.imagens_conteudo import url as url_conteudo
+
+# Volumes principais por escala (os restantes derivam destes)
+ESCALAS = {
+    'pequena': {'plantas': 2000, 'nomes_comuns': 8000, 'referencias': 800, 'autores': 400},
+    'media': {'plantas': 10000, 'nomes_comuns': 40000, 'referencias': 4000, 'autores': 1600},
+    'grande': {'plantas': 50000, 'nomes_comuns': 200000, 'referencias': 20000, 'autores': 8000},
+}
+
+TAMANHO_LOTE = 5000
+
+# Datas relativas a um instante fixo (não a now(): os dados não mudam entre execuções)
+DATA_BASE = datetime(2024, 1, 1)
+
+FAMILIAS = (
+    'Fabaceae', 'Asteraceae', 'Euphorbiaceae', 'Rubiaceae', 'Lamiaceae', 'Apocynaceae', 'Malvaceae',
+    'Combretaceae', 'Anacardiaceae', 'Solanaceae', 'Poaceae', 'Acanthaceae', 'Cucurbitaceae',
+    'Celastraceae', 'Rutaceae', 'Meliaceae', 'Moraceae', 'Capparaceae', 'Asphodelaceae', 'Amaranthaceae',
+    'Verbenaceae', 'Annonaceae', 'Ebenaceae', 'Myrtaceae', 'Vitaceae', 'Menispermaceae', 'Loganiaceae',
+    'Sapindaceae', 'Burseraceae', 'Phyllanthaceae',
+)
+EPITETOS = (
+    'africana', 'officinalis', 'vulgaris', 'indica', 'mossambicensis', 'zambesiaca', 'capensis', 'alba',
+    'nigra', 'rubra', 'tomentosa', 'glabra', 'angustifolia', 'latifolia', 'macrophylla', 'parviflora',
+    'grandiflora', 'arborea', 'scandens', 'repens', 'edulis', 'amara', 'odorata', 'spinosa', 'pubescens',
+    'villosa', 'speciosa', 'elegans', 'gracilis', 'robusta', 'sylvatica', 'aquatica', 'montana', 'littoralis',
+    'oleifera', 'senegalensis', 'abyssinica', 'kirkii', 'welwitschii', 'swynnertonii',
+)
+AUTORIAS = ('L.', 'Lam.', 'Hochst.', 'Benth.', 'Welw.', 'Baker', 'Oliv.', 'Burm.f.', '(L.) DC.', 'Sond.',
+            'Klotzsch', 'Harv.', 'Engl.', 'Schumach. & Thonn.', '(Hochst.) A.Rich.', 'Wild')
+SILABAS = ('ma', 'mu', 'ka', 'ku', 'nha', 'nhi', 'mbe', 'ndo', 'tsi', 'wa', 'xi', 'zi', 'la', 'ru',
+           'ga', 'sa', 'na', 'ti', 'ba', 'vu', 'mpa', 'ngu', 'ko', 'le', 'se')
+PREFIXOS_NOME = ('erva', 'pau', 'folha', 'raiz', 'flor', 'árvore', 'capim', 'batata')
+FRASES = (
+    'Espécie frequente em matas de miombo e savanas arborizadas.',
+    'Usada pelos praticantes de medicina tradicional da região.',
+    'Cultivada em quintais e machambas.',
+    'Ocorre em solos arenosos próximos da costa.',
+    'A colheita é feita sobretudo na estação seca.',
+    'Vendida nos mercados informais das cidades.',
+)
+COMPOSTOS = ('alcaloides', 'flavonoides', 'taninos', 'saponinas', 'terpenoides', 'cumarinas',
+             'antraquinonas', 'glicosídeos cardíacos', 'óleos essenciais', 'esteróis')
+PROPRIEDADES = ('anti-inflamatória', 'antimicrobiana', 'antimalárica', 'antioxidante', 'analgésica',
+                'antidiarreica', 'hipoglicemiante', 'anti-helmíntica', 'cicatrizante', 'diurética')
+
+PROVINCIAS = (  # (nome, peso ~ população)
+    ('Niassa', 2), ('Cabo Delgado', 3), ('Nampula', 6), ('Zambézia', 6), ('Tete', 3), ('Manica', 2),
+    ('Sofala', 3), ('Inhambane', 2), ('Gaza', 2), ('Maputo', 2), ('Maputo Cidade', 1),
+)
+ZONAS = ('Norte', 'Sul', 'Centro', 'Litoral', 'Interior')
+TIPOS_LOCAL = ('Distrito de', 'Posto Administrativo de', 'Localidade de', 'Reserva de', 'Serra de')
+
+PARTES = ('Folha', 'Raiz', 'Casca do caule', 'Caule', 'Fruto', 'Semente', 'Flor', 'Planta inteira',
+          'Látex', 'Rizoma', 'Bolbo', 'Tubérculo', 'Resina', 'Ramo', 'Seiva')
+CONDICOES = (
+    'malária', 'diarreia', 'tosse', 'febre', 'dores de cabeça', 'dores de barriga', 'feridas', 'queimaduras',
+    'diabetes', 'hipertensão', 'infecções urinárias', 'infertilidade', 'dores menstruais', 'reumatismo',
+    'parasitas intestinais', 'doenças de pele', 'conjuntivite', 'dores de dentes', 'asma', 'tuberculose',
+    'anemia', 'epilepsia', 'picadas de cobra', 'hemorroidas', 'úlceras', 'constipação', 'vómitos',
+    'insónia', 'doenças venéreas', 'inflamação', 'icterícia', 'bilharziose', 'sarampo', 'varicela',
+    'inchaço', 'dores no peito', 'fraqueza', 'falta de apetite', 'convulsões infantis', 'otite',
+)
+ACOES = ('Tratamento de', 'Alívio de', 'Prevenção de', 'Usada contra', 'Complemento no tratamento de')
+PREPARACOES = ('Decocção', 'Infusão', 'Maceração', 'Cataplasma', 'Pó', 'Sumo', 'Inalação', 'Banho')
+DETALHES_PREPARACAO = ('das partes frescas', 'das partes secas', 'em água fria', 'em água quente',
+                       'misturada com mel')
+EXTRACCOES = ('Extracção aquosa', 'Extracção etanólica', 'Extracção metanólica', 'Soxhlet com hexano',
+              'Hidrodestilação', 'Extracção com diclorometano', 'Extracção por ultrassons',
+              'Extracção com acetato de etilo', 'Percolação', 'Extracção supercrítica com CO2')
+INSTITUICOES = (
+    ('Universidade Eduardo Mondlane', 'UEM'), ('Instituto de Investigação Agrária de Moçambique', 'IIAM'),
+    ('Instituto Nacional de Saúde', 'INS'), ('Universidade Lúrio', 'UniLúrio'),
+    ('Universidade Pedagógica', 'UP'), ('Centro de Investigação e Desenvolvimento em Etnobotânica', 'CIDE'),
+    ('Universidade Zambeze', 'UniZambeze'), ('Jardim Botânico de Maputo', None),
+)
+APELIDOS = (
+    'Silva', 'Macuácua', 'Bandeira', 'Cossa', 'Mabunda', 'Nhantumbo', 'Sitoe', 'Chissano', 'Mondlane',
+    'Tembe', 'Langa', 'Muianga', 'Jansen', 'Mendes', 'Pereira', 'Ribeiro', 'Santos', 'Costa', 'Gonçalves',
+    'Magaia', 'Zimba', 'Chirindza', 'Bruschi', 'Hedberg', 'Van Wyk', 'Neuwinger', 'Watt', 'Gelfand',
+    'Amico', 'Almeida', 'Matavele', 'Manhiça', 'Mussa', 'Ussene', 'Abdula', 'Carimo', 'Lopes', 'Tique',
+)
+TEMAS_TITULO = (
+    'Estudo etnobotânico das plantas medicinais usadas em {}',
+    'Ethnobotanical survey of medicinal plants in {}',
+    'Plantas usadas no tratamento de {}',
+    'Phytochemical screening and antimicrobial activity of {}',
+    'Atividade antimalárica de extractos de {}',
+    'Conhecimento tradicional sobre {} em comunidades rurais',
+    'Medicinal plants traded in the markets of {}',
+)
+ACOES_UTILIZADOR = ('LOGIN', 'CRIAR_PLANTA', 'EDITAR_PLANTA', 'APAGAR_PLANTA', 'CRIAR_REFERENCIA',
+                    'EDITAR_AUTOR', 'UPLOAD_IMAGEM')
+
+
+# =====================================================
+# UTILITÁRIOS
+# =====================================================
+
+def _pesos_zipf(rng, n, s=1.1):
+    """Pesos 1/k^s em ordem aleatória (a popularidade não segue os ids)"""
+    pesos = [1 / (k ** s) for k in range(1, n + 1)]
+    rng.shuffle(pesos)
+    return pesos
+
+
+def _amostra_unica(rng, populacao, pesos, k):
+    """k elementos distintos escolhidos pelos pesos (k pequeno face à população)"""
+    k = min(k, len(populacao))
+    escolhidos = set()
+    while len(escolhidos) < k:
+        escolhidos.update(rng.choices(populacao, weights=pesos, k=k - len(escolhidos)))
+    return sorted(escolhidos)
+
+
+def _quantos(rng, pesos):
+    """Índice sorteado de uma lista de pesos (p.ex. número de autores de uma referência)"""
+    return rng.choices(range(len(pesos)), weights=pesos)[0]
+
+
+def _palavra(rng, minimo=2, maximo=4):
+    return ''.join(rng.choice(SILABAS) for _ in range(rng.randint(minimo, maximo)))
+
+
+def _inserir(tabela, linhas):
+    """INSERT em lotes (sem objetos ORM; packets razoáveis no MySQL)"""
+    tabela = getattr(tabela, '__table__', tabela)
+    for i in range(0, len(linhas), TAMANHO_LOTE):
+        db.session.execute(tabela.insert(), linhas[i:i + TAMANHO_LOTE])
+
+
+# =====================================================
+# GERADOR
+# =====================================================
+
+class GeradorDados:
+    """
+    Gera e insere todos os dados de uma escala
+
+    Exemplo:
+        with app.app_context():
+            totais = GeradorDados(semente=42, escala='media').gerar(limpar=True)
+    """
+
+    def __init__(self, semente=42, escala='pequena'):
+        if escala not in ESCALAS:
+            raise ValueError(f"Escala desconhecida: {escala} (use {', '.join(ESCALAS)})")
+        self.semente = semente
+        self.escala = escala
+        self.volumes = ESCALAS[escala]
+        self.rng = random.Random(semente)
+        self.totais = {}
+
+    def _gravar(self, tabela, linhas):
+        _inserir(tabela, linhas)
+        nome = getattr(tabela, '__tablename__', None) or tabela.name
+        self.totais[nome] = self.totais.get(nome, 0) + len(linhas)
+
+    # ---------------- auxiliares ----------------
+
+    def _gerar_localizacao(self):
+        rng = self.rng
+        self._gravar(Provincia, [{'id_provincia': i, 'provincia': nome}
+                                 for i, (nome, _) in enumerate(PROVINCIAS, 1)])
+        pesos_provincia = [peso for _, peso in PROVINCIAS]
+
+        regioes = []
+        for id_provincia, (nome, _) in enumerate(PROVINCIAS, 1):
+            for zona in rng.sample(ZONAS, 3):
+                regioes.append({'id_regiao': len(regioes) + 1, 'nome_regiao': f'{zona} de {nome}',
+                                'id_provincia': id_provincia})
+        self._gravar(Regiao, regioes)
+
+        total = max(40, min(900, self.volumes['plantas'] // 60))
+        provincias = rng.choices(range(1, len(PROVINCIAS) + 1), weights=pesos_provincia, k=total)
+        self.locais = list(range(1, total + 1))
+        self._gravar(Local_colheita, [{
+            'id_local': i, 'nome_local': f'{rng.choice(TIPOS_LOCAL)} {_palavra(rng).capitalize()}',
+            'id_provincia': provincias[i - 1]
+        } for i in self.locais])
+
+    def _gerar_usos(self):
+        rng = self.rng
+        self.partes = list(range(1, len(PARTES) + 1))
+        self.pesos_partes = [1 / k for k in self.partes]  # Folha e raiz são as mais citadas
+        self._gravar(Parte_usada, [{'id_parte': i, 'nome_parte': nome} for i, nome in enumerate(PARTES, 1)])
+
+        descricoes = sorted({f'{acao} {condicao}' for acao in ACOES for condicao in CONDICOES})
+        rng.shuffle(descricoes)
+        descricoes = descricoes[:max(60, min(400, self.volumes['plantas'] // 100))]
+        self.indicacoes = list(range(1, len(descricoes) + 1))
+        self._gravar(Indicacao, [{'id_uso': i, 'descricao_uso': d} for i, d in enumerate(descricoes, 1)])
+
+        preparacoes = [f'{p} {d}' for p in PREPARACOES for d in DETALHES_PREPARACAO]
+        self._gravar(Metodo_preparacao_trad, [{'id_metodo_preparacao': i, 'descricao_metodo_preparacao': d}
+                                              for i, d in enumerate(preparacoes, 1)])
+        self._gravar(Metodo_extraccao_cientif, [{'id_metodo_extraccao': i, 'descricao_metodo_extraccao': d}
+                                                for i, d in enumerate(EXTRACCOES, 1)])
+
+        # Indicações e métodos por parte (partilhados por todas as plantas)
+        pesos_indicacoes = _pesos_zipf(rng, len(self.indicacoes), 0.8)
+        pares, metodos_trad, metodos_extr = [], [], []
+        for id_parte, peso in zip(self.partes, self.pesos_partes):
+            k = max(3, int(len(self.indicacoes) * 0.3 * peso))
+            pares.extend({'id_parte': id_parte, 'id_uso': i}
+                         for i in _amostra_unica(rng, self.indicacoes, pesos_indicacoes, k))
+            metodos_trad.extend({'id_parte': id_parte, 'id_metodo_preparacao': m}
+                                for m in rng.sample(range(1, len(preparacoes) + 1), rng.randint(2, 8)))
+            metodos_extr.extend({'id_parte': id_parte, 'id_metodo_extraccao': m}
+                                for m in rng.sample(range(1, len(EXTRACCOES) + 1), rng.randint(1, 5)))
+        self._gravar(Parte_indicacao, pares)
+        self._gravar(Planta_metodo_trad, metodos_trad)
+        self._gravar(Parte_metodo, metodos_extr)
+
+    # ---------------- plantas ----------------
+
+    def _nomes_cientificos(self, total):
+        """[(nome_cientifico, familia)] únicos, com famílias e géneros em cauda longa"""
+        rng = self.rng
+        n_familias = max(len(FAMILIAS), min(250, total // 100))
+        familias = list(FAMILIAS)
+        while len(familias) < n_familias:
+            nome = f'{_palavra(rng, 2, 3).capitalize()}aceae'
+            if nome not in familias:
+                familias.append(nome)
+        # As famílias reais ficam à cabeça da distribuição
+        pesos_familias = [1 / (k ** 1.2) for k in range(1, n_familias + 1)]
+
+        n_generos = max(20, total // 8)
+        generos = []
+        nomes_generos = set()
+        while len(generos) < n_generos:
+            nome = _palavra(rng, 2, 4).capitalize()
+            if nome not in nomes_generos:
+                nomes_generos.add(nome)
+                generos.append((nome, rng.choices(familias, weights=pesos_familias)[0]))
+        pesos_generos = _pesos_zipf(rng, n_generos)
+
+        nomes = set()
+        resultado = []
+        while len(resultado) < total:
+            genero, familia = rng.choices(generos, weights=pesos_generos)[0]
+            epiteto = rng.choice(EPITETOS) if rng.random() < 0.6 else _palavra(rng) + rng.choice(('a', 'ii', 'ensis'))
+            sorteio = rng.random()
+            if sorteio < 0.07:
+                nome = f'{genero} {epiteto} var. {_palavra(rng)}a'
+            elif sorteio < 0.10:
+                nome = f'{genero} {epiteto} subsp. {rng.choice(EPITETOS)}'
+            elif sorteio < 0.11:
+                nome = f'{genero} × {epiteto}'
+            else:
+                nome = f'{genero} {epiteto} {rng.choice(AUTORIAS)}'
+            nome = nome[:100]
+            if nome in nomes:
+                continue
+            nomes.add(nome)
+            # Grafias inconsistentes da família, como nos dados importados à mão
+            if rng.random() < 0.02:
+                familia = rng.choice((familia.lower(), familia.upper(), f' {familia}'))
+            resultado.append((nome, familia))
+        return resultado
+
+    def _gerar_plantas(self):
+        rng = self.rng
+        total = self.volumes['plantas']
+        self.plantas = list(range(1, total + 1))
+
+        linhas = []
+        for id_planta, (nome, familia) in enumerate(self._nomes_cientificos(total), 1):
+            linhas.append({
+                'id_planta': id_planta, 'nome_cientifico': nome, 'familia': familia,
+                'infos_adicionais': ' '.join(rng.sample(FRASES, rng.randint(1, 3))) if rng.random() < 0.6 else None,
+                'comp_quimica': ', '.join(rng.sample(COMPOSTOS, rng.randint(1, 4))) if rng.random() < 0.4 else None,
+                'prop_farmacologica': ', '.join(rng.sample(PROPRIEDADES, rng.randint(1, 3))) if rng.random() < 0.4 else None,
+            })
+        self._gravar(Planta_medicinal, linhas)
+
+        # Nomes comuns: conjunto de nomes com repetição (o mesmo nome popular em várias plantas)
+        alvo = self.volumes['nomes_comuns']
+        conjunto = []
+        for _ in range(int(alvo * 0.7)):
+            sorteio = rng.random()
+            if sorteio < 0.6:
+                conjunto.append(_palavra(rng).capitalize())
+            elif sorteio < 0.85:
+                conjunto.append(f'{rng.choice(PREFIXOS_NOME)}-de-{_palavra(rng)}')
+            else:
+                conjunto.append(f'{_palavra(rng).capitalize()} {_palavra(rng, 1, 2)}')
+        pesos_nomes = _pesos_zipf(rng, len(conjunto), 0.7)
+        pesos_plantas = [rng.lognormvariate(0, 0.8) for _ in self.plantas]
+        donos = rng.choices(self.plantas, weights=pesos_plantas, k=alvo)
+        nomes = rng.choices(conjunto, weights=pesos_nomes, k=alvo)
+        self._gravar(Nome_comum, [{'id_nome': i, 'nome': nome, 'id_planta': dono}
+                                  for i, (dono, nome) in enumerate(zip(donos, nomes), 1)])
+
+        pesos_locais = _pesos_zipf(rng, len(self.locais), 0.9)
+        planta_local, planta_parte = [], []
+        for id_planta in self.plantas:
+            for id_local in _amostra_unica(rng, self.locais, pesos_locais, _quantos(rng, (15, 35, 25, 13, 7, 5))):
+                planta_local.append({'id_planta': id_planta, 'id_local': id_local})
+            for id_parte in _amostra_unica(rng, self.partes, self.pesos_partes, 1 + _quantos(rng, (50, 30, 15, 5))):
+                planta_parte.append({'id_planta': id_planta, 'id_parte': id_parte})
+        self._gravar(Planta_local, planta_local)
+        self._gravar(Planta_parte, planta_parte)
+
+    # ---------------- referências ----------------
+
+    def _gerar_referencias(self):
+        rng = self.rng
+        n_afiliacoes = max(len(INSTITUICOES), min(150, self.volumes['autores'] // 50))
+        afiliacoes = list(INSTITUICOES)
+        while len(afiliacoes) < n_afiliacoes:
+            nome = _palavra(rng, 2, 3).capitalize()
+            afiliacoes.append((f'Universidade de {nome}', f'U{nome[:3].upper()}'))
+        self._gravar(Afiliacao, [{'id_afiliacao': i, 'nome_afiliacao': nome, 'sigla_afiliacao': sigla}
+                                 for i, (nome, sigla) in enumerate(afiliacoes, 1)])
+
+        autores = list(range(1, self.volumes['autores'] + 1))
+        self._gravar(Autor, [{
+            'id_autor': i,
+            'nome_autor': f"{rng.choice(APELIDOS)}, {'. '.join(rng.sample('ABCDEFGHIJLMNOPRST', rng.randint(1, 2)))}."
+        } for i in autores])
+
+        ids_afiliacoes = list(range(1, n_afiliacoes + 1))
+        pesos_afiliacoes = [1 / (k ** 1.3) for k in ids_afiliacoes]  # UEM/IIAM à cabeça
+        autor_afiliacao = []
+        for id_autor in autores:
+            for id_afiliacao in _amostra_unica(rng, ids_afiliacoes, pesos_afiliacoes, _quantos(rng, (15, 70, 12, 3))):
+                autor_afiliacao.append({'id_autor': id_autor, 'id_afiliacao': id_afiliacao})
+        self._gravar(Autor_afiliacao, autor_afiliacao)
+
+        referencias = list(range(1, self.volumes['referencias'] + 1))
+        linhas = []
+        for i in referencias:
+            assunto = rng.choice((rng.choice(PROVINCIAS)[0], rng.choice(CONDICOES), _palavra(rng).capitalize()))
+            linhas.append({
+                'id_referencia': i,
+                'titulo_referencia': rng.choice(TEMAS_TITULO).format(assunto)[:255],
+                'link_referencia': f'https://doi.org/10.{rng.randint(1000, 9999)}/ref.{i}' if rng.random() < 0.7 else None,
+                'ano_publicacao': int(rng.triangular(1960, 2024, 2016)),
+            })
+        self._gravar(Referencia, linhas)
+
+        pesos_autores = _pesos_zipf(rng, len(autores))  # Autores prolíficos
+        referencia_autor = []
+        for id_referencia in referencias:
+            for id_autor in _amostra_unica(rng, autores, pesos_autores, 1 + _quantos(rng, (30, 25, 18, 12, 8, 7))):
+                referencia_autor.append({'id_referencia': id_referencia, 'id_autor': id_autor})
+        self._gravar(Referencia_autor, referencia_autor)
+
+        pesos_referencias = _pesos_zipf(rng, len(referencias), 0.9)
+        planta_referencia = []
+        for id_planta in self.plantas:
+            for id_referencia in _amostra_unica(rng, referencias, pesos_referencias,
+                                                _quantos(rng, (10, 35, 25, 15, 8, 4, 3))):
+                planta_referencia.append({'id_planta': id_planta, 'id_referencia': id_referencia})
+        self._gravar(Planta_referencia, planta_referencia)
+
+    # ---------------- imagens ----------------
+
+    def _gerar_imagens(self):
+        """Só metadados (Ficheiro_imagem, Imagem, variantes): não há ficheiros no disco"""
+        rng = self.rng
+        ficheiros, imagens, variantes = {}, [], []
+        for id_planta in self.plantas:
+            if rng.random() >= 0.35:
+                continue
+            for _ in range(1 + _quantos(rng, (55, 25, 12, 8))):
+                if ficheiros and rng.random() < 0.03:
+                    sha256 = rng.choice(list(ficheiros))  # Conteúdo repetido (deduplicado)
+                else:
+                    sha256 = f'{rng.getrandbits(256):064x}'
+                    largura, altura = rng.choice(((4000, 3000), (3000, 4000), (1600, 1200), (1024, 768), (800, 800)))
+                    ficheiros[sha256] = {
+                        'sha256': sha256, 'extensao': rng.choices(('jpg', 'png', 'webp'), weights=(75, 15, 10))[0],
+                        'bytes': rng.randint(80_000, 6_000_000), 'referencias': 0,
+                        'estado': 'pronta' if rng.random() < 0.99 else 'pendente',
+                        'criado_em': DATA_BASE - timedelta(minutes=rng.randint(0, 500_000)),
+                        'largura': largura, 'altura': altura,
+                    }
+                ficheiro = ficheiros[sha256]
+                ficheiro['referencias'] += 1
+                pronta = ficheiro['estado'] == 'pronta'
+                imagens.append({
+                    'id_imagem': len(imagens) + 1, 'id_planta': id_planta, 'sha256': sha256,
+                    'nome_arquivo': f"{sha256}.{ficheiro['extensao']}",
+                    'url_armazenamento': url_conteudo(sha256, ficheiro['extensao']),
+                    'legenda': rng.choice((None, 'Folhas', 'Hábito', 'Flores', 'Frutos', 'Casca')),
+                    'referencia_img': None, 'estado': ficheiro['estado'], 'erro_processamento': None,
+                    'largura': ficheiro['largura'] if pronta else None,
+                    'altura': ficheiro['altura'] if pronta else None,
+                    'formato': ficheiro['extensao'] if pronta else None,
+                    'bytes': ficheiro['bytes'],
+                    'cor_dominante': f'#{rng.randint(0, 0xffffff):06x}' if pronta else None,
+                    'lqip': ('data:image/jpeg;base64,' + base64.b64encode(rng.randbytes(420)).decode('ascii')
+                             if pronta else None),
+                })
+
+        for ficheiro in ficheiros.values():
+            if ficheiro['estado'] != 'pronta':
+                continue
+            for variante, largura in (('thumb', 320), ('medium', 800), ('full', 1600)):
+                largura = min(largura, ficheiro['largura'])
+                altura = max(1, round(ficheiro['altura'] * largura / ficheiro['largura']))
+                for formato in ('webp', 'jpg'):
+                    variantes.append({'sha256': ficheiro['sha256'], 'variante': variante, 'formato': formato,
+                                      'largura': largura, 'altura': altura,
+                                      'bytes': largura * altura // (12 if formato == 'webp' else 8)})
+
+        colunas = {c.name for c in Ficheiro_imagem.__table__.columns}
+        self._gravar(Ficheiro_imagem, [{k: v for k, v in f.items() if k in colunas} for f in ficheiros.values()])
+        self._gravar(Imagem, imagens)
+        self._gravar(Imagem_variante, variantes)
+
+    # ---------------- utilizadores ----------------
+
+    def _gerar_utilizadores(self):
+        rng = self.rng
+        self._gravar(PerfilUsuario, [
+            {'id_perfil': 1, 'nome_perfil': 'Administrador', 'descricao': 'Acesso total', 'data_criacao': DATA_BASE},
+            {'id_perfil': 2, 'nome_perfil': 'Editor', 'descricao': 'Gestão de plantas', 'data_criacao': DATA_BASE},
+            {'id_perfil': 3, 'nome_perfil': 'Consultor', 'descricao': 'Só leitura', 'data_criacao': DATA_BASE},
+        ])
+        # Hash fixo: os utilizadores sintéticos não fazem login
+        utilizadores = list(range(1, 26))
+        self._gravar(Usuario, [{
+            'id_usuario': i, 'nome_completo': f'{_palavra(rng).capitalize()} {rng.choice(APELIDOS)}',
+            'email': f'utilizador{i}@exemplo.mz', 'senha_hash': 'sintetico$sem-login',
+            'id_perfil': 1 if i <= 2 else rng.choice((2, 3)), 'ativo': rng.random() < 0.9,
+            'data_registro': DATA_BASE - timedelta(days=rng.randint(30, 900)), 'tentativas_login': 0,
+        } for i in utilizadores])
+
+        sessoes = []
+        for id_usuario in utilizadores:
+            for _ in range(rng.randint(0, 3)):
+                inicio = DATA_BASE - timedelta(hours=rng.randint(1, 2000))
+                sessoes.append({
+                    'id_sessao': f'{rng.getrandbits(128):032x}', 'id_usuario': id_usuario,
+                    'token_acesso': f'{rng.getrandbits(256):064x}', 'ip_origem': f'10.0.{rng.randint(0, 255)}.{rng.randint(1, 254)}',
+                    'user_agent': 'Mozilla/5.0', 'data_criacao': inicio, 'data_expiracao': inicio + timedelta(hours=8),
+                    'ativo': rng.random() < 0.2,
+                })
+        self._gravar(SessaoUsuario, sessoes)
+
+        self._gravar(LogAcoesUsuario, [{
+            'id_log': i, 'id_usuario': rng.choice(utilizadores), 'acao': rng.choice(ACOES_UTILIZADOR),
+            'tabela_afetada': 'Planta_medicinal', 'id_registro_afetado': rng.choice(self.plantas),
+            'ip_origem': '10.0.0.1', 'data_acao': DATA_BASE - timedelta(minutes=rng.randint(0, 500_000)),
+        } for i in range(1, self.volumes['plantas'] // 10 + 1)])
+
+        termos = [_palavra(rng) for _ in range(200)]
+        pesos_termos = _pesos_zipf(rng, len(termos))
+        self._gravar(LogPesquisas, [{
+            'id_pesquisa': i, 'termo_pesquisa': rng.choices(termos, weights=pesos_termos)[0],
+            'tipo_pesquisa': rng.choice(('nome_popular', 'nome_cientifico', 'global')),
+            'ip_usuario': f'41.220.{rng.randint(0, 255)}.{rng.randint(1, 254)}',
+            'data_pesquisa': DATA_BASE - timedelta(minutes=rng.randint(0, 500_000)),
+            'resultados_encontrados': rng.randint(0, 50),
+        } for i in range(1, self.volumes['plantas'] // 2 + 1)])
+
+    # ---------------- execução ----------------
+
+    def gerar(self, limpar=False):
+        """
+        Criar as tabelas (se faltarem) e inserir todos os dados
+
+        Args:
+            limpar: apagar e recriar TODAS as tabelas antes (obrigatório se a
+                    BD já tiver plantas: nunca se misturam dados reais e sintéticos)
+
+        Returns:
+            dict: linhas inseridas por tabela
+        """
+        from utils.familias_index import indice_familias
+        from utils.grafo_citacoes import grafo
+        from utils.picker_index import FONTES, sincronizar_indice
+        from utils.taxonomia import sincronizar_taxonomia
+        from utils.wizard_bootstrap import cache_bootstrap
+
+        if limpar:
+            db.drop_all()
+        db.create_all()
+        if db.session.query(Planta_medicinal.id_planta).first() is not None:
+            raise RuntimeError('A base de dados já tem plantas: use limpar=True (--limpar) numa BD descartável')
+
+        print(f"🌱 A gerar dados sintéticos (escala {self.escala}, semente {self.semente})...")
+        try:
+            self._gerar_localizacao()
+            self._gerar_usos()
+            self._gerar_plantas()
+            self._gerar_referencias()
+            self._gerar_imagens()
+            self._gerar_utilizadores()
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        # Tabelas e caches derivados, pelas rotinas da aplicação
+        indice_familias.sincronizar()
+        sincronizar_taxonomia()
+        for tipo in FONTES:
+            sincronizar_indice(tipo)
+        grafo.reconstruir()
+        cache_bootstrap.invalidar()
+
+        print(f"✅ Dados gerados: {sum(self.totais.values())} linhas em {len(self.totais)} tabelas")
+        return dict(self.totais)
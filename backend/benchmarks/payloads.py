@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark de Serialização e Compressão das Respostas
+
+Para cada payload real (obtido da aplicação sobre a BD de DATABASE_URL):
+- bytes e tempo de serialização: json da biblioteca padrão com acentos
+  escapados (o comportamento anterior), biblioteca padrão sem escape e orjson
+- bytes e tempo de compressão do corpo final: gzip 1/6/9 e brotli 4/5/11
+  (se o módulo brotli estiver instalado)
+
+Os tempos são a mediana de --repeticoes execuções, em ms de CPU do processo
+
+Exemplo (a partir de backend/):
+    DATABASE_URL=sqlite:////tmp/bench.db python -m benchmarks.payloads --saida /tmp/payloads.json
+"""
+import argparse
+import gzip
+import statistics
+import sys
+import time
+
+from benchmarks.executar import _gravar_json
+
+# (nome, url(amostras))
+PAYLOADS = (
+    ('referencias_com_autores', lambda a: '/api/referencias'),
+    ('wizard_bootstrap', lambda a: '/api/wizard/bootstrap'),
+    ('wizard_familias', lambda a: '/api/wizard/data/familias'),
+    ('wizard_locais', lambda a: '/api/wizard/data/locais'),
+    ('wizard_autores', lambda a: '/api/wizard/data/autores'),
+    ('wizard_referencias', lambda a: '/api/wizard/data/referencias'),
+    ('planta_detalhe', lambda a: f'/api/plantas/{a.plantas[len(a.plantas) // 2]}'),
+    ('plantas_100', lambda a: '/api/plantas?per_page=100'),
+    ('dashboard_stats', lambda a: '/api/admin/dashboard/stats'),
+    ('busca', lambda a: f'/api/busca?q={a.fragmentos_nome[0]}'),
+)
+
+
+def medir(funcao, repeticoes):
+    """
+    Returns:
+        tuple: (resultado, mediana do tempo de CPU em ms)
+    """
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.process_time()
+        resultado = funcao()
+        tempos.append((time.process_time() - inicio) * 1000)
+    return resultado, round(statistics.median(tempos), 3)
+
+
+def compressores():
+    """(nome, função bytes -> bytes) das codificações a comparar"""
+    from utils.compressao import brotli
+
+    lista = [(f'gzip{n}', lambda d, n=n: gzip.compress(d, compresslevel=n, mtime=0)) for n in (1, 6, 9)]
+    if brotli is not None:
+        lista += [(f'br{q}', lambda d, q=q: brotli.compress(d, quality=q)) for q in (4, 5, 11)]
+    return lista
+
+
+def medir_payload(app, objeto, repeticoes):
+    from utils.json_rapido import ProviderStdlib, ProviderOrjson, orjson
+
+    stdlib = ProviderStdlib(app)
+    serializadores = [
+        ('stdlib_ascii', lambda: (stdlib.dumps(objeto, separators=(',', ':'), ensure_ascii=True) + '\n').encode()),
+        ('stdlib', lambda: stdlib.serializar(objeto)),
+    ]
+    if orjson is not None:
+        serializadores.append(('orjson', lambda: ProviderOrjson(app).serializar(objeto)))
+
+    resultado = {'serializacao': {}, 'compressao': {}}
+    for nome, funcao in serializadores:
+        dados, ms = medir(funcao, repeticoes)
+        resultado['serializacao'][nome] = {'bytes': len(dados), 'ms': ms}
+
+    corpo = dados  # Corpo enviado: o do último (mais rápido disponível)
+    for nome, funcao in compressores():
+        comprimido, ms = medir(lambda: funcao(corpo), repeticoes)
+        resultado['compressao'][nome] = {
+            'bytes': len(comprimido), 'ms': ms, 'razao': round(len(comprimido) / len(corpo), 3)
+        }
+    return resultado
+
+
+def executar(app, repeticoes=20, nomes=None):
+    import random
+
+    from benchmarks.cenarios import Amostras
+
+    with app.app_context():
+        amostras = Amostras(random.Random(42))
+    cliente = app.test_client()
+
+    resultados = {}
+    for nome, url in PAYLOADS:
+        if nomes and nome not in nomes:
+            continue
+        resposta = cliente.get(url(amostras))
+        if resposta.status_code != 200:
+            print(f"  ⚠️ {nome}: HTTP {resposta.status_code}, ignorado")
+            continue
+        objeto = app.json.loads(resposta.get_data())
+        with app.app_context():
+            r = resultados[nome] = medir_payload(app, objeto, repeticoes)
+
+        s, c = r['serializacao'], r['compressao']
+        rapido = s.get('orjson') or s['stdlib']
+        print(f"  {nome:<26} {s['stdlib_ascii']['bytes']:>9} B → {rapido['bytes']:>9} B  "
+              f"json {s['stdlib_ascii']['ms']:>7} ms → {rapido['ms']:>6} ms  "
+              + '  '.join(f"{k} {v['bytes']:>7} B {v['ms']:>6} ms" for k, v in c.items()))
+    return resultados
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serialização e compressão dos payloads reais (usa DATABASE_URL)')
+    parser.add_argument('--repeticoes', type=int, default=20)
+    parser.add_argument('--payloads', help='lista separada por vírgulas (por omissão todos)')
+    parser.add_argument('--saida', help='gravar o resultado em JSON')
+    args = parser.parse_args(argv)
+
+    from app import create_app
+
+    # Corpos sem compressão: a compressão é medida aqui, sobre o corpo
+    app = create_app({'COMPRESSAO': False, 'SQL_INSTRUMENTACAO': False})
+    print(f"📦 {args.repeticoes} repetições por medição (mediana, ms de CPU)")
+    resultados = executar(app, args.repeticoes, args.payloads.split(',') if args.payloads else None)
+    if args.saida:
+        _gravar_json(args.saida, {'repeticoes': args.repeticoes, 'payloads': resultados})
+        print(f"💾 {args.saida}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -13,7 +13,7 @@ class Config:
     
     # Flask
     SECRET_KEY = os.environ.get('SECRET_KEY', 'plantas-medicinais-secret-key-2025')
-    JSON_AS_ASCII = False
+    DEBUG = os.environ.get('FLASK_DEBUG', '0').lower() in ('1', 'true', 'yes')  # Só no servidor de desenvolvimento
     
     # Database
     SQLALCHEMY_DATABASE_URI = os.environ.get(
@@ -23,6 +23,50 @@ class Config:
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     SQLALCHEMY_ECHO = False  # True para debug de queries
     
+    # Pool de ligações, por processo: a BD vê até workers × (DB_POOL_SIZE + DB_MAX_OVERFLOW)
+    # (com gunicorn, gunicorn.conf.py deriva as omissões do número de workers)
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 10)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 10)),
+        'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', 30)),  # Espera máxima por uma ligação livre
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800)),  # Abaixo do wait_timeout do MySQL/proxy
+        'pool_pre_ping': os.environ.get('DB_POOL_PRE_PING', '1').lower() not in ('0', 'false', 'no'),
+    }
+    if os.environ.get('DB_ISOLATION_LEVEL'):  # p.ex. 'READ COMMITTED' (omissão do MySQL: REPEATABLE READ)
+        SQLALCHEMY_ENGINE_OPTIONS['isolation_level'] = os.environ['DB_ISOLATION_LEVEL']
+    
+    # Instrumentação SQL por pedido (Server-Timing, avisos de N+1, orçamento de queries)
+    SQL_INSTRUMENTACAO = os.environ.get('SQL_INSTRUMENTACAO', '1').lower() not in ('0', 'false', 'no')
+    SQL_N_MAIS_1_LIMITE = int(os.environ.get('SQL_N_MAIS_1_LIMITE', 5))  # Mesma forma repetida no pedido
+    SQL_MAX_LENTAS = int(os.environ.get('SQL_MAX_LENTAS', 5))
+    SQL_ORCAMENTO_PADRAO = int(os.environ['SQL_ORCAMENTO_PADRAO']) if os.environ.get('SQL_ORCAMENTO_PADRAO') else None
+    SQL_ORCAMENTO_ESTRITO = os.environ.get('SQL_ORCAMENTO_ESTRITO', '0').lower() in ('1', 'true', 'yes')  # Testes
+    
+    # Réplicas de leitura (opcional): DATABASE_REPLICA_URLS separado por vírgulas. Leituras de GET
+    # vão para réplicas com atraso <= REPLICA_LAG_MAX_SEGUNDOS (senão primário); depois de uma escrita
+    # o mesmo cliente lê do primário durante REPLICA_STICKY_SEGUNDOS (manter acima do atraso máximo)
+    SQLALCHEMY_REPLICA_URIS = [u.strip() for u in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if u.strip()]
+    REPLICA_LAG_MAX_SEGUNDOS = float(os.environ.get('REPLICA_LAG_MAX_SEGUNDOS', 5))
+    REPLICA_LAG_INTERVALO_SEGUNDOS = float(os.environ.get('REPLICA_LAG_INTERVALO_SEGUNDOS', 5))
+    REPLICA_LAG_QUERY = os.environ.get('REPLICA_LAG_QUERY')  # Em vez de SHOW REPLICA STATUS (p.ex. heartbeat)
+    REPLICA_STICKY_SEGUNDOS = int(os.environ.get('REPLICA_STICKY_SEGUNDOS', 10))
+    
+    # Leituras públicas assíncronas (asgi.py): driver assíncrono derivado de DATABASE_URL
+    # (mysql → aiomysql, sqlite → aiosqlite) ou ASYNC_DATABASE_URL; pool próprio por processo,
+    # maior que o síncrono porque um processo tem muitos pedidos à espera da BD ao mesmo tempo
+    ASYNC_DATABASE_URL = os.environ.get('ASYNC_DATABASE_URL')
+    ASYNC_DB_POOL_SIZE = int(os.environ.get('ASYNC_DB_POOL_SIZE', 20))
+    ASYNC_DB_MAX_OVERFLOW = int(os.environ.get('ASYNC_DB_MAX_OVERFLOW', 10))
+    
+    # JSON das respostas: 'orjson' (biblioteca padrão se não estiver instalado) ou 'stdlib'; acentos sem escape
+    JSON_PROVIDER = os.environ.get('JSON_PROVIDER', 'orjson')
+    
+    # Compressão gzip/brotli negociada (desligar se o proxy já comprime)
+    COMPRESSAO = os.environ.get('COMPRESSAO', '1').lower() not in ('0', 'false', 'no')
+    COMPRESSAO_MIN_BYTES = int(os.environ.get('COMPRESSAO_MIN_BYTES', 1024))
+    COMPRESSAO_GZIP_NIVEL = int(os.environ.get('COMPRESSAO_GZIP_NIVEL', 6))
+    COMPRESSAO_BROTLI_QUALIDADE = int(os.environ.get('COMPRESSAO_BROTLI_QUALIDADE', 5))
+    
     # CORS
     CORS_ORIGINS = os.environ.get(
         'CORS_ORIGINS', 
@@ -41,5 +85,87 @@ class Config:
     DEFAULT_PAGE_SIZE = 20
     MAX_PAGE_SIZE = 100
     
+    # Grafo de citações (reconstrução completa periódica, em segundos)
+    GRAFO_TTL_SEGUNDOS = int(os.environ.get('GRAFO_TTL_SEGUNDOS', 300))
+    
+    # Dicionário de famílias (recarga da tabela Familia, em segundos)
+    FAMILIAS_INDICE_TTL_SEGUNDOS = int(os.environ.get('FAMILIAS_INDICE_TTL_SEGUNDOS', 60))
+    
+    # Rascunhos do wizard ('sqlite' partilhado entre workers ou 'memoria')
+    DRAFT_STORE = os.environ.get('DRAFT_STORE', 'sqlite')
+    DRAFT_SQLITE_PATH = os.environ.get(
+        'DRAFT_SQLITE_PATH',
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'rascunhos.sqlite3')
+    )
+    DRAFT_TTL_SEGUNDOS = int(os.environ.get('DRAFT_TTL_SEGUNDOS', 24 * 3600))
+    DRAFT_MAX_POR_UTILIZADOR = int(os.environ.get('DRAFT_MAX_POR_UTILIZADOR', 10))  # Só com session['id_usuario'] (login)
+    DRAFT_MAX_BYTES = int(os.environ.get('DRAFT_MAX_BYTES', 512 * 1024))  # Imagens ficam nos blobs
+    DRAFT_BLOB_FOLDER = os.environ.get(
+        'DRAFT_BLOB_FOLDER',
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'rascunhos_blobs')
+    )
+    DRAFT_BLOB_MAX_BYTES = int(os.environ.get('DRAFT_BLOB_MAX_BYTES', 5 * 1024 * 1024))
+    
+    # Estado partilhado entre workers: gerações das caches e progresso dos jobs
+    # ('sqlite' para vários workers na mesma máquina ou 'memoria' para um único processo)
+    STATE_STORE = os.environ.get('STATE_STORE', 'sqlite')
+    STATE_SQLITE_PATH = os.environ.get(
+        'STATE_SQLITE_PATH',
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'estado.sqlite3')
+    )
+    STATE_JOBS_TTL_SEGUNDOS = int(os.environ.get('STATE_JOBS_TTL_SEGUNDOS', 7 * 24 * 3600))
+    
+    # Bootstrap do wizard (recarga máxima, para alterações de outros workers)
+    WIZARD_BOOTSTRAP_TTL_SEGUNDOS = int(os.environ.get('WIZARD_BOOTSTRAP_TTL_SEGUNDOS', 300))
+    
+    # Imagens por conteúdo (SHA-256) + processamento em segundo plano ('processos' ou 'sincrono')
+    IMAGE_PROCESSING_MODE = os.environ.get('IMAGE_PROCESSING_MODE', 'processos')
+    IMAGE_WORKERS = int(os.environ.get('IMAGE_WORKERS', 2))  # Por processo (gunicorn.conf.py: cores ÷ workers)
+    IMAGE_QUEUE_MAX = int(os.environ.get('IMAGE_QUEUE_MAX', 200))
+    IMAGE_WORKER_NICE = int(os.environ.get('IMAGE_WORKER_NICE', 10))
+    IMAGE_CONTENT_FOLDER = os.environ.get(
+        'IMAGE_CONTENT_FOLDER',
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'uploads', 'imagens')
+    )
+    IMAGE_STAGING_FOLDER = os.environ.get(
+        'IMAGE_STAGING_FOLDER',
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'imagens_staging')
+    )
+    IMAGE_UPLOAD_MAX_BYTES = int(os.environ.get('IMAGE_UPLOAD_MAX_BYTES', 5 * 1024 * 1024))  # Por imagem, já decodificada
+    UPLOAD_JSON_MAX_BYTES = int(os.environ.get('UPLOAD_JSON_MAX_BYTES', 1024 * 1024))  # JSON sem as imagens base64
+    
+    # Importação de imagens em lote (a API só aceita origens dentro de IMAGE_IMPORT_FOLDER)
+    IMAGE_IMPORT_FOLDER = os.environ.get(
+        'IMAGE_IMPORT_FOLDER',
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'uploads', 'importar')
+    )
+    IMAGE_IMPORT_STATE_FOLDER = os.environ.get(
+        'IMAGE_IMPORT_STATE_FOLDER',
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'importacoes')
+    )
+    IMAGE_IMPORT_WORKERS = int(os.environ.get('IMAGE_IMPORT_WORKERS', os.cpu_count() or 2))
+    
+    # Reconciliação disco ↔ base de dados (checkpoint da última pasta tratada)
+    IMAGE_RECONCILE_STATE_FILE = os.environ.get(
+        'IMAGE_RECONCILE_STATE_FILE',
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'reconciliacao_imagens.json')
+    )
+    
+    # Armazenamento das imagens: 'local' (IMAGE_CONTENT_FOLDER/UPLOAD_FOLDER) ou 's3'
+    # (bucket S3 ou compatível, p.ex. MinIO em IMAGE_S3_ENDPOINT_URL; requer boto3)
+    IMAGE_STORAGE_BACKEND = os.environ.get('IMAGE_STORAGE_BACKEND', 'local')
+    IMAGE_S3_BUCKET = os.environ.get('IMAGE_S3_BUCKET')
+    IMAGE_S3_PREFIX = os.environ.get('IMAGE_S3_PREFIX', '')
+    IMAGE_S3_ENDPOINT_URL = os.environ.get('IMAGE_S3_ENDPOINT_URL')
+    IMAGE_S3_REGION = os.environ.get('IMAGE_S3_REGION')
+    IMAGE_S3_URL_EXPIRES = int(os.environ.get('IMAGE_S3_URL_EXPIRES', 3600))  # URLs assinados (modo 'redirect')
+    
+    # Servir imagens ('flask', 'x-accel' para nginx, 'x-sendfile' para Apache/lighttpd
+    # ou 'redirect' para URLs assinados do S3)
+    IMAGE_SERVE_MODE = os.environ.get('IMAGE_SERVE_MODE', 'flask')
+    IMAGE_ACCEL_PREFIX = os.environ.get('IMAGE_ACCEL_PREFIX', '/_imagens')
+    IMAGE_CACHE_MAX_AGE = int(os.environ.get('IMAGE_CACHE_MAX_AGE', 30 * 24 * 3600))
+    IMAGE_CACHE_MAX_AGE_IMUTAVEL = int(os.environ.get('IMAGE_CACHE_MAX_AGE_IMUTAVEL', 365 * 24 * 3600))
+    
     # Logging
     LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
\ No newline at end of file
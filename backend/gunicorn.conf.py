@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Configuração do Gunicorn (pre-fork: um processo master e N workers)
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Afinação (variáveis de ambiente):
+- WEB_CONCURRENCY: workers (processos). Escala com os cores: por omissão
+  2 × cores + 1, limitado para que cada worker tenha pelo menos 2 ligações
+  à BD. Cada worker tem as suas caches (famílias, grafo, bootstrap), o seu
+  pool de ligações e a sua fila de imagens
+- GUNICORN_THREADS: threads por worker (omissão 4, ou menos se as ligações
+  por worker não chegarem; >1 usa o worker gthread). A API passa a maior
+  parte do tempo à espera da BD, por isso threads aumentam o débito sem
+  mais memória; mantê-las <= DB_POOL_SIZE para não esperar por ligações
+- Ligações à BD no total: workers × (DB_POOL_SIZE + DB_MAX_OVERFLOW) tem de
+  caber no max_connections do MySQL (DB_MAX_CONNECTIONS, omissão 151) menos
+  DB_RESERVED_CONNECTIONS (omissão 20: asgi.py, CLI, migrações, administração).
+  Sem DB_POOL_SIZE/DB_MAX_OVERFLOW no ambiente, são calculados aqui a partir
+  do número de workers e passados aos workers pelo ambiente
+- IMAGE_WORKERS: processos de imagens POR worker. Por omissão cores ÷ workers
+  (mínimo 1), para que o total de processos PIL não passe muito dos cores
+- GUNICORN_MAX_REQUESTS: reciclar cada worker após N pedidos (com jitter,
+  para não reiniciarem todos ao mesmo tempo)
+- STATE_STORE=sqlite (omissão): as caches e o progresso dos jobs ficam
+  coerentes entre workers da mesma máquina
+- As leituras públicas podem ser servidas em modo assíncrono por asgi.py
+  (uvicorn), ao lado deste serviço: ver a configuração do nginx em asgi.py
+"""
+import multiprocessing
+import os
+import sys
+
+bind = os.environ.get('GUNICORN_BIND', f"0.0.0.0:{os.environ.get('PORT', 8000)}")
+
+cores = multiprocessing.cpu_count()
+limite_ligacoes = int(os.environ.get('DB_MAX_CONNECTIONS', 151))
+ligacoes_disponiveis = max(limite_ligacoes - int(os.environ.get('DB_RESERVED_CONNECTIONS', 20)), 1)
+
+workers = int(os.environ.get('WEB_CONCURRENCY', max(min(cores * 2 + 1, ligacoes_disponiveis // 2), 1)))
+ligacoes_por_worker = max(ligacoes_disponiveis // workers, 1)
+threads = int(os.environ.get('GUNICORN_THREADS', min(4, ligacoes_por_worker)))
+
+# Omissões por worker derivadas do número de workers (config.py lê-as do
+# ambiente, herdado pelos workers): o pool cobre as threads e o overflow usa
+# o resto da quota, até 10
+_pool = min(threads, ligacoes_por_worker)
+os.environ.setdefault('DB_POOL_SIZE', str(_pool))
+os.environ.setdefault('DB_MAX_OVERFLOW', str(min(ligacoes_por_worker - _pool, 10)))
+os.environ.setdefault('IMAGE_WORKERS', str(max(cores // workers, 1)))
+worker_class = 'gthread' if threads > 1 else 'sync'
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))  # Atrás de nginx/balanceador
+
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 2000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 200))
+
+# Cada worker importa a aplicação depois do fork: nada (ligações, pools de
+# processos, SQLite) é herdado do master. Com preload (arranque mais rápido,
+# memória partilhada), post_fork descarta as ligações herdadas
+preload_app = os.environ.get('GUNICORN_PRELOAD', '0').lower() in ('1', 'true', 'yes')
+
+# Heartbeat dos workers em memória (em Docker o /tmp pode ser disco lento)
+if os.path.isdir('/dev/shm'):
+    worker_tmp_dir = '/dev/shm'
+
+accesslog = os.environ.get('GUNICORN_ACCESSLOG', '-')
+errorlog = '-'
+loglevel = os.environ.get('LOG_LEVEL', 'info').lower()
+
+
+def on_starting(server):
+    opcoes_pool = (int(os.environ['DB_POOL_SIZE']), int(os.environ['DB_MAX_OVERFLOW']))
+    ligacoes = workers * sum(opcoes_pool)
+    server.log.info(f"{workers} workers × {threads} threads ({worker_class}); "
+                    f"pool {opcoes_pool[0]}+{opcoes_pool[1]} e {os.environ['IMAGE_WORKERS']} processos de imagens "
+                    f"por worker; até {ligacoes} ligações à BD (max_connections {limite_ligacoes})")
+    if ligacoes > limite_ligacoes:  # Só com valores explícitos no ambiente
+        server.log.warning(
+            f"⚠️ {workers} workers × (DB_POOL_SIZE {opcoes_pool[0]} + DB_MAX_OVERFLOW {opcoes_pool[1]}) "
+            f"= {ligacoes} ligações excede max_connections ({limite_ligacoes}): reduzir o pool ou WEB_CONCURRENCY"
+        )
+    if threads > opcoes_pool[0] + opcoes_pool[1]:
+        server.log.warning(f"⚠️ {threads} threads por worker para {sum(opcoes_pool)} ligações no pool")
+
+
+def post_fork(server, worker):
+    modulo = sys.modules.get('wsgi')
+    if modulo is None:  # Sem preload: a aplicação ainda não foi criada
+        return
+    from models.planta import db
+    with modulo.app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)  # Não fechar as ligações do master, só esquecê-las
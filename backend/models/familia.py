@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Model do Dicionário de Famílias
+Planta_medicinal.familia continua a ser texto livre; esta tabela guarda uma
+entrada por família normalizada com a contagem de plantas já calculada,
+mantida pelos eventos em utils/familias_index.py
+"""
+from models.planta import db
+
+
+class Familia(db.Model):
+    """
+    Famílias botânicas normalizadas
+    ✅ NOVO: evita GROUP BY sobre Planta_medicinal em cada listagem
+    """
+    __tablename__ = 'Familia'
+
+    id_familia = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    nome_familia = db.Column(db.String(100), nullable=False)  # Grafia apresentada
+    nome_normalizado = db.Column(db.String(100), nullable=False, unique=True, index=True)
+    total_plantas = db.Column(db.Integer, nullable=False, default=0, index=True)
+
+    def to_dict(self):
+        return {
+            'id_familia': self.id_familia,
+            'nome_familia': self.nome_familia,
+            'total_plantas': self.total_plantas,
+            'label': self.nome_familia,
+            'value': self.nome_familia
+        }
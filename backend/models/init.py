@@ -8,9 +8,17 @@ from .planta import (
     Planta_medicinal, 
     Nome_comum, 
     Imagem,
+    Imagem_variante,
+    Ficheiro_imagem,
     PlantaImagem
 )
 
+from .familia import Familia
+
+from .taxonomia import Taxon, Planta_taxon
+
+from .picker import Termo_picker
+
 from .localizacao import (
     Provincia,
     Local_colheita,
@@ -49,7 +57,13 @@ __all__ = [
     'Planta_medicinal',
     'Nome_comum',
     'Imagem',
+    'Imagem_variante',
+    'Ficheiro_imagem',
     'PlantaImagem',
+    'Familia',
+    'Taxon',
+    'Planta_taxon',
+    'Termo_picker',
     
     # Localização
     'Provincia',
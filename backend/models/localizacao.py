@@ -37,7 +37,7 @@ class Local_colheita(db.Model):
     __tablename__ = 'Local_colheita'
     
     id_local = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    nome_local = db.Column(db.String(255), nullable=False)
+    nome_local = db.Column(db.String(255), nullable=False, index=True)  # Ordenação dos pickers
     id_provincia = db.Column(db.Integer, db.ForeignKey('Provincia.id_provincia'), nullable=False)
     
     # Relationships
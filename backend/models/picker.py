@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Model do Índice de Termos dos Pickers
+Uma linha por palavra normalizada de cada autor/referência/local/indicação,
+para busca por prefixo de qualquer palavra com índice (tipo, termo);
+mantido pelos eventos em utils/picker_index.py
+"""
+from models.planta import db
+
+
+class Termo_picker(db.Model):
+    """
+    Índice invertido de palavras
+    ✅ NOVO: typeahead sem LIKE '%...%' sobre tabelas inteiras
+    """
+    __tablename__ = 'Termo_picker'
+
+    id_termo = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    tipo = db.Column(db.String(20), nullable=False)  # 'autor', 'referencia', 'local', 'indicacao'
+    id_registo = db.Column(db.Integer, nullable=False)
+    termo = db.Column(db.String(50), nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_termo_picker_tipo_termo', 'tipo', 'termo', 'id_registo'),
+        db.Index('ix_termo_picker_tipo_registo', 'tipo', 'id_registo'),
+    )
@@ -7,8 +7,12 @@ CORREÇÃO COMPLETA: Método to_dict alinhado com a ESTRUTURA REAL da nova BD
 from datetime import datetime
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy import Table
+from sqlalchemy.orm import configure_mappers, object_session, selectinload
 
-db = SQLAlchemy()
+from utils.replicas import SessaoReplicas
+
+# SessaoReplicas: leituras de GET nas réplicas de leitura, se configuradas (utils/replicas.py)
+db = SQLAlchemy(session_options={'class_': SessaoReplicas})
 
 # ✅ Definir tabelas associativas que NÃO têm model próprio
 Planta_metodo_trad = Table('Planta_metodo_trad', db.metadata,
@@ -31,7 +35,9 @@ class Planta_medicinal(db.Model):
     
     id_planta = db.Column(db.Integer, primary_key=True, autoincrement=True)
     nome_cientifico = db.Column(db.String(100), nullable=False, unique=True)
-    familia = db.Column(db.String(100), nullable=False)  # ✅ Texto direto
+    # ✅ Texto direto; active_history: o valor anterior é carregado antes de uma
+    # alteração (a contagem da família antiga é decrementada em utils/familias_index.py)
+    familia = db.column_property(db.Column(db.String(100), nullable=False), active_history=True)
     infos_adicionais = db.Column(db.Text, nullable=True)
     comp_quimica = db.Column(db.Text, nullable=True)
     prop_farmacologica = db.Column(db.Text, nullable=True)
@@ -43,6 +49,30 @@ class Planta_medicinal(db.Model):
     partes_usadas = db.relationship('Planta_parte', backref='planta', lazy=True, cascade="all, delete-orphan")
     referencias = db.relationship('Planta_referencia', backref='planta', lazy=True, cascade="all, delete-orphan")
     
+    @staticmethod
+    def opcoes_detalhe():
+        """
+        Opções de carregamento para to_dict(include_relations=True): cada
+        nível das relações numa query IN, em vez de um lazy load por linha
+        (usar antes de qualquer commit, que expira o que foi carregado)
+        """
+        from models.localizacao import Planta_local, Local_colheita
+        from models.uso_medicinal import Planta_parte, Parte_usada, Parte_indicacao
+        from models.referencia import Planta_referencia, Referencia, Referencia_autor, Autor, Autor_afiliacao
+
+        configure_mappers()  # Os backrefs (Planta_local.local, ...) só existem depois da configuração
+        return (
+            selectinload(Planta_medicinal.nomes_comuns),
+            selectinload(Planta_medicinal.imagens),
+            selectinload(Planta_medicinal.locais).selectinload(Planta_local.local)
+            .selectinload(Local_colheita.provincia),
+            selectinload(Planta_medicinal.partes_usadas).selectinload(Planta_parte.parte)
+            .selectinload(Parte_usada.indicacoes).selectinload(Parte_indicacao.indicacao),
+            selectinload(Planta_medicinal.referencias).selectinload(Planta_referencia.referencia)
+            .selectinload(Referencia.autores_relacao).selectinload(Referencia_autor.autor)
+            .selectinload(Autor.afiliacoes).selectinload(Autor_afiliacao.afiliacao),
+        )
+    
     def to_dict(self, include_relations=False):
         """
         Conversão para dicionário - ADAPTADO À NOVA BD
@@ -66,6 +96,9 @@ class Planta_medicinal(db.Model):
         }
         
         if include_relations:
+            # Sessão da própria planta: a do Flask ou a de uma AsyncSession (run_sync)
+            sessao = object_session(self) or db.session
+
             # 1. ✅ Buscar províncias e locais de colheita
             provincias = []
             for pl in self.locais:
@@ -78,43 +111,71 @@ class Planta_medicinal(db.Model):
                             'local': local_obj.nome_local
                         })
 
-                        # ✅ Buscar TODOS os autores com TODAS as suas afiliações
-                        autores_dict = {}  # Usar dict para evitar duplicatas
+            # ✅ Buscar TODOS os autores com TODAS as suas afiliações
+            autores_dict = {}  # Usar dict para evitar duplicatas
 
-                        for pr in self.referencias:
-                            if pr.referencia:
-                                for ra in pr.referencia.autores_relacao:
-                                    if ra.autor and ra.autor.id_autor not in autores_dict:
-                                        autor = ra.autor
-                                        
-                                        # ✅ Buscar TODAS as afiliações deste autor
-                                        afiliacoes_list = []
-                                        for aa in autor.afiliacoes:
-                                            if aa.afiliacao:
-                                                afiliacoes_list.append({
-                                                    'id_afiliacao': aa.afiliacao.id_afiliacao,
-                                                    'nome_afiliacao': aa.afiliacao.nome_afiliacao,
-                                                    'sigla_afiliacao': aa.afiliacao.sigla_afiliacao
-                                                })
-                                        
-                                        # ✅ Manter compatibilidade: primeira afiliação nos campos diretos
-                                        afiliacao_nome = None
-                                        afiliacao_sigla = None
-                                        if afiliacoes_list:
-                                            afiliacao_nome = afiliacoes_list[0]['nome_afiliacao']
-                                            afiliacao_sigla = afiliacoes_list[0]['sigla_afiliacao']
-                                        
-                                        autores_dict[autor.id_autor] = {
-                                            'id_autor': autor.id_autor,
-                                            'nome_autor': autor.nome_autor,
-                                            'afiliacao': afiliacao_nome,  # Primeira afiliação (compatibilidade)
-                                            'sigla_afiliacao': afiliacao_sigla,  # Primeira afiliação (compatibilidade)
-                                            'afiliacoes': afiliacoes_list  # ✅ TODAS as afiliações
-                                        }
+            for pr in self.referencias:
+                if pr.referencia:
+                    for ra in pr.referencia.autores_relacao:
+                        if ra.autor and ra.autor.id_autor not in autores_dict:
+                            autor = ra.autor
+                            
+                            # ✅ Buscar TODAS as afiliações deste autor
+                            afiliacoes_list = []
+                            for aa in autor.afiliacoes:
+                                if aa.afiliacao:
+                                    afiliacoes_list.append({
+                                        'id_afiliacao': aa.afiliacao.id_afiliacao,
+                                        'nome_afiliacao': aa.afiliacao.nome_afiliacao,
+                                        'sigla_afiliacao': aa.afiliacao.sigla_afiliacao
+                                    })
+                            
+                            # ✅ Manter compatibilidade: primeira afiliação nos campos diretos
+                            afiliacao_nome = None
+                            afiliacao_sigla = None
+                            if afiliacoes_list:
+                                afiliacao_nome = afiliacoes_list[0]['nome_afiliacao']
+                                afiliacao_sigla = afiliacoes_list[0]['sigla_afiliacao']
+                            
+                            autores_dict[autor.id_autor] = {
+                                'id_autor': autor.id_autor,
+                                'nome_autor': autor.nome_autor,
+                                'afiliacao': afiliacao_nome,  # Primeira afiliação (compatibilidade)
+                                'sigla_afiliacao': afiliacao_sigla,  # Primeira afiliação (compatibilidade)
+                                'afiliacoes': afiliacoes_list  # ✅ TODAS as afiliações
+                            }
 
-                        autores_list = list(autores_dict.values())
+            autores_list = list(autores_dict.values())
             
             # 2. ✅ Buscar partes usadas com indicações, métodos de preparação e extração
+            # Métodos de todas as partes numa query por tabela (as relações são 'dynamic')
+            from models.uso_medicinal import Metodo_preparacao_trad, Metodo_extraccao_cientif
+            ids_partes = [pp.id_parte for pp in self.partes_usadas]
+            preparacao_por_parte, extracao_por_parte = {}, {}
+            if ids_partes:
+                try:
+                    for id_parte, mp in sessao.query(Planta_metodo_trad.c.id_parte, Metodo_preparacao_trad).join(
+                        Planta_metodo_trad,
+                        Metodo_preparacao_trad.id_metodo_preparacao == Planta_metodo_trad.c.id_metodo_preparacao
+                    ).filter(Planta_metodo_trad.c.id_parte.in_(ids_partes)):
+                        preparacao_por_parte.setdefault(id_parte, []).append({
+                            'id_preparacao': mp.id_metodo_preparacao,
+                            'descricao': mp.descricao_metodo_preparacao
+                        })
+                except Exception as e:
+                    print(f"⚠️ Erro ao buscar métodos de preparação: {e}")
+                try:
+                    for id_parte, me in sessao.query(Parte_metodo.c.id_parte, Metodo_extraccao_cientif).join(
+                        Parte_metodo,
+                        Metodo_extraccao_cientif.id_metodo_extraccao == Parte_metodo.c.id_metodo_extraccao
+                    ).filter(Parte_metodo.c.id_parte.in_(ids_partes)):
+                        extracao_por_parte.setdefault(id_parte, []).append({
+                            'id_extraccao': me.id_metodo_extraccao,
+                            'descricao': me.descricao_metodo_extraccao
+                        })
+                except Exception as e:
+                    print(f"⚠️ Erro ao buscar métodos de extração: {e}")
+
             partes_com_indicacoes = []
             for pp in self.partes_usadas:
                 if pp.parte:
@@ -129,47 +190,10 @@ class Planta_medicinal(db.Model):
                                 'descricao': pi.indicacao.descricao_uso
                             })
                     
-                    # 2b. ✅ Buscar métodos de preparação tradicional
-                    # (Parte_usada → Planta_metodo_trad → Metodo_preparacao_trad)
-                    metodos_preparacao = []
-                    try:
-                        from models.uso_medicinal import Metodo_preparacao_trad
-                        
-                        metodos_prep_query = db.session.query(Metodo_preparacao_trad).join(
-                            Planta_metodo_trad,
-                            Metodo_preparacao_trad.id_metodo_preparacao == Planta_metodo_trad.c.id_metodo_preparacao
-                        ).filter(
-                            Planta_metodo_trad.c.id_parte == parte_obj.id_parte
-                        ).all()
-                        
-                        for mp in metodos_prep_query:
-                            metodos_preparacao.append({
-                                'id_preparacao': mp.id_metodo_preparacao,
-                                'descricao': mp.descricao_metodo_preparacao
-                            })
-                    except Exception as e:
-                        print(f"⚠️ Erro ao buscar métodos de preparação: {e}")
-                    
-                    # 2c. ✅ Buscar métodos de extração científica
-                    # (Parte_usada → Parte_metodo → Metodo_extraccao_cientif)
-                    metodos_extracao = []
-                    try:
-                        from models.uso_medicinal import Metodo_extraccao_cientif
-                        
-                        metodos_ext_query = db.session.query(Metodo_extraccao_cientif).join(
-                            Parte_metodo,
-                            Metodo_extraccao_cientif.id_metodo_extraccao == Parte_metodo.c.id_metodo_extraccao
-                        ).filter(
-                            Parte_metodo.c.id_parte == parte_obj.id_parte
-                        ).all()
-                        
-                        for me in metodos_ext_query:
-                            metodos_extracao.append({
-                                'id_extraccao': me.id_metodo_extraccao,
-                                'descricao': me.descricao_metodo_extraccao
-                            })
-                    except Exception as e:
-                        print(f"⚠️ Erro ao buscar métodos de extração: {e}")
+                    # 2b/2c. ✅ Métodos de preparação tradicional e de extração científica
+                    # (Parte_usada → Planta_metodo_trad / Parte_metodo)
+                    metodos_preparacao = preparacao_por_parte.get(parte_obj.id_parte, [])
+                    metodos_extracao = extracao_por_parte.get(parte_obj.id_parte, [])
                     
                     parte_info = {
                         'id_parte': parte_obj.id_parte,
@@ -233,8 +257,12 @@ class Planta_medicinal(db.Model):
                 'id_imagem': img.id_imagem,
                 'nome_arquivo': img.nome_arquivo,
                 'url': img.url_armazenamento,
+                'thumb': img.url_variante('thumb'),
+                'srcset': img.srcset('webp'),
+                'srcset_jpeg': img.srcset('jpg'),
                 'legenda': img.legenda,
-                'referencia': img.referencia_img
+                'referencia': img.referencia_img,
+                **img.metadados()
             } for img in self.imagens]
             
             # ✅ ATUALIZAR dicionário com TODAS as relações
@@ -267,6 +295,22 @@ class Nome_comum(db.Model):
         }
 
 
+class Ficheiro_imagem(db.Model):
+    """
+    Conteúdo de imagem armazenado uma única vez (endereçado por SHA-256)
+    Várias Imagem podem apontar para o mesmo ficheiro; `referencias` conta-as
+    """
+    __tablename__ = 'Ficheiro_imagem'
+    
+    sha256 = db.Column(db.String(64), primary_key=True)
+    extensao = db.Column(db.String(5), nullable=False)
+    bytes = db.Column(db.Integer, nullable=False)
+    referencias = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Processamento em segundo plano: pendente → pronta | erro
+    estado = db.Column(db.String(20), nullable=False, default='pendente', server_default='pendente')
+    criado_em = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+
 class Imagem(db.Model):
     """
     Imagens das plantas
@@ -275,10 +319,53 @@ class Imagem(db.Model):
     
     id_imagem = db.Column(db.Integer, primary_key=True, autoincrement=True)
     nome_arquivo = db.Column(db.String(255), nullable=False)
-    url_armazenamento = db.Column(db.String(255), nullable=False, unique=True)
+    # Não é único: imagens com o mesmo conteúdo partilham o ficheiro e o URL
+    url_armazenamento = db.Column(db.String(255), nullable=False, index=True)
     legenda = db.Column(db.String(255), nullable=True)
     referencia_img = db.Column(db.String(255), nullable=True)
     id_planta = db.Column(db.Integer, db.ForeignKey('Planta_medicinal.id_planta'), nullable=False)
+    # NULL = imagem antiga guardada em <UPLOAD_FOLDER>/<id_planta>/<nome_arquivo>
+    sha256 = db.Column(db.String(64), db.ForeignKey('Ficheiro_imagem.sha256'), nullable=True, index=True)
+    # Processamento em segundo plano: pendente → pronta | erro
+    estado = db.Column(db.String(20), nullable=False, default='pronta', server_default='pronta', index=True)
+    erro_processamento = db.Column(db.String(255), nullable=True)
+    # Metadados extraídos no processamento (layout e placeholder sem abrir a imagem)
+    largura = db.Column(db.Integer, nullable=True)
+    altura = db.Column(db.Integer, nullable=True)
+    formato = db.Column(db.String(10), nullable=True)
+    bytes = db.Column(db.Integer, nullable=True)
+    cor_dominante = db.Column(db.String(7), nullable=True)  # '#rrggbb'
+    lqip = db.Column(db.Text, nullable=True)  # data URI JPEG de até 16px
+    
+    # selectin: as variantes de todas as imagens carregadas vêm numa query
+    variantes = db.relationship('Imagem_variante', lazy='selectin', viewonly=True,
+                                primaryjoin='Imagem.sha256 == foreign(Imagem_variante.sha256)',
+                                order_by='Imagem_variante.largura')
+    
+    def url_variante(self, variante, formato='webp'):
+        """URL de uma variante (thumb, medium, full) ou None se não existir"""
+        for v in self.variantes:
+            if v.variante == variante and v.formato == formato:
+                return v.url(self.url_armazenamento)
+        return None
+    
+    def srcset(self, formato='webp'):
+        """Valor para o atributo srcset: 'url 320w, url 800w, ...'"""
+        return ', '.join(
+            f"{v.url(self.url_armazenamento)} {v.largura}w"
+            for v in self.variantes if v.formato == formato
+        ) or None
+    
+    def metadados(self):
+        """Dimensões, formato e placeholder (None enquanto 'pendente')"""
+        return {
+            'largura': self.largura,
+            'altura': self.altura,
+            'formato': self.formato,
+            'bytes': self.bytes,
+            'cor_dominante': self.cor_dominante,
+            'lqip': self.lqip
+        }
     
     def to_dict(self):
         return {
@@ -287,7 +374,44 @@ class Imagem(db.Model):
             'url': self.url_armazenamento,
             'legenda': self.legenda,
             'referencia': self.referencia_img,
-            'id_planta': self.id_planta
+            'id_planta': self.id_planta,
+            'sha256': self.sha256,
+            'estado': self.estado,
+            'erro': self.erro_processamento,
+            'thumb': self.url_variante('thumb'),
+            'srcset': self.srcset('webp'),
+            'srcset_jpeg': self.srcset('jpg'),
+            'variantes': [v.to_dict(self.url_armazenamento) for v in self.variantes],
+            **self.metadados()
+        }
+
+
+class Imagem_variante(db.Model):
+    """
+    Derivados de um conteúdo em larguras fixas (WebP e JPEG)
+    Ficheiro: <pasta do conteúdo>/<sha256>.<variante>.<formato>
+    """
+    __tablename__ = 'Imagem_variante'
+    
+    sha256 = db.Column(db.String(64), db.ForeignKey('Ficheiro_imagem.sha256', ondelete='CASCADE'), primary_key=True)
+    variante = db.Column(db.String(10), primary_key=True)  # thumb, medium, full
+    formato = db.Column(db.String(5), primary_key=True)    # webp, jpg
+    largura = db.Column(db.Integer, nullable=False)
+    altura = db.Column(db.Integer, nullable=False)
+    bytes = db.Column(db.Integer, nullable=False)
+    
+    def url(self, url_original):
+        base = url_original.rsplit('.', 1)[0]
+        return f"{base}.{self.variante}.{self.formato}"
+    
+    def to_dict(self, url_original):
+        return {
+            'variante': self.variante,
+            'formato': self.formato,
+            'url': self.url(url_original),
+            'largura': self.largura,
+            'altura': self.altura,
+            'bytes': self.bytes
         }
 
 
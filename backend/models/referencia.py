@@ -13,7 +13,7 @@ class Autor(db.Model):
     __tablename__ = 'Autor'
     
     id_autor = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    nome_autor = db.Column(db.String(255), nullable=False)
+    nome_autor = db.Column(db.String(255), nullable=False, index=True)  # Ordenação dos pickers
     
     # Relationships
     afiliacoes = db.relationship('Autor_afiliacao', backref='autor', lazy=True)
@@ -104,7 +104,7 @@ class Referencia(db.Model):
     __tablename__ = 'Referencia'
     
     id_referencia = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    titulo_referencia = db.Column(db.String(255), nullable=False)
+    titulo_referencia = db.Column(db.String(255), nullable=False, index=True)  # Ordenação dos pickers
     link_referencia = db.Column(db.String(255), nullable=True, unique=True)
     ano_publicacao = db.Column(db.Integer, nullable=True)  # YEAR convertido para INTEGER
     
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Models da Hierarquia Taxonómica
+Derivada de Planta_medicinal.familia + nome_cientifico (família → género →
+espécie), com contagens de plantas já calculadas em cada nó e mantidas
+pelos eventos em utils/taxonomia.py
+"""
+from models.planta import db
+
+
+class Taxon(db.Model):
+    """
+    Nó da hierarquia taxonómica
+    ✅ NOVO: navegação por família/género/espécie sem GROUP BY nas plantas
+    """
+    __tablename__ = 'Taxon'
+
+    id_taxon = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    nivel = db.Column(db.String(10), nullable=False)  # 'familia', 'genero', 'especie'
+    nome = db.Column(db.String(150), nullable=False)  # Grafia apresentada
+    nome_normalizado = db.Column(db.String(150), nullable=False)
+    chave = db.Column(db.String(255), nullable=False, unique=True, index=True)  # Caminho normalizado
+    id_pai = db.Column(db.Integer, db.ForeignKey('Taxon.id_taxon'), nullable=True, index=True)
+    total_plantas = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.Index('ix_taxon_nivel_nome', 'nivel', 'nome_normalizado'),
+        db.Index('ix_taxon_pai_total', 'id_pai', 'total_plantas'),
+    )
+
+    def to_dict(self):
+        return {
+            'id_taxon': self.id_taxon,
+            'nivel': self.nivel,
+            'nome': self.nome,
+            'id_pai': self.id_pai,
+            'total_plantas': self.total_plantas
+        }
+
+
+class Planta_taxon(db.Model):
+    """
+    Posição de cada planta na hierarquia
+    id_especie é NULL para nomes indeterminados (ex: 'Aloe sp.')
+    """
+    __tablename__ = 'Planta_taxon'
+
+    id_planta = db.Column(db.Integer, db.ForeignKey('Planta_medicinal.id_planta'), primary_key=True)
+    id_familia = db.Column(db.Integer, db.ForeignKey('Taxon.id_taxon'), nullable=False, index=True)
+    id_genero = db.Column(db.Integer, db.ForeignKey('Taxon.id_taxon'), nullable=False, index=True)
+    id_especie = db.Column(db.Integer, db.ForeignKey('Taxon.id_taxon'), nullable=True, index=True)
+    rank_infra = db.Column(db.String(10), nullable=True)  # 'subsp.', 'var.', 'f.', 'cv.'
+    epiteto_infra = db.Column(db.String(100), nullable=True)
+    hibrido = db.Column(db.Boolean, nullable=False, default=False)
+
+    def to_dict(self):
+        return {
+            'id_planta': self.id_planta,
+            'id_familia': self.id_familia,
+            'id_genero': self.id_genero,
+            'id_especie': self.id_especie,
+            'rank_infra': self.rank_infra,
+            'epiteto_infra': self.epiteto_infra,
+            'hibrido': self.hibrido
+        }
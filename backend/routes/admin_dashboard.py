@@ -4,7 +4,7 @@
 Rotas Admin Dashboard - TODOS OS ENDPOINTS do admin_dashboard_api.py
 Adaptado para nextsql.sql e integrado com app.py existente
 """
-from flask import Blueprint, jsonify, request, send_from_directory
+from flask import Blueprint, jsonify, request
 from models.planta import db, Planta_medicinal, Nome_comum, Imagem
 from models.localizacao import Provincia, Local_colheita, Planta_local
 from models.referencia import Autor, Referencia, Referencia_autor, Planta_referencia, Afiliacao
@@ -12,17 +12,16 @@ from models.uso_medicinal import (Indicacao, Parte_usada, Planta_parte, Parte_in
                                    Metodo_preparacao_trad, Metodo_extraccao_cientif)
 from sqlalchemy import func, desc, or_, and_
 from datetime import datetime, timedelta
-from werkzeug.utils import secure_filename
-from PIL import Image as PILImage
-import os
-import uuid
+from utils.familias_index import indice_familias
+from utils.imagens_fila import fila_imagens, FilaCheia, UploadRejeitado
+from utils.uploads_streaming import ler_multipart
+from utils.imagens_conteudo import criar_imagem
+from routes.imagens import servir_imagem_antiga
 
 admin_dashboard_bp = Blueprint('admin_dashboard', __name__, url_prefix='/api/admin')
 
 # Configurações upload
-UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'uploads', 'plantas_imagens')
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
@@ -71,11 +70,9 @@ def get_top_familias():
     """Top famílias - ADAPTADO (familia agora é campo texto)"""
     try:
         limit = request.args.get('limit', 8, type=int)
-        resultados = db.session.query(
-            Planta_medicinal.familia,
-            func.count(Planta_medicinal.id_planta).label('total')
-        ).group_by(Planta_medicinal.familia).order_by(desc('total')).limit(limit).all()
-        return jsonify([{'familia': r.familia, 'total': r.total} for r in resultados]), 200
+        indice_familias.garantir_atualizado()
+        resultados = indice_familias.top(limit)
+        return jsonify([{'familia': r['nome_familia'], 'total': r['total_plantas']} for r in resultados]), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -217,10 +214,9 @@ def busca_integrada():
             result['plantas'] = [{'id_planta': p.id_planta, 'nome_cientifico': p.nome_cientifico, 'familia': p.familia} for p in plantas]
         
         if tipo in ['familias', 'todos']:
-            familias = db.session.query(
-                Planta_medicinal.familia, func.count(Planta_medicinal.id_planta).label('total')
-            ).filter(Planta_medicinal.familia.ilike(search_term)).group_by(Planta_medicinal.familia).limit(limit).all()
-            result['familias'] = [{'familia': f.familia, 'total': f.total} for f in familias]
+            indice_familias.garantir_atualizado()
+            _, familias = indice_familias.listar(search=q, limit=limit)
+            result['familias'] = [{'familia': f['nome_familia'], 'total': f['total_plantas']} for f in familias]
         
         if tipo in ['autores', 'todos']:
             autores = Autor.query.filter(Autor.nome_autor.ilike(search_term)).limit(limit).all()
@@ -261,48 +257,45 @@ def get_indicacoes():
 # ==================== IMAGENS ====================
 @admin_dashboard_bp.route('/plantas/<int:planta_id>/imagens', methods=['POST'])
 def upload_imagem(planta_id):
-    """Upload de imagem"""
+    """Upload de imagem (armazenamento por conteúdo, processada em segundo plano)"""
+    recebidos, agendado = [], False
     try:
-        if 'file' not in request.files:
-            return jsonify({'error': 'Nenhum arquivo'}), 400
-        
-        file = request.files['file']
-        if not allowed_file(file.filename):
-            return jsonify({'error': 'Tipo de arquivo não permitido'}), 400
-        
         planta = Planta_medicinal.query.get(planta_id)
         if not planta:
             return jsonify({'error': 'Planta não encontrada'}), 404
         
-        # Salvar arquivo
-        planta_folder = os.path.join(UPLOAD_FOLDER, str(planta_id))
-        os.makedirs(planta_folder, exist_ok=True)
-        
-        filename = secure_filename(f"{uuid.uuid4().hex}.{file.filename.rsplit('.', 1)[1].lower()}")
-        filepath = os.path.join(planta_folder, filename)
-        file.save(filepath)
-        
-        # Redimensionar
-        with PILImage.open(filepath) as img:
-            img.thumbnail((800, 800), PILImage.Resampling.LANCZOS)
-            img.save(filepath, optimize=True, quality=85)
-        
-        # Criar registro
-        url_armazenamento = f"/uploads/plantas_imagens/{planta_id}/{filename}"
-        nova_imagem = Imagem(
-            nome_arquivo=filename,
-            url_armazenamento=url_armazenamento,
-            legenda=request.form.get('legenda'),
-            referencia_img=request.form.get('referencia_img'),
-            id_planta=planta_id
+        fila_imagens.verificar_capacidade()
+        
+        form, uploads = ler_multipart(fila_imagens, ALLOWED_EXTENSIONS)
+        recebidos = [u for u, _ in uploads.values()]
+        if 'file' not in uploads:
+            return jsonify({'error': 'Nenhum arquivo'}), 400
+        upload, nome = uploads['file']
+        
+        # Criar registro (o tamanho de 800px passa a ser o derivado 'medium')
+        nova_imagem, processar = criar_imagem(
+            upload, planta_id, nome.rsplit('.', 1)[1].lower(),
+            legenda=form.get('legenda'),
+            referencia=form.get('referencia_img')
         )
-        db.session.add(nova_imagem)
         db.session.commit()
-        
-        return jsonify({'message': 'Imagem enviada', 'imagem': nova_imagem.to_dict()}), 201
+        fila_imagens.agendar(nova_imagem, processar, upload)
+        agendado = True
+        
+        if nova_imagem.estado == 'pronta':
+            return jsonify({'message': 'Imagem enviada', 'imagem': nova_imagem.to_dict()}), 201
+        return jsonify({'message': 'Imagem recebida, em processamento', 'imagem': nova_imagem.to_dict()}), 202
+    except FilaCheia as e:
+        return jsonify({'error': str(e)}), 503, {'Retry-After': '30'}
+    except UploadRejeitado as e:
+        return jsonify({'error': str(e)}), e.status
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
+    finally:
+        for outro in recebidos:
+            if not (agendado and outro is upload):
+                fila_imagens.descartar(outro)
 
 @admin_dashboard_bp.route('/plantas/<int:planta_id>/imagens/<int:imagem_id>', methods=['DELETE'])
 def delete_imagem(planta_id, imagem_id):
@@ -312,9 +305,7 @@ def delete_imagem(planta_id, imagem_id):
         if not imagem:
             return jsonify({'error': 'Imagem não encontrada'}), 404
         
-        filepath = os.path.join(UPLOAD_FOLDER, str(planta_id), imagem.nome_arquivo)
-        if os.path.exists(filepath):
-            os.remove(filepath)
+        fila_imagens.apagar(imagem)
         
         db.session.delete(imagem)
         db.session.commit()
@@ -326,11 +317,7 @@ def delete_imagem(planta_id, imagem_id):
 @admin_dashboard_bp.route('/uploads/plantas_imagens/<int:planta_id>/<filename>')
 def serve_image(planta_id, filename):
     """Servir imagem"""
-    try:
-        planta_folder = os.path.join(UPLOAD_FOLDER, str(planta_id))
-        return send_from_directory(planta_folder, filename)
-    except:
-        return jsonify({'error': 'Imagem não encontrada'}), 404
+    return servir_imagem_antiga(planta_id, filename)
 
 
 # ==================== DASHBOARD - ESTATÍSTICAS DE REFERÊNCIAS ====================
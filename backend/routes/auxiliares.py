@@ -12,6 +12,7 @@ from models.uso_medicinal import (
 )
 from models.referencia import Autor, Afiliacao, Referencia
 from sqlalchemy import func
+from utils.familias_index import indice_familias
 
 auxiliares_bp = Blueprint('auxiliares', __name__)
 
@@ -132,23 +133,17 @@ def get_familias():
     ✅ MUDOU: Agora busca valores únicos do campo 'familia'
     """
     try:
-        familias = db.session.query(
-            Planta_medicinal.familia,
-            func.count(Planta_medicinal.id_planta).label('total_plantas')
-        ).group_by(
-            Planta_medicinal.familia
-        ).order_by(
-            Planta_medicinal.familia
-        ).all()
+        indice_familias.garantir_atualizado()
+        _, familias = indice_familias.listar()
         
         return jsonify([
             {
-                'nome_familia': f.familia,
-                'label': f.familia,
-                'value': f.familia,
-                'total_plantas': f.total_plantas
+                'nome_familia': f['nome_familia'],
+                'label': f['nome_familia'],
+                'value': f['nome_familia'],
+                'total_plantas': f['total_plantas']
             }
-            for f in familias if f.familia  # Ignorar vazios
+            for f in familias
         ])
     except Exception as e:
         return handle_error(e, "Erro ao buscar famílias")
@@ -7,13 +7,86 @@ from flask import Blueprint, request, jsonify
 from models.planta import db, Planta_medicinal, Nome_comum
 from models.localizacao import Provincia, Local_colheita
 from models.uso_medicinal import Parte_usada, Indicacao
-from models.referencia import Autor
+from models.referencia import Autor, Autor_afiliacao
 from models.usuario import LogPesquisas
-from sqlalchemy import func, or_
+from sqlalchemy import func, or_, select
+from sqlalchemy.orm import selectinload
+from utils.familias_index import indice_familias
+from utils.sql_instrumentacao import orcamento_queries
 
 busca_bp = Blueprint('busca', __name__)
 
+
+# =====================================================
+# CONSULTAS (também usadas pela leitura assíncrona)
+# =====================================================
+def consulta_plantas(padrao, limit):
+    """Plantas por nome científico OU popular, com os nomes comuns agregados"""
+    return select(
+        Planta_medicinal.id_planta,
+        Planta_medicinal.nome_cientifico,
+        Planta_medicinal.familia,
+        func.group_concat(Nome_comum.nome.distinct()).label('nomes_comuns')
+    ).outerjoin(
+        Nome_comum, Planta_medicinal.id_planta == Nome_comum.id_planta
+    ).filter(
+        or_(
+            Planta_medicinal.nome_cientifico.ilike(padrao),
+            Nome_comum.nome.ilike(padrao)
+        )
+    ).group_by(
+        Planta_medicinal.id_planta
+    ).limit(limit)
+
+
+def formatar_plantas(linhas):
+    return [{
+        'id_planta': p.id_planta,
+        'nome_cientifico': p.nome_cientifico,
+        'familia': p.familia,
+        'nomes_comuns': p.nomes_comuns.split(',') if p.nomes_comuns else []
+    } for p in linhas]
+
+
+def consulta_autores(padrao, limit, com_afiliacoes=False):
+    """
+    Args:
+        com_afiliacoes: carregar já as afiliações (para Autor.to_dict, sem um lazy load por autor)
+    """
+    consulta = select(Autor).filter(Autor.nome_autor.ilike(padrao)).limit(limit)
+    if com_afiliacoes:
+        consulta = consulta.options(
+            selectinload(Autor.afiliacoes).selectinload(Autor_afiliacao.afiliacao)
+        )
+    return consulta
+
+
+def consulta_provincias(padrao, limit):
+    return select(Provincia).filter(Provincia.provincia.ilike(padrao)).limit(limit)
+
+
+def consultas_sugestoes_plantas(padrao, limit):
+    """
+    Returns:
+        tuple: (nomes científicos, nomes comuns) - consultas independentes
+    """
+    cientificos = select(
+        Planta_medicinal.nome_cientifico.label('label'),
+        Planta_medicinal.id_planta.label('value')
+    ).filter(
+        Planta_medicinal.nome_cientifico.ilike(padrao)
+    ).limit(limit)
+    comuns = select(
+        Nome_comum.nome.label('label'),
+        Nome_comum.id_planta.label('value')
+    ).filter(
+        Nome_comum.nome.ilike(padrao)
+    ).limit(limit)
+    return cientificos, comuns
+
+
 @busca_bp.route('/busca', methods=['GET'])
+@orcamento_queries(10)
 def busca_global():
     """
     Busca global no sistema
@@ -39,59 +112,22 @@ def busca_global():
         
         # Buscar plantas (por nome científico OU popular)
         if tipo in ['plantas', 'todos']:
-            plantas = db.session.query(
-                Planta_medicinal.id_planta,
-                Planta_medicinal.nome_cientifico,
-                Planta_medicinal.familia,
-                func.group_concat(Nome_comum.nome.distinct()).label('nomes_comuns')
-            ).outerjoin(
-                Nome_comum, Planta_medicinal.id_planta == Nome_comum.id_planta
-            ).filter(
-                or_(
-                    Planta_medicinal.nome_cientifico.ilike(search_pattern),
-                    Nome_comum.nome.ilike(search_pattern)
-                )
-            ).group_by(
-                Planta_medicinal.id_planta
-            ).limit(limit).all()
-            
-            resultados['plantas'] = [{
-                'id_planta': p.id_planta,
-                'nome_cientifico': p.nome_cientifico,
-                'familia': p.familia,
-                'nomes_comuns': p.nomes_comuns.split(',') if p.nomes_comuns else []
-            } for p in plantas]
-        
-        # ✅ MUDOU: Buscar famílias (agora busca diretamente no campo texto)
+            plantas = db.session.execute(consulta_plantas(search_pattern, limit)).all()
+            resultados['plantas'] = formatar_plantas(plantas)
+        
+        # ✅ MUDOU: Buscar famílias no dicionário normalizado
         if tipo in ['familias', 'todos']:
-            familias = db.session.query(
-                Planta_medicinal.familia,
-                func.count(Planta_medicinal.id_planta).label('total_plantas')
-            ).filter(
-                Planta_medicinal.familia.ilike(search_pattern)
-            ).group_by(
-                Planta_medicinal.familia
-            ).limit(limit).all()
-            
-            resultados['familias'] = [{
-                'nome_familia': f.familia,
-                'total_plantas': f.total_plantas
-            } for f in familias]
+            indice_familias.garantir_atualizado()
+            _, resultados['familias'] = indice_familias.listar(search=termo, limit=limit)
         
         # Buscar autores
         if tipo in ['autores', 'todos']:
-            autores = Autor.query.filter(
-                Autor.nome_autor.ilike(search_pattern)
-            ).limit(limit).all()
-            
+            autores = db.session.scalars(consulta_autores(search_pattern, limit, com_afiliacoes=True)).all()
             resultados['autores'] = [a.to_dict() for a in autores]
         
         # Buscar províncias
         if tipo in ['provincias', 'todos']:
-            provincias = Provincia.query.filter(
-                Provincia.provincia.ilike(search_pattern)
-            ).limit(limit).all()
-            
+            provincias = db.session.scalars(consulta_provincias(search_pattern, limit)).all()
             resultados['provincias'] = [p.to_dict() for p in provincias]
         
         # Calcular total
@@ -124,6 +160,7 @@ def busca_global():
 
 
 @busca_bp.route('/busca/autocomplete', methods=['GET'])
+@orcamento_queries(4)
 def autocomplete():
     """
     Sugestões para autocomplete
@@ -140,46 +177,26 @@ def autocomplete():
         search_pattern = f'{termo}%'  # Começa com...
         
         if tipo == 'planta':
-            # Buscar nomes científicos
-            cientificos = db.session.query(
-                Planta_medicinal.nome_cientifico.label('label'),
-                Planta_medicinal.id_planta.label('value')
-            ).filter(
-                Planta_medicinal.nome_cientifico.ilike(search_pattern)
-            ).limit(limit // 2).all()
-            
-            # Buscar nomes comuns
-            comuns = db.session.query(
-                Nome_comum.nome.label('label'),
-                Nome_comum.id_planta.label('value')
-            ).filter(
-                Nome_comum.nome.ilike(search_pattern)
-            ).limit(limit // 2).all()
+            # Buscar nomes científicos e nomes comuns
+            consulta_cientificos, consulta_comuns = consultas_sugestoes_plantas(search_pattern, limit // 2)
+            cientificos = db.session.execute(consulta_cientificos).all()
+            comuns = db.session.execute(consulta_comuns).all()
             
             resultados = [{'label': r.label, 'value': r.value} for r in cientificos + comuns]
             
         elif tipo == 'familia':
-            # ✅ MUDOU: Busca famílias únicas no campo texto
-            familias = db.session.query(
-                Planta_medicinal.familia.label('label')
-            ).filter(
-                Planta_medicinal.familia.ilike(search_pattern)
-            ).distinct().limit(limit).all()
+            # ✅ MUDOU: Prefixo no dicionário de famílias
+            indice_familias.garantir_atualizado()
+            familias = indice_familias.buscar_prefixo(termo, limit)
             
-            resultados = [{'label': f.label, 'value': f.label} for f in familias]
+            resultados = [{'label': f['nome_familia'], 'value': f['nome_familia']} for f in familias]
             
         elif tipo == 'autor':
-            autores = Autor.query.filter(
-                Autor.nome_autor.ilike(search_pattern)
-            ).limit(limit).all()
-            
+            autores = db.session.scalars(consulta_autores(search_pattern, limit)).all()
             resultados = [{'label': a.nome_autor, 'value': a.id_autor} for a in autores]
             
         elif tipo == 'provincia':
-            provincias = Provincia.query.filter(
-                Provincia.provincia.ilike(search_pattern)
-            ).limit(limit).all()
-            
+            provincias = db.session.scalars(consulta_provincias(search_pattern, limit)).all()
             resultados = [{'label': p.provincia, 'value': p.id_provincia} for p in provincias]
             
         else:
@@ -7,6 +7,7 @@ from flask import Blueprint, jsonify, request
 from models.planta import db, Planta_medicinal, Nome_comum
 from models.referencia import Autor
 from sqlalchemy import func, or_
+from utils.familias_index import indice_familias
 
 dashboard_busca_bp = Blueprint('dashboard_busca', __name__)
 
@@ -46,18 +47,14 @@ def busca_integrada():
         
         # Famílias
         if tipo in ['familias', 'todos']:
-            familias = db.session.query(
-                Planta_medicinal.familia,
-                func.count(Planta_medicinal.id_planta).label('total')
-            ).filter(
-                Planta_medicinal.familia.ilike(search)
-            ).group_by(Planta_medicinal.familia).limit(limit).all()
+            indice_familias.garantir_atualizado()
+            _, familias = indice_familias.listar(search=q, limit=limit)
             
             result['familias'] = [{
                 'tipo': 'familia',
-                'nome': f.familia,
-                'nome_familia': f.familia,
-                'total_plantas': f.total
+                'nome': f['nome_familia'],
+                'nome_familia': f['nome_familia'],
+                'total_plantas': f['total_plantas']
             } for f in familias]
         
         # Autores
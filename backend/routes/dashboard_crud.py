@@ -54,7 +54,7 @@ def get_plantas():
 def get_planta(planta_id):
     """Detalhes de uma planta"""
     try:
-        planta = Planta_medicinal.query.get(planta_id)
+        planta = Planta_medicinal.query.options(*Planta_medicinal.opcoes_detalhe()).get(planta_id)
         if not planta:
             return jsonify({'error': 'Planta não encontrada'}), 404
         
@@ -3,65 +3,59 @@
 """
 Rotas de Upload/Gestão de Imagens
 """
-from flask import Blueprint, jsonify, request, send_from_directory
+from flask import Blueprint, jsonify
 from models.planta import db, Planta_medicinal, Imagem
-from werkzeug.utils import secure_filename
-from PIL import Image as PILImage
-import os, uuid
+from utils.imagens_fila import fila_imagens, FilaCheia, UploadRejeitado
+from utils.uploads_streaming import ler_multipart
+from utils.imagens_conteudo import criar_imagem
+from routes.imagens import servir_imagem_antiga
 
 dashboard_imagens_bp = Blueprint('dashboard_imagens', __name__)
 
-UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'uploads', 'plantas_imagens')
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-
-def allowed_file(filename):
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 @dashboard_imagens_bp.route('/plantas/<int:planta_id>/imagens', methods=['POST'])
 def upload_imagem(planta_id):
-    """Upload de imagem"""
+    """Upload de imagem (processada em segundo plano)"""
+    recebidos, agendado = [], False
     try:
-        if 'file' not in request.files:
-            return jsonify({'error': 'Nenhum arquivo'}), 400
-        
-        file = request.files['file']
-        if not allowed_file(file.filename):
-            return jsonify({'error': 'Tipo não permitido'}), 400
-        
         planta = Planta_medicinal.query.get(planta_id)
         if not planta:
             return jsonify({'error': 'Planta não encontrada'}), 404
         
-        # Salvar
-        folder = os.path.join(UPLOAD_FOLDER, str(planta_id))
-        os.makedirs(folder, exist_ok=True)
+        fila_imagens.verificar_capacidade()
         
-        filename = secure_filename(f"{uuid.uuid4().hex}.{file.filename.rsplit('.', 1)[1].lower()}")
-        filepath = os.path.join(folder, filename)
-        file.save(filepath)
-        
-        # Redimensionar
-        with PILImage.open(filepath) as img:
-            img.thumbnail((800, 800), PILImage.Resampling.LANCZOS)
-            img.save(filepath, optimize=True, quality=85)
+        # Staging direto do corpo do pedido (o tamanho de 800px passa a ser o derivado 'medium')
+        form, uploads = ler_multipart(fila_imagens, ALLOWED_EXTENSIONS)
+        recebidos = [u for u, _ in uploads.values()]
+        if 'file' not in uploads:
+            return jsonify({'error': 'Nenhum arquivo'}), 400
+        upload, nome = uploads['file']
         
-        # DB
-        url = f"/uploads/plantas_imagens/{planta_id}/{filename}"
-        nova = Imagem(
-            nome_arquivo=filename,
-            url_armazenamento=url,
-            legenda=request.form.get('legenda'),
-            referencia_img=request.form.get('referencia_img'),
-            id_planta=planta_id
+        # DB (conteúdo repetido reutiliza o ficheiro)
+        nova, processar = criar_imagem(
+            upload, planta_id, nome.rsplit('.', 1)[1].lower(),
+            legenda=form.get('legenda'),
+            referencia=form.get('referencia_img')
         )
-        db.session.add(nova)
         db.session.commit()
+        fila_imagens.agendar(nova, processar, upload)
+        agendado = True
         
-        return jsonify({'message': 'Imagem enviada', 'imagem': nova.to_dict()}), 201
+        if nova.estado == 'pronta':
+            return jsonify({'message': 'Imagem enviada', 'imagem': nova.to_dict()}), 201
+        return jsonify({'message': 'Imagem recebida, em processamento', 'imagem': nova.to_dict()}), 202
+    except FilaCheia as e:
+        return jsonify({'error': str(e)}), 503, {'Retry-After': '30'}
+    except UploadRejeitado as e:
+        return jsonify({'error': str(e)}), e.status
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
+    finally:
+        for outro in recebidos:
+            if not (agendado and outro is upload):
+                fila_imagens.descartar(outro)
 
 @dashboard_imagens_bp.route('/plantas/<int:planta_id>/imagens/<int:imagem_id>', methods=['DELETE'])
 def delete_imagem(planta_id, imagem_id):
@@ -71,9 +65,7 @@ def delete_imagem(planta_id, imagem_id):
         if not imagem:
             return jsonify({'error': 'Imagem não encontrada'}), 404
         
-        filepath = os.path.join(UPLOAD_FOLDER, str(planta_id), imagem.nome_arquivo)
-        if os.path.exists(filepath):
-            os.remove(filepath)
+        fila_imagens.apagar(imagem)
         
         db.session.delete(imagem)
         db.session.commit()
@@ -85,8 +77,4 @@ def delete_imagem(planta_id, imagem_id):
 @dashboard_imagens_bp.route('/uploads/plantas_imagens/<int:planta_id>/<filename>')
 def serve_image(planta_id, filename):
     """Servir imagem"""
-    try:
-        folder = os.path.join(UPLOAD_FOLDER, str(planta_id))
-        return send_from_directory(folder, filename)
-    except:
-        return jsonify({'error': 'Não encontrada'}), 404
\ No newline at end of file
+    return servir_imagem_antiga(planta_id, filename)
\ No newline at end of file
@@ -10,6 +10,7 @@ from models.referencia import Autor, Referencia, Referencia_autor, Planta_refere
 from models.uso_medicinal import Indicacao
 from sqlalchemy import func, desc, text
 from datetime import datetime, timedelta
+from utils.familias_index import indice_familias
 
 dashboard_stats_bp = Blueprint('dashboard_stats', __name__)
 
@@ -18,9 +19,10 @@ dashboard_stats_bp = Blueprint('dashboard_stats', __name__)
 def get_stats():
     """Estatísticas gerais do sistema"""
     try:
+        indice_familias.garantir_atualizado()
         return jsonify({
             'total_plantas': Planta_medicinal.query.count(),
-            'total_familias': db.session.query(func.count(func.distinct(Planta_medicinal.familia))).scalar(),
+            'total_familias': len(indice_familias),
             'total_autores': Autor.query.count(),
             'total_provincias': Provincia.query.count(),
             'total_referencias': Referencia.query.count(),
@@ -36,12 +38,10 @@ def plantas_por_familia():
     """Distribuição de plantas por família"""
     try:
         limit = request.args.get('limit', 6, type=int)
-        familias = db.session.query(
-            Planta_medicinal.familia,
-            func.count(Planta_medicinal.id_planta).label('count')
-        ).group_by(Planta_medicinal.familia).order_by(desc('count')).limit(limit).all()
+        indice_familias.garantir_atualizado()
+        familias = indice_familias.top(limit)
         
-        return jsonify({'familias': [{'name': f.familia, 'count': f.count} for f in familias]}), 200
+        return jsonify({'familias': [{'name': f['nome_familia'], 'count': f['total_plantas']} for f in familias]}), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -5,10 +5,12 @@ Rotas Admin - Gestão de Famílias
 Autor: Sistema de Plantas Medicinais
 Descrição: Rotas para consulta e edição de famílias (agora como atributo das plantas)
 """
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, jsonify, request, current_app
 from models.planta import db, Planta_medicinal
 from sqlalchemy import func, desc, asc
 from sqlalchemy.exc import SQLAlchemyError
+from utils.familias_index import indice_familias, normalizar_familia
+from utils import familias_lote
 
 admin_familias_bp = Blueprint('admin_familias', __name__)
 
@@ -46,45 +48,23 @@ def listar_familias():
         if sort_order not in ['asc', 'desc']:
             sort_order = 'asc'
         
-        # Query base: agregar famílias das plantas
-        query = db.session.query(
-            Planta_medicinal.familia.label('nome_familia'),
-            func.count(Planta_medicinal.id_planta).label('total_plantas')
-        ).group_by(Planta_medicinal.familia)
-        
-        # Aplicar filtro de busca
-        if search:
-            query = query.filter(Planta_medicinal.familia.ilike(f'%{search}%'))
-        
-        # Total de famílias (antes da paginação)
-        total = query.count()
-        
-        # Aplicar ordenação
-        if sort_by == 'nome_familia':
-            order_col = Planta_medicinal.familia
-        else:  # total_plantas
-            order_col = func.count(Planta_medicinal.id_planta)
-        
-        if sort_order == 'asc':
-            query = query.order_by(asc(order_col))
-        else:
-            query = query.order_by(desc(order_col))
-        
-        # Aplicar paginação
+        # ✅ Ler do dicionário de famílias (sem GROUP BY sobre as plantas)
+        indice_familias.garantir_atualizado()
         offset = (page - 1) * limit
-        familias = query.offset(offset).limit(limit).all()
+        total, familias = indice_familias.listar(
+            search=search,
+            sort_by=sort_by,
+            sort_order=sort_order,
+            offset=offset,
+            limit=limit
+        )
         
         # Calcular total de páginas
         total_pages = (total + limit - 1) // limit if total > 0 else 1
         
         # Formatar resposta
-        familias_list = [{
-            'nome_familia': f.nome_familia,
-            'total_plantas': f.total_plantas
-        } for f in familias]
-        
         return jsonify({
-            'familias': familias_list,
+            'familias': familias,
             'total': total,
             'page': page,
             'limit': limit,
@@ -123,25 +103,16 @@ def detalhes_familia(nome_familia):
         JSON com detalhes da família (nome e total de plantas)
     """
     try:
-        # Buscar família
-        familia_data = db.session.query(
-            Planta_medicinal.familia.label('nome_familia'),
-            func.count(Planta_medicinal.id_planta).label('total_plantas')
-        ).filter(
-            Planta_medicinal.familia == nome_familia
-        ).group_by(
-            Planta_medicinal.familia
-        ).first()
+        # Buscar família no dicionário
+        indice_familias.garantir_atualizado()
+        familia_data = indice_familias.obter(nome_familia)
         
         if not familia_data:
             return jsonify({
                 'error': f'Família "{nome_familia}" não encontrada'
             }), 404
         
-        return jsonify({
-            'nome_familia': familia_data.nome_familia,
-            'total_plantas': familia_data.total_plantas
-        }), 200
+        return jsonify(familia_data), 200
         
     except SQLAlchemyError as e:
         print(f"❌ Erro de banco de dados em detalhes_familia: {e}")
@@ -175,6 +146,9 @@ def renomear_familia():
         - Nome antigo deve existir
         - Se nome novo já existir, faz MERGE (unifica as famílias)
     
+    Aplicada em blocos de plantas (familias_lote.aplicar), cada um na sua
+    transação: uma família grande não bloqueia a tabela num único UPDATE
+    
     Returns:
         JSON com mensagem de sucesso e número de plantas afetadas
     """
@@ -204,43 +178,40 @@ def renomear_familia():
             }), 400
         
         # 2. Nomes idênticos
-        if old_name.lower() == new_name.lower():
+        if normalizar_familia(old_name) == normalizar_familia(new_name):
             return jsonify({
                 'error': 'O nome antigo e o novo nome são idênticos',
                 'old_name': old_name,
                 'new_name': new_name
             }), 400
         
-        # 3. Verificar se nome antigo existe
-        count_old = Planta_medicinal.query.filter_by(familia=old_name).count()
+        # 3. Contagens de origem e destino numa única query agrupada
+        previa = familias_lote.pre_visualizar([(old_name, new_name)])['renomeacoes'][0]
         
-        if count_old == 0:
+        if not previa['encontrada']:
             return jsonify({
                 'error': f'Família "{old_name}" não encontrada no sistema',
                 'sugestao': 'Verifique se o nome está correto (case-sensitive)'
             }), 404
         
-        # 4. Verificar se nome novo já existe (pode ser merge)
-        count_new = Planta_medicinal.query.filter_by(familia=new_name).count()
-        
+        # 4. Nome novo já existe: MERGE
+        count_new = previa['plantas_destino']
         is_merge = count_new > 0
         
         # ===== EXECUTAR RENOMEAÇÃO =====
         
-        # Atualizar TODAS as plantas com a família antiga para o novo nome
-        plantas_atualizadas = Planta_medicinal.query.filter_by(familia=old_name).update(
-            {'familia': new_name},
-            synchronize_session=False  # Performance: não sincronizar sessão durante update em massa
+        # Blocos por id_planta com commit por bloco (locks curtos); as
+        # contagens vêm do rowcount de cada UPDATE
+        resultado = familias_lote.aplicar(
+            [(old_name, new_name)], total_previsto=previa['plantas_afetadas']
         )
-        
-        # Commit da transação
-        db.session.commit()
+        plantas_atualizadas = resultado['plantas_atualizadas']
         
         # ===== RESPOSTA =====
         
         if is_merge:
             # Caso de merge: famílias unificadas
-            total_final = Planta_medicinal.query.filter_by(familia=new_name).count()
+            total_final = count_new + plantas_atualizadas
             
             return jsonify({
                 'message': f'Famílias unificadas com sucesso',
@@ -287,6 +258,123 @@ def renomear_familia():
         }), 500
 
 
+# ==================== RENOMEAR / UNIFICAR EM LOTE ====================
+@admin_familias_bp.route('/familias/batch-rename', methods=['POST'])
+def renomear_familias_lote():
+    """
+    Renomear/unificar várias famílias num único pedido
+    
+    Body (JSON):
+        {
+            "renomeacoes": [{"old_name": "A", "new_name": "B"}, ...]
+                           (ou {"A": "B", ...}),
+            "dry_run": true,          # Apenas pré-visualizar (default: true)
+            "chunk_size": 500,        # Plantas por bloco de UPDATE (máx: 5000)
+            "pausa_ms": 0,            # Pausa entre blocos
+            "background": true        # Executar em segundo plano (default: true)
+        }
+    
+    Returns:
+        - dry_run: contagens afetadas por renomeação (uma query agrupada)
+        - background: job_id (202) para acompanhar em /familias/batch-rename/<job_id>
+        - síncrono: relatório final
+    """
+    try:
+        data = request.get_json()
+        
+        if not data:
+            return jsonify({
+                'error': 'Corpo da requisição inválido ou vazio'
+            }), 400
+        
+        pares, erros = familias_lote.normalizar_pedido(data.get('renomeacoes'))
+        if erros:
+            return jsonify({
+                'error': 'Pedido de renomeação inválido',
+                'erros': erros
+            }), 400
+        
+        dry_run = data.get('dry_run', True)
+        chunk_size = data.get('chunk_size', familias_lote.CHUNK_PADRAO)
+        pausa_ms = data.get('pausa_ms', 0)
+        
+        if not isinstance(chunk_size, int) or chunk_size < 1:
+            chunk_size = familias_lote.CHUNK_PADRAO
+        chunk_size = min(chunk_size, familias_lote.CHUNK_MAXIMO)
+        if not isinstance(pausa_ms, int) or pausa_ms < 0:
+            pausa_ms = 0
+        
+        # ===== PRÉ-VISUALIZAÇÃO =====
+        previa = familias_lote.pre_visualizar(pares)
+        
+        if dry_run:
+            return jsonify({
+                'dry_run': True,
+                **previa
+            }), 200
+        
+        if previa['total_plantas_afetadas'] == 0:
+            return jsonify({
+                'error': 'Nenhuma das famílias de origem foi encontrada',
+                **previa
+            }), 404
+        
+        # ===== APLICAR =====
+        if data.get('background', True):
+            job_id = familias_lote.iniciar_job(
+                current_app._get_current_object(), pares,
+                chunk_size=chunk_size, pausa_ms=pausa_ms
+            )
+            return jsonify({
+                'message': 'Renomeação em lote iniciada',
+                'job_id': job_id,
+                'status_url': f'/api/admin/familias/batch-rename/{job_id}',
+                **previa
+            }), 202
+        
+        resultado = familias_lote.aplicar(pares, chunk_size=chunk_size, pausa_ms=pausa_ms)
+        return jsonify({
+            'message': 'Renomeação em lote concluída',
+            **resultado
+        }), 200
+        
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        print(f"❌ Erro de banco de dados em renomear_familias_lote: {e}")
+        return jsonify({
+            'error': 'Erro ao renomear famílias no banco de dados',
+            'details': str(e)
+        }), 500
+    except Exception as e:
+        db.session.rollback()
+        print(f"❌ Erro inesperado em renomear_familias_lote: {e}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({
+            'error': 'Erro interno ao renomear famílias',
+            'details': str(e)
+        }), 500
+
+
+@admin_familias_bp.route('/familias/batch-rename/<string:job_id>', methods=['GET'])
+def progresso_renomeacao_lote(job_id):
+    """
+    Progresso de uma renomeação em lote
+    
+    Returns:
+        JSON com estado ('pendente', 'em_execucao', 'concluido', 'erro'),
+        blocos processados, plantas atualizadas e resultado final
+    """
+    job = familias_lote.obter_job(job_id)
+    
+    if not job:
+        return jsonify({
+            'error': f'Job "{job_id}" não encontrado'
+        }), 404
+    
+    return jsonify(job), 200
+
+
 # ==================== VALIDAR NOME DE FAMÍLIA ====================
 @admin_familias_bp.route('/familias/validate', methods=['POST'])
 def validar_nome_familia():
@@ -316,13 +404,15 @@ def validar_nome_familia():
                 'error': 'Campo "nome_familia" é obrigatório'
             }), 400
         
-        # Verificar se existe
-        count = Planta_medicinal.query.filter_by(familia=nome_familia).count()
+        # Verificar se existe (qualquer grafia equivalente)
+        indice_familias.garantir_atualizado()
+        familia = indice_familias.obter(nome_familia)
         
         return jsonify({
             'nome_familia': nome_familia,
-            'exists': count > 0,
-            'total_plantas': count
+            'exists': familia is not None,
+            'nome_existente': familia['nome_familia'] if familia else None,
+            'total_plantas': familia['total_plantas'] if familia else 0
         }), 200
         
     except Exception as e:
@@ -343,23 +433,12 @@ def estatisticas_familias():
         JSON com estatísticas agregadas
     """
     try:
-        # Total de famílias únicas
-        total_familias = db.session.query(
-            func.count(func.distinct(Planta_medicinal.familia))
-        ).scalar() or 0
-        
-        # Total de plantas
-        total_plantas = Planta_medicinal.query.count()
-        
-        # Família com mais plantas
-        familia_top = db.session.query(
-            Planta_medicinal.familia,
-            func.count(Planta_medicinal.id_planta).label('total')
-        ).group_by(
-            Planta_medicinal.familia
-        ).order_by(
-            desc('total')
-        ).first()
+        indice_familias.garantir_atualizado()
+        indice_familias.verificar_divergencia()  # Pedido do admin: a única leitura que conta as plantas
+        stats = indice_familias.estatisticas()
+        total_familias = stats['total_familias']
+        total_plantas = stats['total_plantas']
+        familia_top = stats['familia_top']
         
         # Média de plantas por família
         media_plantas = total_plantas / total_familias if total_familias > 0 else 0
@@ -369,9 +448,10 @@ def estatisticas_familias():
             'total_plantas': total_plantas,
             'media_plantas_por_familia': round(media_plantas, 2),
             'familia_mais_plantas': {
-                'nome': familia_top.familia if familia_top else None,
-                'total_plantas': familia_top.total if familia_top else 0
-            } if familia_top else None
+                'nome': familia_top['nome_familia'],
+                'total_plantas': familia_top['total_plantas']
+            } if familia_top else None,
+            'divergencia': stats['divergencia']  # Não nulo: sincronizar o dicionário
         }), 200
         
     except Exception as e:
@@ -379,4 +459,33 @@ def estatisticas_familias():
         return jsonify({
             'error': 'Erro ao calcular estatísticas',
             'details': str(e)
+        }), 500
+
+
+# ==================== SINCRONIZAR DICIONÁRIO ====================
+@admin_familias_bp.route('/familias/sincronizar', methods=['POST'])
+def sincronizar_familias():
+    """
+    Reconstruir o dicionário de famílias a partir das plantas
+    (útil após importações feitas diretamente na BD)
+    
+    Returns:
+        JSON com o total de famílias no dicionário
+    """
+    try:
+        indice_familias.sincronizar()
+        stats = indice_familias.estatisticas()
+        
+        return jsonify({
+            'message': 'Dicionário de famílias sincronizado',
+            'total_familias': stats['total_familias'],
+            'total_plantas': stats['total_plantas']
+        }), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        print(f"❌ Erro em sincronizar_familias: {e}")
+        return jsonify({
+            'error': 'Erro ao sincronizar famílias',
+            'details': str(e)
         }), 500
\ No newline at end of file
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Rotas do Grafo de Citações
+Co-autoria, plantas com referências em comum e caminhos entre
+autores/referências/plantas, servidos a partir do grafo CSR em memória
+"""
+from flask import Blueprint, request, jsonify
+from models.planta import db, Planta_medicinal
+from models.referencia import Autor, Referencia
+from utils.grafo_citacoes import grafo, TIPOS_NO
+
+grafo_bp = Blueprint('grafo', __name__)
+
+MAX_PROFUNDIDADE = 4
+MAX_LIMITE = 500
+MAX_CAMINHO = 12  # Saltos máximos de /caminho (BFS sobre o grafo inteiro)
+
+# Coleção no URL (plural, como /autores/<id>/colaboradores) -> tipo de nó
+TIPO_POR_COLECAO = {'autores': 'autor', 'referencias': 'referencia', 'plantas': 'planta'}
+
+def handle_error(e, message="Erro ao processar requisição"):
+    """Tratamento de erros padronizado"""
+    print(f"❌ Erro: {e}")
+    return jsonify({'error': message, 'details': str(e)}), 500
+
+def _nomes(nos):
+    """
+    Resolver nomes de vários nós com UMA query por tipo
+
+    Args:
+        nos: iterável de (tipo, id)
+
+    Returns:
+        dict: {(tipo, id): nome}
+    """
+    ids_por_tipo = {t: set() for t in TIPOS_NO}
+    for tipo, id_ in nos:
+        ids_por_tipo[tipo].add(id_)
+
+    colunas = {
+        'autor': (Autor.id_autor, Autor.nome_autor),
+        'referencia': (Referencia.id_referencia, Referencia.titulo_referencia),
+        'planta': (Planta_medicinal.id_planta, Planta_medicinal.nome_cientifico),
+    }
+
+    nomes = {}
+    for tipo, ids in ids_por_tipo.items():
+        if not ids:
+            continue
+        col_id, col_nome = colunas[tipo]
+        for id_, nome in db.session.query(col_id, col_nome).filter(col_id.in_(ids)).all():
+            nomes[(tipo, id_)] = nome
+    return nomes
+
+def _parse_no(valor):
+    """Converter 'tipo:id' em (tipo, id)"""
+    try:
+        tipo, id_ = valor.split(':', 1)
+        tipo = tipo.strip().lower()
+        if tipo not in TIPOS_NO:
+            return None
+        return tipo, int(id_)
+    except (ValueError, AttributeError):
+        return None
+
+# =====================================================
+# VIZINHANÇA
+# =====================================================
+@grafo_bp.route('/<any(autores, referencias, plantas):colecao>/<int:id_no>/vizinhos', methods=['GET'])
+def get_vizinhos(colecao, id_no):
+    """
+    Nós alcançáveis a partir de um autor/referência/planta
+    (/autores/<id>/vizinhos, /referencias/<id>/vizinhos, /plantas/<id>/vizinhos)
+
+    Query Params:
+        - profundidade (int): saltos máximos (default: 1, máx: 4)
+        - tipos (str): filtrar tipos, separados por vírgula (ex: 'autor,planta')
+        - limit (int): máximo de resultados (default: 100)
+    """
+    try:
+        tipo = TIPO_POR_COLECAO[colecao]
+        profundidade = min(max(request.args.get('profundidade', 1, type=int), 1), MAX_PROFUNDIDADE)
+        limite = min(max(request.args.get('limit', 100, type=int), 1), MAX_LIMITE)
+        tipos = request.args.get('tipos', '').strip()
+        tipos = {t.strip() for t in tipos.split(',') if t.strip() in TIPOS_NO} or None
+
+        grafo.garantir_atualizado()
+        if not grafo.existe(tipo, id_no):
+            return jsonify({'error': f'{tipo.capitalize()} {id_no} não tem ligações no grafo'}), 404
+
+        vizinhos = grafo.vizinhanca(tipo, id_no, profundidade=profundidade, tipos=tipos, limite=limite)
+        nomes = _nomes((v['tipo'], v['id']) for v in vizinhos)
+        for v in vizinhos:
+            v['nome'] = nomes.get((v['tipo'], v['id']))
+
+        return jsonify({
+            'origem': {'tipo': tipo, 'id': id_no},
+            'profundidade': profundidade,
+            'vizinhos': vizinhos,
+            'total': len(vizinhos)
+        })
+    except Exception as e:
+        return handle_error(e, "Erro ao consultar vizinhança no grafo")
+
+# =====================================================
+# CO-AUTORES / PLANTAS RELACIONADAS
+# =====================================================
+@grafo_bp.route('/autores/<int:id_autor>/colaboradores', methods=['GET'])
+def get_colaboradores(id_autor):
+    """Autores que mais co-assinaram referências com este autor"""
+    try:
+        limite = min(max(request.args.get('limit', 10, type=int), 1), MAX_LIMITE)
+
+        grafo.garantir_atualizado()
+        colaboradores = grafo.top_relacionados('autor', id_autor, via='referencia', limite=limite)
+        nomes = _nomes(('autor', c['id']) for c in colaboradores)
+
+        return jsonify({
+            'id_autor': id_autor,
+            'colaboradores': [{
+                'id_autor': c['id'],
+                'nome_autor': nomes.get(('autor', c['id'])),
+                'referencias_em_comum': c['partilhados']
+            } for c in colaboradores]
+        })
+    except Exception as e:
+        return handle_error(e, "Erro ao buscar colaboradores")
+
+@grafo_bp.route('/plantas/<int:id_planta>/relacionadas', methods=['GET'])
+def get_plantas_relacionadas(id_planta):
+    """Plantas que partilham mais referências com esta planta"""
+    try:
+        limite = min(max(request.args.get('limit', 10, type=int), 1), MAX_LIMITE)
+
+        grafo.garantir_atualizado()
+        relacionadas = grafo.top_relacionados('planta', id_planta, via='referencia', limite=limite)
+        nomes = _nomes(('planta', r['id']) for r in relacionadas)
+
+        return jsonify({
+            'id_planta': id_planta,
+            'plantas': [{
+                'id_planta': r['id'],
+                'nome_cientifico': nomes.get(('planta', r['id'])),
+                'referencias_em_comum': r['partilhados']
+            } for r in relacionadas]
+        })
+    except Exception as e:
+        return handle_error(e, "Erro ao buscar plantas relacionadas")
+
+# =====================================================
+# CAMINHO MAIS CURTO
+# =====================================================
+@grafo_bp.route('/caminho', methods=['GET'])
+def get_caminho():
+    """
+    Caminho mais curto entre dois nós
+
+    Query Params:
+        - origem (str): 'tipo:id' (ex: 'autor:3')
+        - destino (str): 'tipo:id' (ex: 'planta:12')
+        - max (int): saltos máximos (default: 8, máx: 12)
+    """
+    try:
+        origem = _parse_no(request.args.get('origem', ''))
+        destino = _parse_no(request.args.get('destino', ''))
+        if not origem or not destino:
+            return jsonify({'error': 'Parâmetros "origem" e "destino" obrigatórios no formato tipo:id'}), 400
+
+        max_saltos = min(max(request.args.get('max', 8, type=int), 1), MAX_CAMINHO)
+
+        grafo.garantir_atualizado()
+        caminho = grafo.caminho_mais_curto(origem, destino, max_profundidade=max_saltos)
+
+        if caminho is None:
+            return jsonify({
+                'origem': {'tipo': origem[0], 'id': origem[1]},
+                'destino': {'tipo': destino[0], 'id': destino[1]},
+                'caminho': [],
+                'distancia': None
+            }), 404
+
+        nomes = _nomes(caminho)
+        return jsonify({
+            'origem': {'tipo': origem[0], 'id': origem[1]},
+            'destino': {'tipo': destino[0], 'id': destino[1]},
+            'caminho': [{'tipo': t, 'id': i, 'nome': nomes.get((t, i))} for t, i in caminho],
+            'distancia': len(caminho) - 1
+        })
+    except Exception as e:
+        return handle_error(e, "Erro ao calcular caminho")
+
+# =====================================================
+# ESTATÍSTICAS
+# =====================================================
+@grafo_bp.route('/stats', methods=['GET'])
+def get_stats_grafo():
+    """Tamanho do grafo em memória"""
+    try:
+        grafo.garantir_atualizado()
+        return jsonify(grafo.estatisticas())
+    except Exception as e:
+        return handle_error(e, "Erro ao obter estatísticas do grafo")
@@ -2,17 +2,19 @@
 # -*- coding: utf-8 -*-
 """
 Rotas de Imagens - Upload e gestão
-MANTIDO da estrutura antiga (sem mudanças)
+O processamento (PIL) corre na fila de imagens, fora do pedido
 """
 import os
-import uuid
-import base64
-from flask import Blueprint, request, jsonify, send_from_directory
-from werkzeug.utils import secure_filename
-from PIL import Image as PILImage
-from io import BytesIO
+from flask import Blueprint, current_app, request, jsonify
 from models.planta import db, Planta_medicinal, Imagem
-from config import Config
+from utils.imagens_fila import fila_imagens, FilaCheia, UploadRejeitado
+from utils.uploads_streaming import ler_json, ler_multipart, uploads_em
+from utils.imagens_conteudo import criar_imagem, PREFIXO_RE
+from utils import armazenamento
+from utils.armazenamento import RAIZ_CONTEUDO, RAIZ_ANTIGAS
+from utils.imagens_servir import servir_imagem
+from utils import imagens_importacao
+from utils.imagens_reconciliacao import Reconciliacao
 
 imagens_bp = Blueprint('imagens', __name__)
 
@@ -54,86 +56,230 @@ def upload_imagem(planta_id):
     """
     Upload de imagem para uma planta
     Aceita: multipart/form-data OU base64
+    
+    O ficheiro fica em staging e é processado em segundo plano:
+    responde 202 com estado 'pendente' (ver GET /imagens/<id>/estado)
     """
+    recebidos, agendado = [], False
     try:
         planta = Planta_medicinal.query.get_or_404(planta_id)
+        fila_imagens.verificar_capacidade()
         
-        # Criar pasta da planta se não existir
-        planta_folder = os.path.join(Config.UPLOAD_FOLDER, str(planta_id))
-        os.makedirs(planta_folder, exist_ok=True)
-        
-        # Verificar se é upload por arquivo ou base64
-        if 'file' in request.files:
+        # Verificar se é upload por arquivo ou base64 (ambos gravados em
+        # staging à medida que o corpo chega)
+        if request.mimetype == 'multipart/form-data':
             # Upload tradicional
-            file = request.files['file']
+            form, uploads = ler_multipart(fila_imagens, ALLOWED_EXTENSIONS)
+            recebidos = [u for u, _ in uploads.values()]
             
-            if file.filename == '':
+            if 'file' not in uploads:
                 return jsonify({'error': 'Nenhum arquivo selecionado'}), 400
             
-            if not allowed_file(file.filename):
-                return jsonify({'error': 'Tipo de arquivo não permitido'}), 400
-            
-            # Gerar nome único
-            ext = file.filename.rsplit('.', 1)[1].lower()
-            filename = f"{uuid.uuid4()}.{ext}"
-            filepath = os.path.join(planta_folder, filename)
+            upload, nome = uploads['file']
+            ext = nome.rsplit('.', 1)[1].lower()
             
-            # Salvar arquivo
-            file.save(filepath)
+            legenda = form.get('legenda')
+            referencia = form.get('referencia')
             
         elif request.is_json:
-            # Upload base64
-            data = request.get_json()
+            # Upload base64 (decodificado aos blocos; aceita prefixo data URL)
+            data = ler_json(fila_imagens, ('image_base64',))
+            recebidos = list(uploads_em(data))
             
-            if 'image_base64' not in data:
+            if not isinstance(data, dict) or data.get('image_base64') is None:
                 return jsonify({'error': 'image_base64 é obrigatório'}), 400
             
-            # Decodificar base64
-            image_data = data['image_base64']
-            if ',' in image_data:
-                image_data = image_data.split(',')[1]
-            
-            image_bytes = base64.b64decode(image_data)
-            
-            # Abrir imagem com PIL
-            img = PILImage.open(BytesIO(image_bytes))
+            upload = data['image_base64']
+            if isinstance(upload, UploadRejeitado):
+                raise upload
             
-            # Determinar formato
-            format_map = {'JPEG': 'jpg', 'PNG': 'png', 'GIF': 'gif', 'WEBP': 'webp'}
-            ext = format_map.get(img.format, 'jpg')
+            # Formato pelos primeiros bytes (o PIL só corre na fila)
+            ext = None
             
-            # Gerar nome único
-            filename = f"{uuid.uuid4()}.{ext}"
-            filepath = os.path.join(planta_folder, filename)
-            
-            # Salvar imagem
-            img.save(filepath)
+            legenda = data.get('legenda')
+            referencia = data.get('referencia')
             
         else:
             return jsonify({'error': 'Formato de upload inválido'}), 400
         
-        # Salvar metadados no BD
-        url_armazenamento = f"/uploads/plantas_imagens/{planta_id}/{filename}"
-        
-        imagem = Imagem(
-            nome_arquivo=filename,
-            url_armazenamento=url_armazenamento,
-            legenda=request.form.get('legenda') if 'file' in request.files else data.get('legenda'),
-            referencia_img=request.form.get('referencia') if 'file' in request.files else data.get('referencia'),
-            id_planta=planta_id
-        )
+        # Salvar metadados no BD (conteúdo repetido reutiliza o ficheiro)
+        try:
+            imagem, processar = criar_imagem(upload, planta_id, ext, legenda, referencia)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        db.session.add(imagem)
         db.session.commit()
+        fila_imagens.agendar(imagem, processar, upload)
+        agendado = True
+        
+        if imagem.estado == 'pronta':
+            return jsonify({
+                'message': 'Imagem enviada com sucesso',
+                'imagem': imagem.to_dict()
+            }), 201
         
         return jsonify({
-            'message': 'Imagem enviada com sucesso',
+            'message': 'Imagem recebida, em processamento',
             'imagem': imagem.to_dict()
-        }), 201
+        }), 202
         
+    except FilaCheia as e:
+        return jsonify({'error': str(e)}), 503, {'Retry-After': '30'}
+    except UploadRejeitado as e:
+        return jsonify({'error': str(e)}), e.status
     except Exception as e:
         db.session.rollback()
         return handle_error(e, "Erro ao fazer upload da imagem")
+    finally:
+        # Staging deste pedido que não chegou à fila (o agendado já foi tratado por agendar)
+        for outro in recebidos:
+            if not (agendado and outro is upload):
+                fila_imagens.descartar(outro)
+
+# =====================================================
+# GET - ESTADO DO PROCESSAMENTO
+# =====================================================
+@imagens_bp.route('/imagens/<int:imagem_id>/estado', methods=['GET'])
+def get_estado_imagem(imagem_id):
+    """Estado do processamento de uma imagem (pendente, pronta ou erro)"""
+    try:
+        imagem = Imagem.query.get_or_404(imagem_id)
+        return jsonify({
+            'id_imagem': imagem.id_imagem,
+            'estado': imagem.estado,
+            'erro': imagem.erro_processamento,
+            'url': imagem.url_armazenamento if imagem.estado == 'pronta' else None
+        })
+    except Exception as e:
+        return handle_error(e, "Erro ao buscar estado da imagem")
+
+@imagens_bp.route('/imagens/migrar', methods=['POST'])
+def migrar_imagens_antigas():
+    """
+    Passar imagens antigas para o armazenamento por conteúdo (com derivados
+    thumb/medium/full) e preencher os metadados em falta, em lotes de ?limite=
+    """
+    try:
+        limite = min(request.args.get('limite', 100, type=int), 1000)
+        resultado = fila_imagens.migrar_imagens_antigas(limite)
+        resultado['metadados_preenchidos'] = fila_imagens.preencher_metadados(limite)
+        return jsonify({**resultado, **fila_imagens.estatisticas()}), 202
+    except Exception as e:
+        db.session.rollback()
+        return handle_error(e, "Erro ao migrar imagens")
+
+# =====================================================
+# POST - IMPORTAÇÃO EM LOTE (pasta ou ZIP no servidor)
+# =====================================================
+def _caminho_importacao(relativo):
+    """Caminho dentro de IMAGE_IMPORT_FOLDER (None se sair da pasta)"""
+    pasta = os.path.realpath(current_app.config['IMAGE_IMPORT_FOLDER'])
+    caminho = os.path.realpath(os.path.join(pasta, relativo))
+    return caminho if os.path.commonpath([pasta, caminho]) == pasta else None
+
+@imagens_bp.route('/imagens/importar', methods=['POST'])
+def importar_imagens():
+    """
+    Importar uma pasta ou ZIP de IMAGE_IMPORT_FOLDER em segundo plano
+    
+    Body:
+        origem: caminho relativo da pasta/ZIP
+        csv: caminho relativo do CSV (arquivo, id_planta|nome_cientifico, legenda, referencia)
+        padrao: regex com (?P<nome>...) ou (?P<id_planta>...) aplicada ao nome do ficheiro
+        lote, workers: opcionais
+    
+    Returns:
+        202 com job_id (progresso em GET /imagens/importar/<job_id>)
+    """
+    try:
+        data = request.get_json() or {}
+        if not data.get('origem'):
+            return jsonify({'error': 'origem é obrigatória'}), 400
+        
+        origem = _caminho_importacao(data['origem'])
+        csv_caminho = _caminho_importacao(data['csv']) if data.get('csv') else None
+        if origem is None or (data.get('csv') and csv_caminho is None):
+            return jsonify({'error': 'Caminho fora da pasta de importação'}), 400
+        
+        estado = imagens_importacao.criar_job(
+            current_app._get_current_object(), origem, csv_caminho,
+            data.get('padrao'), data.get('lote', imagens_importacao.LOTE_PADRAO), data.get('workers')
+        )
+        job_id = imagens_importacao.iniciar_job(current_app._get_current_object(), estado)
+        return jsonify({
+            'message': 'Importação iniciada',
+            'job_id': job_id,
+            'status_url': f'/api/imagens/importar/{job_id}'
+        }), 202
+    except (imagens_importacao.ErroImportacao, TypeError) as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return handle_error(e, "Erro ao iniciar importação")
+
+@imagens_bp.route('/imagens/importar/<string:job_id>', methods=['GET'])
+def progresso_importacao(job_id):
+    """Progresso de uma importação (lido do ficheiro de estado, qualquer worker)"""
+    job = imagens_importacao.obter_job(current_app, job_id)
+    if not job:
+        return jsonify({'error': f'Job "{job_id}" não encontrado'}), 404
+    return jsonify(job), 200
+
+@imagens_bp.route('/imagens/importar/<string:job_id>/retomar', methods=['POST'])
+def retomar_importacao(job_id):
+    """Continuar uma importação interrompida a partir do último lote confirmado"""
+    try:
+        estado = imagens_importacao.preparar_retoma(current_app, job_id)
+        imagens_importacao.iniciar_job(current_app._get_current_object(), estado)
+        return jsonify({
+            'message': 'Importação retomada',
+            'job_id': job_id,
+            'cursor': estado['cursor'],
+            'status_url': f'/api/imagens/importar/{job_id}'
+        }), 202
+    except imagens_importacao.ErroImportacao as e:
+        return jsonify({'error': str(e)}), 409
+    except Exception as e:
+        return handle_error(e, "Erro ao retomar importação")
+
+@imagens_bp.route('/imagens/reconciliar', methods=['POST'])
+def reconciliar_imagens():
+    """
+    Comparar ficheiros em disco com a base de dados (uma passagem limitada)
+    
+    Body:
+        aplicar: apagar órfãos e corrigir contagens (por omissão só reporta)
+        remover_em_falta: apagar registos Imagem sem ficheiro
+        limite: pastas a tratar neste pedido (máx. 500)
+        reiniciar: ignorar o checkpoint
+    
+    Returns:
+        Relatório acumulado do ciclo; 'concluido' quando todas as pastas foram vistas
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        limite = min(int(data.get('limite', 100)), 500)
+    except (TypeError, ValueError):
+        return jsonify({'error': 'limite inválido'}), 400
+    try:
+        resultado = Reconciliacao(
+            current_app, bool(data.get('aplicar')), bool(data.get('remover_em_falta'))
+        ).executar(limite, bool(data.get('reiniciar')))
+        return jsonify(resultado), 200
+    except Exception as e:
+        return handle_error(e, "Erro na reconciliação de imagens")
+
+@imagens_bp.route('/imagens/reconciliar', methods=['GET'])
+def estado_reconciliacao():
+    """Checkpoint atual e relatório do último ciclo completo"""
+    checkpoint = Reconciliacao(current_app).ler_checkpoint()
+    if checkpoint is None:
+        return jsonify({'message': 'Nenhuma reconciliação executada'}), 404
+    return jsonify(checkpoint), 200
+
+@imagens_bp.route('/imagens/processamento', methods=['GET'])
+def get_fila_imagens():
+    """Estatísticas da fila de imagens deste processo"""
+    return jsonify(fila_imagens.estatisticas())
 
 # =====================================================
 # PUT - ATUALIZAR METADADOS DA IMAGEM
@@ -170,15 +316,8 @@ def delete_imagem(imagem_id):
     try:
         imagem = Imagem.query.get_or_404(imagem_id)
         
-        # Deletar arquivo físico
-        filepath = os.path.join(
-            Config.UPLOAD_FOLDER,
-            str(imagem.id_planta),
-            imagem.nome_arquivo
-        )
-        
-        if os.path.exists(filepath):
-            os.remove(filepath)
+        # Deletar arquivo físico (imagens antigas; as outras saem pela contagem de referências)
+        fila_imagens.apagar(imagem)
         
         # Deletar registro do BD
         db.session.delete(imagem)
@@ -191,13 +330,33 @@ def delete_imagem(imagem_id):
         return handle_error(e, "Erro ao excluir imagem")
 
 # =====================================================
-# GET - SERVIR ARQUIVO DE IMAGEM
+# GET - SERVIR IMAGEM POR CONTEÚDO (URL imutável)
+# =====================================================
+@imagens_bp.route('/uploads/imagens/<prefixo>/<filename>')
+def serve_imagem_conteudo(prefixo, filename):
+    """
+    Servir original ou derivado de um conteúdo; o nome é o SHA-256, por
+    isso serve de ETag e a resposta pode ficar em cache para sempre
+    """
+    if not PREFIXO_RE.match(prefixo) or not filename.startswith(prefixo):
+        return jsonify({'error': 'Imagem não encontrada'}), 404
+    resposta = servir_imagem(armazenamento.conteudo, f'{prefixo}/{filename}', RAIZ_CONTEUDO,
+                             imutavel=True, etag=filename)
+    if resposta is None:
+        return jsonify({'error': 'Imagem não encontrada'}), 404
+    return resposta
+
+# =====================================================
+# GET - SERVIR ARQUIVO DE IMAGEM (imagens antigas)
 # =====================================================
+def servir_imagem_antiga(planta_id, filename):
+    """Imagem antiga (<id_planta>/<nome>); partilhado com as rotas do dashboard"""
+    resposta = servir_imagem(armazenamento.antigas, f'{planta_id}/{filename}', RAIZ_ANTIGAS)
+    if resposta is None:
+        return jsonify({'error': 'Imagem não encontrada'}), 404
+    return resposta
+
 @imagens_bp.route('/uploads/plantas_imagens/<int:planta_id>/<filename>')
 def serve_imagem(planta_id, filename):
     """Servir arquivo de imagem"""
-    try:
-        planta_folder = os.path.join(Config.UPLOAD_FOLDER, str(planta_id))
-        return send_from_directory(planta_folder, filename)
-    except Exception as e:
-        return jsonify({'error': 'Imagem não encontrada'}), 404
\ No newline at end of file
+    return servir_imagem_antiga(planta_id, filename)
@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Leituras Públicas Assíncronas (ASGI, servidas por asgi.py)
+- GET /api/plantas, /api/plantas/<id>, /api/busca e /api/busca/autocomplete
+  com o SQLAlchemy asyncio: um pedido à espera da BD não ocupa um worker
+  nem uma thread, por isso um processo atende muitas leituras em simultâneo
+- Sub-consultas independentes correm em paralelo, cada uma na sua ligação:
+  as quatro entidades da busca global, contagem e página da listagem,
+  nomes científicos e comuns do autocomplete
+- Mesmos parâmetros, consultas (filtrar_plantas, consulta_*) e JSON que as
+  rotas síncronas; escritas e restantes rotas continuam no Flask (wsgi.py)
+- Com réplicas de leitura, as mesmas regras das rotas síncronas: réplica
+  saudável escolhida por pedido, primário para clientes com o cookie de
+  escrita recente e para o registo das pesquisas
+"""
+import asyncio
+import math
+import re
+import time
+from http.cookies import SimpleCookie
+from urllib.parse import parse_qsl
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import selectinload
+from werkzeug.datastructures import MultiDict
+
+from models.planta import db, Planta_medicinal
+from models.usuario import LogPesquisas
+from routes.busca import (
+    consulta_plantas, formatar_plantas, consulta_autores, consulta_provincias, consultas_sugestoes_plantas
+)
+from routes.plantas import filtrar_plantas
+from utils.bd_async import BDAsync
+from utils.compressao import Compressor
+from utils.familias_index import indice_familias
+from utils.replicas import COOKIE_PRIMARIO, roteador
+from utils.sql_instrumentacao import medir_queries
+
+
+class Pedido:
+    """Parâmetros, cabeçalhos e cliente de um pedido ASGI"""
+
+    def __init__(self, scope):
+        self.metodo = scope['method']
+        self.caminho = scope['path']
+        self.args = MultiDict(parse_qsl(scope.get('query_string', b'').decode('latin-1'), keep_blank_values=True))
+        self.cabecalhos = {k.decode('latin-1').lower(): v.decode('latin-1') for k, v in scope.get('headers', ())}
+        self.remote_addr = (scope.get('client') or (None,))[0]
+        self.cookies = {k: m.value for k, m in SimpleCookie(self.cabecalhos.get('cookie', '')).items()}
+
+
+def _erro(e, mensagem):
+    print(f"❌ Erro: {e}")
+    return {'error': mensagem, 'details': str(e)}, 500
+
+
+def _linhas(consulta):
+    async def executar(sessao):
+        return (await sessao.execute(consulta)).all()
+    return executar
+
+
+def _objetos(consulta, serializar):
+    """Entidades serializadas dentro da sessão (run_sync: lazy loads sem bloquear o loop)"""
+    async def executar(sessao):
+        objetos = (await sessao.scalars(consulta)).all()
+        return await sessao.run_sync(lambda _: [serializar(o) for o in objetos])
+    return executar
+
+
+def _com_app(app, funcao, *args):
+    """Código síncrono que usa db.session (dicionário de famílias), numa thread"""
+    with app.app_context():
+        return funcao(*args)
+
+
+def _familias(termo, limit):
+    indice_familias.garantir_atualizado()
+    return indice_familias.listar(search=termo, limit=limit)[1]
+
+
+def _familias_prefixo(termo, limit):
+    indice_familias.garantir_atualizado()
+    return indice_familias.buscar_prefixo(termo, limit)
+
+
+async def _registar_pesquisa(bd, pedido, termo, tipo, total):
+    """Mesmo registo em LogPesquisas que as rotas síncronas; falhas não afetam a resposta"""
+    try:
+        async with bd.sessao(escrita=True) as sessao:
+            sessao.add(LogPesquisas(
+                termo_pesquisa=termo[:255],
+                tipo_pesquisa=tipo,
+                resultados_encontrados=total,
+                ip_usuario=pedido.remote_addr,
+                user_agent=pedido.cabecalhos.get('user-agent', '')[:500]
+            ))
+            await sessao.commit()
+    except Exception:
+        pass
+
+
+# =====================================================
+# ROTAS
+# =====================================================
+
+async def listar_plantas(app, bd, pedido):
+    """GET /api/plantas (filtros e paginação de routes.plantas.get_plantas)"""
+    try:
+        page = pedido.args.get('page', 1, type=int)
+        per_page = pedido.args.get('per_page', 20, type=int)
+        # Como paginate(error_out=False)
+        pagina = page if page >= 1 else 1
+        por_pagina = per_page if per_page >= 1 else 20
+
+        consulta = filtrar_plantas(select(Planta_medicinal), pedido.args)
+
+        async def contar(sessao):
+            return await sessao.scalar(select(func.count()).select_from(consulta.order_by(None).subquery()))
+
+        async def itens(sessao):
+            plantas = (await sessao.scalars(
+                consulta.options(selectinload(Planta_medicinal.nomes_comuns))  # Sem um lazy load por planta
+                .limit(por_pagina).offset((pagina - 1) * por_pagina)
+            )).all()
+            return [planta.to_dict() for planta in plantas]
+
+        total, plantas = await bd.paralelo(contar, itens)
+        return {
+            'plantas': plantas,
+            'total': total,
+            'pages': math.ceil(total / por_pagina) if total else 0,
+            'current_page': page,
+            'per_page': per_page
+        }, 200
+
+    except Exception as e:
+        return _erro(e, "Erro ao buscar plantas")
+
+
+async def detalhe_planta(app, bd, pedido, planta_id):
+    """GET /api/plantas/<id>"""
+    try:
+        async with bd.sessao() as sessao:
+            planta = await sessao.get(Planta_medicinal, int(planta_id), options=Planta_medicinal.opcoes_detalhe())
+            if planta is None:
+                return {'error': 'Planta não encontrada'}, 404
+
+            # Serialização (relações já carregadas; o resto por lazy load na sessão da planta) e registo da visualização em paralelo
+            dados, _ = await asyncio.gather(
+                sessao.run_sync(lambda _: planta.to_dict(include_relations=True)),
+                _registar_pesquisa(bd, pedido, planta.nome_cientifico, 'visualizacao_detalhes', 1)
+            )
+        return dados, 200
+
+    except Exception as e:
+        return _erro(e, "Erro ao buscar detalhes da planta")
+
+
+async def busca_global(app, bd, pedido):
+    """GET /api/busca: as buscas por entidade correm em paralelo"""
+    try:
+        termo = pedido.args.get('q', '').strip()
+        tipo = pedido.args.get('tipo', 'todos')
+        limit = pedido.args.get('limit', 20, type=int)
+
+        if not termo:
+            return {'error': 'Termo de busca é obrigatório'}, 400
+
+        search_pattern = f'%{termo}%'
+
+        async def plantas(sessao):
+            return formatar_plantas((await sessao.execute(consulta_plantas(search_pattern, limit))).all())
+
+        buscas = {}
+        if tipo in ['plantas', 'todos']:
+            buscas['plantas'] = bd.executar(plantas)
+        if tipo in ['familias', 'todos']:
+            buscas['familias'] = asyncio.to_thread(_com_app, app, _familias, termo, limit)
+        if tipo in ['autores', 'todos']:
+            buscas['autores'] = bd.executar(_objetos(consulta_autores(search_pattern, limit, com_afiliacoes=True), lambda a: a.to_dict()))
+        if tipo in ['provincias', 'todos']:
+            buscas['provincias'] = bd.executar(
+                _objetos(consulta_provincias(search_pattern, limit), lambda p: p.to_dict())
+            )
+
+        resultados = {'plantas': [], 'familias': [], 'autores': [], 'provincias': []}
+        resultados.update(zip(buscas, await asyncio.gather(*buscas.values())))
+        resultados['total'] = sum(len(v) for v in resultados.values())
+
+        await _registar_pesquisa(bd, pedido, termo, tipo, resultados['total'])
+        return resultados, 200
+
+    except Exception as e:
+        print(f"❌ Erro na busca: {e}")
+        return {'error': 'Erro ao realizar busca'}, 500
+
+
+async def autocomplete(app, bd, pedido):
+    """GET /api/busca/autocomplete"""
+    try:
+        termo = pedido.args.get('q', '').strip()
+        tipo = pedido.args.get('tipo', 'planta')
+        limit = pedido.args.get('limit', 10, type=int)
+
+        if not termo or len(termo) < 2:
+            return [], 200
+
+        search_pattern = f'{termo}%'  # Começa com...
+
+        if tipo == 'planta':
+            consulta_cientificos, consulta_comuns = consultas_sugestoes_plantas(search_pattern, limit // 2)
+            cientificos, comuns = await bd.paralelo(_linhas(consulta_cientificos), _linhas(consulta_comuns))
+            resultados = [{'label': r.label, 'value': r.value} for r in cientificos + comuns]
+
+        elif tipo == 'familia':
+            familias = await asyncio.to_thread(_com_app, app, _familias_prefixo, termo, limit)
+            resultados = [{'label': f['nome_familia'], 'value': f['nome_familia']} for f in familias]
+
+        elif tipo == 'autor':
+            resultados = await bd.executar(_objetos(
+                consulta_autores(search_pattern, limit), lambda a: {'label': a.nome_autor, 'value': a.id_autor}
+            ))
+
+        elif tipo == 'provincia':
+            resultados = await bd.executar(_objetos(
+                consulta_provincias(search_pattern, limit), lambda p: {'label': p.provincia, 'value': p.id_provincia}
+            ))
+
+        else:
+            resultados = []
+
+        return resultados, 200
+
+    except Exception as e:
+        print(f"❌ Erro no autocomplete: {e}")
+        return [], 200
+
+
+ROTAS = (
+    (re.compile(r'/api/plantas'), listar_plantas),
+    (re.compile(r'/api/plantas/(\d+)'), detalhe_planta),
+    (re.compile(r'/api/busca'), busca_global),
+    (re.compile(r'/api/busca/autocomplete'), autocomplete),
+)
+
+
+# =====================================================
+# APLICAÇÃO ASGI
+# =====================================================
+
+class AppLeiturasAsync:
+    """
+    Aplicação ASGI das leituras públicas
+
+    A aplicação Flask (create_app) fornece a configuração, o JSON e o app
+    context para as caches síncronas. O AsyncEngine é criado no arranque
+    (lifespan) ou no primeiro pedido, já dentro do event loop do worker
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.bd = None
+        self.origens = set(app.config.get('CORS_ORIGINS') or ())
+        self.instrumentacao = app.config.get('SQL_INSTRUMENTACAO', True)
+        self.compressor = Compressor(app.config) if app.config.get('COMPRESSAO', True) else None
+
+    def _bd(self):
+        if self.bd is None:
+            self.bd = BDAsync(self.app.config)
+        return self.bd
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._ciclo_de_vida(receive, send)
+        elif scope['type'] == 'http':
+            await self._pedido(Pedido(scope), send)
+
+    async def _ciclo_de_vida(self, receive, send):
+        while True:
+            mensagem = await receive()
+            if mensagem['type'] == 'lifespan.startup':
+                try:
+                    self._bd()
+                except Exception as e:
+                    await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                    return
+                await send({'type': 'lifespan.startup.complete'})
+            elif mensagem['type'] == 'lifespan.shutdown':
+                if self.bd is not None:
+                    await self.bd.fechar()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _despachar(self, pedido):
+        for padrao, rota in ROTAS:
+            encontrado = padrao.fullmatch(pedido.caminho)
+            if encontrado is None:
+                continue
+            if pedido.metodo not in ('GET', 'HEAD'):
+                return {'error': 'Método não permitido'}, 405
+            bd = self._bd()
+            with bd.ler_de(await self._escolher_replica(pedido)):
+                return await rota(self.app, bd, pedido, *encontrado.groups())
+        return {'error': 'Endpoint não encontrado'}, 404
+
+    async def _escolher_replica(self, pedido):
+        """Réplica do pedido ou None (sem réplicas, escrita recente do cliente, nenhuma saudável)"""
+        if not roteador.ativo or pedido.cookies.get(COOKIE_PRIMARIO):
+            return None
+        if roteador.verificacao_pendente():
+            # A medição do atraso é síncrona (engines do Flask-SQLAlchemy): numa thread
+            return await asyncio.to_thread(_com_app, self.app, lambda: roteador.escolher(db.engines))
+        return roteador.escolher()
+
+    async def _pedido(self, pedido, send):
+        inicio = time.perf_counter()
+        if self.instrumentacao:
+            with medir_queries() as medicao:
+                corpo, estado = await self._despachar(pedido)
+        else:
+            medicao = None
+            corpo, estado = await self._despachar(pedido)
+
+        dados = self.app.json.serializar(corpo)
+        cabecalhos = [(b'content-type', b'application/json')]
+        vary = []
+        if self.compressor is not None:
+            vary.append('Accept-Encoding')
+            codificacao = self.compressor.negociar(pedido.cabecalhos.get('accept-encoding'), len(dados))
+            if codificacao is not None:
+                dados = self.compressor.comprimir(dados, codificacao)
+                cabecalhos.append((b'content-encoding', codificacao.encode()))
+        cabecalhos.append((b'content-length', str(len(dados)).encode()))
+        if medicao is not None:
+            total_ms = (time.perf_counter() - inicio) * 1000
+            cabecalhos.append((b'server-timing', (
+                f'db;dur={medicao.tempo_ms:.1f};desc="{medicao.total} queries", app;dur={total_ms:.1f}'
+            ).encode()))
+        origem = pedido.cabecalhos.get('origin')
+        if origem and origem in self.origens:
+            cabecalhos.append((b'access-control-allow-origin', origem.encode('latin-1')))
+            vary.append('Origin')
+        if vary:
+            cabecalhos.append((b'vary', ', '.join(vary).encode()))
+
+        await send({'type': 'http.response.start', 'status': estado, 'headers': cabecalhos})
+        await send({'type': 'http.response.body', 'body': b'' if pedido.metodo == 'HEAD' else dados})
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Rotas dos Pickers (typeahead)
+Busca paginada por prefixo de palavras para listas grandes - autores,
+referências, locais de colheita e indicações - em vez de enviar a tabela
+inteira para o browser
+"""
+from flask import Blueprint, request, jsonify
+from models.planta import db
+from utils.picker_index import FONTES, buscar, itens, sincronizar_indice
+
+pickers_bp = Blueprint('pickers', __name__)
+
+MAX_PER_PAGE = 50
+
+# Segmento do URL -> tipo no índice
+TIPOS_URL = {
+    'autores': 'autor',
+    'referencias': 'referencia',
+    'locais': 'local',
+    'indicacoes': 'indicacao',
+}
+
+def handle_error(e, message="Erro ao processar requisição"):
+    """Tratamento de erros padronizado"""
+    print(f"❌ Erro: {e}")
+    return jsonify({'error': message, 'details': str(e)}), 500
+
+@pickers_bp.route('/<string:recurso>', methods=['GET'])
+def get_picker(recurso):
+    """
+    Opções de um picker
+    
+    Query Params:
+        - q (str): texto digitado; cada palavra casa com o início de uma palavra do registo
+        - ids (str): ids separados por vírgula (resolver opções já selecionadas)
+        - provincia_id (int): só para /locais
+        - page (int): página (default: 1)
+        - per_page (int): itens por página (default: 20, máx: 50)
+    
+    Returns:
+        {'items': [{'value', 'label', 'secondary'}], 'total', 'page', 'per_page', 'has_more'}
+    """
+    try:
+        tipo = TIPOS_URL.get(recurso)
+        if tipo is None:
+            return jsonify({'error': f'Picker inválido. Use: {", ".join(TIPOS_URL)}'}), 404
+        
+        ids = request.args.get('ids', '').strip()
+        if ids:
+            try:
+                lista_ids = [int(i) for i in ids.split(',') if i.strip()][:MAX_PER_PAGE]
+            except ValueError:
+                return jsonify({'error': 'Parâmetro "ids" deve conter inteiros separados por vírgula'}), 400
+            resultado = itens(tipo, lista_ids)
+            return jsonify({'items': resultado, 'total': len(resultado)})
+        
+        page = max(request.args.get('page', 1, type=int), 1)
+        per_page = min(max(request.args.get('per_page', 20, type=int), 1), MAX_PER_PAGE)
+        
+        total, pagina = buscar(
+            tipo,
+            request.args.get('q', ''),
+            page=page,
+            per_page=per_page,
+            provincia_id=request.args.get('provincia_id', type=int)
+        )
+        
+        return jsonify({
+            'items': itens(tipo, pagina),
+            'total': total,
+            'page': page,
+            'per_page': per_page,
+            'has_more': page * per_page < total
+        })
+    except Exception as e:
+        return handle_error(e, "Erro ao buscar opções")
+
+@pickers_bp.route('/sincronizar', methods=['POST'])
+def post_sincronizar():
+    """Reconstruir o índice de termos de todos os pickers"""
+    try:
+        termos = {tipo: sincronizar_indice(tipo) for tipo in FONTES}
+        return jsonify({'message': 'Índice dos pickers sincronizado', 'termos': termos})
+    except Exception as e:
+        db.session.rollback()
+        return handle_error(e, "Erro ao sincronizar índice dos pickers")
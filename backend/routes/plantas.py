@@ -10,6 +10,8 @@ from models.uso_medicinal import Parte_usada, Indicacao, Planta_parte, Parte_ind
 from models.referencia import Autor, Referencia, Planta_referencia, Referencia_autor
 from models.usuario import LogPesquisas
 from sqlalchemy import or_
+from sqlalchemy.orm import selectinload
+from utils.sql_instrumentacao import orcamento_queries
 
 plantas_bp = Blueprint('plantas', __name__)
 
@@ -18,10 +20,104 @@ def handle_error(e, message="Erro ao processar requisição"):
     print(f"❌ Erro: {e}")
     return jsonify({'error': message, 'details': str(e)}), 500
 
+# =====================================================
+# FILTROS DE /api/plantas (também usados pela leitura assíncrona)
+# =====================================================
+def filtrar_plantas(query, args):
+    """
+    Aplicar os filtros de /api/plantas
+
+    Args:
+        query: Planta_medicinal.query ou select(Planta_medicinal)
+        args: parâmetros do pedido (MultiDict)
+
+    Returns:
+        A mesma forma de query, filtrada e sem duplicados
+    """
+    # Parâmetros de busca
+    search_popular = args.get('search_popular', '')
+    search_cientifico = args.get('search_cientifico', '')
+    search = args.get('search', '')
+    
+    # Filtros específicos
+    autor_id = args.get('autor_id', type=int)
+    provincia_id = args.get('provincia_id', type=int)
+    familia_nome = args.get('familia', '')  # ✅ MUDOU: agora busca por nome
+    parte_usada = args.get('parte_usada', '')
+    indicacao_id = args.get('indicacao_id', type=int)
+    
+    # Filtro por nome popular
+    if search_popular:
+        query = query.join(Planta_medicinal.nomes_comuns).filter(
+            Nome_comum.nome.ilike(f'%{search_popular}%')
+        )
+    
+    # Filtro por nome científico
+    if search_cientifico:
+        query = query.filter(
+            Planta_medicinal.nome_cientifico.ilike(f'%{search_cientifico}%')
+        )
+    
+    # Filtro geral (científico OU popular)
+    if search and not search_popular and not search_cientifico:
+        query = query.outerjoin(Planta_medicinal.nomes_comuns).filter(
+            or_(
+                Planta_medicinal.nome_cientifico.ilike(f'%{search}%'),
+                Nome_comum.nome.ilike(f'%{search}%')
+            )
+        )
+    
+    # ✅ NOVO: Filtro por família (agora é campo texto!)
+    if familia_nome:
+        query = query.filter(
+            Planta_medicinal.familia.ilike(f'%{familia_nome}%')
+        )
+    
+    # Filtro por província (ADAPTADO: precisa de 2 JOINs agora!)
+    if provincia_id:
+        query = query.join(Planta_medicinal.locais).join(
+            Local_colheita
+        ).filter(Local_colheita.id_provincia == provincia_id)
+    
+    # Filtro por parte usada - CORRIGIDO
+    if parte_usada:
+        try:
+            # Se vier ID (número), buscar por ID
+            parte_id = int(parte_usada)
+            query = query.join(Planta_medicinal.partes_usadas).join(
+                Parte_usada
+            ).filter(Parte_usada.id_parte == parte_id)
+        except ValueError:
+            # Se vier texto, buscar por nome
+            query = query.join(Planta_medicinal.partes_usadas).join(
+                Parte_usada
+            ).filter(Parte_usada.nome_parte.ilike(f'%{parte_usada}%'))
+    
+    # Filtro por indicação (ADAPTADO: nova estrutura)
+    if indicacao_id:
+        query = query.join(Planta_medicinal.partes_usadas).join(
+            Parte_usada
+        ).join(Parte_usada.indicacoes).filter(
+            Parte_indicacao.id_uso == indicacao_id
+        )
+    
+    # Filtro por autor (mantido)
+    if autor_id:
+        query = query.join(Planta_medicinal.referencias).join(
+            Referencia
+        ).join(Referencia.autores_relacao).filter(
+            Referencia_autor.id_autor == autor_id
+        )
+    
+    # Remover duplicatas
+    return query.distinct()
+
+
 # =====================================================
 # GET - LISTAR PLANTAS (com filtros avançados)
 # =====================================================
 @plantas_bp.route('/plantas', methods=['GET'])
+@orcamento_queries(10)
 def get_plantas():
     """
     Buscar plantas com filtros
@@ -31,86 +127,10 @@ def get_plantas():
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 20, type=int)
         
-        # Parâmetros de busca
-        search_popular = request.args.get('search_popular', '')
-        search_cientifico = request.args.get('search_cientifico', '')
-        search = request.args.get('search', '')
-        
-        # Filtros específicos
-        autor_id = request.args.get('autor_id', type=int)
-        provincia_id = request.args.get('provincia_id', type=int)
-        familia_nome = request.args.get('familia', '')  # ✅ MUDOU: agora busca por nome
-        parte_usada = request.args.get('parte_usada', '')
-        indicacao_id = request.args.get('indicacao_id', type=int)
-        
-        # Query base
-        query = Planta_medicinal.query
-        
-        # Filtro por nome popular
-        if search_popular:
-            query = query.join(Planta_medicinal.nomes_comuns).filter(
-                Nome_comum.nome.ilike(f'%{search_popular}%')
-            )
-        
-        # Filtro por nome científico
-        if search_cientifico:
-            query = query.filter(
-                Planta_medicinal.nome_cientifico.ilike(f'%{search_cientifico}%')
-            )
-        
-        # Filtro geral (científico OU popular)
-        if search and not search_popular and not search_cientifico:
-            query = query.outerjoin(Planta_medicinal.nomes_comuns).filter(
-                or_(
-                    Planta_medicinal.nome_cientifico.ilike(f'%{search}%'),
-                    Nome_comum.nome.ilike(f'%{search}%')
-                )
-            )
-        
-        # ✅ NOVO: Filtro por família (agora é campo texto!)
-        if familia_nome:
-            query = query.filter(
-                Planta_medicinal.familia.ilike(f'%{familia_nome}%')
-            )
-        
-        # Filtro por província (ADAPTADO: precisa de 2 JOINs agora!)
-        if provincia_id:
-            query = query.join(Planta_medicinal.locais).join(
-                Local_colheita
-            ).filter(Local_colheita.id_provincia == provincia_id)
-        
-# Filtro por parte usada - CORRIGIDO
-        if parte_usada:
-            try:
-                # Se vier ID (número), buscar por ID
-                parte_id = int(parte_usada)
-                query = query.join(Planta_medicinal.partes_usadas).join(
-                    Parte_usada
-                ).filter(Parte_usada.id_parte == parte_id)
-            except ValueError:
-                # Se vier texto, buscar por nome
-                query = query.join(Planta_medicinal.partes_usadas).join(
-                    Parte_usada
-                ).filter(Parte_usada.nome_parte.ilike(f'%{parte_usada}%'))
-        
-        # Filtro por indicação (ADAPTADO: nova estrutura)
-        if indicacao_id:
-            query = query.join(Planta_medicinal.partes_usadas).join(
-                Parte_usada
-            ).join(Parte_usada.indicacoes).filter(
-                Parte_indicacao.id_uso == indicacao_id
-            )
-        
-        # Filtro por autor (mantido)
-        if autor_id:
-            query = query.join(Planta_medicinal.referencias).join(
-                Referencia
-            ).join(Referencia.autores_relacao).filter(
-                Referencia_autor.id_autor == autor_id
-            )
-        
-        # Remover duplicatas
-        query = query.distinct()
+        # Query base com os filtros
+        query = filtrar_plantas(Planta_medicinal.query, request.args).options(
+            selectinload(Planta_medicinal.nomes_comuns)  # Sem um lazy load por planta
+        )
         
         # Executar query com paginação
         plantas = query.paginate(page=page, per_page=per_page, error_out=False)
@@ -131,13 +151,16 @@ def get_plantas():
 # GET - DETALHES DE UMA PLANTA
 # =====================================================
 @plantas_bp.route('/plantas/<int:planta_id>', methods=['GET'])
+@orcamento_queries(22)
 def get_planta_detalhes(planta_id):
     """
     Buscar detalhes completos de uma planta
     ADAPTADO: inclui todas as relações da nova estrutura
     """
     try:
-        planta = Planta_medicinal.query.get_or_404(planta_id)
+        planta = Planta_medicinal.query.options(*Planta_medicinal.opcoes_detalhe()).get_or_404(planta_id)
+        # Serializar antes do commit do registo (o commit expira as relações já carregadas)
+        dados = planta.to_dict(include_relations=True)
         
         # Registrar visualização
         try:
@@ -153,7 +176,7 @@ def get_planta_detalhes(planta_id):
         except:
             pass  # Não falhar se log der erro
         
-        return jsonify(planta.to_dict(include_relations=True))
+        return jsonify(dados)
         
     except Exception as e:
         return handle_error(e, "Erro ao buscar detalhes da planta")
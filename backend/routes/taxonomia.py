@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Rotas da Taxonomia
+Navegação família → género → espécie servida a partir das tabelas
+Taxon/Planta_taxon (contagens pré-calculadas, sem varrer Planta_medicinal)
+"""
+from flask import Blueprint, request, jsonify
+from models.planta import db, Planta_medicinal
+from models.taxonomia import Taxon, Planta_taxon
+from utils.familias_index import normalizar_familia
+from utils.taxonomia import NIVEIS, verificar_taxonomia, sincronizar_taxonomia
+
+taxonomia_bp = Blueprint('taxonomia', __name__)
+
+MAX_PER_PAGE = 200
+
+# Coluna de Planta_taxon usada para listar as plantas de cada nível
+COLUNA_NIVEL = {
+    'familia': Planta_taxon.id_familia,
+    'genero': Planta_taxon.id_genero,
+    'especie': Planta_taxon.id_especie,
+}
+
+def handle_error(e, message="Erro ao processar requisição"):
+    """Tratamento de erros padronizado"""
+    print(f"❌ Erro: {e}")
+    return jsonify({'error': message, 'details': str(e)}), 500
+
+def _paginacao():
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', 50, type=int), 1), MAX_PER_PAGE)
+    return page, per_page
+
+def _ordenar(query):
+    """Ordenação pedida em ?sort=nome|total (default: nome)"""
+    if request.args.get('sort') == 'total':
+        return query.order_by(Taxon.total_plantas.desc(), Taxon.nome_normalizado)
+    return query.order_by(Taxon.nome_normalizado)
+
+def _filhos(ids_pais):
+    """Filhos de vários nós com UMA query: {id_pai: [taxon, ...]}"""
+    filhos = {}
+    if ids_pais:
+        for taxon in Taxon.query.filter(Taxon.id_pai.in_(ids_pais)).order_by(Taxon.nome_normalizado).all():
+            filhos.setdefault(taxon.id_pai, []).append(taxon.to_dict())
+    return filhos
+
+# =====================================================
+# ÁRVORE (famílias na raiz)
+# =====================================================
+@taxonomia_bp.route('', methods=['GET'])
+def get_arvore():
+    """
+    Famílias com contagens (raiz da árvore)
+
+    Query Params:
+        - search (str): prefixo do nome da família
+        - expandir (bool): incluir os géneros de cada família
+        - sort (str): 'nome' ou 'total'
+        - page, per_page
+    """
+    try:
+        verificar_taxonomia()
+        page, per_page = _paginacao()
+
+        query = Taxon.query.filter(Taxon.nivel == 'familia')
+        search = normalizar_familia(request.args.get('search', ''))
+        if search:
+            query = query.filter(Taxon.nome_normalizado.like(f'{search}%'))
+
+        paginado = _ordenar(query).paginate(page=page, per_page=per_page, error_out=False)
+        familias = [t.to_dict() for t in paginado.items]
+
+        if request.args.get('expandir', '').lower() in ('1', 'true', 'sim'):
+            generos = _filhos([f['id_taxon'] for f in familias])
+            for familia in familias:
+                familia['filhos'] = generos.get(familia['id_taxon'], [])
+
+        return jsonify({
+            'familias': familias,
+            'total': paginado.total,
+            'pages': paginado.pages,
+            'current_page': page,
+            'per_page': per_page
+        })
+    except Exception as e:
+        return handle_error(e, "Erro ao carregar taxonomia")
+
+# =====================================================
+# DRILL-DOWN
+# =====================================================
+@taxonomia_bp.route('/<int:id_taxon>', methods=['GET'])
+def get_taxon(id_taxon):
+    """
+    Nó da hierarquia com ascendentes e filhos paginados
+    (família → géneros, género → espécies)
+    """
+    try:
+        verificar_taxonomia()
+        taxon = Taxon.query.get(id_taxon)
+        if not taxon:
+            return jsonify({'error': 'Táxon não encontrado'}), 404
+
+        # No máximo 2 níveis acima
+        ascendentes = []
+        id_pai = taxon.id_pai
+        while id_pai:
+            pai = Taxon.query.get(id_pai)
+            if not pai:
+                break
+            ascendentes.insert(0, pai.to_dict())
+            id_pai = pai.id_pai
+
+        page, per_page = _paginacao()
+        paginado = _ordenar(Taxon.query.filter(Taxon.id_pai == id_taxon)).paginate(
+            page=page, per_page=per_page, error_out=False
+        )
+
+        resultado = taxon.to_dict()
+        resultado.update({
+            'ascendentes': ascendentes,
+            'filhos': [t.to_dict() for t in paginado.items],
+            'total_filhos': paginado.total,
+            'pages': paginado.pages,
+            'current_page': page,
+            'per_page': per_page
+        })
+        return jsonify(resultado)
+    except Exception as e:
+        return handle_error(e, "Erro ao carregar táxon")
+
+@taxonomia_bp.route('/<int:id_taxon>/plantas', methods=['GET'])
+def get_plantas_taxon(id_taxon):
+    """Plantas de um táxon (qualquer nível), via Planta_taxon indexada"""
+    try:
+        verificar_taxonomia()
+        taxon = Taxon.query.get(id_taxon)
+        if not taxon:
+            return jsonify({'error': 'Táxon não encontrado'}), 404
+
+        page, per_page = _paginacao()
+        coluna = COLUNA_NIVEL[taxon.nivel]
+        query = db.session.query(
+            Planta_medicinal.id_planta,
+            Planta_medicinal.nome_cientifico,
+            Planta_medicinal.familia,
+            Planta_taxon.rank_infra,
+            Planta_taxon.epiteto_infra,
+            Planta_taxon.hibrido
+        ).join(
+            Planta_taxon, Planta_taxon.id_planta == Planta_medicinal.id_planta
+        ).filter(coluna == id_taxon).order_by(Planta_medicinal.nome_cientifico)
+
+        paginado = query.paginate(page=page, per_page=per_page, error_out=False)
+
+        return jsonify({
+            'taxon': taxon.to_dict(),
+            'plantas': [{
+                'id_planta': p.id_planta,
+                'nome_cientifico': p.nome_cientifico,
+                'familia': p.familia,
+                'rank_infra': p.rank_infra,
+                'epiteto_infra': p.epiteto_infra,
+                'hibrido': p.hibrido
+            } for p in paginado.items],
+            'total': paginado.total,
+            'pages': paginado.pages,
+            'current_page': page,
+            'per_page': per_page
+        })
+    except Exception as e:
+        return handle_error(e, "Erro ao buscar plantas do táxon")
+
+# =====================================================
+# BUSCA POR NÍVEL (ex: navegar por género)
+# =====================================================
+@taxonomia_bp.route('/busca', methods=['GET'])
+def buscar_taxon():
+    """
+    Táxons cujo nome começa por `q`
+
+    Query Params:
+        - q (str): prefixo (obrigatório)
+        - nivel (str): 'familia', 'genero' ou 'especie' (opcional)
+        - limit (int): máximo de resultados (default: 20)
+    """
+    try:
+        termo = normalizar_familia(request.args.get('q', ''))
+        if not termo:
+            return jsonify({'error': 'Parâmetro "q" obrigatório'}), 400
+
+        nivel = request.args.get('nivel', '').strip()
+        if nivel and nivel not in NIVEIS:
+            return jsonify({'error': f'Nível inválido. Use: {", ".join(NIVEIS)}'}), 400
+
+        limite = min(max(request.args.get('limit', 20, type=int), 1), MAX_PER_PAGE)
+
+        verificar_taxonomia()
+        query = Taxon.query.filter(Taxon.nome_normalizado.like(f'{termo}%'))
+        if nivel:
+            query = query.filter(Taxon.nivel == nivel)
+        taxons = query.order_by(Taxon.total_plantas.desc(), Taxon.nome_normalizado).limit(limite).all()
+
+        return jsonify({
+            'resultados': [t.to_dict() for t in taxons],
+            'total': len(taxons)
+        })
+    except Exception as e:
+        return handle_error(e, "Erro na busca taxonómica")
+
+# =====================================================
+# SINCRONIZAR (admin)
+# =====================================================
+@taxonomia_bp.route('/sincronizar', methods=['POST'])
+def post_sincronizar():
+    """Reconstruir a hierarquia a partir de todas as plantas"""
+    try:
+        totais = sincronizar_taxonomia()
+        return jsonify({'message': 'Taxonomia sincronizada', **totais})
+    except Exception as e:
+        db.session.rollback()
+        return handle_error(e, "Erro ao sincronizar taxonomia")
@@ -9,7 +9,7 @@ MUDANÇAS CRÍTICAS:
 - Composição/Propriedades em campos TEXT (não tabelas)
 """
 
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, send_file, Response, session
 from models.planta import db, Planta_medicinal, Nome_comum, Imagem
 from models.localizacao import Provincia, Local_colheita, Planta_local
 from models.uso_medicinal import (
@@ -22,34 +22,37 @@ from sqlalchemy import func, distinct
 from datetime import datetime, timedelta
 import uuid
 import os
-import base64
-from PIL import Image as PILImage
-from io import BytesIO
 from config import Config
 import json
+from utils.grafo_citacoes import registar_arestas
+from utils.imagens_fila import fila_imagens, FilaCheia, UploadRejeitado
+from utils.uploads_streaming import ler_json, uploads_em
+from utils.imagens_conteudo import Upload, criar_imagem, conteudo_conhecido
+from utils.wizard_bootstrap import (
+    cache_bootstrap, carregar_familias, carregar_provincias, carregar_locais,
+    carregar_partes_usadas, carregar_indicacoes, carregar_metodos_preparacao,
+    carregar_metodos_extracao, carregar_autores, carregar_referencias
+)
+from utils.rascunhos import obter_armazem, obter_blobs, ErroRascunho, ConflitoVersao
+from utils.rascunhos_blobs import BlobInvalido
+from utils.json_patch import PatchInvalido
 
 wizard_bp = Blueprint('wizard', __name__)
 
 # =====================================================
-# ARMAZENAMENTO TEMPORÁRIO DE RASCUNHOS
+# ARMAZENAMENTO DE RASCUNHOS (ver utils/rascunhos.py)
 # =====================================================
-plant_drafts = {}
-
-def clean_expired_drafts():
-    """Remove rascunhos expirados (mais de 24h)"""
-    now = datetime.utcnow()
-    expired_keys = []
-    
-    for draft_id, draft_data in plant_drafts.items():
-        try:
-            expires_at = datetime.fromisoformat(draft_data['expires_at'])
-            if now > expires_at:
-                expired_keys.append(draft_id)
-        except:
-            expired_keys.append(draft_id)
-    
-    for key in expired_keys:
-        del plant_drafts[key]
+def _dono_rascunho(data=None):
+    """
+    Quem acede ao rascunho: (user_id, token)
+    - user_id: utilizador autenticado da sessão (cookie assinado), None se anónimo.
+      Nenhuma rota define ainda session['id_usuario']: sem login, o dono é
+      sempre o token e a quota por utilizador não se aplica
+    - token: header X-Draft-Token ou campo draft_token (devolvido ao criar o rascunho)
+    """
+    user_id = session.get('id_usuario')
+    token = request.headers.get('X-Draft-Token') or (data or {}).get('draft_token')
+    return (str(user_id) if user_id is not None else None), (str(token)[:200] if token else None)
 
 def handle_error(e, message="Erro ao processar requisição"):
     """Tratamento de erros padronizado"""
@@ -60,6 +63,30 @@ def handle_error(e, message="Erro ao processar requisição"):
 # ROTAS DE DADOS AUXILIARES (SELECT OPTIONS)
 # =====================================================
 
+@wizard_bp.route('/bootstrap', methods=['GET'])
+def get_bootstrap_wizard():
+    """
+    Todos os dados auxiliares do wizard num único payload versionado
+    (famílias, províncias, locais, partes usadas, indicações, métodos,
+    autores e referências)
+    
+    Em cache até uma tabela auxiliar mudar; ETag = versão do payload,
+    por isso aberturas repetidas recebem 304
+    """
+    try:
+        corpo, etag = cache_bootstrap.obter()
+        
+        if request.if_none_match.contains_weak(etag):  # ETag fraco quando a resposta vai comprimida
+            resposta = Response(status=304)
+        else:
+            resposta = Response(corpo, mimetype='application/json')
+        
+        resposta.set_etag(etag)
+        resposta.headers['Cache-Control'] = 'no-cache'  # Revalidar sempre (barato: 304)
+        return resposta
+    except Exception as e:
+        return handle_error(e, "Erro ao carregar dados do wizard")
+
 @wizard_bp.route('/data/familias', methods=['GET'])
 def get_familias_wizard():
     """
@@ -67,25 +94,7 @@ def get_familias_wizard():
     ✅ ADAPTADO: agora busca do campo TEXT, não de tabela separada
     """
     try:
-        # Buscar famílias distintas que já existem
-        familias_query = db.session.query(
-            distinct(Planta_medicinal.familia)
-        ).filter(
-            Planta_medicinal.familia.isnot(None),
-            Planta_medicinal.familia != ''
-        ).order_by(Planta_medicinal.familia).all()
-        
-        familias = [
-            {
-                'id': idx + 1,
-                'nome_familia': familia[0],
-                'label': familia[0],
-                'value': familia[0]
-            }
-            for idx, familia in enumerate(familias_query)
-        ]
-        
-        return jsonify(familias)
+        return jsonify(carregar_familias())
     except Exception as e:
         return handle_error(e, "Erro ao buscar famílias")
 
@@ -93,8 +102,7 @@ def get_familias_wizard():
 def get_provincias_wizard():
     """Buscar todas as províncias"""
     try:
-        provincias = Provincia.query.order_by(Provincia.provincia).all()
-        return jsonify([p.to_dict() for p in provincias])
+        return jsonify(carregar_provincias())
     except Exception as e:
         return handle_error(e, "Erro ao buscar províncias")
 
@@ -106,13 +114,7 @@ def get_locais_wizard():
     """
     try:
         provincia_id = request.args.get('provincia_id', type=int)
-        
-        query = Local_colheita.query
-        if provincia_id:
-            query = query.filter_by(id_provincia=provincia_id)
-        
-        locais = query.order_by(Local_colheita.nome_local).all()
-        return jsonify([local.to_dict() for local in locais])
+        return jsonify(carregar_locais(provincia_id))
     except Exception as e:
         return handle_error(e, "Erro ao buscar locais")
 
@@ -120,8 +122,7 @@ def get_locais_wizard():
 def get_partes_usadas_wizard():
     """Buscar partes usadas"""
     try:
-        partes = Parte_usada.query.order_by(Parte_usada.nome_parte).all()
-        return jsonify([p.to_dict() for p in partes])
+        return jsonify(carregar_partes_usadas())
     except Exception as e:
         return handle_error(e, "Erro ao buscar partes usadas")
 
@@ -129,8 +130,7 @@ def get_partes_usadas_wizard():
 def get_indicacoes_wizard():
     """Buscar indicações terapêuticas"""
     try:
-        indicacoes = Indicacao.query.order_by(Indicacao.descricao_uso).all()
-        return jsonify([i.to_dict() for i in indicacoes])
+        return jsonify(carregar_indicacoes())
     except Exception as e:
         return handle_error(e, "Erro ao buscar indicações")
 
@@ -138,18 +138,7 @@ def get_indicacoes_wizard():
 def get_metodos_preparacao_wizard():
     """Buscar métodos de preparação tradicional"""
     try:
-        metodos = Metodo_preparacao_trad.query.order_by(
-            Metodo_preparacao_trad.descricao_metodo_preparacao
-        ).all()
-        return jsonify([
-            {
-                'id_preparacao': m.id_metodo_preparacao,
-                'descricao': m.descricao_metodo_preparacao,
-                'label': m.descricao_metodo_preparacao,
-                'value': m.id_metodo_preparacao
-            }
-            for m in metodos
-        ])
+        return jsonify(carregar_metodos_preparacao())
     except Exception as e:
         return handle_error(e, "Erro ao buscar métodos de preparação")
 
@@ -157,18 +146,7 @@ def get_metodos_preparacao_wizard():
 def get_metodos_extracao_wizard():
     """Buscar métodos de extração científica"""
     try:
-        metodos = Metodo_extraccao_cientif.query.order_by(
-            Metodo_extraccao_cientif.descricao_metodo_extraccao
-        ).all()
-        return jsonify([
-            {
-                'id_extraccao': m.id_metodo_extraccao,
-                'descricao': m.descricao_metodo_extraccao,
-                'label': m.descricao_metodo_extraccao,
-                'value': m.id_metodo_extraccao
-            }
-            for m in metodos
-        ])
+        return jsonify(carregar_metodos_extracao())
     except Exception as e:
         return handle_error(e, "Erro ao buscar métodos de extração")
 
@@ -176,8 +154,7 @@ def get_metodos_extracao_wizard():
 def get_autores_wizard():
     """Buscar autores"""
     try:
-        autores = Autor.query.order_by(Autor.nome_autor).all()
-        return jsonify([a.to_dict() for a in autores])
+        return jsonify(carregar_autores())
     except Exception as e:
         return handle_error(e, "Erro ao buscar autores")
 
@@ -185,26 +162,7 @@ def get_autores_wizard():
 def get_referencias_wizard():
     """Buscar referências bibliográficas"""
     try:
-        referencias = Referencia.query.order_by(
-            Referencia.ano_publicacao.desc(),
-            Referencia.titulo_referencia
-        ).all()
-        
-        return jsonify([
-            {
-                'id_referencia': r.id_referencia,
-                'titulo': r.titulo_referencia,
-                'ano': r.ano_publicacao,
-                'link': r.link_referencia,
-                'autores': [
-                    {'id_autor': ra.autor.id_autor, 'nome_autor': ra.autor.nome_autor}
-                    for ra in r.autores_relacao
-                ],
-                'label': f"{r.titulo_referencia} ({r.ano_publicacao})",
-                'value': r.id_referencia
-            }
-            for r in referencias
-        ])
+        return jsonify(carregar_referencias())
     except Exception as e:
         return handle_error(e, "Erro ao buscar referências")
 
@@ -212,59 +170,190 @@ def get_referencias_wizard():
 # RASCUNHOS (DRAFTS)
 # =====================================================
 
+def _erro_rascunho(e):
+    """Resposta 4xx para erros do armazém de rascunhos"""
+    resposta = {'error': str(e)}
+    if isinstance(e, ConflitoVersao):
+        resposta['version'] = e.versao_atual
+    return jsonify(resposta), e.status
+
 @wizard_bp.route('/draft/save', methods=['POST'])
 def save_draft():
-    """Salvar rascunho do wizard"""
+    """
+    Salvar rascunho completo do wizard
+    Imagens em base64 ('file_data') são movidas para a área de blobs
+    e substituídas por 'blob_hash'
+    
+    Body: {draft_id?, form_data, current_step, base_version?}
+    Header X-Draft-Token: token do rascunho (omitir ao criar: vem na resposta
+    como 'draft_token' e é exigido nos pedidos seguintes)
+    """
     try:
-        clean_expired_drafts()
+        data = request.get_json() or {}
+        draft_id = data.get('draft_id') or str(uuid.uuid4())
+        form_data = data.get('form_data', {})
         
-        data = request.get_json()
-        draft_id = data.get('draft_id', str(uuid.uuid4()))
+        blobs = obter_blobs()
+        blobs.extrair_imagens(form_data)
+        blobs.limpar_se_necessario()
         
-        plant_drafts[draft_id] = {
-            'data': data.get('form_data', {}),
-            'current_step': data.get('current_step', 1),
-            'expires_at': (datetime.utcnow() + timedelta(hours=24)).isoformat(),
-            'updated_at': datetime.utcnow().isoformat()
+        rascunho = obter_armazem().guardar(
+            draft_id,
+            *_dono_rascunho(data),
+            form_data,
+            data.get('current_step', 1),
+            versao_base=data.get('base_version')
+        )
+        
+        resposta = {
+            'draft_id': draft_id,
+            'message': 'Rascunho salvo com sucesso',
+            'version': rascunho['version'],
+            'expires_at': rascunho['expires_at']
         }
+        if 'draft_token' in rascunho:
+            resposta['draft_token'] = rascunho['draft_token']
+        return jsonify(resposta)
+    except ErroRascunho as e:
+        return _erro_rascunho(e)
+    except BlobInvalido as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return handle_error(e, "Erro ao salvar rascunho")
+
+@wizard_bp.route('/draft/<draft_id>', methods=['PATCH'])
+def patch_draft(draft_id):
+    """
+    Autosave incremental: operações JSON Patch contra uma versão do rascunho
+    
+    Body:
+        {
+            "version": 3,                 # Versão sobre a qual o delta foi calculado
+            "patch": [{"op": "replace", "path": "/nome_cientifico", "value": "..."}],
+            "current_step": 2             # Opcional
+        }
+    
+    Header X-Draft-Token: token do rascunho (403 sem ele, salvo o mesmo utilizador autenticado)
+    
+    Returns:
+        200 com a nova versão; 409 com a versão atual se "version" estiver desatualizada
+    """
+    try:
+        data = request.get_json() or {}
+        versao = data.get('version')
+        operacoes = data.get('patch')
+        
+        if not isinstance(versao, int):
+            return jsonify({'error': 'Campo "version" (inteiro) é obrigatório'}), 400
+        if not isinstance(operacoes, list):
+            return jsonify({'error': 'Campo "patch" deve ser uma lista de operações'}), 400
+        
+        # Valores com imagens base64 também vão para os blobs
+        blobs = obter_blobs()
+        blobs.extrair_imagens([op.get('value') for op in operacoes if isinstance(op, dict)])
+        
+        rascunho = obter_armazem().aplicar_delta(
+            draft_id,
+            *_dono_rascunho(data),
+            versao,
+            operacoes,
+            passo=data.get('current_step')
+        )
+        # O rascunho renovou a expiração: as imagens que não vieram no delta também
+        blobs.tocar_referenciados(rascunho['data'])
+        blobs.limpar_se_necessario()
         
         return jsonify({
             'draft_id': draft_id,
-            'message': 'Rascunho salvo com sucesso',
-            'expires_at': plant_drafts[draft_id]['expires_at']
+            'version': rascunho['version'],
+            'current_step': rascunho['current_step'],
+            'expires_at': rascunho['expires_at'],
+            'tamanho': rascunho['tamanho']
         })
+    except ErroRascunho as e:
+        return _erro_rascunho(e)
+    except (PatchInvalido, BlobInvalido) as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
-        return handle_error(e, "Erro ao salvar rascunho")
+        return handle_error(e, "Erro ao aplicar delta ao rascunho")
 
 @wizard_bp.route('/draft/<draft_id>', methods=['GET'])
 def get_draft(draft_id):
-    """Recuperar rascunho"""
+    """Recuperar rascunho (header X-Draft-Token)"""
     try:
-        clean_expired_drafts()
+        rascunho = obter_armazem().obter(draft_id, *_dono_rascunho())
         
-        if draft_id not in plant_drafts:
+        if rascunho is None:
             return jsonify({'error': 'Rascunho não encontrado ou expirado'}), 404
         
         return jsonify({
             'draft_id': draft_id,
-            'data': plant_drafts[draft_id]['data'],
-            'current_step': plant_drafts[draft_id]['current_step'],
-            'expires_at': plant_drafts[draft_id]['expires_at']
+            'data': rascunho['data'],
+            'current_step': rascunho['current_step'],
+            'version': rascunho['version'],
+            'expires_at': rascunho['expires_at']
         })
+    except ErroRascunho as e:
+        return _erro_rascunho(e)
     except Exception as e:
         return handle_error(e, "Erro ao recuperar rascunho")
 
 @wizard_bp.route('/draft/<draft_id>', methods=['DELETE'])
 def delete_draft(draft_id):
-    """Deletar rascunho"""
+    """Deletar rascunho (header X-Draft-Token)"""
     try:
-        if draft_id in plant_drafts:
-            del plant_drafts[draft_id]
+        if obter_armazem().apagar(draft_id, *_dono_rascunho()):
             return jsonify({'message': 'Rascunho removido com sucesso'})
         return jsonify({'error': 'Rascunho não encontrado'}), 404
+    except ErroRascunho as e:
+        return _erro_rascunho(e)
     except Exception as e:
         return handle_error(e, "Erro ao deletar rascunho")
 
+@wizard_bp.route('/draft/blobs', methods=['POST'])
+def upload_draft_blob():
+    """
+    Enviar uma imagem do rascunho para a área de blobs
+    Aceita multipart ('file'), JSON {'file_data': base64} ou corpo binário
+    
+    Returns:
+        {'blob_hash', 'tamanho', 'url'} - usar {'blob_hash': ...} no form_data
+    """
+    try:
+        blobs = obter_blobs()
+        
+        if 'file' in request.files:
+            blob_hash = blobs.guardar(request.files['file'].read())
+        elif request.is_json:
+            file_data = (request.get_json() or {}).get('file_data', '')
+            blob_hash, _ = blobs.guardar_base64(file_data)
+        else:
+            blob_hash = blobs.guardar(request.get_data())
+        
+        return jsonify({
+            'blob_hash': blob_hash,
+            'tamanho': os.path.getsize(blobs.caminho(blob_hash)),
+            'url': f'/api/wizard/draft/blobs/{blob_hash}'
+        }), 201
+    except BlobInvalido as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return handle_error(e, "Erro ao guardar imagem do rascunho")
+
+@wizard_bp.route('/draft/blobs/<blob_hash>', methods=['GET'])
+def get_draft_blob(blob_hash):
+    """Imagem de um rascunho (conteúdo imutável: cache longa)"""
+    try:
+        blobs = obter_blobs()
+        if not blobs.existe(blob_hash):
+            return jsonify({'error': 'Blob não encontrado'}), 404
+        
+        resposta = send_file(blobs.caminho(blob_hash), mimetype='application/octet-stream', etag=blob_hash)
+        resposta.headers['Cache-Control'] = 'private, max-age=86400, immutable'
+        return resposta
+    except Exception as e:
+        return handle_error(e, "Erro ao ler imagem do rascunho")
+
 # =====================================================
 # VALIDAÇÃO DE STEPS
 # =====================================================
@@ -359,18 +448,54 @@ def validate_step():
 # CRIAR PLANTA COMPLETA
 # =====================================================
 
+def _id_inteiro(valor):
+    try:
+        return int(valor) if valor not in (None, '') else None
+    except (TypeError, ValueError):
+        return None
+
+def _ids_unicos(valores):
+    """Ids inteiros, sem repetidos, pela ordem recebida"""
+    ids = []
+    for valor in valores:
+        id_ = _id_inteiro(valor)
+        if id_ and id_ not in ids:
+            ids.append(id_)
+    return ids
+
+def _ids_existentes(coluna, ids):
+    """Subconjunto de `ids` que existe na tabela (uma query IN)"""
+    if not ids:
+        return set()
+    return {id_ for (id_,) in db.session.query(coluna).filter(coluna.in_(ids)).all()}
+
+def _inserir_varios(model, linhas):
+    """INSERT com executemany (sem um objeto ORM por linha)"""
+    if linhas:
+        db.session.execute(model.__table__.insert(), linhas)
+
 @wizard_bp.route('/plantas', methods=['POST'])
 def create_planta_wizard():
     """
     Criar planta completa com todos os relacionamentos
     ✅ TOTALMENTE ADAPTADO para nova estrutura BD
+    
+    As imagens ficam 'pendente' e são processadas em segundo plano
     """
+    imagens_criadas = []  # (Imagem, processar, Upload)
+    recebidos = []  # Todos os Upload em staging deste pedido
+    agendadas = False
     try:
-        data = request.get_json()
+        # Imagens base64 ('file_data') são decodificadas para staging durante a leitura
+        data = ler_json(fila_imagens, ('file_data',)) if request.is_json else None
+        recebidos = list(uploads_em(data))
         
         if not data:
             return jsonify({'error': 'Dados não fornecidos'}), 400
         
+        if data.get('imagens'):
+            fila_imagens.verificar_capacidade()
+        
         print(f"🌿 Iniciando criação de planta: {data.get('nome_cientifico')}")
         
         # ============================================
@@ -390,94 +515,109 @@ def create_planta_wizard():
         print(f"✅ Planta criada com ID: {planta.id_planta}")
         
         # ============================================
-        # 2. ADICIONAR NOMES COMUNS
+        # 2. VALIDAR TODOS OS IDS (uma query IN por tabela)
         # ============================================
-        for nome_comum in data.get('nomes_comuns', []):
-            if nome_comum and nome_comum.strip():
-                nome = Nome_comum(
-                    nome=nome_comum.strip(),
-                    id_planta=planta.id_planta
-                )
-                db.session.add(nome)
+        ids_locais = _ids_unicos(data.get('locais', []))
         
-        print(f"✅ Nomes comuns adicionados: {len(data.get('nomes_comuns', []))}")
+        partes_pedidas = []
+        for parte_data in data.get('partes_usadas', []):
+            id_parte = _id_inteiro(parte_data.get('id_parte'))
+            if id_parte:
+                partes_pedidas.append((id_parte, _ids_unicos(parte_data.get('indicacoes', []))))
+        
+        ids_partes = _ids_unicos(p for p, _ in partes_pedidas)
+        ids_indicacoes = _ids_unicos(i for _, inds in partes_pedidas for i in inds)
+        ids_referencias = _ids_unicos(
+            r.get('id') if isinstance(r, dict) else r for r in data.get('referencias', [])
+        )
+        
+        locais_validos = _ids_existentes(Local_colheita.id_local, ids_locais)
+        partes_validas = _ids_existentes(Parte_usada.id_parte, ids_partes)
+        indicacoes_validas = _ids_existentes(Indicacao.id_uso, ids_indicacoes)
+        referencias_validas = _ids_existentes(Referencia.id_referencia, ids_referencias)
+        
+        # Pares Parte_indicacao que já existem (partilhados entre plantas)
+        pares_existentes = set()
+        if partes_validas and indicacoes_validas:
+            pares_existentes = set(db.session.query(
+                Parte_indicacao.id_parte, Parte_indicacao.id_uso
+            ).filter(
+                Parte_indicacao.id_parte.in_(partes_validas),
+                Parte_indicacao.id_uso.in_(indicacoes_validas)
+            ).all())
+        
+        ids_ignorados = {
+            'locais': [i for i in ids_locais if i not in locais_validos],
+            'partes_usadas': [i for i in ids_partes if i not in partes_validas],
+            'indicacoes': [i for i in ids_indicacoes if i not in indicacoes_validas],
+            'referencias': [i for i in ids_referencias if i not in referencias_validas]
+        }
         
         # ============================================
-        # 3. ADICIONAR LOCAIS DE COLHEITA
+        # 3. NOMES COMUNS E LOCAIS DE COLHEITA (insert-many)
         # ✅ NOVA ESTRUTURA: Planta → Planta_local → Local_colheita
         # ============================================
-        for id_local in data.get('locais', []):
-            local = Local_colheita.query.get(id_local)
-            if local:
-                planta_local = Planta_local(
-                    id_planta=planta.id_planta,
-                    id_local=id_local
-                )
-                db.session.add(planta_local)
+        nomes_comuns = []
+        for nome_comum in data.get('nomes_comuns', []):
+            if nome_comum and nome_comum.strip() and nome_comum.strip() not in nomes_comuns:
+                nomes_comuns.append(nome_comum.strip())
+        
+        _inserir_varios(Nome_comum, [
+            {'nome': nome, 'id_planta': planta.id_planta} for nome in nomes_comuns
+        ])
+        _inserir_varios(Planta_local, [
+            {'id_planta': planta.id_planta, 'id_local': id_local}
+            for id_local in ids_locais if id_local in locais_validos
+        ])
         
-        print(f"✅ Locais de colheita vinculados: {len(data.get('locais', []))}")
+        print(f"✅ Nomes comuns adicionados: {len(nomes_comuns)}")
+        print(f"✅ Locais de colheita vinculados: {len(locais_validos)}")
         
         # ============================================
-        # 4. ADICIONAR PARTES USADAS E INDICAÇÕES
+        # 4. PARTES USADAS E INDICAÇÕES (insert-many)
         # ✅ NOVA ESTRUTURA: Planta → Planta_parte → Parte → Parte_indicacao → Indicação
         # ============================================
-        for parte_data in data.get('partes_usadas', []):
-            id_parte = parte_data.get('id_parte')
-            if not id_parte:
+        novos_pares = []
+        for id_parte, inds in partes_pedidas:
+            if id_parte not in partes_validas:
                 continue
-            
-            # Vincular parte à planta
-            planta_parte = Planta_parte(
-                id_planta=planta.id_planta,
-                id_parte=id_parte
-            )
-            db.session.add(planta_parte)
-            
-            # Adicionar indicações para esta parte
-            for id_indicacao in parte_data.get('indicacoes', []):
-                # Verificar se já existe a relação Parte_indicacao
-                existing = Parte_indicacao.query.filter_by(
-                    id_parte=id_parte,
-                    id_uso=id_indicacao
-                ).first()
-                
-                if not existing:
-                    parte_indicacao = Parte_indicacao(
-                        id_parte=id_parte,
-                        id_uso=id_indicacao
-                    )
-                    db.session.add(parte_indicacao)
+            for id_indicacao in inds:
+                par = (id_parte, id_indicacao)
+                if id_indicacao in indicacoes_validas and par not in pares_existentes:
+                    pares_existentes.add(par)
+                    novos_pares.append(par)
+        
+        _inserir_varios(Planta_parte, [
+            {'id_planta': planta.id_planta, 'id_parte': id_parte}
+            for id_parte in ids_partes if id_parte in partes_validas
+        ])
+        _inserir_varios(Parte_indicacao, [
+            {'id_parte': id_parte, 'id_uso': id_uso} for id_parte, id_uso in novos_pares
+        ])
         
-        print(f"✅ Partes usadas e indicações vinculadas: {len(data.get('partes_usadas', []))}")
+        print(f"✅ Partes usadas e indicações vinculadas: {len(partes_validas)}")
         
         # ============================================
-        # 5. ADICIONAR REFERÊNCIAS E AUTORES
+        # 5. REFERÊNCIAS E AUTORES
         # ✅ MANTIDO: lógica de autores via referências
         # ============================================
+        refs_planta = [r for r in ids_referencias if r in referencias_validas]
+        _inserir_varios(Planta_referencia, [
+            {'id_planta': planta.id_planta, 'id_referencia': ref_id} for ref_id in refs_planta
+        ])
+        registar_arestas(db.session, adicionadas=[
+            (('referencia', ref_id), ('planta', planta.id_planta)) for ref_id in refs_planta
+        ])
+        
         autores_das_referencias = set()
+        if refs_planta:
+            autores_das_referencias = {
+                id_autor for (id_autor,) in db.session.query(Referencia_autor.id_autor).filter(
+                    Referencia_autor.id_referencia.in_(refs_planta)
+                ).distinct().all()
+            }
         
-        for id_referencia in data.get('referencias', []):
-            # Suporte para formato dict ou int
-            if isinstance(id_referencia, dict):
-                ref_id = id_referencia.get('id')
-            else:
-                ref_id = id_referencia
-            
-            if ref_id:
-                referencia = Referencia.query.get(ref_id)
-                if referencia:
-                    # Vincular referência à planta
-                    planta_ref = Planta_referencia(
-                        id_planta=planta.id_planta,
-                        id_referencia=ref_id
-                    )
-                    db.session.add(planta_ref)
-                    
-                    # Coletar autores desta referência
-                    for autor_ref in referencia.autores_relacao:
-                        autores_das_referencias.add(autor_ref.autor)
-        
-        print(f"✅ Referências vinculadas: {len(data.get('referencias', []))}")
+        print(f"✅ Referências vinculadas: {len(refs_planta)}")
         print(f"✅ Autores coletados das referências: {len(autores_das_referencias)}")
         
         # ============================================
@@ -488,51 +628,37 @@ def create_planta_wizard():
             print(f"🖼️ Processando {len(imagens_data)} imagens...")
             
             try:
-                # Criar diretório para imagens da planta
-                planta_folder = os.path.join(Config.UPLOAD_FOLDER, str(planta.id_planta))
-                os.makedirs(planta_folder, exist_ok=True)
-                
                 for ordem, imagem_info in enumerate(imagens_data, 1):
                     try:
-                        # Extrair dados da imagem
-                        file_data = imagem_info.get('file_data', '')
+                        # Extrair dados da imagem ('file_data' já é um Upload em staging)
+                        file_data = imagem_info.get('file_data')
+                        blob_hash = imagem_info.get('blob_hash')  # Imagem já enviada pelo autosave
                         file_extension = imagem_info.get('file_extension', 'jpg')
                         legenda = imagem_info.get('legenda', '')
                         
-                        if not file_data:
+                        if not file_data and not blob_hash:
                             continue
                         
-                        # Gerar nome único para o arquivo
-                        filename = f"{uuid.uuid4().hex}.{file_extension}"
-                        filepath = os.path.join(planta_folder, filename)
-                        
-                        # Decodificar base64 e salvar
-                        if ',' in file_data:
-                            file_data = file_data.split(',')[1]
-                        
-                        image_bytes = base64.b64decode(file_data)
-                        
-                        # Processar imagem com PIL (validar/otimizar)
-                        img = PILImage.open(BytesIO(image_bytes))
+                        if blob_hash:
+                            origem = obter_blobs().caminho(blob_hash)
+                            if not os.path.exists(origem):
+                                raise ValueError(f'blob {blob_hash} não encontrado (rascunho expirado?)')
+                            # Os blobs também são SHA-256: conteúdo já guardado não é copiado
+                            if conteudo_conhecido(blob_hash):
+                                upload = Upload(blob_hash, os.path.getsize(origem), None, None)
+                            else:
+                                upload = fila_imagens.copiar(origem)
+                                recebidos.append(upload)
+                        elif isinstance(file_data, UploadRejeitado):
+                            raise file_data
+                        else:
+                            upload = file_data
                         
-                        # Converter RGBA para RGB se necessário
-                        if img.mode == 'RGBA':
-                            img = img.convert('RGB')
+                        # Criar registro no BD (conteúdo repetido reutiliza o ficheiro)
+                        imagem, processar = criar_imagem(upload, planta.id_planta, file_extension, legenda)
+                        imagens_criadas.append((imagem, processar, upload))
                         
-                        # Salvar imagem
-                        img.save(filepath, quality=85, optimize=True)
-                        
-                        # Criar registro no BD
-                        imagem = Imagem(
-                            id_planta=planta.id_planta,
-                            nome_arquivo=filename,
-                            url_armazenamento=f'/uploads/plantas_imagens/{planta.id_planta}/{filename}',
-                            legenda=legenda,
-                            referencia_img=None
-                        )
-                        db.session.add(imagem)
-                        
-                        print(f"  ✅ Imagem {ordem} salva: {filename}")
+                        print(f"  ✅ Imagem {ordem}: {imagem.nome_arquivo} ({imagem.estado})")
                         
                     except Exception as img_error:
                         print(f"  ⚠️ Erro ao processar imagem {ordem}: {img_error}")
@@ -546,6 +672,10 @@ def create_planta_wizard():
         # ============================================
         db.session.commit()
         
+        agendadas = True
+        for imagem, processar, upload in imagens_criadas:
+            fila_imagens.agendar(imagem, processar, upload)
+        
         print(f"🎉 Planta criada com sucesso! ID: {planta.id_planta}")
         
         return jsonify({
@@ -553,13 +683,21 @@ def create_planta_wizard():
             'id_planta': planta.id_planta,
             'nome_cientifico': planta.nome_cientifico,
             'familia': planta.familia,
-            'total_nomes_comuns': len(data.get('nomes_comuns', [])),
-            'total_locais': len(data.get('locais', [])),
-            'total_partes': len(data.get('partes_usadas', [])),
-            'total_referencias': len(data.get('referencias', [])),
-            'total_imagens': len(imagens_data)
+            'total_nomes_comuns': len(nomes_comuns),
+            'total_locais': len(locais_validos),
+            'total_partes': len(partes_validas),
+            'total_referencias': len(refs_planta),
+            'total_imagens': len(imagens_criadas),
+            'imagens': [{'id_imagem': i.id_imagem, 'estado': i.estado} for i, _, _ in imagens_criadas],
+            'ids_ignorados': {k: v for k, v in ids_ignorados.items() if v}
         }), 201
         
+    except FilaCheia as e:
+        return jsonify({'error': str(e)}), 503, {'Retry-After': '30'}
+        
+    except UploadRejeitado as e:
+        return jsonify({'error': str(e)}), e.status
+        
     except IntegrityError as e:
         db.session.rollback()
         print(f"❌ Erro de integridade: {e}")
@@ -579,6 +717,14 @@ def create_planta_wizard():
         db.session.rollback()
         print(f"❌ Erro geral: {e}")
         return handle_error(e, "Erro ao criar planta")
+    
+    finally:
+        # Staging que não chegou a agendar (400 antes das imagens, imagem recusada,
+        # commit falhado); os agendados são de agendar (fila ou descarte)
+        usados = {id(u) for _, _, u in imagens_criadas} if agendadas else set()
+        for upload in recebidos:
+            if id(upload) not in usados:
+                fila_imagens.descartar(upload)
 
 # =====================================================
 # HEALTH CHECK DO WIZARD
@@ -590,10 +736,12 @@ def wizard_health():
     return jsonify({
         'status': 'ok',
         'message': 'Wizard API funcionando',
-        'active_drafts': len(plant_drafts),
+        'active_drafts': obter_armazem().contar(),
         'endpoints': {
+            'bootstrap': '/api/wizard/bootstrap',
             'data': '/api/wizard/data/*',
             'draft': '/api/wizard/draft/*',
+            'draft_blobs': '/api/wizard/draft/blobs',
             'validate': '/api/wizard/validate/step',
             'create': '/api/wizard/plantas'
         }
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""
+Fixtures dos testes: aplicação sobre SQLite num diretório temporário
+(base de dados, rascunhos, estado partilhado e imagens isolados por teste)
+
+Executar a partir de backend/:
+    python -m pytest -q
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def configuracao_testes(pasta, **extra):
+    """Config de create_app para um teste (tudo dentro de `pasta`)"""
+    config = {
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{pasta}/plantas.db',
+        'SQLALCHEMY_REPLICA_URIS': [],
+        'STATE_STORE': 'memoria',
+        'DRAFT_STORE': 'memoria',
+        'DRAFT_BLOB_FOLDER': str(pasta / 'rascunhos_blobs'),
+        'IMAGE_PROCESSING_MODE': 'sincrono',
+        'IMAGE_CONTENT_FOLDER': str(pasta / 'imagens'),
+        'IMAGE_STAGING_FOLDER': str(pasta / 'imagens_staging'),
+        'UPLOAD_FOLDER': str(pasta / 'uploads'),
+        'IMAGE_RECONCILE_STATE_FILE': str(pasta / 'reconciliacao.json'),
+        'IMAGE_IMPORT_FOLDER': str(pasta / 'importar'),
+        'IMAGE_IMPORT_STATE_FOLDER': str(pasta / 'importacoes'),
+        'SQL_ORCAMENTO_ESTRITO': True,
+        'COMPRESSAO': False,
+    }
+    config.update(extra)
+    return config
+
+
+@pytest.fixture
+def app(tmp_path):
+    from app import create_app
+    from models.planta import db
+
+    aplicacao = create_app(configuracao_testes(tmp_path))
+    with aplicacao.app_context():
+        db.create_all()
+        yield aplicacao
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
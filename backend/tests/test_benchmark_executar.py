@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+"""Gate do benchmark: orçamento de queries por endpoint e latência pelo p50 das rondas"""
+from benchmarks.executar import acima_do_orcamento, comparar, orcamento_endpoint
+
+
+def _cenario(**valores):
+    return {'erros': 0, 'estados': {'200': 30}, 'orcamento': 10, 'acima_orcamento': 0, 'p50_ms': 10.0,
+            'p50_ronda_min_ms': 10.0, 'p95_ms': 12.0, 'queries_max': 3, 'pico_memoria_kb': 100.0, **valores}
+
+
+def test_orcamento_do_endpoint(app):
+    assert orcamento_endpoint(app, '/api/plantas?page=2', 'GET') == 10
+    assert orcamento_endpoint(app, '/api/plantas/7', 'GET') == app.view_functions['plantas.get_planta_detalhes'].orcamento_queries
+    assert orcamento_endpoint(app, '/api/nao-existe', 'GET') is None
+
+
+def test_acima_do_orcamento_falha_sem_baseline():
+    relatorio = {'cenarios': {'plantas': _cenario(acima_orcamento=30, queries_max=22), 'busca': _cenario()}}
+    assert acima_do_orcamento(relatorio) == {'plantas': (30, 10)}
+
+
+def test_latencia_compara_o_melhor_p50_das_rondas():
+    baseline = {'cenarios': {'plantas': _cenario()}}
+    # Uma ronda lenta sobe o p50 global, não o menor p50 das rondas
+    ruido = {'cenarios': {'plantas': _cenario(p50_ms=20.0, p95_ms=30.0)}}
+    assert comparar(ruido, baseline) == []
+
+    lento = {'cenarios': {'plantas': _cenario(p50_ms=20.0, p50_ronda_min_ms=19.0, p95_ms=30.0)}}
+    assert len(comparar(lento, baseline)) == 1
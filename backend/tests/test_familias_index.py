@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""Dicionário de famílias: contagens mantidas na escrita, leituras sem reconstrução"""
+from models.familia import Familia
+from models.planta import db, Planta_medicinal
+from utils.familias_index import ajustar_contagem, indice_familias
+from utils.sql_instrumentacao import medir_queries
+
+
+def _contagens():
+    return {f.nome_normalizado: f.total_plantas for f in Familia.query.all()}
+
+
+def test_contagens_acompanham_as_plantas(app):
+    plantas = [Planta_medicinal(nome_cientifico=f'Acacia sp{i}', familia='Fabáceae') for i in range(3)]
+    db.session.add_all(plantas)
+    db.session.commit()
+    assert _contagens() == {'fabaceae': 3}
+
+    plantas[0].familia = 'Rubiaceae'
+    db.session.delete(plantas[1])
+    db.session.commit()
+    assert _contagens() == {'fabaceae': 1, 'rubiaceae': 1}
+
+
+def test_ajustar_contagem_upsert(app):
+    with db.engine.begin() as conexao:
+        ajustar_contagem(conexao, 'Lamiaceae', 1)
+        ajustar_contagem(conexao, ' lamiaceae ', 2)  # Mesma família: soma, sem violar o UNIQUE
+    assert _contagens() == {'lamiaceae': 3}
+
+    with db.engine.begin() as conexao:
+        ajustar_contagem(conexao, 'Lamiaceae', -3)
+        ajustar_contagem(conexao, 'Inexistente', -1)
+    assert _contagens() == {}
+
+
+def test_carregar_nao_conta_as_plantas(app):
+    db.session.add(Planta_medicinal(nome_cientifico='Aloe vera', familia='Asphodelaceae'))
+    db.session.commit()
+
+    with medir_queries() as medicao:
+        indice_familias.carregar()
+    assert not any('planta_medicinal' in forma.lower() for forma in medicao.formas), medicao.resumo()
+
+
+def test_verificar_so_reporta_divergencia(app):
+    db.session.add(Planta_medicinal(nome_cientifico='Aloe vera', familia='Asphodelaceae'))
+    db.session.commit()
+    # Escrita fora da aplicação: a tabela deixa de bater com as plantas
+    db.session.execute(Familia.__table__.delete())
+    db.session.commit()
+
+    assert indice_familias.verificar_divergencia() == {'soma_familias': 0, 'plantas': 1}
+    assert indice_familias.divergencia == {'soma_familias': 0, 'plantas': 1}
+    assert _contagens() == {}  # A verificação não reconstruiu
+
+    indice_familias.sincronizar()
+    assert indice_familias.divergencia is None
+    assert indice_familias.verificar_divergencia() is None
+    assert _contagens() == {'asphodelaceae': 1}
+
+
+def test_comando_verificar_familias(app):
+    db.session.add(Planta_medicinal(nome_cientifico='Aloe vera', familia='Asphodelaceae'))
+    db.session.commit()
+    db.session.execute(Familia.__table__.delete())
+    db.session.commit()
+    runner = app.test_cli_runner()
+
+    resultado = runner.invoke(args=['verificar-familias'])
+    assert resultado.exit_code == 1
+    assert _contagens() == {}
+
+    assert runner.invoke(args=['verificar-familias', '--sincronizar']).exit_code == 0
+    assert _contagens() == {'asphodelaceae': 1}
+    resultado = runner.invoke(args=['verificar-familias'])
+    assert resultado.exit_code == 0, resultado.output
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""Renomeação de famílias em lote: blocos por keyset e contagens consistentes"""
+import time
+
+from models.familia import Familia
+from models.planta import db, Planta_medicinal
+from utils import familias_lote
+from utils.estado_partilhado import obter_estado
+from utils.sql_instrumentacao import medir_queries
+
+
+def _plantas(familias):
+    db.session.add_all([Planta_medicinal(nome_cientifico=f'Planta sp{i}', familia=f) for i, f in enumerate(familias)])
+    db.session.commit()
+
+
+def _contagens():
+    return {f.nome_normalizado: f.total_plantas for f in Familia.query.all()}
+
+
+def test_renomear_e_unificar_por_blocos(app):
+    _plantas(['Leguminosae'] * 5 + ['Outra'] * 100 + ['Fabaceae'] * 2 + ['Compositae'] * 3)
+
+    resultado = familias_lote.aplicar([('Leguminosae', 'Fabaceae'), ('Compositae', 'Asteraceae')], chunk_size=3)
+
+    assert resultado['plantas_atualizadas'] == 8
+    assert resultado['blocos'] == 3  # 8 plantas afetadas em blocos de 3; os ids de 'Outra' não contam
+    assert [r['plantas_movidas'] for r in resultado['renomeacoes']] == [5, 3]
+    assert _contagens() == {'fabaceae': 7, 'asteraceae': 3, 'outra': 100}
+    assert Planta_medicinal.query.filter_by(familia='Leguminosae').count() == 0
+
+
+def test_blocos_nao_percorrem_intervalos_vazios(app):
+    _plantas(['Leguminosae'] + ['Outra'] * 300 + ['Leguminosae'])
+
+    with medir_queries() as medicao:
+        resultado = familias_lote.aplicar([('Leguminosae', 'Fabaceae')], chunk_size=10)
+    assert resultado['blocos'] == 1
+    assert medicao.total < 30, medicao.resumo()
+
+
+def test_job_em_segundo_plano(app):
+    _plantas(['Leguminosae'] * 4)
+    job_id = familias_lote.iniciar_job(app, [('Leguminosae', 'Fabaceae')], chunk_size=2)
+
+    limite = time.monotonic() + 5
+    while obter_estado().obter_job(job_id)['estado'] in ('pendente', 'em_execucao') and time.monotonic() < limite:
+        time.sleep(0.02)
+    job = obter_estado().obter_job(job_id)
+    assert job['estado'] == 'concluido', job
+    assert job['blocos_processados'] == 2
+    assert job['resultado']['plantas_atualizadas'] == 4
+
+
+def test_aplicar_com_total_previsto_nao_volta_a_contar(app):
+    _plantas(['Leguminosae'] * 3)
+
+    with medir_queries() as medicao:
+        familias_lote.aplicar([('Leguminosae', 'Fabaceae')], chunk_size=10, total_previsto=3)
+    assert not any('count(' in forma.lower() for forma in medicao.formas), medicao.resumo()
+
+
+def test_renomear_uma_familia_por_blocos(client, monkeypatch):
+    """PUT /familias/rename passa por familias_lote.aplicar com a contagem da pré-visualização"""
+    _plantas(['Leguminosae'] * 5 + ['Fabaceae'] * 2)
+    blocos = []
+    aplicar = familias_lote.aplicar
+    monkeypatch.setattr(familias_lote, 'aplicar', lambda *a, **k: blocos.append(k) or aplicar(*a, chunk_size=2, **k))
+
+    resposta = client.put('/api/admin/familias/rename', json={'old_name': 'Leguminosae', 'new_name': 'Fabaceae'})
+    dados = resposta.get_json()
+    assert resposta.status_code == 200, dados
+    assert (dados['operation'], dados['plantas_movidas'], dados['total_plantas_familia']) == ('merge', 5, 7)
+    assert blocos == [{'total_previsto': 5}]
+    assert _contagens() == {'fabaceae': 7}
+
+    ausente = client.put('/api/admin/familias/rename', json={'old_name': 'Leguminosae', 'new_name': 'Fabaceae'})
+    assert ausente.status_code == 404
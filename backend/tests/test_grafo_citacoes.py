@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""Grafo de citações: CSR + overlay, BFS e rotas"""
+import pytest
+
+from models.planta import db, Planta_medicinal
+from models.referencia import Autor, Referencia, Referencia_autor, Planta_referencia
+from utils import grafo_citacoes
+from utils.grafo_citacoes import GrafoCitacoes
+
+
+@pytest.fixture
+def ids(app):
+    """a1, a2 → r1; a2 → r2; r1 → p1; r2 → p2 (cadeia a1-r1-a2-r2-p2)"""
+    autores = [Autor(nome_autor=f'Autor {i}') for i in (1, 2, 3)]
+    referencias = [Referencia(titulo_referencia=f'Referência {i}') for i in (1, 2)]
+    plantas = [Planta_medicinal(nome_cientifico=f'Aloe sp{i}', familia='Asphodelaceae') for i in (1, 2)]
+    db.session.add_all(autores + referencias + plantas)
+    db.session.flush()
+    a1, a2, a3 = (a.id_autor for a in autores)
+    r1, r2 = (r.id_referencia for r in referencias)
+    p1, p2 = (p.id_planta for p in plantas)
+    db.session.add_all([
+        Referencia_autor(id_referencia=r1, id_autor=a1),
+        Referencia_autor(id_referencia=r1, id_autor=a2),
+        Referencia_autor(id_referencia=r2, id_autor=a2),
+        Planta_referencia(id_planta=p1, id_referencia=r1),
+        Planta_referencia(id_planta=p2, id_referencia=r2),
+    ])
+    db.session.commit()
+    return {'a1': a1, 'a2': a2, 'a3': a3, 'r1': r1, 'r2': r2, 'p1': p1, 'p2': p2}
+
+
+@pytest.fixture
+def grafo(ids):
+    novo = GrafoCitacoes(ttl_segundos=0)
+    novo.reconstruir()
+    return novo
+
+
+def _vizinhos(grafo, tipo, id_, **kwargs):
+    return {(v['tipo'], v['id'], v['distancia']) for v in grafo.vizinhanca(tipo, id_, **kwargs)}
+
+
+def test_construcao_e_bfs(grafo, ids):
+    assert grafo.estatisticas()['arestas'] == 5
+    assert _vizinhos(grafo, 'referencia', ids['r1']) == {
+        ('autor', ids['a1'], 1), ('autor', ids['a2'], 1), ('planta', ids['p1'], 1)
+    }
+    assert ('planta', ids['p2'], 4) in _vizinhos(grafo, 'autor', ids['a1'], profundidade=4)
+    assert _vizinhos(grafo, 'autor', ids['a1'], profundidade=2, tipos={'autor'}) == {('autor', ids['a2'], 2)}
+    assert len(grafo.vizinhanca('autor', ids['a1'], profundidade=4, limite=2)) == 2
+    assert grafo.vizinhanca('autor', ids['a3']) == []
+
+
+def test_caminho_mais_curto(grafo, ids):
+    caminho = grafo.caminho_mais_curto(('autor', ids['a1']), ('planta', ids['p2']))
+    assert caminho == [('autor', ids['a1']), ('referencia', ids['r1']), ('autor', ids['a2']),
+                       ('referencia', ids['r2']), ('planta', ids['p2'])]
+    assert grafo.caminho_mais_curto(('autor', ids['a1']), ('planta', ids['p2']), max_profundidade=3) is None
+    assert grafo.caminho_mais_curto(('autor', ids['a1']), ('autor', ids['a1'])) == [('autor', ids['a1'])]
+
+
+def test_top_relacionados(grafo, ids):
+    assert grafo.top_relacionados('autor', ids['a1'], via='referencia') == [{'id': ids['a2'], 'partilhados': 1}]
+
+
+def test_aplicar_remocao_repetida_conta_uma_vez(grafo, ids):
+    aresta = (('autor', ids['a1']), ('referencia', ids['r1']))
+    grafo.aplicar([], [aresta])
+    grafo.aplicar([], [aresta, aresta[::-1]])
+    assert grafo.estatisticas()['arestas'] == 4
+    assert ('autor', ids['a1'], 1) not in _vizinhos(grafo, 'referencia', ids['r1'])
+
+    grafo.aplicar([aresta], [])
+    grafo.aplicar([aresta], [])
+    assert grafo.estatisticas()['arestas'] == 5
+    assert ('autor', ids['a1'], 1) in _vizinhos(grafo, 'referencia', ids['r1'])
+
+
+def test_aplicar_overlay_e_compactar(grafo, ids):
+    nova = (('autor', ids['a3']), ('referencia', ids['r2']))
+    grafo.aplicar([nova], [])
+    grafo.aplicar([], [nova, nova])
+    grafo.aplicar([nova], [])
+    grafo.aplicar([], [(('autor', 999), ('referencia', ids['r2']))])  # Nó desconhecido
+    assert grafo.estatisticas()['arestas'] == 6
+
+    antes = _vizinhos(grafo, 'autor', ids['a3'], profundidade=4)
+    grafo.compactar()
+    assert grafo.estatisticas()['overlay'] == 0
+    assert grafo.estatisticas()['arestas'] == 6
+    assert _vizinhos(grafo, 'autor', ids['a3'], profundidade=4) == antes
+
+
+def test_rotas(client, ids, monkeypatch):
+    monkeypatch.setattr(grafo_citacoes.grafo, '_construido_em', None)  # Instância do processo: ler esta BD
+    resposta = client.get(f"/api/grafo/autores/{ids['a1']}/vizinhos?profundidade=2")
+    assert resposta.status_code == 200
+    assert {v['id'] for v in resposta.get_json()['vizinhos'] if v['tipo'] == 'autor'} == {ids['a2']}
+    assert client.get(f"/api/grafo/autor/{ids['a1']}/vizinhos").status_code == 404
+
+    resposta = client.get(f"/api/grafo/caminho?origem=autor:{ids['a1']}&destino=planta:{ids['p2']}&max=100000")
+    assert resposta.status_code == 200
+    assert resposta.get_json()['distancia'] == 4
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+"""gunicorn.conf.py: omissões por worker cabem no max_connections do MySQL"""
+import multiprocessing
+import os
+import runpy
+
+import pytest
+
+CONF = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'gunicorn.conf.py')
+DERIVADAS = ('DB_POOL_SIZE', 'DB_MAX_OVERFLOW', 'IMAGE_WORKERS')
+
+
+def _carregar(monkeypatch, cores, **ambiente):
+    for nome in (*DERIVADAS, 'WEB_CONCURRENCY', 'GUNICORN_THREADS', 'DB_MAX_CONNECTIONS', 'DB_RESERVED_CONNECTIONS'):
+        monkeypatch.setenv(nome, '0')  # Registar para o monkeypatch repor o ambiente no fim
+        monkeypatch.delenv(nome)
+    for nome, valor in ambiente.items():
+        monkeypatch.setenv(nome, str(valor))
+    monkeypatch.setattr(multiprocessing, 'cpu_count', lambda: cores)
+    conf = runpy.run_path(CONF)
+    return conf, {nome: int(os.environ[nome]) for nome in DERIVADAS}
+
+
+@pytest.mark.parametrize('cores', [1, 4, 8, 16, 64, 128])
+def test_ligacoes_cabem_no_limite(monkeypatch, cores):
+    conf, derivadas = _carregar(monkeypatch, cores)
+
+    assert conf['workers'] * (derivadas['DB_POOL_SIZE'] + derivadas['DB_MAX_OVERFLOW']) <= 151 - 20
+    assert 1 <= conf['threads'] <= derivadas['DB_POOL_SIZE']
+    assert derivadas['IMAGE_WORKERS'] == max(cores // conf['workers'], 1)
+
+
+def test_valores_explicitos_prevalecem(monkeypatch):
+    conf, derivadas = _carregar(monkeypatch, 4, WEB_CONCURRENCY=3, DB_POOL_SIZE=6, IMAGE_WORKERS=2,
+                                DB_MAX_CONNECTIONS=500)
+
+    assert conf['workers'] == 3
+    assert (derivadas['DB_POOL_SIZE'], derivadas['IMAGE_WORKERS']) == (6, 2)
+    assert derivadas['DB_MAX_OVERFLOW'] == 10  # (500 - 20) // 3 por worker: o overflow fica no máximo
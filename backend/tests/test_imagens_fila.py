@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+"""Fila de imagens: callbacks de futuros já concluídos e gravação fora do pool"""
+import threading
+import time
+from concurrent.futures import Future
+
+from utils.imagens_fila import FilaImagens
+
+
+class PoolImediato:
+    """Executa na própria chamada: o futuro já está concluído no add_done_callback"""
+
+    def submit(self, funcao, *args):
+        futuro = Future()
+        try:
+            futuro.set_result(funcao(*args))
+        except Exception as e:
+            futuro.set_exception(e)
+        return futuro
+
+
+def test_futuro_concluido_nao_bloqueia_e_grava_noutra_thread(app, tmp_path, monkeypatch):
+    fila = FilaImagens(pasta_staging=str(tmp_path / 'staging'), max_workers=1)
+    fila.app = app
+    fila._retomado = True
+    monkeypatch.setattr(fila, '_obter_pool', lambda: PoolImediato())
+
+    threads = []
+    registar = fila.registar_resultado
+    monkeypatch.setattr(fila, 'registar_resultado',
+                        lambda *a, **k: (threads.append(threading.current_thread().name), registar(*a, **k)))
+
+    for i in range(3):  # Mais do que max_workers * 2: o terceiro é despachado pelo gravador
+        fila.enfileirar(f'{i:064x}', 'png')  # Sem ficheiro em staging: o processamento falha
+
+    limite = time.monotonic() + 5
+    while (fila.falhadas < 3 or fila.estatisticas()['em_execucao']) and time.monotonic() < limite:
+        time.sleep(0.01)
+    assert fila.falhadas == 3
+    assert set(threads) == {'imagens-gravador'}
+    assert fila.estatisticas()['em_execucao'] == 0
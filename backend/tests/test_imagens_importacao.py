@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""Importação em lote: mapeamento (CSV/padrão), retoma idempotente, origem ZIP e limites do pedido"""
+import io
+import os
+import zipfile
+
+import pytest
+from PIL import Image as PILImage
+
+from models.planta import db, Planta_medicinal, Imagem
+from utils import imagens_importacao
+from utils.imagens_fila import fila_imagens
+from utils.imagens_importacao import (
+    ErroImportacao, ImportacaoImagens, Mapeamento, WORKERS_MAXIMO, criar_job, obter_job, preparar_retoma
+)
+
+
+def _png(cor):
+    saida = io.BytesIO()
+    PILImage.new('RGB', (8, 8), cor).save(saida, 'PNG')
+    return saida.getvalue()
+
+
+@pytest.fixture
+def plantas(app):
+    ocimum = Planta_medicinal(nome_cientifico='Ocimum gratissimum L.', familia='Lamiaceae')
+    aloe = Planta_medicinal(nome_cientifico='Aloe vera (L.) Burm.f.', familia='Asphodelaceae')
+    db.session.add_all([ocimum, aloe])
+    db.session.commit()
+    return {'ocimum': ocimum.id_planta, 'aloe': aloe.id_planta}
+
+
+@pytest.fixture
+def pasta(app):
+    pasta = os.path.join(app.config['IMAGE_IMPORT_FOLDER'], 'lote')
+    os.makedirs(os.path.join(pasta, 'sub'))
+    ficheiros = {
+        'Ocimum_gratissimum_01.png': _png((200, 0, 0)),
+        'Ocimum gratissimum (2).png': _png((0, 200, 0)),
+        'sub/Aloe-vera-1.png': _png((0, 0, 200)),
+        'sub/Ocimum_gratissimum_azul.png': _png((0, 0, 200)),  # Mesmo conteúdo noutra planta: um só Ficheiro_imagem
+        'Desconhecida_planta.png': _png((9, 9, 9)),
+        'notas.txt': b'ignorado',
+    }
+    for nome, dados in ficheiros.items():
+        with open(os.path.join(pasta, nome), 'wb') as f:
+            f.write(dados)
+    return pasta
+
+
+def _executar(app, estado):
+    return ImportacaoImagens(app, estado).executar()
+
+
+def _imagens_por_planta():
+    return dict(db.session.query(Imagem.id_planta, db.func.count(Imagem.id_imagem)).group_by(Imagem.id_planta).all())
+
+
+def _staging():
+    pasta = fila_imagens.pasta_staging
+    return os.listdir(pasta) if os.path.isdir(pasta) else []
+
+
+def test_mapeamento_por_padrao(app, plantas):
+    mapeamento = Mapeamento()
+    mapeamento.carregar()
+    assert mapeamento.resolver('x/Ocimum_gratissimum_01.jpg') == (plantas['ocimum'], None, None)
+    assert mapeamento.resolver('aloe-vera.png') == (plantas['aloe'], None, None)
+    assert mapeamento.resolver('Desconhecida_planta.png') is None
+
+    por_id = Mapeamento(padrao=r'^planta-(?P<id_planta>\d+)')
+    por_id.carregar()
+    assert por_id.resolver(f"planta-{plantas['aloe']}-a.jpg") == (plantas['aloe'], None, None)
+    assert por_id.resolver('planta-99999.jpg') is None
+
+    with pytest.raises(ErroImportacao):
+        Mapeamento(padrao=r'^(\w+)')  # Sem grupo nome/id_planta
+
+
+def test_mapeamento_por_csv(app, plantas, tmp_path):
+    caminho = tmp_path / 'mapa.csv'
+    caminho.write_text(
+        'arquivo,id_planta,nome_cientifico,legenda,referencia\n'
+        f"a.jpg,{plantas['ocimum']},,Folhas,Herbário\n"
+        'sub/b.jpg,,Aloe vera,,\n'
+        'c.jpg,abc,,,\n',
+        encoding='utf-8'
+    )
+    mapeamento = Mapeamento(str(caminho))
+    mapeamento.carregar()
+    assert mapeamento.resolver('pasta/a.jpg') == (plantas['ocimum'], 'Folhas', 'Herbário')  # Pelo nome base
+    assert mapeamento.resolver('sub/b.jpg') == (plantas['aloe'], None, None)
+    assert mapeamento.resolver('c.jpg') is None
+    assert mapeamento.resolver('fora-do-csv.jpg') is None
+
+
+def test_importar_pasta_e_repetir_e_idempotente(app, plantas, pasta):
+    estado = _executar(app, criar_job(app, pasta, workers=1))
+
+    assert estado['estado'] == 'concluido', estado['erro']
+    assert estado['total'] == 5
+    assert (estado['importadas'], estado['sem_planta']) == (4, 1)
+    assert estado['processadas'] == 3  # Conteúdo repetido processado uma vez
+    assert _imagens_por_planta() == {plantas['ocimum']: 3, plantas['aloe']: 1}
+    assert {e for (e,) in db.session.query(Imagem.estado).distinct()} == {'pronta'}
+    assert _staging() == []
+
+    outra = _executar(app, criar_job(app, pasta, workers=1))
+    assert (outra['importadas'], outra['duplicadas']) == (0, 4)
+    assert _imagens_por_planta() == {plantas['ocimum']: 3, plantas['aloe']: 1}
+
+
+def test_retomar_continua_do_ultimo_lote(app, plantas, pasta, monkeypatch):
+    estado = criar_job(app, pasta, lote=2, workers=1)
+    importar_lote = ImportacaoImagens.importar_lote
+    lotes = []
+
+    def falhar_no_segundo(self, nomes):
+        lotes.append(nomes)
+        if len(lotes) == 2:
+            raise RuntimeError('worker terminou')
+        return importar_lote(self, nomes)
+
+    monkeypatch.setattr(ImportacaoImagens, 'importar_lote', falhar_no_segundo)
+    interrompido = _executar(app, estado)
+    assert interrompido['estado'] == 'erro'
+    assert interrompido['cursor'] == 2
+    monkeypatch.setattr(ImportacaoImagens, 'importar_lote', importar_lote)
+
+    retomado = _executar(app, preparar_retoma(app, estado['job_id']))
+    assert retomado['estado'] == 'concluido', retomado['erro']
+    assert retomado['importadas'] == 4
+    assert _imagens_por_planta() == {plantas['ocimum']: 3, plantas['aloe']: 1}
+    with pytest.raises(ErroImportacao):
+        preparar_retoma(app, estado['job_id'])  # Já concluído
+
+
+def test_importar_zip(app, plantas):
+    origem = os.path.join(app.config['IMAGE_IMPORT_FOLDER'], 'lote.zip')
+    os.makedirs(os.path.dirname(origem), exist_ok=True)
+    with zipfile.ZipFile(origem, 'w') as arquivo:
+        arquivo.writestr('fotos/Ocimum_gratissimum_1.png', _png((1, 2, 3)))
+        arquivo.writestr('fotos/Aloe_vera_1.png', _png((4, 5, 6)))
+        arquivo.writestr('__MACOSX/fotos/._Aloe_vera_1.png', b'metadados')
+
+    estado = _executar(app, criar_job(app, origem, workers=1))
+    assert estado['estado'] == 'concluido', estado['erro']
+    assert (estado['total'], estado['importadas']) == (2, 2)
+    assert _imagens_por_planta() == {plantas['ocimum']: 1, plantas['aloe']: 1}
+
+
+def test_workers_e_lote_limitados(app, pasta):
+    estado = criar_job(app, pasta, lote=10 ** 6, workers=500)
+    assert estado['workers'] == WORKERS_MAXIMO
+    assert estado['lote'] == imagens_importacao.LOTE_MAXIMO
+    assert criar_job(app, pasta, workers=-3)['workers'] == 1
+
+
+def test_rota_limita_workers(client, pasta, monkeypatch):
+    iniciados = []
+    monkeypatch.setattr(imagens_importacao, 'iniciar_job', lambda app, estado: iniciados.append(estado) or estado['job_id'])
+
+    resposta = client.post('/api/imagens/importar', json={'origem': 'lote', 'workers': 500})
+    assert resposta.status_code == 202, resposta.get_json()
+    job = obter_job(client.application, resposta.get_json()['job_id'])
+    assert job['workers'] == WORKERS_MAXIMO == iniciados[0]['workers']
+
+    fora = client.post('/api/imagens/importar', json={'origem': '../'})
+    assert fora.status_code == 400
@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+"""Reconciliação do armazenamento: relatório, correções (aplicar) e retoma pelo checkpoint"""
+import io
+import os
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from models.planta import db, Planta_medicinal, Imagem, Ficheiro_imagem
+from utils import armazenamento, imagens_conteudo
+from utils import imagens_reconciliacao
+from utils.imagens_reconciliacao import Reconciliacao, ORFAO_IDADE_MINIMA, PREFIXOS_CONTEUDO
+
+ANTIGO = datetime.utcnow() - timedelta(seconds=ORFAO_IDADE_MINIMA * 2)
+
+
+def _sha(prefixo, n):
+    return f'{prefixo}{n:062x}'
+
+
+def _gravar(chave, antigo=True):
+    armazenamento.conteudo.guardar(chave, io.BytesIO(b'conteudo'))
+    if antigo:
+        momento = time.time() - ORFAO_IDADE_MINIMA * 2
+        os.utime(armazenamento.conteudo.caminho_local(chave), (momento, momento))
+
+
+def _existe(chave):
+    return armazenamento.conteudo.existe(chave)
+
+
+def _conteudo(sha256, referencias, imagens=0, criado_em=ANTIGO, estado='pronta', com_ficheiro=True):
+    """Ficheiro_imagem com `referencias` gravado e `imagens` registos Imagem reais (sem eventos)"""
+    db.session.add(Ficheiro_imagem(sha256=sha256, extensao='png', bytes=8, referencias=referencias,
+                                   estado=estado, criado_em=criado_em))
+    db.session.flush()
+    if imagens:
+        id_planta = Planta_medicinal.query.first().id_planta
+        db.session.execute(Imagem.__table__.insert(), [{
+            'id_planta': id_planta, 'sha256': sha256, 'nome_arquivo': f'{sha256}.png',
+            'url_armazenamento': imagens_conteudo.url(sha256, 'png'), 'estado': estado
+        } for _ in range(imagens)])
+    db.session.commit()
+    if com_ficheiro:
+        _gravar(imagens_conteudo.chave(sha256, 'png'))
+    return imagens_conteudo.chave(sha256, 'png')
+
+
+@pytest.fixture
+def cenario(app):
+    db.session.add(Planta_medicinal(nome_cientifico='Acacia reconciliada Mill.', familia='Fabaceae'))
+    db.session.commit()
+    chaves = {
+        'contagem_errada': _conteudo(_sha('ef', 1), referencias=5, imagens=2),
+        'sem_referencias': _conteudo(_sha('ab', 2), referencias=1),
+        'sem_referencias_recente': _conteudo(_sha('ab', 3), referencias=1, criado_em=datetime.utcnow()),
+        'certo': _conteudo(_sha('cd', 1), referencias=1, imagens=1),
+        'orfao': 'ab/' + _sha('ab', 9) + '.png',
+    }
+    _gravar(chaves['orfao'])
+    return chaves
+
+
+def _referencias(sha256):
+    return db.session.query(Ficheiro_imagem.referencias).filter_by(sha256=sha256).scalar()
+
+
+def _executar(app, **opcoes):
+    limite = opcoes.pop('limite', 1000)
+    return Reconciliacao(app, **opcoes).executar(limite=limite)
+
+
+def test_so_relatorio_nao_altera_nada(app, cenario):
+    resultado = _executar(app)
+
+    relatorio = resultado['relatorio']
+    assert resultado['concluido']
+    assert relatorio['pastas'] == len(PREFIXOS_CONTEUDO)
+    assert relatorio['orfaos'] == 1
+    assert relatorio['referencias_corrigidas'] == 3
+    assert relatorio['conteudos_removidos'] == 0
+    assert all(_existe(chave) for chave in cenario.values())
+    assert _referencias(_sha('ef', 1)) == 5
+    assert db.session.query(Ficheiro_imagem).count() == 4
+
+
+def test_aplicar_corrige_e_remove_so_o_antigo(app, cenario):
+    relatorio = _executar(app, aplicar=True)['relatorio']
+
+    assert relatorio['orfaos_apagados'] == 1
+    assert relatorio['conteudos_removidos'] == 1
+    assert not _existe(cenario['orfao'])
+    assert _referencias(_sha('ef', 1)) == 2
+    # Sem referências e antigo: registo e ficheiro removidos
+    assert db.session.get(Ficheiro_imagem, _sha('ab', 2)) is None
+    assert not _existe(cenario['sem_referencias'])
+    # Recente: pode ser de um pedido em curso
+    assert db.session.get(Ficheiro_imagem, _sha('ab', 3)) is not None
+    assert _existe(cenario['sem_referencias_recente'])
+    assert _existe(cenario['certo'])
+
+
+def test_referencias_alteradas_entretanto_nao_remove(app, cenario, monkeypatch):
+    remover = Reconciliacao._remover_conteudo
+
+    def com_imagem_nova(self, sha256, *args):
+        # Outro pedido cria uma imagem com este conteúdo depois da leitura da pasta
+        with db.engine.begin() as outra:
+            outra.execute(Ficheiro_imagem.__table__.update().where(
+                Ficheiro_imagem.__table__.c.sha256 == sha256
+            ).values(referencias=Ficheiro_imagem.__table__.c.referencias + 1))
+        return remover(self, sha256, *args)
+
+    monkeypatch.setattr(Reconciliacao, '_remover_conteudo', com_imagem_nova)
+    relatorio = _executar(app, aplicar=True)['relatorio']
+
+    assert relatorio['conteudos_removidos'] == 0
+    assert _referencias(_sha('ab', 2)) == 2
+    assert _existe(cenario['sem_referencias'])
+
+
+def test_falha_na_pasta_nao_apaga_ficheiros(app, cenario, monkeypatch):
+    # Conteúdo 'pronta' sem ficheiro na mesma pasta, tratado depois da remoção
+    _conteudo(_sha('ab', 4), referencias=1, imagens=1, com_ficheiro=False)
+
+    def falhar(*args):
+        raise RuntimeError('falha simulada')
+
+    monkeypatch.setattr(Reconciliacao, '_remover_imagens', falhar)
+    with pytest.raises(RuntimeError):
+        _executar(app, aplicar=True, remover_em_falta=True)
+
+    # Rollback: o registo volta e o ficheiro continua lá
+    assert db.session.get(Ficheiro_imagem, _sha('ab', 2)) is not None
+    assert _existe(cenario['sem_referencias'])
+
+
+def test_retoma_pelo_checkpoint(app, cenario):
+    primeiro = _executar(app, limite=100)
+    assert not primeiro['concluido']
+    assert primeiro['arvore'] == 'conteudo'
+    assert primeiro['relatorio']['pastas'] == 100
+
+    segundo = _executar(app, limite=100)
+    assert not segundo['concluido']
+    assert segundo['relatorio']['pastas'] == 200
+    assert segundo['ultima_pasta'] == PREFIXOS_CONTEUDO[199]
+
+    terceiro = _executar(app, limite=100)
+    assert terceiro['concluido']
+    assert terceiro['relatorio']['pastas'] == len(PREFIXOS_CONTEUDO)
+    # 'ab' foi visto uma única vez ao longo das três execuções
+    assert terceiro['relatorio']['orfaos'] == 1
+
+    # O ciclo seguinte recomeça do início com o relatório do anterior guardado
+    checkpoint = Reconciliacao(app).ler_checkpoint()
+    assert checkpoint['ultima_pasta'] is None
+    assert checkpoint['ultimo_ciclo']['relatorio']['orfaos'] == 1
+    assert imagens_reconciliacao.ARVORES[0] == checkpoint['arvore']
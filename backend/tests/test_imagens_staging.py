@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+"""Staging de uploads: um ficheiro por pedido, descartado só pelo seu dono"""
+import base64
+import io
+import os
+import time
+from concurrent.futures import Future
+
+import pytest
+from PIL import Image as PILImage
+
+from models.planta import db, Planta_medicinal, Imagem, Ficheiro_imagem
+from utils.imagens_conteudo import criar_imagem
+from utils.imagens_fila import FilaImagens, SUFIXO_STAGING, STAGING_EM_CURSO_SEGUNDOS, fila_imagens
+
+
+def _png(cor=(200, 30, 30)):
+    saida = io.BytesIO()
+    PILImage.new('RGB', (8, 8), cor).save(saida, 'PNG')
+    return saida.getvalue()
+
+
+def _receber(fila, dados):
+    with fila.abrir_staging() as escrita:
+        escrita.write(dados)
+        return escrita.concluir()
+
+
+def _staging(fila):
+    if not os.path.isdir(fila.pasta_staging):
+        return []
+    return sorted(n for n in os.listdir(fila.pasta_staging) if n.endswith(SUFIXO_STAGING))
+
+
+class PoolParado:
+    """Aceita trabalhos sem os executar (ficam 'em execução')"""
+
+    def __init__(self):
+        self.trabalhos = []
+
+    def submit(self, funcao, *args):
+        self.trabalhos.append(args)
+        return Future()
+
+
+@pytest.fixture
+def fila(app, tmp_path, monkeypatch):
+    fila = FilaImagens(pasta_staging=str(tmp_path / 'staging'), max_workers=1)
+    fila.app = app
+    fila._retomado = True
+    pool = PoolParado()
+    monkeypatch.setattr(fila, '_obter_pool', lambda: pool)
+    fila.pool = pool
+    return fila
+
+
+@pytest.fixture
+def planta(app):
+    planta = Planta_medicinal(nome_cientifico='Acacia staging Mill.', familia='Fabaceae')
+    db.session.add(planta)
+    db.session.commit()
+    return planta.id_planta
+
+
+def test_mesmos_bytes_staging_distinto(fila):
+    primeiro, segundo = _receber(fila, _png()), _receber(fila, _png())
+    assert primeiro.sha256 == segundo.sha256
+    assert primeiro.caminho != segundo.caminho
+
+    fila.descartar(segundo)
+    assert os.path.exists(primeiro.caminho)
+    assert not os.path.exists(segundo.caminho)
+
+
+def test_pedido_falhado_nao_apaga_staging_agendado(fila, planta):
+    upload = _receber(fila, _png())
+    imagem, processar = criar_imagem(upload, planta)
+    db.session.commit()
+    fila.agendar(imagem, processar, upload)
+
+    # Outro pedido com os mesmos bytes falha depois de gravar o seu staging
+    falhado = _receber(fila, _png())
+    fila.descartar(falhado)
+
+    (origem, _, _), = fila.pool.trabalhos
+    assert origem == upload.caminho
+    assert os.path.exists(origem)
+
+
+def test_conteudo_ja_na_fila_descarta_o_staging_do_pedido(fila, planta):
+    primeiro = _receber(fila, _png())
+    imagem, processar = criar_imagem(primeiro, planta)
+    db.session.commit()
+    fila.agendar(imagem, processar, primeiro)
+
+    segundo = _receber(fila, _png())
+    imagem, processar = criar_imagem(segundo, planta)
+    db.session.commit()
+    assert not processar
+    fila.agendar(imagem, processar, segundo)
+
+    assert _staging(fila) == [os.path.basename(primeiro.caminho)]
+    assert len(fila.pool.trabalhos) == 1
+
+
+def _envelhecer(caminho, segundos):
+    antigo = time.time() - segundos
+    os.utime(caminho, (antigo, antigo))
+
+
+def test_retomar_reclama_um_staging_antigo_e_ignora_os_recentes(fila, planta):
+    uploads = [_receber(fila, _png()) for _ in range(3)]
+    db.session.add(Ficheiro_imagem(
+        sha256=uploads[0].sha256, extensao='png', bytes=uploads[0].tamanho, referencias=1, estado='pendente'
+    ))
+    db.session.commit()
+    for upload in uploads[:2]:
+        _envelhecer(upload.caminho, STAGING_EM_CURSO_SEGUNDOS + 60)
+
+    assert fila.retomar() == 1
+
+    (origem, _, _), = fila.pool.trabalhos
+    assert origem not in {u.caminho for u in uploads}  # Renomeado: o pedido dono já não o apaga
+    assert os.path.exists(origem)
+    # A outra cópia antiga sai; a recente pode ser de um pedido em curso
+    assert not any(os.path.exists(u.caminho) for u in uploads[:2])
+    assert os.path.exists(uploads[2].caminho)
+
+
+def _imagem_wizard(dados):
+    return {'file_data': base64.b64encode(dados).decode(), 'file_extension': 'png', 'legenda': 'x'}
+
+
+def test_wizard_falhado_descarta_o_staging(client):
+    resposta = client.post('/api/wizard/plantas', json={
+        'nome_cientifico': 'Acacia sem familia Mill.',  # Sem 'familia': falha antes das imagens
+        'imagens': [_imagem_wizard(_png())],
+    })
+    assert resposta.status_code >= 400
+    assert _staging(fila_imagens) == []
+
+
+def test_wizard_imagens_repetidas_sem_staging_perdido(client):
+    dados = _png((10, 120, 40))
+    resposta = client.post('/api/wizard/plantas', json={
+        'nome_cientifico': 'Acacia repetida Mill.',
+        'familia': 'Fabaceae',
+        'imagens': [_imagem_wizard(dados), _imagem_wizard(dados), {'file_data': 'AA!A'}],
+    })
+    assert resposta.status_code == 201, resposta.get_json()
+    assert resposta.get_json()['total_imagens'] == 2
+    assert {estado for (estado,) in db.session.query(Imagem.estado).all()} == {'pronta'}
+    assert _staging(fila_imagens) == []
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""JSON Patch (RFC 6902) usado pelo autosave"""
+import pytest
+
+from utils.json_patch import PatchInvalido, aplicar_patch
+
+
+def _documento():
+    return {'nome': 'Aloe', 'nomes_comuns': ['babosa', 'aloé'], 'imagens': [{'legenda': 'a'}], 'a/b': 1, 'm~n': 2}
+
+
+@pytest.mark.parametrize('operacoes, alteradas, removidas', [
+    ([{'op': 'add', 'path': '/familia', 'value': 'Asphodelaceae'}], {'familia': 'Asphodelaceae'}, set()),
+    ([{'op': 'add', 'path': '/nomes_comuns/-', 'value': 'azebre'}], {'nomes_comuns': ['babosa', 'aloé', 'azebre']}, set()),
+    ([{'op': 'add', 'path': '/nomes_comuns/0', 'value': 'azebre'}], {'nomes_comuns': ['azebre', 'babosa', 'aloé']}, set()),
+    ([{'op': 'remove', 'path': '/nomes_comuns/1'}], {'nomes_comuns': ['babosa']}, set()),
+    ([{'op': 'replace', 'path': '/imagens/0/legenda', 'value': 'b'}], {'imagens': [{'legenda': 'b'}]}, set()),
+    ([{'op': 'replace', 'path': '/a~1b', 'value': 3}], {'a/b': 3}, set()),
+    ([{'op': 'replace', 'path': '/m~0n', 'value': 4}], {'m~n': 4}, set()),
+    ([{'op': 'move', 'from': '/nome', 'path': '/nome_cientifico'}], {'nome_cientifico': 'Aloe'}, {'nome'}),
+    ([{'op': 'copy', 'from': '/imagens/0', 'path': '/imagens/-'}], {'imagens': [{'legenda': 'a'}, {'legenda': 'a'}]}, set()),
+    ([{'op': 'test', 'path': '/nome', 'value': 'Aloe'}, {'op': 'remove', 'path': '/nome'}], {}, {'nome'}),
+])
+def test_operacoes(operacoes, alteradas, removidas):
+    esperado = {k: v for k, v in _documento().items() if k not in removidas}
+    esperado.update(alteradas)
+    assert aplicar_patch(_documento(), operacoes) == esperado
+
+
+def test_copia_independente():
+    documento = aplicar_patch(_documento(), [{'op': 'copy', 'from': '/imagens/0', 'path': '/capa'}])
+    documento['capa']['legenda'] = 'x'
+    assert documento['imagens'][0]['legenda'] == 'a'
+
+
+def test_substituir_raiz():
+    assert aplicar_patch(_documento(), [{'op': 'replace', 'path': '', 'value': {'novo': True}}]) == {'novo': True}
+
+
+@pytest.mark.parametrize('operacoes', [
+    {'op': 'add'},
+    [{'op': 'mover', 'path': '/nome'}],
+    [{'op': 'add', 'path': 'nome', 'value': 1}],
+    [{'op': 'add', 'path': '/nome'}],
+    [{'op': 'remove', 'path': '/inexistente'}],
+    [{'op': 'remove', 'path': ''}],
+    [{'op': 'replace', 'path': '/nomes_comuns/5', 'value': 'x'}],
+    [{'op': 'add', 'path': '/nomes_comuns/01', 'value': 'x'}],
+    [{'op': 'add', 'path': '/nomes_comuns/-1', 'value': 'x'}],
+    [{'op': 'add', 'path': '/nome/x', 'value': 1}],
+    [{'op': 'add', 'path': '/inexistente/x', 'value': 1}],
+    [{'op': 'move', 'from': '/imagens', 'path': '/imagens/0/dentro'}],
+    [{'op': 'test', 'path': '/nome', 'value': 'Outra'}],
+])
+def test_patch_invalido(operacoes):
+    with pytest.raises(PatchInvalido):
+        aplicar_patch(_documento(), operacoes)
@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+"""
+Leituras assíncronas (asgi.py): encaminhamento, HEAD/405, réplica por pedido,
+compressão e, com o driver aiosqlite instalado, a listagem sobre a BD
+"""
+import asyncio
+import gzip
+import json
+from contextlib import contextmanager
+
+import pytest
+
+from models.planta import db, Planta_medicinal, Nome_comum
+from routes import leitura_async
+from routes.leitura_async import AppLeiturasAsync, Pedido
+from utils.replicas import COOKIE_PRIMARIO
+
+
+def _scope(metodo, caminho, query=b'', cabecalhos=()):
+    return {
+        'type': 'http', 'method': metodo, 'path': caminho, 'query_string': query,
+        'headers': [(k.encode(), v.encode()) for k, v in cabecalhos], 'client': ('10.0.0.7', 5123),
+    }
+
+
+def _chamar(asgi, metodo, caminho, query=b'', cabecalhos=()):
+    """Um pedido HTTP pela aplicação ASGI: (estado, cabeçalhos, corpo)"""
+    mensagens = []
+
+    async def receber():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def enviar(mensagem):
+        mensagens.append(mensagem)
+
+    async def executar():
+        try:
+            await asgi(_scope(metodo, caminho, query, cabecalhos), receber, enviar)
+        finally:
+            if isinstance(asgi.bd, leitura_async.BDAsync):
+                await asgi.bd.fechar()  # Engine do event loop deste pedido
+                asgi.bd = None
+
+    asyncio.run(executar())
+    inicio, corpo = mensagens
+    return inicio['status'], {k.decode(): v.decode() for k, v in inicio['headers']}, corpo['body']
+
+
+class BDFalsa:
+    """Regista a réplica escolhida para cada pedido (sem driver assíncrono)"""
+
+    def __init__(self):
+        self.replicas = []
+
+    @contextmanager
+    def ler_de(self, replica):
+        self.replicas.append(replica)
+        yield
+
+
+class RoteadorFalso:
+    ativo = True
+
+    def verificacao_pendente(self):
+        return False
+
+    def escolher(self, engines=None):
+        return 'replica_0'
+
+
+@pytest.fixture
+def rotas(monkeypatch):
+    """Os padrões de ROTAS com rotas que só registam o que receberam"""
+    chamadas = []
+
+    def registar(nome):
+        async def rota(app, bd, pedido, *grupos):
+            chamadas.append((nome, grupos))
+            return {'rota': nome, 'grupos': list(grupos), 'texto': 'x' * 4096}, 200
+        return rota
+
+    monkeypatch.setattr(leitura_async, 'ROTAS', tuple(
+        (padrao, registar(rota.__name__)) for padrao, rota in leitura_async.ROTAS
+    ))
+    return chamadas
+
+
+@pytest.fixture
+def asgi(app):
+    aplicacao = AppLeiturasAsync(app)
+    aplicacao.bd = BDFalsa()
+    return aplicacao
+
+
+def test_pedido_le_parametros_cabecalhos_e_cookies():
+    pedido = Pedido(_scope('GET', '/api/busca', b'q=ch%C3%A1&limit=5&tipo=',
+                           [('Cookie', f'{COOKIE_PRIMARIO}=1; outro=2'), ('User-Agent', 'teste')]))
+
+    assert pedido.args.get('q') == 'chá'
+    assert pedido.args.get('limit', type=int) == 5
+    assert pedido.args.get('tipo') == ''
+    assert pedido.cabecalhos['user-agent'] == 'teste'
+    assert pedido.cookies == {COOKIE_PRIMARIO: '1', 'outro': '2'}
+    assert pedido.remote_addr == '10.0.0.7'
+
+
+@pytest.mark.parametrize('caminho, rota, grupos', [
+    ('/api/plantas', 'listar_plantas', []),
+    ('/api/plantas/42', 'detalhe_planta', ['42']),
+    ('/api/busca', 'busca_global', []),
+    ('/api/busca/autocomplete', 'autocomplete', []),
+])
+def test_despachar_encaminha_pelo_caminho(asgi, rotas, caminho, rota, grupos):
+    estado, _, corpo = _chamar(asgi, 'GET', caminho)
+
+    assert estado == 200
+    assert (json.loads(corpo)['rota'], json.loads(corpo)['grupos']) == (rota, grupos)
+
+
+def test_caminho_desconhecido_e_metodo_nao_permitido(asgi, rotas):
+    assert _chamar(asgi, 'GET', '/api/plantas/abc')[0] == 404
+    assert _chamar(asgi, 'GET', '/api/familias')[0] == 404
+    assert _chamar(asgi, 'POST', '/api/plantas')[0] == 405
+    assert _chamar(asgi, 'DELETE', '/api/plantas/1')[0] == 405
+    assert rotas == []
+
+
+def test_head_sem_corpo_com_o_tamanho_do_get(asgi, rotas):
+    _, cabecalhos_get, corpo = _chamar(asgi, 'GET', '/api/plantas')
+    estado, cabecalhos, corpo_head = _chamar(asgi, 'HEAD', '/api/plantas')
+
+    assert estado == 200
+    assert corpo_head == b''
+    assert cabecalhos['content-length'] == cabecalhos_get['content-length'] == str(len(corpo))
+
+
+def test_replica_escolhida_por_pedido(asgi, rotas, monkeypatch):
+    monkeypatch.setattr(leitura_async, 'roteador', RoteadorFalso())
+
+    _chamar(asgi, 'GET', '/api/plantas')
+    _chamar(asgi, 'GET', '/api/plantas', cabecalhos=[('Cookie', f'{COOKIE_PRIMARIO}=1')])  # Escrita recente
+
+    assert asgi.bd.replicas == ['replica_0', None]
+
+
+def test_sem_replicas_le_do_primario(asgi, rotas):
+    _chamar(asgi, 'GET', '/api/busca')
+    assert asgi.bd.replicas == [None]
+
+
+def test_compressao_e_vary(app, rotas):
+    app.config['COMPRESSAO'] = True
+    asgi = AppLeiturasAsync(app)
+    asgi.bd = BDFalsa()
+
+    estado, cabecalhos, corpo = _chamar(asgi, 'GET', '/api/plantas', cabecalhos=[('Accept-Encoding', 'gzip')])
+    assert estado == 200
+    assert cabecalhos['content-encoding'] == 'gzip'
+    assert cabecalhos['content-length'] == str(len(corpo))
+    assert 'Accept-Encoding' in cabecalhos['vary']
+    assert json.loads(gzip.decompress(corpo))['rota'] == 'listar_plantas'
+
+    _, sem_suporte, corpo = _chamar(asgi, 'GET', '/api/plantas')
+    assert 'content-encoding' not in sem_suporte
+    assert json.loads(corpo)['rota'] == 'listar_plantas'
+
+
+# =====================================================
+# COM O DRIVER (aiosqlite)
+# =====================================================
+
+def test_listar_plantas_igual_a_rota_sincrona(app, client):
+    pytest.importorskip('aiosqlite')
+    for i in range(3):
+        planta = Planta_medicinal(nome_cientifico=f'Acacia assincrona{i} Mill.', familia='Fabaceae')
+        db.session.add(planta)
+        db.session.flush()
+        db.session.add(Nome_comum(nome=f'mufula {i}', id_planta=planta.id_planta))
+    db.session.commit()
+
+    estado, cabecalhos, corpo = _chamar(AppLeiturasAsync(app), 'GET', '/api/plantas', b'per_page=2&page=2')
+
+    assert estado == 200
+    assert 'queries' in cabecalhos['server-timing']
+    dados = json.loads(corpo)
+    assert (dados['total'], dados['pages'], dados['current_page']) == (3, 2, 2)
+    assert dados == client.get('/api/plantas?per_page=2&page=2').get_json()
+
+
+def test_detalhe_e_busca_iguais_as_rotas_sincronas(app, client):
+    pytest.importorskip('aiosqlite')
+    planta = Planta_medicinal(nome_cientifico='Acacia assincrona Mill.', familia='Fabaceae')
+    db.session.add(planta)
+    db.session.commit()
+
+    for caminho, query, url in [
+        (f'/api/plantas/{planta.id_planta}', b'', f'/api/plantas/{planta.id_planta}'),
+        ('/api/busca', b'q=assincrona', '/api/busca?q=assincrona'),
+    ]:
+        estado, _, corpo = _chamar(AppLeiturasAsync(app), 'GET', caminho, query)
+        assert estado == 200, corpo
+        assert json.loads(corpo) == client.get(url).get_json()
+
+    assert _chamar(AppLeiturasAsync(app), 'GET', '/api/plantas/999999')[0] == 404
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""Rotas públicas de leitura dentro de @orcamento_queries (conftest liga SQL_ORCAMENTO_ESTRITO)"""
+import pytest
+
+from models.planta import db, Planta_medicinal, Nome_comum
+from models.referencia import Autor, Afiliacao, Autor_afiliacao
+from utils.sql_instrumentacao import medir_queries
+
+
+def _popular(n, prefixo='a'):
+    """n plantas com dois nomes comuns e n autores com duas afiliações cada"""
+    afiliacoes = [Afiliacao(nome_afiliacao=f'Universidade {prefixo}{k}', sigla_afiliacao=f'U{k}') for k in range(2)]
+    plantas = [Planta_medicinal(nome_cientifico=f'Acacia {prefixo}{i} Mill.', familia='Fabaceae') for i in range(n)]
+    autores = [Autor(nome_autor=f'Autora {prefixo}{i}') for i in range(n)]
+    db.session.add_all([*afiliacoes, *plantas, *autores])
+    db.session.flush()
+    for i, (planta, autor) in enumerate(zip(plantas, autores)):
+        db.session.add_all([
+            Nome_comum(nome=f'mufula {prefixo}{i}', id_planta=planta.id_planta),
+            Nome_comum(nome=f'nhamussoro {prefixo}{i}', id_planta=planta.id_planta),
+            *[Autor_afiliacao(id_autor=autor.id_autor, id_afiliacao=a.id_afiliacao) for a in afiliacoes],
+        ])
+    db.session.commit()
+    return plantas[0].id_planta
+
+
+def _orcamento(app, endpoint):
+    return app.view_functions[endpoint].orcamento_queries
+
+
+def _medir(client, url, orcamento):
+    with medir_queries(orcamento=orcamento) as medicao:
+        resposta = client.get(url)
+    assert resposta.status_code == 200, resposta.get_json()
+    return resposta.get_json(), medicao
+
+
+ROTAS = [
+    ('/api/plantas?per_page=20', 'plantas.get_plantas'),
+    ('/api/busca?q=a', 'busca.busca_global'),
+    ('/api/plantas/{id}', 'plantas.get_planta_detalhes'),
+]
+
+
+@pytest.mark.parametrize('url, endpoint', ROTAS)
+def test_rota_dentro_do_orcamento(app, client, url, endpoint):
+    id_planta = _popular(20)
+    orcamento = _orcamento(app, endpoint)
+
+    _, medicao = _medir(client, url.format(id=id_planta), orcamento)
+    assert medicao.total <= orcamento, medicao.resumo()
+
+
+@pytest.mark.parametrize('url, endpoint', ROTAS[:2])
+def test_queries_nao_crescem_com_os_resultados(app, client, url, endpoint):
+    _popular(2)
+    _medir(client, url, None)  # Aquecer caches (índice de famílias)
+    _, poucos = _medir(client, url, _orcamento(app, endpoint))
+    _popular(18, prefixo='b')
+    _, muitos = _medir(client, url, _orcamento(app, endpoint))
+    assert muitos.total == poucos.total, (poucos.resumo(), muitos.resumo())
+
+
+def test_listagem_e_busca_serializam_as_relacoes(client):
+    _popular(3)
+
+    plantas, _ = _medir(client, '/api/plantas', None)
+    assert all(len(p['nomes_comuns']) == 2 for p in plantas['plantas'])
+
+    busca, _ = _medir(client, '/api/busca?q=Autora&tipo=autores', None)
+    assert len(busca['autores']) == 3
+    assert all(len(a['afiliacoes']) == 2 for a in busca['autores'])
+    assert busca['autores'][0]['sigla_afiliacao'] in ('U0', 'U1')
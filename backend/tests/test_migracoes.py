@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""flask migrar-bd sobre uma base de dados com o esquema anterior"""
+from sqlalchemy import inspect
+
+from models.planta import db
+from utils.migracoes import migrar, planear_migracao
+
+# Imagem como era antes das imagens por conteúdo (URL única, sem metadados)
+IMAGEM_ANTIGA = '''
+CREATE TABLE "Imagem" (
+    id_imagem INTEGER NOT NULL,
+    nome_arquivo VARCHAR(255) NOT NULL,
+    url_armazenamento VARCHAR(255) NOT NULL,
+    legenda VARCHAR(255),
+    referencia_img VARCHAR(255),
+    id_planta INTEGER NOT NULL,
+    PRIMARY KEY (id_imagem),
+    UNIQUE (url_armazenamento),
+    FOREIGN KEY(id_planta) REFERENCES "Planta_medicinal" (id_planta)
+)
+'''
+
+
+def _esquema_antigo(engine):
+    with engine.begin() as conexao:
+        for tabela in ('Planta_taxon', 'Taxon', 'Familia', 'Termo_picker', 'Imagem_variante', 'Imagem',
+                       'Ficheiro_imagem'):
+            conexao.exec_driver_sql(f'DROP TABLE "{tabela}"')
+        conexao.exec_driver_sql(IMAGEM_ANTIGA)
+        for indice in ('ix_Autor_nome_autor', 'ix_Referencia_titulo_referencia', 'ix_Local_colheita_nome_local'):
+            conexao.exec_driver_sql(f'DROP INDEX "{indice}"')
+        conexao.exec_driver_sql(
+            "INSERT INTO Planta_medicinal (id_planta, nome_cientifico, familia) "
+            "VALUES (1, 'Aloe vera (L.) Burm.f.', 'Asphodelaceae')"
+        )
+        conexao.exec_driver_sql(
+            "INSERT INTO Imagem (id_imagem, nome_arquivo, url_armazenamento, id_planta) "
+            "VALUES (1, 'a.jpg', 'plantas/1/a.jpg', 1)"
+        )
+
+
+def test_esquema_atual_nada_a_fazer(app):
+    assert planear_migracao(db.engine) == []
+
+
+def test_migracao_aplica_e_e_idempotente(app):
+    _esquema_antigo(db.engine)
+
+    passos, criadas = migrar(db.engine, aplicar=False)
+    descricoes = [p.descricao for p in passos]
+    assert 'criar tabela Familia' in descricoes
+    assert 'coluna Imagem.lqip' in descricoes
+    assert 'índice ix_Autor_nome_autor' in descricoes
+    assert criadas == []
+    assert 'Familia' not in inspect(db.engine).get_table_names()  # Só reportou
+
+    passos, criadas = migrar(db.engine, aplicar=True)
+    assert not [p for p in passos if p.aviso]
+    assert {'Familia', 'Taxon', 'Planta_taxon', 'Termo_picker', 'Ficheiro_imagem', 'Imagem_variante'} <= set(criadas)
+
+    inspetor = inspect(db.engine)
+    colunas = {c['name'] for c in inspetor.get_columns('Imagem')}
+    assert {'sha256', 'estado', 'erro_processamento', 'largura', 'altura', 'formato',
+            'bytes', 'cor_dominante', 'lqip'} <= colunas
+    assert not inspetor.get_unique_constraints('Imagem')
+    assert 'ix_Local_colheita_nome_local' in {i['name'] for i in inspetor.get_indexes('Local_colheita')}
+
+    with db.engine.connect() as conexao:
+        linha = conexao.exec_driver_sql('SELECT url_armazenamento, estado FROM Imagem').one()
+    assert tuple(linha) == ('plantas/1/a.jpg', 'pronta')
+
+    # Segunda execução: nada a fazer
+    assert planear_migracao(db.engine) == []
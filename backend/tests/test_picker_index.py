@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""Pickers: busca por prefixo de palavras, ordenação e paginação"""
+from models.localizacao import Provincia, Local_colheita
+from models.picker import Termo_picker
+from models.planta import db
+from models.referencia import Autor
+from utils.picker_index import buscar, registos_por_indexar, tokenizar
+
+
+def _autores(*nomes):
+    autores = [Autor(nome_autor=nome) for nome in nomes]
+    db.session.add_all(autores)
+    db.session.commit()
+    return {a.nome_autor: a.id_autor for a in autores}
+
+
+def _nomes(ids, por_nome):
+    por_id = {v: k for k, v in por_nome.items()}
+    return [por_id[i] for i in ids]
+
+
+def test_tokenizar():
+    assert tokenizar('Flor-roxa de São João', 2020, None) == ['flor', 'roxa', 'de', 'sao', 'joao', '2020']
+
+
+def test_label_que_comeca_pelo_texto_primeiro(app):
+    ids = _autores('Silva, Maria', 'Maria Santos', 'Ana Maria', 'Mariana Costa', 'Pedro Amaral')
+
+    total, encontrados = buscar('autor', 'mar')
+    assert total == 4  # 'Amaral' não começa por 'mar'
+    assert _nomes(encontrados, ids) == ['Maria Santos', 'Mariana Costa', 'Ana Maria', 'Silva, Maria']
+
+
+def test_todas_as_palavras_sem_acentos(app):
+    ids = _autores('João Pedro Silva', 'Joana Pedrosa', 'Pedro Joaquim', 'Ana Silva')
+
+    assert _nomes(buscar('autor', 'joao')[1], ids) == ['João Pedro Silva']
+    assert _nomes(buscar('autor', 'PED jo')[1], ids) == ['Joana Pedrosa', 'João Pedro Silva', 'Pedro Joaquim']
+    assert buscar('autor', 'jo xyz') == (0, [])
+
+
+def test_paginacao_e_sem_texto(app):
+    ids = _autores(*[f'Autor {i:02d}' for i in range(25)])
+
+    total, pagina1 = buscar('autor', '', page=1, per_page=10)
+    _, pagina3 = buscar('autor', '', page=3, per_page=10)
+    assert total == 25
+    assert _nomes(pagina1, ids)[:2] == ['Autor 00', 'Autor 01']
+    assert _nomes(pagina3, ids) == [f'Autor {i}' for i in range(20, 25)]
+
+
+def test_carateres_especiais_nao_sao_curingas(app):
+    ids = _autores('100% Silva', '1000 Silva')
+    assert _nomes(buscar('autor', '100%')[1], ids) == ['100% Silva', '1000 Silva']
+
+
+def test_locais_por_provincia(app):
+    norte, sul = Provincia(provincia='Norte'), Provincia(provincia='Sul')
+    db.session.add_all([norte, sul])
+    db.session.flush()
+    db.session.add_all([Local_colheita(nome_local='Vale do Rio', id_provincia=norte.id_provincia),
+                        Local_colheita(nome_local='Rio Seco', id_provincia=sul.id_provincia)])
+    db.session.commit()
+
+    assert buscar('local', 'rio')[0] == 2
+    assert buscar('local', 'rio', provincia_id=sul.id_provincia)[0] == 1
+
+
+def test_rota_e_ids_selecionados(client):
+    ids = _autores('Maria Santos', 'Ana Maria')
+    resposta = client.get('/api/pickers/autores?q=mar&per_page=1')
+    corpo = resposta.get_json()
+    assert resposta.status_code == 200
+    assert corpo['items'] == [{'value': ids['Maria Santos'], 'label': 'Maria Santos', 'secondary': None}]
+    assert corpo['has_more'] is True
+
+    corpo = client.get(f"/api/pickers/autores?ids={ids['Ana Maria']},{ids['Maria Santos']}").get_json()
+    assert [i['label'] for i in corpo['items']] == ['Ana Maria', 'Maria Santos']
+    assert client.get('/api/pickers/outros').status_code == 404
+
+
+def test_registos_sem_palavras_nao_contam_como_divergencia(app):
+    _autores('Maria Santos', '---')
+    assert registos_por_indexar('autor') == 0
+
+    Termo_picker.query.delete()
+    db.session.commit()
+    assert registos_por_indexar('autor') == 1
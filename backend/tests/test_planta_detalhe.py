@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""GET /api/plantas/<id>: relações carregadas por nível (sem N+1), dentro do orçamento"""
+from models.planta import db, Planta_medicinal, Nome_comum, Planta_metodo_trad, Parte_metodo
+from models.localizacao import Provincia, Local_colheita, Planta_local
+from models.uso_medicinal import (
+    Parte_usada, Indicacao, Planta_parte, Parte_indicacao, Metodo_preparacao_trad, Metodo_extraccao_cientif
+)
+from models.referencia import (
+    Autor, Afiliacao, Autor_afiliacao, Referencia, Referencia_autor, Planta_referencia
+)
+from utils.sql_instrumentacao import medir_queries
+
+ORCAMENTO_DETALHE = 22  # O mesmo de @orcamento_queries em routes/plantas.py
+
+
+def _criar_planta(nome, n):
+    """Planta com n nomes, locais, partes (indicações e métodos) e referências (autores com afiliações)"""
+    planta = Planta_medicinal(nome_cientifico=nome, familia='Fabaceae')
+    provincia = Provincia(provincia=f'Prov {nome[:12]}')
+    db.session.add_all([planta, provincia])
+    db.session.flush()
+
+    for i in range(n):
+        local = Local_colheita(nome_local=f'{nome} local {i}', id_provincia=provincia.id_provincia)
+        parte = Parte_usada(nome_parte=f'{nome[:30]} parte {i}')
+        indicacao = Indicacao(descricao_uso=f'{nome} indicação {i}')
+        preparacao = Metodo_preparacao_trad(descricao_metodo_preparacao=f'{nome} infusão {i}')
+        extracao = Metodo_extraccao_cientif(descricao_metodo_extraccao=f'{nome} extração {i}')
+        referencia = Referencia(titulo_referencia=f'{nome} referência {i}')
+        afiliacao = Afiliacao(nome_afiliacao=f'{nome} universidade {i}')
+        autores = [Autor(nome_autor=f'{nome} autor {i}.{k}') for k in range(2)]
+        db.session.add_all([local, parte, indicacao, preparacao, extracao, referencia, afiliacao, *autores])
+        db.session.flush()
+
+        db.session.add_all([
+            Nome_comum(nome=f'{nome} comum {i}', id_planta=planta.id_planta),
+            Planta_local(id_planta=planta.id_planta, id_local=local.id_local),
+            Planta_parte(id_planta=planta.id_planta, id_parte=parte.id_parte),
+            Parte_indicacao(id_parte=parte.id_parte, id_uso=indicacao.id_uso),
+            Planta_referencia(id_planta=planta.id_planta, id_referencia=referencia.id_referencia),
+            *[Referencia_autor(id_referencia=referencia.id_referencia, id_autor=a.id_autor) for a in autores],
+            *[Autor_afiliacao(id_autor=a.id_autor, id_afiliacao=afiliacao.id_afiliacao) for a in autores],
+        ])
+        db.session.execute(Planta_metodo_trad.insert().values(
+            id_parte=parte.id_parte, id_metodo_preparacao=preparacao.id_metodo_preparacao))
+        db.session.execute(Parte_metodo.insert().values(
+            id_parte=parte.id_parte, id_metodo_extraccao=extracao.id_metodo_extraccao))
+    db.session.commit()
+    return planta.id_planta
+
+
+def _detalhe(client, id_planta):
+    with medir_queries(orcamento=ORCAMENTO_DETALHE) as medicao:
+        resposta = client.get(f'/api/plantas/{id_planta}')
+    assert resposta.status_code == 200, resposta.get_json()
+    return resposta.get_json(), medicao
+
+
+def test_detalhe_completo(client):
+    dados, medicao = _detalhe(client, _criar_planta('Acacia completa Mill.', 3))
+
+    assert len(dados['provincias']) == 3
+    assert len(dados['partes_usadas']) == 3
+    parte = dados['partes_usadas'][0]
+    assert len(parte['indicacoes']) == 1
+    assert len(parte['metodos_preparacao']) == 1
+    assert len(parte['metodos_extracao']) == 1
+    assert len(dados['referencias']) == 3
+    assert all(len(r['autores']) == 2 for r in dados['referencias'])
+    assert dados['referencias'][0]['autores'][0]['afiliacoes']
+    assert not medicao.repetidas(3), medicao.resumo()
+
+
+def test_queries_nao_crescem_com_as_relacoes(client):
+    _, pequena = _detalhe(client, _criar_planta('Acacia pequena Mill.', 1))
+    _, grande = _detalhe(client, _criar_planta('Acacia grande Mill.', 5))
+    assert grande.total == pequena.total, (pequena.resumo(), grande.resumo())
+
+
+def test_detalhe_sem_locais(client):
+    planta = Planta_medicinal(nome_cientifico='Acacia isolada Mill.', familia='Fabaceae')
+    db.session.add(planta)
+    db.session.commit()
+
+    dados, _ = _detalhe(client, planta.id_planta)
+    assert dados['provincias'] == []
+    assert dados['autores'] == []
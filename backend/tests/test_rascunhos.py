@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""Armazéns de rascunhos: dono por token/sessão, quota e versões"""
+import pytest
+
+from utils.rascunhos import (
+    ArmazemMemoria, ArmazemRascunhos, ArmazemSQLite, ConflitoVersao, QuotaExcedida, RascunhoDeOutroUtilizador
+)
+
+
+@pytest.fixture(params=['memoria', 'sqlite'])
+def armazem(request, tmp_path):
+    if request.param == 'memoria':
+        return ArmazemMemoria(max_por_utilizador=2)
+    return ArmazemSQLite(str(tmp_path / 'rascunhos.sqlite3'), max_por_utilizador=2)
+
+
+def test_backend_incompleto_nao_instancia():
+    class SemContar(ArmazemRascunhos):
+        _atualizar = ArmazemMemoria._atualizar
+        _ler = ArmazemMemoria._ler
+        _apagar = ArmazemMemoria._apagar
+        limpar_expirados = ArmazemMemoria.limpar_expirados
+
+    with pytest.raises(TypeError):
+        ArmazemRascunhos()
+    with pytest.raises(TypeError, match='contar'):
+        SemContar()
+
+
+def test_token_gerado_na_criacao_e_exigido(armazem):
+    criado = armazem.guardar('r1', None, None, {'nome': 'a'})
+    token = criado['draft_token']
+    assert len(token) >= 32
+
+    with pytest.raises(RascunhoDeOutroUtilizador):
+        armazem.guardar('r1', None, None, {'nome': 'b'})
+    with pytest.raises(RascunhoDeOutroUtilizador):
+        armazem.obter('r1', None, 'outro-token')
+    with pytest.raises(RascunhoDeOutroUtilizador):
+        armazem.apagar('r1')
+
+    atualizado = armazem.aplicar_delta('r1', None, token, 1, [{'op': 'replace', 'path': '/nome', 'value': 'c'}])
+    assert atualizado['version'] == 2
+    assert 'draft_token' not in atualizado
+    assert armazem.obter('r1', None, token)['data'] == {'nome': 'c'}
+    assert armazem.apagar('r1', None, token)
+    assert armazem.obter('r1', None, token) is None
+
+
+def test_utilizador_autenticado_acede_sem_token(armazem):
+    armazem.guardar('r1', '7', None, {})
+    assert armazem.obter('r1', '7')['user_id'] == '7'
+    with pytest.raises(RascunhoDeOutroUtilizador):
+        armazem.obter('r1', '8')
+
+
+def test_quota_so_para_autenticados(armazem):
+    armazem.guardar('a1', '7', None, {})
+    armazem.guardar('a2', '7', None, {})
+    with pytest.raises(QuotaExcedida):
+        armazem.guardar('a3', '7', None, {})
+
+    for i in range(5):  # Anónimos: cada rascunho tem o seu token, sem quota partilhada
+        armazem.guardar(f'anonimo{i}', None, None, {})
+    assert armazem.contar() == 7
+
+
+def test_conflito_de_versao(armazem):
+    token = armazem.guardar('r1', None, None, {})['draft_token']
+    armazem.guardar('r1', None, token, {'x': 1}, versao_base=1)
+    with pytest.raises(ConflitoVersao) as erro:
+        armazem.guardar('r1', None, token, {'x': 2}, versao_base=1)
+    assert erro.value.versao_atual == 2
+
+
+def test_rotas_exigem_token(client):
+    resposta = client.post('/api/wizard/draft/save', json={'form_data': {'nome': 'a'}, 'user_id': 'x'})
+    assert resposta.status_code == 200
+    corpo = resposta.get_json()
+    draft_id, token = corpo['draft_id'], corpo['draft_token']
+
+    # X-User-Id/user_id já não identificam o dono
+    assert client.get(f'/api/wizard/draft/{draft_id}', headers={'X-User-Id': 'x'}).status_code == 403
+    assert client.delete(f'/api/wizard/draft/{draft_id}').status_code == 403
+
+    resposta = client.get(f'/api/wizard/draft/{draft_id}', headers={'X-Draft-Token': token})
+    assert resposta.status_code == 200
+    assert resposta.get_json()['data'] == {'nome': 'a'}
+    assert client.delete(f'/api/wizard/draft/{draft_id}', headers={'X-Draft-Token': token}).status_code == 200
+
+
+def test_sqlite_nova_ligacao_depois_do_fork(tmp_path, monkeypatch):
+    armazem = ArmazemSQLite(str(tmp_path / 'rascunhos.sqlite3'))
+    armazem.guardar('r1', None, 'tok', {'a': 1})
+    herdada = armazem._conexao()
+    assert armazem._conexao() is herdada
+
+    # Filho do fork (preload do gunicorn): não reutiliza a ligação do master
+    monkeypatch.setattr('utils.rascunhos.os.getpid', lambda: -1)
+    assert armazem._conexao() is not herdada
+    assert armazem.obter('r1', token='tok')['data'] == {'a': 1}
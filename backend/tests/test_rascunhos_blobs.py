@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""Blobs dos rascunhos: base64 estrito e recolha dos blobs sem rascunho vivo"""
+import base64
+import os
+import time
+
+import pytest
+
+from utils.rascunhos_blobs import ArmazemBlobs, BlobInvalido
+
+PNG = b'\x89PNG\r\n\x1a\n' + bytes(range(256)) * 2
+
+
+@pytest.fixture
+def blobs(tmp_path):
+    return ArmazemBlobs(str(tmp_path / 'blobs'), ttl_segundos=3600)
+
+
+def _envelhecer(blobs, blob_hash):
+    antigo = time.time() - blobs.ttl_segundos - 60
+    os.utime(blobs.caminho(blob_hash), (antigo, antigo))
+
+
+def test_base64_valido_com_prefixo_e_quebras(blobs):
+    codificado = base64.b64encode(PNG).decode()
+    blob_hash, tamanho = blobs.guardar_base64('data:image/png;base64,' + codificado[:40] + '\n' + codificado[40:])
+    assert tamanho == len(PNG)
+    assert blobs.ler(blob_hash) == PNG
+
+
+@pytest.mark.parametrize('texto', ['AAAA!!!!', 'AAA', 'data:image/png;base64,AA*A', 'ção=', 123, None])
+def test_base64_invalido_recusado(blobs, texto):
+    with pytest.raises(BlobInvalido):
+        blobs.guardar_base64(texto)
+
+
+def test_gravacao_toca_blobs_referenciados(blobs):
+    referenciado = blobs.guardar(PNG)
+    abandonado = blobs.guardar(PNG[::-1])
+    _envelhecer(blobs, referenciado)
+    _envelhecer(blobs, abandonado)
+
+    rascunho = {'nome': 'x', 'imagens': [{'blob_hash': referenciado, 'legenda': 'a'}]}
+    assert blobs.tocar_referenciados(rascunho) == 1
+
+    assert blobs.limpar_antigos() == 1
+    assert blobs.existe(referenciado)
+    assert not blobs.existe(abandonado)
+
+
+def test_autosave_por_delta_mantem_imagens(client, app):
+    from utils.rascunhos import obter_blobs
+
+    codificado = base64.b64encode(PNG).decode()
+    resposta = client.post('/api/wizard/draft/save', json={
+        'form_data': {'nome': 'a', 'imagens': [{'file_data': 'data:image/png;base64,' + codificado}]}
+    })
+    assert resposta.status_code == 200
+    corpo = resposta.get_json()
+    blob_hash = client.get(f"/api/wizard/draft/{corpo['draft_id']}",
+                           headers={'X-Draft-Token': corpo['draft_token']}).get_json()['data']['imagens'][0]['blob_hash']
+
+    blobs = obter_blobs()
+    _envelhecer(blobs, blob_hash)
+    resposta = client.patch(f"/api/wizard/draft/{corpo['draft_id']}", headers={'X-Draft-Token': corpo['draft_token']},
+                            json={'version': 1, 'patch': [{'op': 'replace', 'path': '/nome', 'value': 'b'}]})
+    assert resposta.status_code == 200
+
+    assert blobs.limpar_antigos() == 0
+    assert blobs.existe(blob_hash)
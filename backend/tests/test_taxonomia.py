@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""Taxonomia: interpretação dos nomes científicos e verificação do índice"""
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import Select
+from sqlalchemy.dialects import mysql
+
+from models.planta import db, Planta_medicinal
+from models.taxonomia import Planta_taxon, Taxon
+from utils import taxonomia
+from utils.taxonomia import parsear_nome_cientifico, plantas_por_indexar
+
+
+@pytest.mark.parametrize('nome, esperado', [
+    ('Aloe vera (L.) Burm.f.', {'genero': 'Aloe', 'especie': 'vera'}),
+    ('Solanum nigrum var. americanum', {'genero': 'Solanum', 'especie': 'nigrum',
+                                        'rank_infra': 'var.', 'epiteto_infra': 'americanum'}),
+    ('Acacia karroo subsp Hayne', {'rank_infra': 'subsp.', 'epiteto_infra': 'hayne'}),
+    ('Mentha × piperita L.', {'genero': 'Mentha', 'especie': 'piperita', 'hibrido': True}),
+    ('Mentha ×piperita', {'especie': 'piperita', 'hibrido': True}),
+    ('× Citrofortunella microcarpa', {'genero': 'Citrofortunella', 'especie': 'microcarpa', 'hibrido': True}),
+    ('Aloe sp.', {'genero': 'Aloe', 'especie': None}),
+    ('Ficus cf. sycomorus', {'genero': 'Ficus', 'especie': 'sycomorus'}),
+    ('Rosa cv. Peace', {'especie': None, 'rank_infra': 'cv.', 'epiteto_infra': 'Peace'}),
+    ("Camellia sinensis 'Yabu kita'", {'especie': 'sinensis', 'rank_infra': 'cv.', 'epiteto_infra': 'Yabu kita'}),
+    ('ALOE Vera', {'genero': 'Aloe', 'especie': None}),
+])
+def test_parsear_nome_cientifico(nome, esperado):
+    partes = parsear_nome_cientifico(nome)
+    assert {k: partes[k] for k in esperado} == esperado
+
+
+@pytest.mark.parametrize('nome', [None, '', '   ', '123 abc', '(L.) Burm.f.', '×'])
+def test_parsear_nome_nao_interpretavel(nome):
+    assert parsear_nome_cientifico(nome)['genero'] is None
+
+
+def test_nomes_nao_interpretaveis_nao_contam_como_divergencia(app):
+    db.session.add_all([
+        Planta_medicinal(nome_cientifico='Aloe vera', familia='Asphodelaceae'),
+        Planta_medicinal(nome_cientifico='123 desconhecida', familia='Asphodelaceae'),
+    ])
+    db.session.commit()
+    assert Planta_taxon.query.count() == 1
+    assert plantas_por_indexar() == 0
+
+
+def test_verificar_taxonomia_nao_reconstroi(app, monkeypatch):
+    db.session.add(Planta_medicinal(nome_cientifico='Aloe vera', familia='Asphodelaceae'))
+    db.session.commit()
+    Planta_taxon.query.delete()
+    db.session.commit()
+
+    monkeypatch.setattr(taxonomia, '_verificado', False)
+    taxonomia.verificar_taxonomia()
+    assert plantas_por_indexar() == 1
+    assert Planta_taxon.query.count() == 0  # Só reportou
+
+
+class ConexaoComCorrida:
+    """Outra transação cria o nó logo depois do primeiro SELECT (que não o encontrou)"""
+
+    def __init__(self, conexao, criar):
+        self.conexao = conexao
+        self.dialect = conexao.dialect
+        self.criar = criar
+
+    def execute(self, instrucao):
+        resultado = self.conexao.execute(instrucao)
+        if self.criar and isinstance(instrucao, Select):
+            valor = resultado.scalar()
+            criar, self.criar = self.criar, None
+            with db.engine.begin() as outra:
+                outra.execute(Taxon.__table__.insert().values(**criar))
+            return SimpleNamespace(scalar=lambda: valor)
+        return resultado
+
+
+def test_no_criado_em_simultaneo_nao_viola_unique(app):
+    nos = [('familia', 'Asphodelaceae', 'asphodelaceae'), ('genero', 'Aloe', 'asphodelaceae|aloe')]
+    concorrente = {'nivel': 'familia', 'nome': 'Asphodelaceae', 'nome_normalizado': 'asphodelaceae',
+                   'chave': 'asphodelaceae', 'total_plantas': 0}
+
+    with db.engine.begin() as conexao:
+        ids = taxonomia._garantir_caminho(ConexaoComCorrida(conexao, concorrente), nos, {})
+
+    familia = db.session.query(Taxon).filter_by(chave='asphodelaceae').one()
+    genero = db.session.query(Taxon).filter_by(chave='asphodelaceae|aloe').one()
+    assert ids == [familia.id_taxon, genero.id_taxon]
+    assert genero.id_pai == familia.id_taxon
+
+
+def test_insercao_de_no_em_mysql():
+    capturadas = []
+
+    class Conexao:
+        dialect = mysql.dialect()
+
+        def execute(self, instrucao):
+            capturadas.append(str(instrucao.compile(dialect=self.dialect)))
+            return SimpleNamespace(rowcount=1, inserted_primary_key=(7,))
+
+    assert taxonomia._inserir_se_nao_existe(Conexao(), {'nivel': 'familia', 'nome': 'Fabaceae', 'chave': 'fabaceae'}) == 7
+    assert 'ON DUPLICATE KEY UPDATE' in capturadas[0]
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""Receção de JSON com imagens base64 em streaming"""
+import base64
+import hashlib
+import io
+import json
+import os
+
+import pytest
+
+from utils import uploads_streaming
+from utils.imagens_fila import FilaImagens, UploadRejeitado
+from utils.uploads_streaming import DecodificadorBase64, ler_json
+
+PNG = b'\x89PNG\r\n\x1a\n' + bytes(range(256)) * 4
+B64 = base64.b64encode(PNG).decode()
+
+
+@pytest.fixture
+def fila(tmp_path):
+    return FilaImagens(pasta_staging=str(tmp_path / 'staging'))
+
+
+def _ler(fila, corpo, campos=('image_base64',), max_esqueleto=4096):
+    if isinstance(corpo, (dict, list)):
+        corpo = json.dumps(corpo)
+    return ler_json(fila, campos, io.BytesIO(corpo.encode()), max_esqueleto)
+
+
+@pytest.mark.parametrize('texto', [B64, 'data:image/png;base64,' + B64, B64[:50] + '\n  ' + B64[50:]])
+@pytest.mark.parametrize('bloco', [1, 3, 7, 4096])
+def test_decodificador_por_blocos(texto, bloco):
+    destino = io.BytesIO()
+    decodificador = DecodificadorBase64(destino)
+    dados = texto.encode()
+    for i in range(0, len(dados), bloco):
+        decodificador.alimentar(dados[i:i + bloco])
+    decodificador.terminar()
+    assert destino.getvalue() == PNG
+
+
+def test_decodificador_sem_padding():
+    destino = io.BytesIO()
+    decodificador = DecodificadorBase64(destino)
+    decodificador.alimentar(base64.b64encode(b'ab').rstrip(b'='))
+    decodificador.terminar()
+    assert destino.getvalue() == b'ab'
+
+
+def test_decodificador_recusa_caracteres_invalidos():
+    decodificador = DecodificadorBase64(io.BytesIO())
+    with pytest.raises(UploadRejeitado):
+        decodificador.alimentar(b'AAAA*AAA')
+        decodificador.terminar()
+
+
+@pytest.mark.parametrize('bloco', [5, 64 * 1024])
+def test_ler_json_imagem_aninhada(fila, monkeypatch, bloco):
+    monkeypatch.setattr(uploads_streaming, 'TAMANHO_BLOCO', bloco)
+    escapado = B64.replace('/', '\\/')  # Encoders que escapam a barra
+    corpo = '{"legenda": "a \\"b\\"", "imagens": [{"image_base64": "%s", "ordem": 1}]}' % escapado
+
+    dados = _ler(fila, corpo)
+    upload = dados['imagens'][0]['image_base64']
+    assert upload.sha256 == hashlib.sha256(PNG).hexdigest()
+    assert upload.extensao == 'png'
+    assert dados['legenda'] == 'a "b"'
+    assert dados['imagens'][0]['ordem'] == 1
+
+
+def test_ler_json_vazio_e_invalido(fila):
+    dados = _ler(fila, {'a': {'image_base64': ''}, 'b': {'image_base64': 'AA!A'}, 'c': {'image_base64': None}})
+    assert dados['a']['image_base64'] is None
+    assert isinstance(dados['b']['image_base64'], UploadRejeitado)
+    assert dados['c']['image_base64'] is None
+
+
+@pytest.mark.parametrize('valor', ['"\\u00000"', '"\\u000099"', '"\\u0000x"', '"\\u0000"', '5', '{"x": 1}'])
+def test_marcador_forjado_recusado(fila, valor):
+    # Chave com escape: não é reconhecida no streaming, mas o json.loads decodifica-a
+    dados = _ler(fila, '{"x": {"image_base64": "%s"}, "image_\\u0062ase64": %s}' % (B64, valor))
+    assert isinstance(dados['image_base64'], UploadRejeitado)
+    assert dados['x']['image_base64'].sha256 == hashlib.sha256(PNG).hexdigest()
+
+
+def test_ler_json_limites(fila):
+    with pytest.raises(UploadRejeitado) as erro:
+        _ler(fila, {'texto': 'x' * 5000})
+    assert erro.value.status == 413
+    with pytest.raises(UploadRejeitado):
+        _ler(fila, '{"image_base64": "AAAA')
+    with pytest.raises(UploadRejeitado):
+        _ler(fila, '{"a": }')
+
+
+def _staging(fila):
+    return os.listdir(fila.pasta_staging) if os.path.isdir(fila.pasta_staging) else []
+
+
+def test_ler_json_falhado_nao_deixa_staging(fila):
+    with pytest.raises(UploadRejeitado):
+        _ler(fila, '{"x": {"image_base64": "%s"}, "a": }' % B64)
+    assert _staging(fila) == []
+
+
+def test_chave_repetida_descarta_o_upload_perdido(fila):
+    dados = _ler(fila, '{"image_base64": "%s", "image_base64": "%s"}' % (B64, B64))
+    assert _staging(fila) == [os.path.basename(dados['image_base64'].caminho)]
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""Submissão do wizard: número de queries constante (inserts em lote, validação por IN)"""
+import pytest
+
+from models.planta import db, Planta_medicinal, Nome_comum
+from models.localizacao import Provincia, Local_colheita, Planta_local
+from models.uso_medicinal import Parte_usada, Indicacao, Planta_parte, Parte_indicacao
+from models.referencia import Autor, Referencia, Referencia_autor, Planta_referencia
+from utils.sql_instrumentacao import medir_queries
+
+# Queries de uma submissão (independente do nº de nomes, locais, partes, indicações e referências)
+ORCAMENTO_SUBMIT = 25
+
+
+@pytest.fixture
+def auxiliares(app):
+    provincia = Provincia(provincia='Maputo')
+    db.session.add(provincia)
+    db.session.flush()
+    locais = [Local_colheita(nome_local=f'Local {i}', id_provincia=provincia.id_provincia) for i in range(4)]
+    partes = [Parte_usada(nome_parte=f'Parte {i}') for i in range(4)]
+    indicacoes = [Indicacao(descricao_uso=f'Indicação {i}') for i in range(8)]
+    autores = [Autor(nome_autor=f'Autor {i}') for i in range(6)]
+    referencias = [Referencia(titulo_referencia=f'Referência {i}') for i in range(5)]
+    db.session.add_all(locais + partes + indicacoes + autores + referencias)
+    db.session.flush()
+    # Cada referência com dois autores (autores partilhados entre referências)
+    db.session.add_all(
+        Referencia_autor(id_referencia=r.id_referencia, id_autor=autores[(i + k) % len(autores)].id_autor)
+        for i, r in enumerate(referencias) for k in (0, 1)
+    )
+    db.session.commit()
+    return {
+        'locais': [l.id_local for l in locais],
+        'partes': [p.id_parte for p in partes],
+        'indicacoes': [i.id_uso for i in indicacoes],
+        'referencias': [r.id_referencia for r in referencias],
+    }
+
+
+def _corpo(nome, ids, n):
+    return {
+        'nome_cientifico': nome,
+        'familia': 'Fabaceae',
+        'nomes_comuns': [f'{nome} comum {i}' for i in range(n)],
+        'locais': ids['locais'][:n],
+        'partes_usadas': [{'id_parte': p, 'indicacoes': ids['indicacoes'][:2 * n]} for p in ids['partes'][:n]],
+        'referencias': ids['referencias'][:n],
+    }
+
+
+def _submeter(client, corpo):
+    with medir_queries(orcamento=ORCAMENTO_SUBMIT) as medicao:
+        resposta = client.post('/api/wizard/plantas', json=corpo)
+    assert resposta.status_code == 201, resposta.get_json()
+    return resposta.get_json(), medicao
+
+
+def test_submit_com_varios_autores_referencias_e_usos(client, auxiliares):
+    resultado, medicao = _submeter(client, _corpo('Acacia grande Mill.', auxiliares, 4))
+
+    assert resultado['total_referencias'] == 4
+    assert resultado['total_partes'] == 4
+    assert not resultado['ids_ignorados']
+    assert not medicao.repetidas(5), medicao.resumo()  # Sem N+1
+
+    id_planta = resultado['id_planta']
+    assert Nome_comum.query.filter_by(id_planta=id_planta).count() == 4
+    assert Planta_local.query.filter_by(id_planta=id_planta).count() == 4
+    assert Planta_parte.query.filter_by(id_planta=id_planta).count() == 4
+    assert Planta_referencia.query.filter_by(id_planta=id_planta).count() == 4
+    assert Parte_indicacao.query.count() == 4 * 8
+
+
+def test_queries_nao_crescem_com_o_tamanho(client, auxiliares):
+    # A primeira planta da família/género cria também as linhas Familia e Taxon
+    _submeter(client, _corpo('Acacia inicial Mill.', auxiliares, 0))
+
+    _, pequena = _submeter(client, _corpo('Acacia pequena Mill.', auxiliares, 1))
+    _, grande = _submeter(client, _corpo('Acacia grande Mill.', auxiliares, 4))
+    assert grande.total == pequena.total, (pequena.resumo(), grande.resumo())
+
+
+def test_ids_invalidos_sao_ignorados(client, auxiliares):
+    corpo = _corpo('Acacia ignorada Mill.', auxiliares, 2)
+    corpo['referencias'].append(999999)
+    corpo['locais'].append(888888)
+    resultado, _ = _submeter(client, corpo)
+    assert resultado['ids_ignorados'] == {'referencias': [999999], 'locais': [888888]}
+    assert Planta_medicinal.query.count() == 1
@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Armazenamento de Ficheiros de Imagem
+Todas as leituras, escritas, remoções e listagens de imagens passam por
+aqui, por chave relativa ('ab/<sha256>.jpg', '12/foto.jpg'); nenhuma rota
+monta caminhos no disco
+- 'local' (IMAGE_STORAGE_BACKEND): uma pasta por raiz; as chaves de
+  conteúdo já começam pelo prefixo do hash (<ab>/), por isso nenhuma pasta
+  chega a ter milhões de entradas
+- 's3': bucket S3 ou compatível (MinIO, Ceph, ...) com boto3 (opcional);
+  IMAGE_S3_ENDPOINT_URL aponta para o serviço local em desenvolvimento.
+  Vários servidores da API partilham assim o mesmo armazenamento
+
+Leituras e escritas são feitas aos blocos (upload_fileobj em multipart,
+corpo do get_object lido em streaming). Os objetos são picklable: seguem
+com os trabalhos para os processos da fila
+"""
+import mimetypes
+import os
+import shutil
+import tempfile
+from collections import namedtuple
+from contextlib import contextmanager
+
+from werkzeug.security import safe_join
+
+TAMANHO_BLOCO = 1024 * 1024
+
+BACKENDS = ('local', 's3')
+
+# Raízes (também os nomes das localizações internas no modo x-accel)
+RAIZ_CONTEUDO = 'imagens'
+RAIZ_ANTIGAS = 'plantas_imagens'
+
+
+class InfoFicheiro(namedtuple('InfoFicheiro', 'nome tamanho modificado etag')):
+    """Nome (último segmento da chave), bytes, mtime em segundos e ETag do backend (ou None)"""
+
+
+def _tipo_mime(chave):
+    return mimetypes.guess_type(chave)[0] or 'application/octet-stream'
+
+
+# =====================================================
+# LOCAL
+# =====================================================
+
+class ArmazenamentoLocal:
+    """Ficheiros numa pasta; escrita atómica (temporário + os.replace)"""
+
+    local = True
+
+    def __init__(self, pasta):
+        self.pasta = pasta
+
+    def caminho_local(self, chave):
+        """Caminho no disco (None se a chave sair da pasta)"""
+        return safe_join(self.pasta, chave)
+
+    def _caminho(self, chave):
+        caminho = self.caminho_local(chave)
+        if caminho is None:
+            raise ValueError(f'Chave inválida: {chave}')
+        return caminho
+
+    def info(self, chave):
+        caminho = self.caminho_local(chave)
+        try:
+            estado = os.stat(caminho) if caminho else None
+        except FileNotFoundError:
+            return None
+        if estado is None or not os.path.isfile(caminho):
+            return None
+        return InfoFicheiro(os.path.basename(caminho), estado.st_size, estado.st_mtime, None)
+
+    def existe(self, chave):
+        return self.info(chave) is not None
+
+    def abrir(self, chave):
+        """Ficheiro binário para leitura (FileNotFoundError se não existir)"""
+        return open(self._caminho(chave), 'rb')
+
+    def _temporario(self, destino):
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        fd, temporario = tempfile.mkstemp(dir=os.path.dirname(destino), prefix='.tmp-')
+        return os.fdopen(fd, 'wb'), temporario
+
+    def guardar(self, chave, origem):
+        """Gravar a partir de um objeto com read() (nunca se vê meio ficheiro)"""
+        destino = self._caminho(chave)
+        f, temporario = self._temporario(destino)
+        try:
+            with f:
+                shutil.copyfileobj(origem, f, TAMANHO_BLOCO)
+            os.replace(temporario, destino)
+        except Exception:
+            if os.path.exists(temporario):
+                os.remove(temporario)
+            raise
+
+    def guardar_ficheiro(self, chave, caminho, mover=False):
+        """Gravar um ficheiro local; com mover=True usa rename quando possível"""
+        destino = self._caminho(chave)
+        if mover:
+            os.makedirs(os.path.dirname(destino), exist_ok=True)
+            try:
+                os.replace(caminho, destino)
+                return
+            except OSError:
+                pass  # Discos diferentes: copiar
+        with open(caminho, 'rb') as origem:
+            self.guardar(chave, origem)
+        if mover:
+            os.remove(caminho)
+
+    def apagar(self, chave):
+        try:
+            os.remove(self._caminho(chave))
+        except FileNotFoundError:
+            pass
+
+    def listar(self, prefixo):
+        """InfoFicheiro de cada ficheiro diretamente em <prefixo>/ (temporários incluídos)"""
+        try:
+            with os.scandir(self._caminho(prefixo)) as entradas:
+                for entrada in entradas:
+                    if entrada.is_file(follow_symlinks=False):
+                        estado = entrada.stat()
+                        yield InfoFicheiro(entrada.name, estado.st_size, estado.st_mtime, None)
+        except FileNotFoundError:
+            return
+
+    def listar_pastas(self, prefixo=''):
+        """Nomes das subpastas de <prefixo>/"""
+        pasta = self._caminho(prefixo) if prefixo else self.pasta
+        try:
+            with os.scandir(pasta) as entradas:
+                return [e.name for e in entradas if e.is_dir(follow_symlinks=False)]
+        except FileNotFoundError:
+            return []
+
+    def remover_pasta_vazia(self, prefixo):
+        try:
+            os.rmdir(self._caminho(prefixo))
+        except OSError:
+            pass  # Não existe ou não está vazia
+
+    @contextmanager
+    def copia_local(self, chave):
+        """Caminho de um ficheiro legível no disco (aqui, o próprio ficheiro)"""
+        caminho = self._caminho(chave)
+        if not os.path.isfile(caminho):
+            raise FileNotFoundError(chave)
+        yield caminho
+
+    def url_temporario(self, chave, expira):
+        return None
+
+
+# =====================================================
+# S3
+# =====================================================
+
+class ArmazenamentoS3:
+    """Objetos em <bucket>/<prefixo><chave>; o cliente boto3 é criado por processo"""
+
+    local = False
+
+    def __init__(self, bucket, prefixo='', endpoint_url=None, regiao=None):
+        self.bucket = bucket
+        self.prefixo = prefixo.strip('/') + '/' if prefixo.strip('/') else ''
+        self.endpoint_url = endpoint_url or None
+        self.regiao = regiao or None
+        self._cliente = None
+
+    def __getstate__(self):
+        # O cliente não é picklable nem pode ser partilhado entre processos
+        return {**self.__dict__, '_cliente': None}
+
+    @property
+    def cliente(self):
+        if self._cliente is None:
+            try:
+                import boto3
+            except ImportError:
+                raise RuntimeError("IMAGE_STORAGE_BACKEND='s3' requer o pacote boto3")
+            # Credenciais pela cadeia normal do boto3 (variáveis AWS_*, perfil, IAM)
+            self._cliente = boto3.client('s3', endpoint_url=self.endpoint_url, region_name=self.regiao)
+        return self._cliente
+
+    def _chave(self, chave):
+        return self.prefixo + chave.lstrip('/')
+
+    @staticmethod
+    def _nao_encontrado(erro):
+        return erro.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound')
+
+    def info(self, chave):
+        from botocore.exceptions import ClientError
+        try:
+            objeto = self.cliente.head_object(Bucket=self.bucket, Key=self._chave(chave))
+        except ClientError as e:
+            if self._nao_encontrado(e):
+                return None
+            raise
+        return InfoFicheiro(chave.rsplit('/', 1)[-1], objeto['ContentLength'],
+                            objeto['LastModified'].timestamp(), objeto.get('ETag', '').strip('"') or None)
+
+    def existe(self, chave):
+        return self.info(chave) is not None
+
+    def abrir(self, chave):
+        """Corpo do objeto em streaming (read(n)/close(); FileNotFoundError se não existir)"""
+        from botocore.exceptions import ClientError
+        try:
+            return self.cliente.get_object(Bucket=self.bucket, Key=self._chave(chave))['Body']
+        except ClientError as e:
+            if self._nao_encontrado(e):
+                raise FileNotFoundError(chave)
+            raise
+
+    def guardar(self, chave, origem):
+        """Upload em streaming (multipart acima de 8MB); o objeto só aparece completo"""
+        self.cliente.upload_fileobj(origem, self.bucket, self._chave(chave),
+                                    ExtraArgs={'ContentType': _tipo_mime(chave)})
+
+    def guardar_ficheiro(self, chave, caminho, mover=False):
+        self.cliente.upload_file(caminho, self.bucket, self._chave(chave),
+                                 ExtraArgs={'ContentType': _tipo_mime(chave)})
+        if mover:
+            os.remove(caminho)
+
+    def apagar(self, chave):
+        self.cliente.delete_object(Bucket=self.bucket, Key=self._chave(chave))
+
+    def _paginas(self, prefixo):
+        paginador = self.cliente.get_paginator('list_objects_v2')
+        inicio = self._chave(prefixo.rstrip('/') + '/') if prefixo else self.prefixo
+        return paginador.paginate(Bucket=self.bucket, Prefix=inicio, Delimiter='/')
+
+    def listar(self, prefixo):
+        for pagina in self._paginas(prefixo):
+            for objeto in pagina.get('Contents', ()):
+                yield InfoFicheiro(objeto['Key'].rsplit('/', 1)[-1], objeto['Size'],
+                                   objeto['LastModified'].timestamp(), objeto.get('ETag', '').strip('"') or None)
+
+    def listar_pastas(self, prefixo=''):
+        return [
+            p['Prefix'].rstrip('/').rsplit('/', 1)[-1]
+            for pagina in self._paginas(prefixo) for p in pagina.get('CommonPrefixes', ())
+        ]
+
+    def remover_pasta_vazia(self, prefixo):
+        pass  # Não há pastas no S3
+
+    @contextmanager
+    def copia_local(self, chave):
+        """Descarregar para um temporário (removido à saída) para quem precisa de um caminho"""
+        fd, temporario = tempfile.mkstemp(prefix='.tmp-', suffix=os.path.splitext(chave)[1])
+        try:
+            with os.fdopen(fd, 'wb') as f, self.abrir(chave) as corpo:
+                shutil.copyfileobj(corpo, f, TAMANHO_BLOCO)
+            yield temporario
+        finally:
+            os.remove(temporario)
+
+    def url_temporario(self, chave, expira):
+        """URL assinado para o cliente descarregar diretamente do bucket"""
+        return self.cliente.generate_presigned_url(
+            'get_object', Params={'Bucket': self.bucket, 'Key': self._chave(chave)}, ExpiresIn=expira
+        )
+
+
+# =====================================================
+# CONFIGURAÇÃO
+# =====================================================
+
+# Configurados no arranque (configurar_armazenamento)
+conteudo = None
+antigas = None
+
+
+def criar_armazenamento(config, pasta, raiz):
+    """
+    Backend de uma raiz conforme IMAGE_STORAGE_BACKEND
+
+    Args:
+        pasta: pasta local (backend 'local')
+        raiz: prefixo das chaves no bucket (backend 's3')
+    """
+    backend = config.get('IMAGE_STORAGE_BACKEND', 'local')
+    if backend == 'local':
+        return ArmazenamentoLocal(pasta)
+    if backend == 's3':
+        if not config.get('IMAGE_S3_BUCKET'):
+            raise RuntimeError("IMAGE_STORAGE_BACKEND='s3' requer IMAGE_S3_BUCKET")
+        return ArmazenamentoS3(
+            config['IMAGE_S3_BUCKET'],
+            prefixo=f"{config.get('IMAGE_S3_PREFIX', '').strip('/')}/{raiz}",
+            endpoint_url=config.get('IMAGE_S3_ENDPOINT_URL'),
+            regiao=config.get('IMAGE_S3_REGION')
+        )
+    raise RuntimeError(f'IMAGE_STORAGE_BACKEND desconhecido: {backend} (use {", ".join(BACKENDS)})')
+
+
+def configurar_armazenamento(app):
+    """Criar os armazenamentos de conteúdo e de imagens antigas (chamado no arranque)"""
+    global conteudo, antigas
+    conteudo = criar_armazenamento(app.config, app.config['IMAGE_CONTENT_FOLDER'], RAIZ_CONTEUDO)
+    antigas = criar_armazenamento(app.config, app.config['UPLOAD_FOLDER'], RAIZ_ANTIGAS)
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Base de Dados Assíncrona (leituras públicas servidas por asgi.py)
+- AsyncEngine do SQLAlchemy sobre a mesma BD com um driver assíncrono:
+  mysql+pymysql → mysql+aiomysql, sqlite → sqlite+aiosqlite (ou
+  ASYNC_DATABASE_URL). Os drivers são opcionais: só o modo assíncrono
+  precisa deles
+- Uma AsyncSession por sub-consulta: uma ligação só executa uma query de
+  cada vez, por isso consultas independentes correm em paralelo em
+  ligações diferentes do pool (paralelo())
+- Os models e o código síncrono (to_dict com lazy loads) correm dentro de
+  AsyncSession.run_sync sem bloquear o event loop
+- Réplicas de leitura (SQLALCHEMY_REPLICA_URIS): um AsyncEngine por réplica;
+  dentro de ler_de(nome) as sessões de leitura usam essa réplica
+"""
+import asyncio
+import contextvars
+from contextlib import contextmanager
+
+from sqlalchemy.engine import make_url
+
+from utils.replicas import PREFIXO_BIND
+
+DRIVERS_ASYNC = {'mysql': 'aiomysql', 'sqlite': 'aiosqlite', 'postgresql': 'asyncpg'}
+
+# Opções do pool síncrono que também valem para o assíncrono
+_OPCOES_PARTILHADAS = ('pool_timeout', 'pool_recycle', 'pool_pre_ping', 'isolation_level')
+
+
+def url_async(config, url=None):
+    """
+    URL com driver assíncrono: de `url` (réplica), ou ASYNC_DATABASE_URL, ou
+    derivado de SQLALCHEMY_DATABASE_URI
+    """
+    if url is None and config.get('ASYNC_DATABASE_URL'):
+        return make_url(config['ASYNC_DATABASE_URL'])
+    url = make_url(url or config['SQLALCHEMY_DATABASE_URI'])
+    backend = url.get_backend_name()
+    driver = DRIVERS_ASYNC.get(backend)
+    if driver is None:
+        raise ValueError(f'Sem driver assíncrono conhecido para {backend}: definir ASYNC_DATABASE_URL')
+    return url.set(drivername=f'{backend}+{driver}')
+
+
+def criar_engine_async(config, url=None):
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    url = url_async(config, url)
+    opcoes_sync = config.get('SQLALCHEMY_ENGINE_OPTIONS') or {}
+    opcoes = {k: opcoes_sync[k] for k in _OPCOES_PARTILHADAS if k in opcoes_sync}
+    if not (url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:')):
+        opcoes['pool_size'] = config.get('ASYNC_DB_POOL_SIZE', 20)
+        opcoes['max_overflow'] = config.get('ASYNC_DB_MAX_OVERFLOW', 10)
+    else:
+        opcoes.pop('pool_timeout', None)
+
+    try:
+        return create_async_engine(url, **opcoes)
+    except ModuleNotFoundError as e:
+        driver = url.drivername.split('+')[-1]
+        raise RuntimeError(f'O modo assíncrono requer o driver {driver} (pip install {driver}): {e}')
+
+
+class BDAsync:
+    """AsyncEngine + fábrica de sessões (um por processo, criado no event loop que o usa)"""
+
+    def __init__(self, config):
+        from sqlalchemy.ext.asyncio import async_sessionmaker
+
+        self.engine = criar_engine_async(config)
+        # expire_on_commit=False: objetos continuam legíveis depois do commit sem nova query
+        self._sessoes = async_sessionmaker(self.engine, expire_on_commit=False)
+        self.engines_replicas = {
+            f'{PREFIXO_BIND}{i}': criar_engine_async(config, url)
+            for i, url in enumerate(config.get('SQLALCHEMY_REPLICA_URIS') or [])
+        }
+        self._sessoes_replicas = {
+            nome: async_sessionmaker(engine, expire_on_commit=False) for nome, engine in self.engines_replicas.items()
+        }
+        self._replica = contextvars.ContextVar('replica_async', default=None)
+
+    @contextmanager
+    def ler_de(self, replica):
+        """Sessões de leitura do bloco (e das tarefas que ele cria) na réplica; None: primário"""
+        token = self._replica.set(replica)
+        try:
+            yield
+        finally:
+            self._replica.reset(token)
+
+    def sessao(self, escrita=False):
+        replica = None if escrita else self._replica.get()
+        return (self._sessoes_replicas[replica] if replica else self._sessoes)()
+
+    async def executar(self, consulta):
+        """
+        Args:
+            consulta: async def consulta(sessao) -> resultado
+        """
+        async with self.sessao() as sessao:
+            return await consulta(sessao)
+
+    async def paralelo(self, *consultas):
+        """
+        Executar consultas independentes em paralelo, cada uma na sua sessão
+
+        Returns:
+            list: resultados pela ordem das consultas
+        """
+        return await asyncio.gather(*(self.executar(c) for c in consultas))
+
+    async def fechar(self):
+        await self.engine.dispose()
+        for engine in self.engines_replicas.values():
+            await engine.dispose()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Compressão das Respostas
+- gzip ou brotli negociados pelo Accept-Encoding (com q-values; em empate
+  brotli, se o módulo estiver instalado)
+- Só tipos textuais (JSON, texto, SVG...) a partir de COMPRESSAO_MIN_BYTES:
+  em corpos pequenos os cabeçalhos e o CPU custam mais do que se poupa
+- Ficheiros (send_file), respostas em streaming, parciais e já codificadas
+  passam sem alteração
+- Níveis moderados por omissão (gzip 6, brotli 5): a compressão é feita em
+  cada pedido e os níveis máximos poupam pouco mais a muito mais CPU
+- Um ETag forte passa a fraco na resposta comprimida (outra representação
+  do mesmo conteúdo); If-None-Match usa comparação fraca
+
+Com um proxy que já comprime (nginx gzip on), desligar com COMPRESSAO=0
+"""
+import gzip
+
+from flask import request
+from werkzeug.http import parse_accept_header
+
+try:
+    import brotli
+except ImportError:  # Opcional (pip install brotli): sem ele só gzip
+    brotli = None
+
+TIPOS_COMPRESSIVEIS = ('application/json', 'text/', 'application/javascript', 'application/xml', 'image/svg+xml')
+
+# Respostas sem corpo a comprimir: sem conteúdo, parciais (Range) e não modificadas
+_ESTADOS_IGNORADOS = (204, 206, 304)
+
+
+class Compressor:
+    """Negociação e compressão (partilhado pelo Flask e por asgi.py)"""
+
+    def __init__(self, config):
+        self.minimo = config.get('COMPRESSAO_MIN_BYTES', 1024)
+        self.nivel_gzip = config.get('COMPRESSAO_GZIP_NIVEL', 6)
+        self.qualidade_brotli = config.get('COMPRESSAO_BROTLI_QUALIDADE', 5)
+        self.codificacoes = (('br',) if brotli is not None else ()) + ('gzip',)
+
+    @staticmethod
+    def compressivel(mimetype):
+        return bool(mimetype) and mimetype.startswith(TIPOS_COMPRESSIVEIS)
+
+    def negociar(self, accept_encoding, tamanho):
+        """
+        Returns:
+            str: 'br' ou 'gzip', ou None (corpo pequeno ou cliente sem suporte)
+        """
+        if tamanho < self.minimo or not accept_encoding:
+            return None
+        aceites = parse_accept_header(accept_encoding)
+        candidatas = [c for c in self.codificacoes if aceites.quality(c) > 0]
+        return max(candidatas, key=aceites.quality, default=None)
+
+    def comprimir(self, dados, codificacao):
+        if codificacao == 'br':
+            return brotli.compress(dados, quality=self.qualidade_brotli)
+        return gzip.compress(dados, compresslevel=self.nivel_gzip, mtime=0)
+
+
+def registrar_compressao(app):
+    """Comprimir as respostas do Flask (after_request)"""
+    if not app.config.get('COMPRESSAO', True):
+        return
+    compressor = Compressor(app.config)
+
+    def comprimir_resposta(resposta):
+        if (resposta.direct_passthrough or resposta.is_streamed or resposta.status_code < 200
+                or resposta.status_code in _ESTADOS_IGNORADOS or 'Content-Encoding' in resposta.headers
+                or not compressor.compressivel(resposta.mimetype)):
+            return resposta
+
+        resposta.vary.add('Accept-Encoding')
+        dados = resposta.get_data()
+        codificacao = compressor.negociar(request.headers.get('Accept-Encoding'), len(dados))
+        if codificacao is None:
+            return resposta
+
+        resposta.set_data(compressor.comprimir(dados, codificacao))  # Atualiza Content-Length
+        resposta.headers['Content-Encoding'] = codificacao
+        etag, fraco = resposta.get_etag()
+        if etag and not fraco:
+            resposta.set_etag(etag, weak=True)
+        return resposta
+
+    app.after_request(comprimir_resposta)
@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Estado Partilhado entre Workers
+- Gerações: contadores por nome que as caches do processo (dicionário de
+  famílias, bootstrap do wizard, grafo de citações) incrementam depois de
+  um commit e comparam antes de ler. Um worker que vê a geração mudar sabe
+  que outro worker escreveu e recarrega, sem esperar pelo TTL
+- Jobs: progresso dos jobs em segundo plano, consultável a partir de
+  qualquer worker (o pedido de progresso raramente cai no worker que
+  corre o job)
+
+Backends (STATE_STORE):
+- EstadoMemoria: um único processo (servidor de desenvolvimento, testes)
+- EstadoSQLite: ficheiro SQLite (WAL) partilhado pelos workers da máquina
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+
+
+class EstadoPartilhado(ABC):
+    """
+    Interface comum dos backends
+
+    Jobs são dicts serializáveis em JSON; jobs sem atualização há mais de
+    `ttl_jobs_segundos` são removidos ao gravar um novo
+    """
+
+    def __init__(self, ttl_jobs_segundos=7 * 24 * 3600):
+        self.ttl_jobs_segundos = ttl_jobs_segundos
+
+    @abstractmethod
+    def geracao(self, nome):
+        """Valor atual do contador (0 se nunca incrementado)"""
+
+    @abstractmethod
+    def incrementar(self, nome):
+        """Incrementar de forma atómica; devolve o novo valor"""
+
+    @abstractmethod
+    def gravar_job(self, job_id, dados):
+        """Criar ou substituir o job"""
+
+    @abstractmethod
+    def atualizar_job(self, job_id, campos):
+        """Juntar `campos` ao job existente; devolve o job ou None se não existe"""
+
+    @abstractmethod
+    def obter_job(self, job_id):
+        """Cópia do job ou None"""
+
+
+class EstadoMemoria(EstadoPartilhado):
+    """Estado em memória do processo (não partilhado)"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._lock = threading.Lock()
+        self._geracoes = {}
+        self._jobs = {}  # job_id -> (atualizado, dados)
+
+    def geracao(self, nome):
+        return self._geracoes.get(nome, 0)
+
+    def incrementar(self, nome):
+        with self._lock:
+            valor = self._geracoes.get(nome, 0) + 1
+            self._geracoes[nome] = valor
+            return valor
+
+    def gravar_job(self, job_id, dados):
+        agora = time.time()
+        with self._lock:
+            if self.ttl_jobs_segundos:
+                for antigo in [j for j, (t, _) in self._jobs.items() if agora - t > self.ttl_jobs_segundos]:
+                    del self._jobs[antigo]
+            self._jobs[job_id] = (agora, dict(dados))
+
+    def atualizar_job(self, job_id, campos):
+        with self._lock:
+            registo = self._jobs.get(job_id)
+            if registo is None:
+                return None
+            registo[1].update(campos)
+            self._jobs[job_id] = (time.time(), registo[1])
+            return dict(registo[1])
+
+    def obter_job(self, job_id):
+        with self._lock:
+            registo = self._jobs.get(job_id)
+            return dict(registo[1]) if registo else None
+
+
+class EstadoSQLite(EstadoPartilhado):
+    """
+    Estado num ficheiro SQLite (WAL), partilhado por todos os workers da
+    máquina. A ligação é por thread e por processo: uma ligação aberta
+    antes do fork (preload_app) não é reutilizada pelos filhos
+    """
+
+    def __init__(self, caminho, **kwargs):
+        super().__init__(**kwargs)
+        self.caminho = caminho
+        self._local = threading.local()
+        self._esquema_criado = False
+
+    def _conexao(self):
+        conexao = getattr(self._local, 'conexao', None)
+        if conexao is None or self._local.pid != os.getpid():
+            pasta = os.path.dirname(os.path.abspath(self.caminho))
+            os.makedirs(pasta, exist_ok=True)
+            conexao = sqlite3.connect(self.caminho, timeout=10, isolation_level=None)
+            conexao.execute('PRAGMA journal_mode=WAL')
+            conexao.execute('PRAGMA synchronous=NORMAL')
+            if not self._esquema_criado:
+                conexao.executescript("""
+                    CREATE TABLE IF NOT EXISTS geracoes (
+                        nome TEXT PRIMARY KEY,
+                        valor INTEGER NOT NULL
+                    );
+                    CREATE TABLE IF NOT EXISTS jobs (
+                        job_id TEXT PRIMARY KEY,
+                        dados TEXT NOT NULL,
+                        atualizado REAL NOT NULL
+                    );
+                    CREATE INDEX IF NOT EXISTS ix_jobs_atualizado ON jobs (atualizado);
+                """)
+                self._esquema_criado = True
+            self._local.conexao = conexao
+            self._local.pid = os.getpid()
+        return conexao
+
+    def geracao(self, nome):
+        linha = self._conexao().execute('SELECT valor FROM geracoes WHERE nome = ?', (nome,)).fetchone()
+        return linha[0] if linha else 0
+
+    def incrementar(self, nome):
+        conexao = self._conexao()
+        conexao.execute('BEGIN IMMEDIATE')
+        try:
+            conexao.execute(
+                'INSERT INTO geracoes (nome, valor) VALUES (?, 1) '
+                'ON CONFLICT(nome) DO UPDATE SET valor = valor + 1',
+                (nome,)
+            )
+            (valor,) = conexao.execute('SELECT valor FROM geracoes WHERE nome = ?', (nome,)).fetchone()
+            conexao.execute('COMMIT')
+        except Exception:
+            conexao.execute('ROLLBACK')
+            raise
+        return valor
+
+    def gravar_job(self, job_id, dados):
+        agora = time.time()
+        conexao = self._conexao()
+        if self.ttl_jobs_segundos:
+            conexao.execute('DELETE FROM jobs WHERE atualizado < ?', (agora - self.ttl_jobs_segundos,))
+        conexao.execute(
+            'INSERT OR REPLACE INTO jobs (job_id, dados, atualizado) VALUES (?, ?, ?)',
+            (job_id, json.dumps(dados, ensure_ascii=False), agora)
+        )
+
+    def atualizar_job(self, job_id, campos):
+        conexao = self._conexao()
+        conexao.execute('BEGIN IMMEDIATE')
+        try:
+            linha = conexao.execute('SELECT dados FROM jobs WHERE job_id = ?', (job_id,)).fetchone()
+            if linha is None:
+                conexao.execute('ROLLBACK')
+                return None
+            dados = json.loads(linha[0])
+            dados.update(campos)
+            conexao.execute(
+                'UPDATE jobs SET dados = ?, atualizado = ? WHERE job_id = ?',
+                (json.dumps(dados, ensure_ascii=False), time.time(), job_id)
+            )
+            conexao.execute('COMMIT')
+        except Exception:
+            conexao.execute('ROLLBACK')
+            raise
+        return dados
+
+    def obter_job(self, job_id):
+        linha = self._conexao().execute('SELECT dados FROM jobs WHERE job_id = ?', (job_id,)).fetchone()
+        return json.loads(linha[0]) if linha else None
+
+
+# =====================================================
+# GERAÇÕES DAS CACHES
+# =====================================================
+
+class Geracao:
+    """
+    Geração partilhada vista por uma cache do processo
+
+    Uso:
+        - antes de ler a BD para (re)construir a cache: sincronizar()
+        - antes de servir a cache: se alterada(), reconstruir
+        - depois de aplicar localmente um commit próprio: publicar()
+    """
+
+    def __init__(self, nome):
+        self.nome = nome
+        self.vista = None
+
+    def alterada(self):
+        """Outro processo publicou alterações desde a última sincronização"""
+        return obter_estado().geracao(self.nome) != self.vista
+
+    def sincronizar(self):
+        self.vista = obter_estado().geracao(self.nome)
+
+    def publicar(self):
+        """
+        Avisar os outros processos de uma alteração
+
+        Returns:
+            bool: True se nenhum outro processo publicou entretanto; senão
+            a cache local perdeu alterações e alterada() passa a ser True
+        """
+        nova = obter_estado().incrementar(self.nome)
+        em_dia = self.vista is not None and nova == self.vista + 1
+        self.vista = nova if em_dia else None
+        return em_dia
+
+
+# =====================================================
+# CONFIGURAÇÃO
+# =====================================================
+
+# Memória até configurar_estado: scripts e módulos usados fora da aplicação continuam a funcionar
+_estado = EstadoMemoria()
+
+
+def criar_estado(config):
+    """Instanciar o backend indicado em STATE_STORE ('memoria' ou 'sqlite')"""
+    opcoes = {'ttl_jobs_segundos': config.get('STATE_JOBS_TTL_SEGUNDOS', 7 * 24 * 3600)}
+    tipo = config.get('STATE_STORE', 'sqlite')
+    if tipo == 'memoria':
+        return EstadoMemoria(**opcoes)
+    if tipo == 'sqlite':
+        return EstadoSQLite(config['STATE_SQLITE_PATH'], **opcoes)
+    raise ValueError(f'STATE_STORE desconhecido: {tipo}')
+
+
+def configurar_estado(app):
+    """Criar o backend do estado partilhado a partir da configuração (chamado no arranque)"""
+    global _estado
+    _estado = criar_estado(app.config)
+
+
+def obter_estado():
+    return _estado
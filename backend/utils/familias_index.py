@@ -0,0 +1,454 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Índice de Famílias - dicionário normalizado com contagens mantidas
+- Tabela Familia: uma linha por família normalizada com total_plantas
+- IndiceFamilias: cópia em memória da tabela para listagens, buscas e
+  ordenação sem GROUP BY sobre Planta_medicinal
+- Eventos do ORM em Planta_medicinal ajustam as contagens na MESMA
+  transação da escrita (upsert atómico); o índice em memória é atualizado
+  após o commit
+- Leituras nunca reconstroem a tabela nem contam as plantas: a divergência
+  com as plantas (escritas feitas fora da aplicação) é verificada a pedido
+  (`flask verificar-familias`, periódico, ou GET /familias/stats) e só
+  reportada; a reconstrução é feita pelo admin (POST /familias/sincronizar),
+  por `flask verificar-familias --sincronizar` ou por `flask migrar-bd`
+"""
+import bisect
+import heapq
+import threading
+import time
+import unicodedata
+
+from sqlalchemy import event, func, inspect
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlalchemy.orm import Session, object_session
+
+from models.planta import db, Planta_medicinal
+from models.familia import Familia
+from utils.estado_partilhado import Geracao
+from utils.replicas import ler_do_primario
+
+# Chave usada em session.info para acumular ajustes até ao commit
+_CHAVE_PENDENTES = 'familias_pendentes'
+
+
+def normalizar_familia(nome):
+    """
+    Normalizar nome de família para comparação
+    (sem acentos, minúsculas, espaços colapsados - equivalente ao
+    collation *_ci do MySQL)
+
+    Args:
+        nome (str): Nome da família
+
+    Returns:
+        str: Chave normalizada ('' se vazio)
+    """
+    if not nome:
+        return ''
+    texto = unicodedata.normalize('NFKD', nome)
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return ' '.join(texto.split()).casefold()
+
+
+class IndiceFamilias:
+    """
+    Cópia em memória da tabela Familia
+
+    - _entradas: chave normalizada -> {'nome_familia', 'total_plantas'}
+    - _chaves: chaves ordenadas (busca por prefixo com bisect)
+    - Recarregada da tabela quando outro worker publica uma alteração
+      (geração 'familias' do estado partilhado) ou quando o TTL expira
+      (escritas feitas fora da aplicação)
+    - versao: incrementada a cada alteração (caches derivadas comparam-na)
+    - divergencia: {'soma_familias', 'plantas'} se na última verificação
+      (verificar_divergencia) a soma das contagens não batia com o nº de
+      plantas com família (None se batia ou ainda não foi verificada)
+    """
+
+    def __init__(self, ttl_segundos=60):
+        self.ttl_segundos = ttl_segundos
+        self._lock = threading.RLock()
+        self._entradas = {}
+        self._chaves = []
+        self._por_total = None
+        self._carregado_em = None
+        self._geracao = Geracao('familias')
+        self.versao = 0
+        self.divergencia = None
+
+    # ---------------------------------------------------------------
+    # CARREGAMENTO
+    # ---------------------------------------------------------------
+
+    def carregar(self):
+        """
+        Ler a tabela Familia (só a tabela: a recarga pelo TTL em cada worker
+        não percorre as plantas; ver verificar_divergencia)
+        """
+        # Primário: a geração pode ter mudado por uma escrita que a réplica ainda não tem
+        with self._lock, ler_do_primario(db.session):
+            self._geracao.sincronizar()
+            linhas = db.session.query(
+                Familia.nome_normalizado, Familia.nome_familia, Familia.total_plantas
+            ).filter(Familia.total_plantas > 0).all()
+
+            self._definir({
+                chave: {'nome_familia': nome, 'total_plantas': total}
+                for chave, nome, total in linhas
+            })
+
+    def verificar_divergencia(self):
+        """
+        Comparar a soma das contagens da tabela com o nº de plantas com
+        família (tabela por preencher ou escritas feitas fora da aplicação)
+        Só regista a divergência: não apaga nem reescreve a tabela
+
+        Returns:
+            dict: {'soma_familias', 'plantas'} ou None se batem
+        """
+        with ler_do_primario(db.session):
+            soma = db.session.query(func.coalesce(func.sum(Familia.total_plantas), 0)).filter(
+                Familia.total_plantas > 0
+            ).scalar()
+            total_plantas = db.session.query(func.count(Planta_medicinal.id_planta)).filter(
+                func.trim(Planta_medicinal.familia) != ''
+            ).scalar() or 0
+
+        divergencia = {'soma_familias': soma, 'plantas': total_plantas} if soma != total_plantas else None
+        if divergencia and divergencia != self.divergencia:
+            print(f"⚠️ Dicionário de famílias desatualizado: {soma} plantas contadas, "
+                  f"{total_plantas} com família (sincronizar em POST /familias/sincronizar)")
+        self.divergencia = divergencia
+        return divergencia
+
+    def sincronizar(self):
+        """
+        Reconstruir a tabela Familia a partir de Planta_medicinal
+        (único GROUP BY sobre as plantas; usado pelo admin, pela migração
+        e pelo gerador de dados, nunca numa leitura)
+        """
+        with self._lock:
+            self._geracao.sincronizar()
+            grupos = db.session.query(
+                Planta_medicinal.familia,
+                func.count(Planta_medicinal.id_planta)
+            ).group_by(Planta_medicinal.familia).all()
+
+            entradas = {}
+            for nome, total in grupos:
+                chave = normalizar_familia(nome)
+                if not chave:
+                    continue
+                entrada = entradas.setdefault(chave, {'nome_familia': nome.strip(), 'total_plantas': 0, '_maior': 0})
+                entrada['total_plantas'] += total
+                # Grafia apresentada = a mais usada
+                if total > entrada['_maior']:
+                    entrada['nome_familia'] = nome.strip()
+                    entrada['_maior'] = total
+
+            Familia.query.delete()
+            if entradas:
+                db.session.execute(Familia.__table__.insert(), [
+                    {'nome_familia': e['nome_familia'], 'nome_normalizado': chave, 'total_plantas': e['total_plantas']}
+                    for chave, e in entradas.items()
+                ])
+            db.session.commit()
+            self._geracao.publicar()
+
+            self.divergencia = None
+            self._definir({
+                chave: {'nome_familia': e['nome_familia'], 'total_plantas': e['total_plantas']}
+                for chave, e in entradas.items()
+            })
+            print(f"🌿 Dicionário de famílias sincronizado: {len(entradas)} famílias")
+
+    def _definir(self, entradas):
+        self._entradas = entradas
+        self._chaves = sorted(entradas)
+        self._por_total = None
+        self._carregado_em = time.monotonic()
+        self.versao += 1
+
+    def garantir_atualizado(self):
+        """Carregar na primeira utilização, quando outro worker alterou a tabela ou quando o TTL expirar"""
+        with self._lock:
+            if (self._carregado_em is None or
+                    (self.ttl_segundos and time.monotonic() - self._carregado_em > self.ttl_segundos) or
+                    self._geracao.alterada()):
+                self.carregar()
+
+    def invalidar(self):
+        """Recarregar na próxima leitura, neste e nos outros workers"""
+        with self._lock:
+            self._carregado_em = None
+            self._geracao.publicar()
+
+    def aplicar(self, ajustes):
+        """
+        Aplicar ajustes confirmados por um commit deste processo e avisar
+        os outros workers
+
+        Args:
+            ajustes: lista de (nome_familia, delta)
+        """
+        with self._lock:
+            self._geracao.publicar()
+            if self._carregado_em is None:
+                return
+
+            for nome, delta in ajustes:
+                chave = normalizar_familia(nome)
+                if not chave:
+                    continue
+                entrada = self._entradas.get(chave)
+                if entrada is None:
+                    if delta <= 0:
+                        continue
+                    self._entradas[chave] = {'nome_familia': nome.strip(), 'total_plantas': delta}
+                    bisect.insort(self._chaves, chave)
+                else:
+                    entrada['total_plantas'] += delta
+                    if entrada['total_plantas'] <= 0:
+                        del self._entradas[chave]
+                        self._chaves.pop(bisect.bisect_left(self._chaves, chave))
+            self._por_total = None
+            self.versao += 1
+
+    # ---------------------------------------------------------------
+    # CONSULTAS
+    # ---------------------------------------------------------------
+
+    def _item(self, chave):
+        entrada = self._entradas[chave]
+        return {'nome_familia': entrada['nome_familia'], 'total_plantas': entrada['total_plantas']}
+
+    def __len__(self):
+        return len(self._entradas)
+
+    def obter(self, nome):
+        """Entrada de uma família (qualquer grafia equivalente) ou None"""
+        with self._lock:
+            chave = normalizar_familia(nome)
+            return self._item(chave) if chave in self._entradas else None
+
+    def listar(self, search=None, sort_by='nome_familia', sort_order='asc', offset=0, limit=None):
+        """
+        Listar famílias com filtro por substring, ordenação e paginação
+
+        Returns:
+            tuple: (total, [{'nome_familia', 'total_plantas'}])
+        """
+        with self._lock:
+            if sort_by == 'total_plantas':
+                if self._por_total is None:
+                    self._por_total = sorted(self._chaves, key=lambda c: self._entradas[c]['total_plantas'])
+                chaves = self._por_total
+            else:
+                chaves = self._chaves
+
+            if sort_order == 'desc':
+                chaves = chaves[::-1]
+
+            termo = normalizar_familia(search)
+            if termo:
+                chaves = [c for c in chaves if termo in c]
+
+            total = len(chaves)
+            fim = offset + limit if limit else None
+            return total, [self._item(c) for c in chaves[offset:fim]]
+
+    def buscar_prefixo(self, prefixo, limite=10):
+        """Famílias cujo nome começa por `prefixo` (bisect sobre chaves ordenadas)"""
+        with self._lock:
+            termo = normalizar_familia(prefixo)
+            inicio = bisect.bisect_left(self._chaves, termo)
+            resultado = []
+            for chave in self._chaves[inicio:]:
+                if not chave.startswith(termo) or len(resultado) >= limite:
+                    break
+                resultado.append(self._item(chave))
+            return resultado
+
+    def top(self, limite=10):
+        """Famílias com mais plantas"""
+        with self._lock:
+            melhores = heapq.nlargest(
+                limite, self._chaves, key=lambda c: self._entradas[c]['total_plantas']
+            )
+            return [self._item(c) for c in melhores]
+
+    def estatisticas(self):
+        with self._lock:
+            total_plantas = sum(e['total_plantas'] for e in self._entradas.values())
+            topo = self.top(1)
+            return {
+                'total_familias': len(self._entradas),
+                'total_plantas': total_plantas,
+                'familia_top': topo[0] if topo else None,
+                'divergencia': self.divergencia
+            }
+
+
+# Instância única do processo
+indice_familias = IndiceFamilias()
+
+
+# =====================================================
+# MANUTENÇÃO DAS CONTAGENS (mesma transação da escrita)
+# =====================================================
+
+def _upsert_contagem(connection, nome, chave, delta):
+    """
+    INSERT da família com `delta` plantas ou, se já existe, soma ao total
+    (uma instrução: dois pedidos com a mesma família nova não colidem no UNIQUE)
+    """
+    tabela = Familia.__table__
+    valores = {'nome_familia': nome.strip(), 'nome_normalizado': chave, 'total_plantas': delta}
+    dialeto = connection.dialect.name
+
+    if dialeto == 'mysql':
+        instrucao = mysql.insert(tabela).values(**valores)
+        instrucao = instrucao.on_duplicate_key_update(total_plantas=tabela.c.total_plantas + delta)
+    elif dialeto in ('sqlite', 'postgresql'):
+        modulo = sqlite if dialeto == 'sqlite' else postgresql
+        instrucao = modulo.insert(tabela).values(**valores).on_conflict_do_update(
+            index_elements=[tabela.c.nome_normalizado],
+            set_={'total_plantas': tabela.c.total_plantas + delta}
+        )
+    else:
+        raise NotImplementedError(f'Upsert de famílias não suportado em {dialeto}')
+    connection.execute(instrucao)
+
+
+def ajustar_contagem(connection, nome, delta):
+    """
+    Somar `delta` ao total de plantas de uma família na tabela Familia
+    (cria a linha se não existir; remove quando chega a zero)
+    """
+    chave = normalizar_familia(nome)
+    if not chave or not delta:
+        return
+
+    tabela = Familia.__table__
+    if delta > 0:
+        _upsert_contagem(connection, nome, chave, delta)
+    else:
+        connection.execute(
+            tabela.update()
+            .where(tabela.c.nome_normalizado == chave)
+            .values(total_plantas=tabela.c.total_plantas + delta)
+        )
+        connection.execute(
+            tabela.delete().where(
+                tabela.c.nome_normalizado == chave,
+                tabela.c.total_plantas <= 0
+            )
+        )
+
+
+def _registar_pendente(session, nome, delta):
+    session.info.setdefault(_CHAVE_PENDENTES, []).append((nome, delta))
+
+
+def mover_plantas(session, nome_antigo, nome_novo, total):
+    """
+    Registar a mudança de `total` plantas entre famílias feita com UPDATE em
+    massa (não dispara eventos do ORM). Chamar antes do commit.
+    """
+    if not total:
+        return
+    connection = session.connection()
+    ajustar_contagem(connection, nome_antigo, -total)
+    ajustar_contagem(connection, nome_novo, total)
+
+    if normalizar_familia(nome_antigo) == normalizar_familia(nome_novo):
+        # Só mudou a grafia: atualizar o nome apresentado
+        connection.execute(
+            Familia.__table__.update()
+            .where(Familia.__table__.c.nome_normalizado == normalizar_familia(nome_novo))
+            .values(nome_familia=nome_novo.strip())
+        )
+        session.info['familias_recarregar'] = True
+
+    _registar_pendente(session, nome_antigo, -total)
+    _registar_pendente(session, nome_novo, total)
+
+
+def _apos_inserir(mapper, connection, target):
+    ajustar_contagem(connection, target.familia, 1)
+    session = object_session(target)
+    if session is not None:
+        _registar_pendente(session, target.familia, 1)
+
+
+def _apos_atualizar(mapper, connection, target):
+    historico = inspect(target).attrs.familia.history
+    if not historico.has_changes():
+        return
+    antigo = historico.deleted[0] if historico.deleted else None
+    novo = target.familia
+    if normalizar_familia(antigo) == normalizar_familia(novo):
+        return
+
+    ajustar_contagem(connection, antigo, -1)
+    ajustar_contagem(connection, novo, 1)
+    session = object_session(target)
+    if session is not None:
+        _registar_pendente(session, antigo, -1)
+        _registar_pendente(session, novo, 1)
+
+
+def _apos_apagar(mapper, connection, target):
+    ajustar_contagem(connection, target.familia, -1)
+    session = object_session(target)
+    if session is not None:
+        _registar_pendente(session, target.familia, -1)
+
+
+def _apos_commit(session):
+    ajustes = session.info.pop(_CHAVE_PENDENTES, None)
+    if session.info.pop('familias_recarregar', False):
+        indice_familias.invalidar()
+    elif ajustes:
+        indice_familias.aplicar(ajustes)
+
+
+def _apos_rollback(session):
+    session.info.pop(_CHAVE_PENDENTES, None)
+    session.info.pop('familias_recarregar', None)
+
+
+def registrar_comando_familias(app):
+    """Comando `flask verificar-familias` (para um job periódico)"""
+    import click
+
+    @app.cli.command('verificar-familias')
+    @click.option('--sincronizar', is_flag=True, help='Reconstruir a tabela se houver divergência')
+    def verificar_familias(sincronizar):
+        """Comparar as contagens do dicionário de famílias com as plantas"""
+        divergencia = indice_familias.verificar_divergencia()
+        if divergencia is None:
+            click.echo('✅ Dicionário de famílias atualizado')
+            return
+        if sincronizar:
+            indice_familias.sincronizar()
+            return
+        click.echo(f"⚠️ {divergencia['soma_familias']} plantas contadas, {divergencia['plantas']} com família "
+                   f"(volte a executar com --sincronizar)")
+        raise SystemExit(1)
+
+
+def registrar_eventos_familias(app):
+    """Ligar os eventos do ORM ao dicionário de famílias (chamado no arranque)"""
+    indice_familias.ttl_segundos = app.config.get('FAMILIAS_INDICE_TTL_SEGUNDOS', 60)
+
+    if event.contains(Session, 'after_commit', _apos_commit):
+        return
+
+    event.listen(Planta_medicinal, 'after_insert', _apos_inserir)
+    event.listen(Planta_medicinal, 'after_update', _apos_atualizar)
+    event.listen(Planta_medicinal, 'after_delete', _apos_apagar)
+    event.listen(Session, 'after_commit', _apos_commit)
+    event.listen(Session, 'after_rollback', _apos_rollback)
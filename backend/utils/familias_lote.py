@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Renomeação/Unificação de Famílias em Lote
+- Pré-visualização (dry-run) com UMA query agrupada para todos os nomes
+- Aplicação em blocos de até chunk_size plantas afetadas, paginados por
+  id_planta (keyset: WHERE id > último ORDER BY id LIMIT n, sem percorrer
+  intervalos vazios), com commit por bloco (locks curtos) e progresso
+  consultável enquanto o job corre (no estado partilhado: qualquer worker
+  responde ao pedido de progresso)
+- As contagens do dicionário de famílias vêm das linhas que cada UPDATE
+  alterou (rowcount), não da leitura que escolheu o bloco
+"""
+import math
+import os
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from sqlalchemy import func
+
+from models.planta import db, Planta_medicinal
+from utils.estado_partilhado import obter_estado
+from utils.familias_index import normalizar_familia, mover_plantas
+from utils.taxonomia import reindexar_plantas
+
+CHUNK_PADRAO = 500
+CHUNK_MAXIMO = 5000
+MAX_RENOMEACOES = 1000
+
+
+def normalizar_pedido(renomeacoes):
+    """
+    Validar e normalizar o mapeamento de renomeações
+
+    Args:
+        renomeacoes: lista [{'old_name', 'new_name'}] ou dict {antigo: novo}
+
+    Returns:
+        tuple: (lista [(antigo, novo)], lista de erros)
+    """
+    if isinstance(renomeacoes, dict):
+        pares = list(renomeacoes.items())
+    elif isinstance(renomeacoes, list):
+        pares = [
+            (r.get('old_name'), r.get('new_name')) if isinstance(r, dict) else (None, None)
+            for r in renomeacoes
+        ]
+    else:
+        return [], ['"renomeacoes" deve ser uma lista ou um objeto {antigo: novo}']
+
+    erros = []
+    resultado = []
+    origens = {}
+
+    if not pares:
+        erros.append('Nenhuma renomeação fornecida')
+    if len(pares) > MAX_RENOMEACOES:
+        erros.append(f'Máximo de {MAX_RENOMEACOES} renomeações por pedido')
+
+    for i, (antigo, novo) in enumerate(pares):
+        antigo = (antigo or '').strip() if isinstance(antigo, str) else ''
+        novo = (novo or '').strip() if isinstance(novo, str) else ''
+
+        if not antigo or not novo:
+            erros.append(f'Item {i}: "old_name" e "new_name" são obrigatórios')
+            continue
+        if len(novo) > 100:
+            erros.append(f'Item {i}: novo nome excede 100 caracteres')
+            continue
+        if normalizar_familia(antigo) == normalizar_familia(novo):
+            erros.append(f'Item {i}: "{antigo}" e "{novo}" são o mesmo nome')
+            continue
+
+        chave = normalizar_familia(antigo)
+        if chave in origens:
+            erros.append(f'Item {i}: "{antigo}" aparece mais de uma vez como origem')
+            continue
+        origens[chave] = novo
+        resultado.append((antigo, novo))
+
+    # Cadeias (A→B e B→C) dependem da ordem de aplicação: recusar
+    for antigo, novo in resultado:
+        if normalizar_familia(novo) in origens:
+            erros.append(f'"{novo}" é destino e também origem de outra renomeação (cadeia não suportada)')
+
+    return resultado, erros
+
+
+def pre_visualizar(pares):
+    """
+    Contagens afetadas por cada renomeação numa única query agrupada
+
+    Returns:
+        dict: relatório com operação (rename/merge) e totais por par
+    """
+    nomes = {n for par in pares for n in par}
+    contagens = {}
+    for familia, total in db.session.query(
+        Planta_medicinal.familia, func.count(Planta_medicinal.id_planta)
+    ).filter(
+        Planta_medicinal.familia.in_(nomes)
+    ).group_by(Planta_medicinal.familia).all():
+        chave = normalizar_familia(familia)
+        contagens[chave] = contagens.get(chave, 0) + total
+
+    itens = []
+    for antigo, novo in pares:
+        afetadas = contagens.get(normalizar_familia(antigo), 0)
+        existentes = contagens.get(normalizar_familia(novo), 0)
+        itens.append({
+            'old_name': antigo,
+            'new_name': novo,
+            'operation': 'merge' if existentes else 'rename',
+            'plantas_afetadas': afetadas,
+            'plantas_destino': existentes,
+            'total_final': afetadas + existentes,
+            'encontrada': afetadas > 0
+        })
+
+    return {
+        'renomeacoes': itens,
+        'total_renomeacoes': len(itens),
+        'total_plantas_afetadas': sum(i['plantas_afetadas'] for i in itens),
+        'nao_encontradas': [i['old_name'] for i in itens if not i['encontrada']]
+    }
+
+
+def _atualizar_job(job_id, **campos):
+    obter_estado().atualizar_job(job_id, campos)
+
+
+def obter_job(job_id):
+    return obter_estado().obter_job(job_id)
+
+
+def aplicar(pares, chunk_size=CHUNK_PADRAO, pausa_ms=0, job_id=None, total_previsto=None):
+    """
+    Aplicar as renomeações em blocos de plantas afetadas
+
+    Cada bloco: próximas chunk_size plantas das famílias de origem (por
+    id_planta) → um UPDATE por grafia encontrada, restrito aos ids do
+    bloco → ajuste do dicionário de famílias pelo rowcount de cada UPDATE
+    e da taxonomia → COMMIT. Uma planta alterada por outro pedido entre a
+    leitura e o UPDATE não é contada
+
+    Args:
+        total_previsto: plantas afetadas já contadas pelo chamador (pré-visualização);
+            só serve para o progresso, por isso evita repetir a contagem
+
+    Returns:
+        dict: relatório final
+    """
+    mapa = {normalizar_familia(antigo): novo for antigo, novo in pares}
+    origens = [antigo for antigo, _ in pares]
+    afetadas = Planta_medicinal.familia.in_(origens)
+
+    if total_previsto is None:
+        total_previsto = db.session.query(func.count(Planta_medicinal.id_planta)).filter(afetadas).scalar() or 0
+    db.session.commit()  # Não manter a transação aberta entre blocos
+    total_blocos = max(math.ceil(total_previsto / chunk_size), 1)
+
+    movidas = {normalizar_familia(antigo): 0 for antigo in origens}
+    total_atualizadas = 0
+    lidas = 0
+    blocos = 0
+    ultimo = 0
+
+    while True:
+        try:
+            linhas = db.session.query(
+                Planta_medicinal.id_planta, Planta_medicinal.familia
+            ).filter(
+                afetadas, Planta_medicinal.id_planta > ultimo
+            ).order_by(Planta_medicinal.id_planta).limit(chunk_size).all()
+            if not linhas:
+                db.session.commit()
+                break
+
+            por_grafia = {}
+            for id_planta, familia in linhas:
+                por_grafia.setdefault(familia, []).append(id_planta)
+
+            for familia, ids in por_grafia.items():
+                novo = mapa.get(normalizar_familia(familia))
+                if novo is None:
+                    continue
+                alteradas = Planta_medicinal.query.filter(
+                    Planta_medicinal.id_planta.in_(ids),
+                    Planta_medicinal.familia == familia
+                ).update({'familia': novo}, synchronize_session=False)
+                mover_plantas(db.session, familia, novo, alteradas)
+                movidas[normalizar_familia(familia)] += alteradas
+                total_atualizadas += alteradas
+
+            reindexar_plantas(db.session, [id_planta for id_planta, _ in linhas])
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        blocos += 1
+        lidas += len(linhas)
+        ultimo = linhas[-1][0]
+        if job_id:
+            _atualizar_job(
+                job_id,
+                blocos_processados=blocos,
+                total_blocos=max(total_blocos, blocos),
+                plantas_atualizadas=total_atualizadas,
+                progresso=round(min(lidas / total_previsto, 1) * 100, 1) if total_previsto else 100.0,
+                ultimo_id=ultimo
+            )
+
+        if len(linhas) < chunk_size:
+            break
+        if pausa_ms:
+            time.sleep(pausa_ms / 1000)
+
+    return {
+        'plantas_atualizadas': total_atualizadas,
+        'blocos': blocos,
+        'chunk_size': chunk_size,
+        'renomeacoes': [
+            {'old_name': antigo, 'new_name': novo, 'plantas_movidas': movidas[normalizar_familia(antigo)]}
+            for antigo, novo in pares
+        ]
+    }
+
+
+def iniciar_job(app, pares, chunk_size=CHUNK_PADRAO, pausa_ms=0):
+    """
+    Executar `aplicar` numa thread com app context próprio
+
+    Returns:
+        str: job_id para consultar o progresso
+    """
+    job_id = uuid.uuid4().hex
+    obter_estado().gravar_job(job_id, {
+        'job_id': job_id,
+        'estado': 'pendente',
+        'total_renomeacoes': len(pares),
+        'blocos_processados': 0,
+        'total_blocos': None,
+        'plantas_atualizadas': 0,
+        'progresso': 0.0,
+        'iniciado_em': datetime.utcnow().isoformat(),
+        'terminado_em': None,
+        'resultado': None,
+        'erro': None,
+        'pid': os.getpid()  # Worker que corre o job (a thread morre com ele)
+    })
+
+    def executar():
+        with app.app_context():
+            _atualizar_job(job_id, estado='em_execucao')
+            try:
+                resultado = aplicar(pares, chunk_size=chunk_size, pausa_ms=pausa_ms, job_id=job_id)
+                _atualizar_job(job_id, estado='concluido', progresso=100.0, resultado=resultado,
+                               terminado_em=datetime.utcnow().isoformat())
+            except Exception as e:
+                print(f"❌ Erro no job de renomeação {job_id}: {e}")
+                _atualizar_job(job_id, estado='erro', erro=str(e),
+                               terminado_em=datetime.utcnow().isoformat())
+            finally:
+                db.session.remove()
+
+    threading.Thread(target=executar, name=f'familias-lote-{job_id[:8]}', daemon=True).start()
+    return job_id
@@ -0,0 +1,372 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Grafo de Citações - Autor ↔ Referência ↔ Planta
+Mantém listas de adjacência compactas (CSR) em memória, construídas com
+duas queries em bloco (Referencia_autor e Planta_referencia) e atualizadas
+incrementalmente a cada commit que insere/remove associações.
+Commits de outros workers chegam pela geração 'grafo' do estado partilhado
+(reconstrução na próxima consulta).
+"""
+import threading
+import time
+import heapq
+from array import array
+from collections import deque
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+from models.planta import db
+from models.referencia import Referencia_autor, Planta_referencia
+from utils.estado_partilhado import Geracao
+from utils.replicas import ler_do_primario
+
+TIPOS_NO = ('autor', 'referencia', 'planta')
+
+# Chave usada em session.info para acumular arestas até ao commit
+_CHAVE_PENDENTES = 'grafo_citacoes_pendentes'
+
+
+class GrafoCitacoes:
+    """
+    Grafo tripartido não-dirigido em formato CSR
+
+    - Cada nó é identificado por (tipo, id) e mapeado para um índice inteiro
+    - indptr/indices (array('l')) guardam a adjacência base
+    - Alterações posteriores ficam num overlay (_extra/_removidas) até à
+      próxima compactação, para não reconstruir os arrays a cada escrita
+    """
+
+    def __init__(self, ttl_segundos=300):
+        self.ttl_segundos = ttl_segundos
+        self._lock = threading.RLock()
+        self._construido_em = None
+        self._geracao = Geracao('grafo')
+        self._limpar()
+
+    def _limpar(self):
+        self._nos = []            # índice -> (tipo, id)
+        self._indice = {}         # (tipo, id) -> índice
+        self._indptr = array('l', [0])
+        self._indices = array('l')
+        self._extra = {}          # índice -> set(índices) adicionados
+        self._removidas = set()   # {(u, v)} removidas da base
+        self._total_arestas = 0
+
+    # ---------------------------------------------------------------
+    # CONSTRUÇÃO
+    # ---------------------------------------------------------------
+
+    def _no(self, tipo, id_):
+        """Obter (ou criar) o índice de um nó"""
+        chave = (tipo, id_)
+        idx = self._indice.get(chave)
+        if idx is None:
+            idx = len(self._nos)
+            self._nos.append(chave)
+            self._indice[chave] = idx
+        return idx
+
+    def _construir_csr(self, arestas):
+        """Construir indptr/indices a partir de uma lista de pares (u, v)"""
+        n = len(self._nos)
+        graus = [0] * (n + 1)
+        for u, v in arestas:
+            graus[u + 1] += 1
+            graus[v + 1] += 1
+
+        for i in range(n):
+            graus[i + 1] += graus[i]
+
+        indptr = array('l', graus)
+        indices = array('l', [0]) * indptr[-1]
+        cursor = list(graus[:n])
+        for u, v in arestas:
+            indices[cursor[u]] = v
+            cursor[u] += 1
+            indices[cursor[v]] = u
+            cursor[v] += 1
+
+        self._indptr = indptr
+        self._indices = indices
+        self._extra = {}
+        self._removidas = set()
+        self._total_arestas = len(arestas)
+
+    def reconstruir(self):
+        """Reconstruir o grafo inteiro com duas queries em bloco"""
+        with self._lock, ler_do_primario(db.session):  # Réplica pode ainda não ter a última escrita
+            self._geracao.sincronizar()
+            self._limpar()
+            arestas = []
+
+            for id_ref, id_autor in db.session.query(
+                Referencia_autor.id_referencia, Referencia_autor.id_autor
+            ).all():
+                arestas.append((self._no('autor', id_autor), self._no('referencia', id_ref)))
+
+            for id_planta, id_ref in db.session.query(
+                Planta_referencia.id_planta, Planta_referencia.id_referencia
+            ).all():
+                arestas.append((self._no('referencia', id_ref), self._no('planta', id_planta)))
+
+            self._construir_csr(arestas)
+            self._construido_em = time.monotonic()
+            print(f"🕸️ Grafo de citações construído: {len(self._nos)} nós, {len(arestas)} arestas")
+
+    def compactar(self):
+        """Incorporar o overlay nos arrays CSR"""
+        with self._lock:
+            arestas = [
+                (u, v)
+                for u in range(len(self._nos))
+                for v in self._vizinhos_idx(u)
+                if u < v
+            ]
+            self._construir_csr(arestas)
+
+    def garantir_atualizado(self):
+        """Construir na primeira utilização, quando outro worker alterou as associações ou quando o TTL expirar"""
+        with self._lock:
+            expirado = (
+                self._construido_em is None or
+                (self.ttl_segundos and time.monotonic() - self._construido_em > self.ttl_segundos) or
+                self._geracao.alterada()
+            )
+            if expirado:
+                self.reconstruir()
+
+    # ---------------------------------------------------------------
+    # ATUALIZAÇÃO INCREMENTAL
+    # ---------------------------------------------------------------
+
+    def aplicar(self, adicionadas, removidas):
+        """
+        Aplicar arestas alteradas por um commit deste processo e avisar os
+        outros workers
+
+        Args:
+            adicionadas/removidas: iteráveis de ((tipo, id), (tipo, id))
+        """
+        with self._lock:
+            self._geracao.publicar()
+            if self._construido_em is None:
+                return  # Ainda não construído: a primeira consulta lê tudo da BD
+
+            for a, b in removidas:
+                u, v = self._indice.get(a), self._indice.get(b)
+                if u is None or v is None:
+                    continue
+                if v in self._extra.get(u, ()):
+                    self._extra[u].discard(v)
+                    self._extra[v].discard(u)
+                elif self._na_base(u, v) and (u, v) not in self._removidas:
+                    self._removidas.add((u, v))
+                    self._removidas.add((v, u))
+                else:
+                    continue
+                self._total_arestas -= 1
+
+            for a, b in adicionadas:
+                u, v = self._no(*a), self._no(*b)
+                if (u, v) in self._removidas:
+                    self._removidas.discard((u, v))
+                    self._removidas.discard((v, u))
+                elif self._na_base(u, v) or v in self._extra.get(u, ()):
+                    continue
+                else:
+                    self._extra.setdefault(u, set()).add(v)
+                    self._extra.setdefault(v, set()).add(u)
+                self._total_arestas += 1
+
+            tamanho_overlay = sum(len(s) for s in self._extra.values()) + len(self._removidas)
+            if tamanho_overlay > max(1024, len(self._indices) // 10):
+                self.compactar()
+
+    # ---------------------------------------------------------------
+    # CONSULTAS
+    # ---------------------------------------------------------------
+
+    def _na_base(self, u, v):
+        if u >= len(self._indptr) - 1:
+            return False
+        inicio, fim = self._indptr[u], self._indptr[u + 1]
+        return v in self._indices[inicio:fim]
+
+    def _vizinhos_idx(self, u):
+        """Vizinhos de um índice (base CSR + overlay)"""
+        if u < len(self._indptr) - 1:
+            inicio, fim = self._indptr[u], self._indptr[u + 1]
+            for v in self._indices[inicio:fim]:
+                if (u, v) not in self._removidas:
+                    yield v
+        yield from self._extra.get(u, ())
+
+    def existe(self, tipo, id_):
+        return (tipo, id_) in self._indice
+
+    def vizinhanca(self, tipo, id_, profundidade=1, tipos=None, limite=None):
+        """
+        BFS a partir de um nó até `profundidade` saltos
+
+        Returns:
+            list: [{'tipo', 'id', 'distancia'}] ordenada por distância
+        """
+        with self._lock:
+            origem = self._indice.get((tipo, id_))
+            if origem is None:
+                return []
+
+            distancias = {origem: 0}
+            fila = deque([origem])
+            resultado = []
+
+            while fila:
+                u = fila.popleft()
+                d = distancias[u]
+                if d >= profundidade:
+                    continue
+                for v in self._vizinhos_idx(u):
+                    if v in distancias:
+                        continue
+                    distancias[v] = d + 1
+                    fila.append(v)
+                    tipo_v, id_v = self._nos[v]
+                    if tipos is None or tipo_v in tipos:
+                        resultado.append({'tipo': tipo_v, 'id': id_v, 'distancia': d + 1})
+                        if limite and len(resultado) >= limite:
+                            return resultado
+
+            return resultado
+
+    def caminho_mais_curto(self, origem, destino, max_profundidade=8):
+        """
+        Caminho mais curto (BFS) entre dois nós (tipo, id)
+
+        Returns:
+            list | None: [(tipo, id), ...] incluindo origem e destino
+        """
+        with self._lock:
+            s, t = self._indice.get(origem), self._indice.get(destino)
+            if s is None or t is None:
+                return None
+            if s == t:
+                return [origem]
+
+            pais = {s: None}
+            fila = deque([(s, 0)])
+            while fila:
+                u, d = fila.popleft()
+                if d >= max_profundidade:
+                    continue
+                for v in self._vizinhos_idx(u):
+                    if v in pais:
+                        continue
+                    pais[v] = u
+                    if v == t:
+                        caminho = [v]
+                        while pais[caminho[-1]] is not None:
+                            caminho.append(pais[caminho[-1]])
+                        return [self._nos[i] for i in reversed(caminho)]
+                    fila.append((v, d + 1))
+            return None
+
+    def top_relacionados(self, tipo, id_, via, limite=10):
+        """
+        Nós do mesmo tipo que partilham vizinhos do tipo `via`
+
+        Ex.: top_relacionados('autor', 1, via='referencia') → co-autores
+             top_relacionados('planta', 1, via='referencia') → plantas com
+             referências em comum
+
+        Returns:
+            list: [{'id', 'partilhados'}] ordenada por nº de vizinhos partilhados
+        """
+        with self._lock:
+            origem = self._indice.get((tipo, id_))
+            if origem is None:
+                return []
+
+            contagem = {}
+            for m in self._vizinhos_idx(origem):
+                if self._nos[m][0] != via:
+                    continue
+                for v in self._vizinhos_idx(m):
+                    if v != origem and self._nos[v][0] == tipo:
+                        contagem[v] = contagem.get(v, 0) + 1
+
+            melhores = heapq.nlargest(limite, contagem.items(), key=lambda item: (item[1], -item[0]))
+            return [{'id': self._nos[v][1], 'partilhados': n} for v, n in melhores]
+
+    def estatisticas(self):
+        with self._lock:
+            por_tipo = {t: 0 for t in TIPOS_NO}
+            for tipo, _ in self._nos:
+                por_tipo[tipo] += 1
+            return {
+                'nos': len(self._nos),
+                'nos_por_tipo': por_tipo,
+                'arestas': self._total_arestas,
+                'overlay': sum(len(s) for s in self._extra.values()) // 2 + len(self._removidas) // 2,
+                'idade_segundos': round(time.monotonic() - self._construido_em, 1) if self._construido_em else None
+            }
+
+
+# Instância única do processo
+grafo = GrafoCitacoes()
+
+
+# =====================================================
+# EVENTOS: capturar associações alteradas até ao commit
+# =====================================================
+
+def _arestas_de(target):
+    if isinstance(target, Referencia_autor):
+        return (('autor', target.id_autor), ('referencia', target.id_referencia))
+    return (('referencia', target.id_referencia), ('planta', target.id_planta))
+
+
+def _registar_pendente(tipo_alteracao):
+    def listener(mapper, connection, target):
+        session = object_session(target)
+        if session is None:
+            return
+        pendentes = session.info.setdefault(_CHAVE_PENDENTES, {'adicionadas': [], 'removidas': []})
+        pendentes[tipo_alteracao].append(_arestas_de(target))
+    return listener
+
+
+def registar_arestas(session, adicionadas=(), removidas=()):
+    """
+    Registar associações escritas com INSERT/DELETE em massa (não disparam
+    eventos do ORM). Arestas: ((tipo, id), (tipo, id)). Chamar antes do commit.
+    """
+    pendentes = session.info.setdefault(_CHAVE_PENDENTES, {'adicionadas': [], 'removidas': []})
+    pendentes['adicionadas'].extend(adicionadas)
+    pendentes['removidas'].extend(removidas)
+
+
+def _apos_commit(session):
+    pendentes = session.info.pop(_CHAVE_PENDENTES, None)
+    if pendentes:
+        grafo.aplicar(pendentes['adicionadas'], pendentes['removidas'])
+
+
+def _apos_rollback(session):
+    session.info.pop(_CHAVE_PENDENTES, None)
+
+
+def registrar_eventos_grafo(app):
+    """Ligar os eventos do ORM ao grafo (chamado uma vez no arranque)"""
+    grafo.ttl_segundos = app.config.get('GRAFO_TTL_SEGUNDOS', 300)
+
+    if event.contains(Session, 'after_commit', _apos_commit):
+        return
+
+    for model in (Referencia_autor, Planta_referencia):
+        event.listen(model, 'after_insert', _registar_pendente('adicionadas'))
+        event.listen(model, 'after_delete', _registar_pendente('removidas'))
+
+    event.listen(Session, 'after_commit', _apos_commit)
+    event.listen(Session, 'after_rollback', _apos_rollback)
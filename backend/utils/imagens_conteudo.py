@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Armazenamento de Imagens por Conteúdo
+- Ficheiro final: chave <2 primeiros hex>/<sha256>.<ext> no armazenamento
+  de conteúdo (utils.armazenamento: pasta local ou bucket S3), derivados
+  ao lado (<sha256>.<variante>.<formato>); o URL nunca muda de
+  conteúdo, por isso é servido com Cache-Control immutable (1 ano)
+- Ficheiro_imagem tem uma linha por conteúdo com a contagem de Imagem que o
+  usam: o mesmo upload repetido (outra planta, reenvio do wizard) reutiliza
+  o ficheiro e os derivados já gerados
+- Eventos do ORM em Imagem mantêm a contagem na mesma transação; a 0 a
+  linha é removida e os ficheiros apagados depois do commit
+"""
+import re
+from collections import namedtuple
+from datetime import datetime
+
+from sqlalchemy import event, inspect
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, object_session
+
+from models.planta import db, Imagem, Imagem_variante, Ficheiro_imagem
+from utils import armazenamento
+from utils.imagens_processamento import caminho_variante, VARIANTES, FORMATOS_VARIANTES
+
+PREFIXO_URL = '/uploads/imagens'
+SHA256_RE = re.compile(r'^[0-9a-f]{64}$')
+PREFIXO_RE = re.compile(r'^[0-9a-f]{2}$')
+
+_CHAVE_APAGAR = 'imagens_conteudo_apagar'
+
+# Colunas de Imagem preenchidas pelo processamento (extrair_metadados)
+CAMPOS_METADADOS = ('largura', 'altura', 'formato', 'bytes', 'cor_dominante', 'lqip')
+
+
+class Upload(namedtuple('Upload', 'sha256 tamanho extensao caminho')):
+    """Upload gravado em staging; `extensao` vem dos magic bytes (ou None)"""
+
+
+def chave(sha256, extensao):
+    """Chave no armazenamento de conteúdo"""
+    return f'{sha256[:2]}/{sha256}.{extensao}'
+
+
+def url(sha256, extensao):
+    return f'{PREFIXO_URL}/{sha256[:2]}/{sha256}.{extensao}'
+
+
+def apagar_ficheiros(backend, chave_original, incluir_original=True):
+    """Remover o ficheiro final e todos os derivados de um armazenamento"""
+    chaves = [caminho_variante(chave_original, v, f) for v, _ in VARIANTES for f in FORMATOS_VARIANTES]
+    if incluir_original:
+        chaves.append(chave_original)
+    for c in chaves:
+        backend.apagar(c)
+
+
+# =====================================================
+# CRIAÇÃO
+# =====================================================
+
+def conteudo_conhecido(sha256):
+    """O conteúdo já está guardado (ou a ser processado) e não precisa de staging"""
+    ficheiro = db.session.get(Ficheiro_imagem, sha256)
+    return ficheiro is not None and ficheiro.estado != 'erro'
+
+
+def obter_ou_criar_ficheiro(sha256, extensao, tamanho):
+    """
+    Returns:
+        tuple: (Ficheiro_imagem, criado)
+    """
+    ficheiro = db.session.get(Ficheiro_imagem, sha256)
+    if ficheiro is not None:
+        return ficheiro, False
+    # INSERT direto (sem savepoint: begin_nested dispararia after_commit nos
+    # outros índices); chave duplicada = upload igual em paralelo noutro pedido
+    criado = True
+    try:
+        db.session.execute(Ficheiro_imagem.__table__.insert().values(
+            sha256=sha256, extensao=extensao, bytes=tamanho, referencias=0,
+            estado='pendente', criado_em=datetime.utcnow()
+        ))
+    except IntegrityError:
+        criado = False
+    return db.session.get(Ficheiro_imagem, sha256), criado
+
+
+def criar_imagem(upload, id_planta, extensao=None, legenda=None, referencia=None):
+    """
+    Criar o registo Imagem para um upload em staging (sem commit)
+
+    Args:
+        extensao: usada só se os magic bytes não identificarem o formato
+
+    Returns:
+        tuple: (Imagem, processar) - processar=True se o conteúdo ainda
+               tem de passar pela fila (primeiro upload ou erro anterior)
+
+    Raises:
+        ValueError: formato desconhecido
+    """
+    extensao = upload.extensao or extensao
+    if not extensao:
+        raise ValueError('Formato de imagem não suportado')
+
+    ficheiro, criado = obter_ou_criar_ficheiro(upload.sha256, extensao, upload.tamanho)
+    processar = criado
+    if ficheiro.estado == 'erro':
+        ficheiro.estado = 'pendente'
+        processar = True
+
+    imagem = Imagem(
+        id_planta=id_planta,
+        sha256=ficheiro.sha256,
+        nome_arquivo=f'{ficheiro.sha256}.{ficheiro.extensao}',
+        url_armazenamento=url(ficheiro.sha256, ficheiro.extensao),
+        legenda=legenda,
+        referencia_img=referencia,
+        estado=ficheiro.estado
+    )
+    if ficheiro.estado == 'pronta':
+        # Conteúdo já processado: metadados de outra imagem com o mesmo ficheiro
+        metadados = db.session.query(*(getattr(Imagem, c) for c in CAMPOS_METADADOS)).filter(
+            Imagem.sha256 == ficheiro.sha256, Imagem.largura.isnot(None)
+        ).first()
+        if metadados:
+            for campo, valor in zip(CAMPOS_METADADOS, metadados):
+                setattr(imagem, campo, valor)
+    db.session.add(imagem)
+    return imagem, processar
+
+
+# =====================================================
+# CONTAGEM DE REFERÊNCIAS (EVENTOS DO ORM)
+# =====================================================
+
+def _incrementar(connection, sha256):
+    tabela = Ficheiro_imagem.__table__
+    connection.execute(
+        tabela.update().where(tabela.c.sha256 == sha256).values(referencias=tabela.c.referencias + 1)
+    )
+
+
+def _decrementar(connection, session, sha256):
+    tabela = Ficheiro_imagem.__table__
+    connection.execute(
+        tabela.update().where(tabela.c.sha256 == sha256).values(referencias=tabela.c.referencias - 1)
+    )
+    linha = connection.execute(
+        tabela.select().with_only_columns(tabela.c.referencias, tabela.c.extensao).where(tabela.c.sha256 == sha256)
+    ).first()
+    if linha is not None and linha.referencias <= 0:
+        variantes = Imagem_variante.__table__
+        connection.execute(variantes.delete().where(variantes.c.sha256 == sha256))
+        connection.execute(tabela.delete().where(tabela.c.sha256 == sha256))
+        if session is not None:
+            session.info.setdefault(_CHAVE_APAGAR, []).append((sha256, linha.extensao))
+
+
+def _apos_inserir(mapper, connection, target):
+    if target.sha256:
+        _incrementar(connection, target.sha256)
+
+
+def _apos_atualizar(mapper, connection, target):
+    historico = inspect(target).attrs.sha256.history
+    if not historico.has_changes():
+        return
+    for antigo in historico.deleted:
+        if antigo:
+            _decrementar(connection, object_session(target), antigo)
+    for novo in historico.added:
+        if novo:
+            _incrementar(connection, novo)
+
+
+def _apos_apagar(mapper, connection, target):
+    if target.sha256:
+        _decrementar(connection, object_session(target), target.sha256)
+
+
+def _apos_commit(session):
+    for sha256, extensao in session.info.pop(_CHAVE_APAGAR, ()):
+        apagar_ficheiros(armazenamento.conteudo, chave(sha256, extensao))
+
+
+def _apos_rollback(session):
+    session.info.pop(_CHAVE_APAGAR, None)
+
+
+def registrar_eventos_conteudo(app):
+    """Ligar a contagem de referências aos eventos do ORM (chamado no arranque)"""
+    if event.contains(Imagem, 'after_insert', _apos_inserir):
+        return
+
+    event.listen(Imagem, 'after_insert', _apos_inserir)
+    event.listen(Imagem, 'after_update', _apos_atualizar)
+    event.listen(Imagem, 'after_delete', _apos_apagar)
+    event.listen(Session, 'after_commit', _apos_commit)
+    event.listen(Session, 'after_rollback', _apos_rollback)
@@ -0,0 +1,542 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Fila de Processamento de Imagens
+- O pedido HTTP só grava o upload na área de staging (calculando o SHA-256
+  enquanto escreve; um ficheiro <sha256>.<id>.upload por upload, nunca
+  partilhado entre pedidos) e cria o registo Imagem; conteúdo novo fica 'pendente'
+  e o trabalho de PIL corre num pool de processos limitado (IMAGE_WORKERS),
+  com prioridade baixa. Conteúdo já conhecido não volta a ser processado
+- Trabalhos acima da capacidade do pool esperam numa fila em memória;
+  com mais de IMAGE_QUEUE_MAX à espera os uploads recebem 503
+- O estado fica na base de dados (Ficheiro_imagem e Imagem, visível a
+  todos os workers); uploads deixados em staging por um worker que
+  terminou são retomados na primeira utilização da fila noutro processo
+- Os resultados são gravados por uma thread própria: o callback do pool
+  corre na thread de gestão do ProcessPoolExecutor e só os entrega
+"""
+import hashlib
+import os
+import queue
+import secrets
+import shutil
+import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from PIL import Image as PILImage
+
+from models.planta import db, Imagem, Imagem_variante, Ficheiro_imagem
+from utils import armazenamento, imagens_conteudo
+from utils.imagens_conteudo import Upload, apagar_ficheiros, CAMPOS_METADADOS
+from utils.imagens_processamento import (
+    processar_imagem, inicializar_processo, formato_por_assinatura, extrair_metadados
+)
+
+SUFIXO_STAGING = '.upload'
+TAMANHO_ASSINATURA = 16
+
+# Staging sem registo Ficheiro_imagem (pedido falhou) é removido após este tempo
+STAGING_ORFAO_SEGUNDOS = 3600
+# Staging mais recente pode ser de um pedido ainda em curso: retomar não lhe toca
+STAGING_EM_CURSO_SEGUNDOS = 300
+
+
+class FilaCheia(Exception):
+    """Demasiados trabalhos à espera (mapeado para 503 nas rotas)"""
+
+
+class UploadRejeitado(ValueError):
+    """Upload recusado durante a receção (400 formato/base64, 413 tamanho)"""
+
+    def __init__(self, mensagem, status=400):
+        super().__init__(mensagem)
+        self.status = status
+
+
+class EscritaStaging:
+    """
+    Escrita incremental de um upload em staging: calcula o SHA-256 e conta
+    os bytes à medida que chegam, e verifica os magic bytes no primeiro
+    bloco, para recusar antes de receber o resto do corpo
+    """
+
+    def __init__(self, fila, limite_bytes=None, exigir_formato=True):
+        self.fila = fila
+        self.limite_bytes = limite_bytes
+        self.exigir_formato = exigir_formato
+        self.hash = hashlib.sha256()
+        self.tamanho = 0
+        self.inicio = b''
+        os.makedirs(fila.pasta_staging, exist_ok=True)
+        fd, self.temporario = tempfile.mkstemp(dir=fila.pasta_staging, prefix='.tmp-')
+        self.f = os.fdopen(fd, 'wb')
+
+    def write(self, dados):
+        self.tamanho += len(dados)
+        if self.limite_bytes is not None and self.tamanho > self.limite_bytes:
+            raise UploadRejeitado(f'Imagem maior que {self.limite_bytes // (1024 * 1024)}MB', 413)
+        if len(self.inicio) < TAMANHO_ASSINATURA:
+            self.inicio += dados[:TAMANHO_ASSINATURA - len(self.inicio)]
+            if len(self.inicio) == TAMANHO_ASSINATURA:
+                self._verificar_formato()
+        self.hash.update(dados)
+        self.f.write(dados)
+        return len(dados)
+
+    def seek(self, *args):
+        # O parser multipart faz seek(0) no fim de cada ficheiro
+        return 0
+
+    def _verificar_formato(self):
+        if self.exigir_formato and formato_por_assinatura(self.inicio) is None:
+            raise UploadRejeitado('Formato de imagem não suportado')
+
+    def concluir(self):
+        """
+        Returns:
+            Upload: sha256, tamanho, extensão pelos magic bytes, caminho
+        """
+        self.f.close()
+        if self.tamanho == 0:
+            raise UploadRejeitado('Ficheiro vazio')
+        self._verificar_formato()
+        sha256 = self.hash.hexdigest()
+        destino = self.fila.caminho_staging(sha256, secrets.token_hex(8))
+        os.replace(self.temporario, destino)
+        self.temporario = None
+        return Upload(sha256, self.tamanho, formato_por_assinatura(self.inicio), destino)
+
+    def cancelar(self):
+        if self.temporario is None:
+            return
+        self.f.close()
+        try:
+            os.remove(self.temporario)
+        except FileNotFoundError:
+            pass
+        self.temporario = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cancelar()
+
+
+class FilaImagens:
+    """Pool de processos + fila de espera limitada, um por processo da API"""
+
+    def __init__(self, pasta_staging=None, max_workers=2, max_em_espera=200, modo='processos', nice=10):
+        self.pasta_staging = pasta_staging
+        self.max_workers = max_workers
+        self.max_em_espera = max_em_espera
+        self.modo = modo
+        self.nice = nice
+        self.max_bytes_upload = 5 * 1024 * 1024
+        self.app = None
+
+        self._lock = threading.Lock()
+        self._pool = None
+        self._pid = None
+        self._espera = deque()
+        self._em_execucao = set()
+        self._em_curso = {}  # sha256 em espera ou em execução -> staging do trabalho (evita duplicados)
+        self._resultados = queue.Queue()  # (trabalho, pool, futuro) por gravar
+        self._gravador = None
+        self._retomado = False
+        self.concluidas = 0
+        self.falhadas = 0
+
+    # ---------------- staging ----------------
+
+    def caminho_staging(self, sha256, id_upload=None):
+        """Ficheiro em staging de um upload (`id_upload` distingue pedidos com os mesmos bytes)"""
+        nome = f'{sha256}.{id_upload}' if id_upload else sha256
+        return os.path.join(self.pasta_staging, f'{nome}{SUFIXO_STAGING}')
+
+    def abrir_staging(self, limite_bytes=None, exigir_formato=True):
+        """
+        Escrita incremental em staging (uploads HTTP); por omissão com o
+        limite IMAGE_UPLOAD_MAX_BYTES
+        """
+        if limite_bytes is None:
+            limite_bytes = self.max_bytes_upload
+        return EscritaStaging(self, limite_bytes, exigir_formato)
+
+    def copiar(self, origem):
+        """Copiar um ficheiro existente (ex.: blob de rascunho) para staging"""
+        with open(origem, 'rb') as entrada:
+            return self.receber(entrada)
+
+    def receber(self, entrada):
+        """Copiar para staging a partir de um objeto com read() (ex.: armazenamento.abrir)"""
+        with EscritaStaging(self, exigir_formato=False) as escrita:
+            shutil.copyfileobj(entrada, escrita)
+            return escrita.concluir()
+
+    def descartar(self, upload):
+        """
+        Remover o ficheiro em staging de um upload que não foi agendado
+        (só deste pedido: outro pedido com os mesmos bytes tem o seu)
+        """
+        if not isinstance(upload, Upload) or upload.caminho is None:
+            return
+        try:
+            os.remove(upload.caminho)
+        except FileNotFoundError:
+            pass
+
+    def apagar(self, imagem):
+        """
+        Remover o original e os derivados de uma imagem antiga apagada;
+        imagens por conteúdo são removidas pela contagem de referências
+        """
+        if imagem.sha256 is None:
+            apagar_ficheiros(armazenamento.antigas, f'{imagem.id_planta}/{imagem.nome_arquivo}')
+
+    # ---------------- fila ----------------
+
+    def cheia(self):
+        return len(self._espera) >= self.max_em_espera
+
+    def verificar_capacidade(self):
+        if self.cheia():
+            raise FilaCheia(f'Fila de imagens cheia ({len(self._espera)} à espera); tente novamente')
+
+    def agendar(self, imagem, processar, upload):
+        """
+        Depois do commit de criar_imagem: enfileirar o conteúdo novo com o
+        staging deste upload, ou descartá-lo (conteúdo já pronto ou já na
+        fila com o staging de outro pedido)
+        """
+        if processar:
+            self.enfileirar(imagem.sha256, imagem.nome_arquivo.rsplit('.', 1)[1], upload.caminho)
+        else:
+            self.descartar(upload)
+
+    def enfileirar(self, sha256, extensao, origem=None):
+        """
+        Agendar o processamento de um conteúdo já gravado em staging; o
+        trabalho fica dono de `origem` (removida no fim)
+        """
+        self._retomar_uma_vez(ignorar=sha256)
+        if origem is None:
+            origem = self.caminho_staging(sha256)
+        trabalho = (sha256, origem, imagens_conteudo.chave(sha256, extensao))
+
+        if self.modo == 'sincrono':
+            self._executar_local(trabalho)
+            return
+
+        with self._lock:
+            em_curso = self._em_curso.get(sha256)
+            if em_curso is None:
+                self._em_curso[sha256] = origem
+                self._espera.append(trabalho)
+        if em_curso is not None:
+            # Já na fila deste processo com outro staging: este não é usado
+            if em_curso != origem:
+                self.descartar(Upload(sha256, None, None, origem))
+            return
+        self._despachar()
+
+    def _obter_pool(self):
+        # Com self._lock; pool criado na primeira utilização e recriado após fork ou falha
+        if self._pool is None or self._pid != os.getpid():
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                initializer=inicializar_processo,
+                initargs=(self.nice,)
+            )
+            self._pid = os.getpid()
+        return self._pool
+
+    def _obter_gravador(self):
+        # Com self._lock; após fork a thread do processo pai não existe no filho
+        if self._gravador is None or not self._gravador.is_alive():
+            self._gravador = threading.Thread(target=self._gravar_resultados, name='imagens-gravador', daemon=True)
+            self._gravador.start()
+
+    def _descartar_pool(self, pool):
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+
+    def _despachar(self):
+        submetidos = []
+        with self._lock:
+            self._obter_gravador()
+            # No máximo 2 trabalhos por processo submetidos; o resto espera aqui
+            while self._espera and len(self._em_execucao) < self.max_workers * 2:
+                trabalho = self._espera.popleft()
+                sha256, origem, destino = trabalho
+                pool = self._obter_pool()
+                try:
+                    futuro = pool.submit(processar_imagem, origem, destino, armazenamento.conteudo)
+                except BrokenProcessPool:
+                    self._pool = None
+                    pool = self._obter_pool()
+                    futuro = pool.submit(processar_imagem, origem, destino, armazenamento.conteudo)
+                self._em_execucao.add(sha256)
+                submetidos.append((trabalho, pool, futuro))
+
+        # Fora do lock: um futuro já concluído chama o callback nesta thread
+        for trabalho, pool, futuro in submetidos:
+            futuro.add_done_callback(lambda f, t=trabalho, p=pool: self._resultados.put((t, p, f)))
+
+    def _gravar_resultados(self):
+        while True:
+            trabalho, pool, futuro = self._resultados.get()
+            try:
+                self._ao_terminar(trabalho, pool, futuro)
+            except Exception as e:
+                print(f"❌ Erro ao concluir trabalho de imagem {trabalho[0][:12]}: {e}")
+
+    def _ao_terminar(self, trabalho, pool, futuro):
+        sha256, origem, destino = trabalho
+        try:
+            self.registar_resultado(sha256, origem, destino, None, futuro.result())
+        except BrokenProcessPool as e:
+            self._descartar_pool(pool)
+            self.registar_resultado(sha256, origem, destino, f'Processo de imagens terminou: {e}')
+        except Exception as e:
+            self.registar_resultado(sha256, origem, destino, str(e))
+        finally:
+            with self._lock:
+                self._em_execucao.discard(sha256)
+                self._em_curso.pop(sha256, None)
+            self._despachar()
+
+    def _executar_local(self, trabalho):
+        sha256, origem, destino = trabalho
+        try:
+            resultado = processar_imagem(origem, destino, armazenamento.conteudo)
+            self.registar_resultado(sha256, origem, destino, None, resultado)
+        except Exception as e:
+            self.registar_resultado(sha256, origem, destino, str(e))
+
+    def registar_resultado(self, sha256, origem, destino, erro, resultado=None):
+        """
+        Gravar o estado e as variantes geradas na base de dados (também
+        usado pela importação em lote, que tem o seu próprio pool)
+        """
+        if erro:
+            self.falhadas += 1
+            erro = erro.replace(origem, os.path.basename(destino))  # Sem caminhos internos na resposta
+            print(f"  ⚠️ Erro ao processar imagem {sha256[:12]}: {erro}")
+            # Sem reprocessamento automático: o upload inválido sai do staging
+            try:
+                os.remove(origem)
+            except FileNotFoundError:
+                pass
+        else:
+            self.concluidas += 1
+
+        estado = 'erro' if erro else 'pronta'
+        with self.app.app_context():
+            try:
+                alterados = Ficheiro_imagem.query.filter(
+                    Ficheiro_imagem.sha256 == sha256,
+                    Ficheiro_imagem.estado == 'pendente'
+                ).update({'estado': estado}, synchronize_session=False)
+                Imagem.query.filter(
+                    Imagem.sha256 == sha256,
+                    Imagem.estado == 'pendente'
+                ).update({
+                    'estado': estado,
+                    'erro_processamento': erro[:255] if erro else None,
+                    **{campo: resultado[campo] for campo in CAMPOS_METADADOS if resultado}
+                }, synchronize_session=False)
+                if alterados and resultado:
+                    tabela = Imagem_variante.__table__
+                    db.session.execute(tabela.delete().where(tabela.c.sha256 == sha256))
+                    if resultado['variantes']:
+                        db.session.execute(tabela.insert(), [
+                            {'sha256': sha256, **v} for v in resultado['variantes']
+                        ])
+                db.session.commit()
+
+                # Todas as imagens com este conteúdo foram apagadas durante o processamento
+                if not alterados and db.session.get(Ficheiro_imagem, sha256) is None:
+                    apagar_ficheiros(armazenamento.conteudo, destino)
+            except Exception as e:
+                db.session.rollback()
+                print(f"❌ Erro ao gravar estado da imagem {sha256[:12]}: {e}")
+
+    def _retomar_uma_vez(self, ignorar=None):
+        if self._retomado:
+            return
+        self._retomado = True
+        try:
+            self.retomar(ignorar)
+        except Exception as e:
+            print(f"⚠️ Erro ao retomar imagens em staging: {e}")
+
+    def retomar(self, ignorar=None):
+        """
+        Reagendar conteúdos em staging ainda 'pendente' e remover staging
+        já processado ou antigo sem registo. Ficheiros recentes podem ser
+        de pedidos em curso (que os agendam ou descartam) e ficam; um
+        ficheiro reagendado é primeiro renomeado e passa a ser do trabalho
+
+        Returns:
+            int: trabalhos reagendados
+        """
+        if not os.path.isdir(self.pasta_staging):
+            return 0
+
+        encontrados = {}
+        with os.scandir(self.pasta_staging) as entradas:
+            for entrada in entradas:
+                if entrada.name.endswith(SUFIXO_STAGING):
+                    sha256 = entrada.name[:-len(SUFIXO_STAGING)].split('.', 1)[0]
+                    encontrados.setdefault(sha256, []).append(entrada)
+
+        if not encontrados:
+            return 0
+
+        registos = {}
+        hashes = list(encontrados)
+        for i in range(0, len(hashes), 500):
+            for sha256, extensao, estado in db.session.query(
+                Ficheiro_imagem.sha256, Ficheiro_imagem.extensao, Ficheiro_imagem.estado
+            ).filter(Ficheiro_imagem.sha256.in_(hashes[i:i + 500])).all():
+                registos[sha256] = (extensao, estado)
+
+        reagendados = 0
+        agora = time.time()
+        for sha256, entradas in encontrados.items():
+            if sha256 == ignorar:
+                continue
+            registo = registos.get(sha256)
+            pendente = registo is not None and registo[1] == 'pendente'
+            idade_minima = STAGING_EM_CURSO_SEGUNDOS if registo is not None else STAGING_ORFAO_SEGUNDOS
+            for entrada in entradas:
+                try:
+                    if agora - entrada.stat().st_mtime < idade_minima:
+                        continue
+                    if pendente:
+                        origem = self.caminho_staging(sha256, secrets.token_hex(8))
+                        os.replace(entrada.path, origem)
+                        self.enfileirar(sha256, registo[0], origem)
+                        reagendados += 1
+                        pendente = False  # Um trabalho por conteúdo; as outras cópias saem
+                    else:
+                        os.remove(entrada.path)
+                except FileNotFoundError:
+                    pass
+
+        if reagendados:
+            print(f"🖼️ {reagendados} imagens em staging reagendadas")
+        return reagendados
+
+    def migrar_imagens_antigas(self, limite=100):
+        """
+        Passar imagens antigas (<id_planta>/<nome> em armazenamento.antigas) para o
+        armazenamento por conteúdo: o ficheiro é copiado para staging e
+        processado como um upload novo (derivados incluídos); conteúdo
+        repetido é deduplicado
+
+        Returns:
+            dict: migradas, agendadas, em_falta
+        """
+        imagens = Imagem.query.filter(Imagem.sha256.is_(None)).order_by(Imagem.id_imagem).limit(limite).all()
+
+        em_falta, agendar, antigos = 0, [], []
+        for imagem in imagens:
+            antigo = f'{imagem.id_planta}/{imagem.nome_arquivo}'
+            try:
+                with armazenamento.antigas.abrir(antigo) as entrada:
+                    upload = self.receber(entrada)
+            except FileNotFoundError:
+                em_falta += 1
+                continue
+
+            extensao = upload.extensao or imagem.nome_arquivo.rsplit('.', 1)[-1].lower()
+            ficheiro, processar = imagens_conteudo.obter_ou_criar_ficheiro(upload.sha256, extensao, upload.tamanho)
+            if ficheiro.estado == 'erro':
+                ficheiro.estado = 'pendente'
+                processar = True
+
+            imagem.sha256 = ficheiro.sha256
+            imagem.nome_arquivo = f'{ficheiro.sha256}.{ficheiro.extensao}'
+            imagem.url_armazenamento = imagens_conteudo.url(ficheiro.sha256, ficheiro.extensao)
+            imagem.estado = ficheiro.estado
+            imagem.erro_processamento = None
+            agendar.append((imagem, processar, upload))
+            antigos.append(antigo)
+
+        try:
+            db.session.commit()
+        except Exception:
+            for *_, upload in agendar:
+                self.descartar(upload)
+            raise
+
+        for imagem, processar, upload in agendar:
+            self.agendar(imagem, processar, upload)
+        for antigo in antigos:
+            apagar_ficheiros(armazenamento.antigas, antigo)
+
+        return {'migradas': len(agendar), 'agendadas': sum(1 for _, p, _ in agendar if p), 'em_falta': em_falta}
+
+    def preencher_metadados(self, limite=100):
+        """
+        Extrair os metadados (dimensões, cor dominante, LQIP) de conteúdos já
+        processados antes de existirem essas colunas; um PIL.open por
+        conteúdo, aplicado a todas as imagens que o partilham
+
+        Returns:
+            int: conteúdos preenchidos
+        """
+        conteudos = db.session.query(Imagem.sha256, Imagem.nome_arquivo).filter(
+            Imagem.sha256.isnot(None),
+            Imagem.estado == 'pronta',
+            Imagem.largura.is_(None)
+        ).distinct().limit(limite).all()
+
+        preenchidos = 0
+        for sha256, nome_arquivo in conteudos:
+            chave = imagens_conteudo.chave(sha256, nome_arquivo.rsplit('.', 1)[1])
+            try:
+                with armazenamento.conteudo.copia_local(chave) as caminho, PILImage.open(caminho) as img:
+                    metadados = extrair_metadados(img, caminho)
+            except (OSError, ValueError) as e:
+                print(f"  ⚠️ Metadados de {sha256[:12]} não extraídos: {e}")
+                continue
+            Imagem.query.filter(Imagem.sha256 == sha256).update(metadados, synchronize_session=False)
+            preenchidos += 1
+
+        db.session.commit()
+        return preenchidos
+
+    def estatisticas(self):
+        return {
+            'modo': self.modo,
+            'workers': self.max_workers,
+            'em_execucao': len(self._em_execucao),
+            'em_espera': len(self._espera),
+            'max_em_espera': self.max_em_espera,
+            'concluidas': self.concluidas,
+            'falhadas': self.falhadas
+        }
+
+
+fila_imagens = FilaImagens()
+
+
+def configurar_fila_imagens(app):
+    """Aplicar a configuração à fila deste processo (chamado no arranque)"""
+    fila_imagens.app = app
+    fila_imagens.pasta_staging = app.config['IMAGE_STAGING_FOLDER']
+    fila_imagens.max_workers = app.config.get('IMAGE_WORKERS', 2)
+    fila_imagens.max_em_espera = app.config.get('IMAGE_QUEUE_MAX', 200)
+    fila_imagens.modo = app.config.get('IMAGE_PROCESSING_MODE', 'processos')
+    fila_imagens.nice = app.config.get('IMAGE_WORKER_NICE', 10)
+    fila_imagens.max_bytes_upload = app.config.get('IMAGE_UPLOAD_MAX_BYTES', 5 * 1024 * 1024)
+    armazenamento.configurar_armazenamento(app)
+    imagens_conteudo.registrar_eventos_conteudo(app)
@@ -0,0 +1,508 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Importação de Imagens em Lote (pasta do servidor ou ZIP)
+- Cada ficheiro é associado a uma planta por CSV (arquivo → id_planta ou
+  nome_cientifico) ou por um padrão no nome ('Ocimum_gratissimum_01.jpg')
+- Por lote: staging com SHA-256 → uma query para imagens já importadas
+  (retoma idempotente) e uma para conteúdos conhecidos → INSERT em bloco
+  de Ficheiro_imagem e Imagem → COMMIT
+- O conteúdo novo é processado (derivados e metadados) num pool de
+  processos próprio, para não ocupar a fila dos uploads interativos
+- O progresso fica num ficheiro JSON por job (visível a todos os
+  workers); um job interrompido continua do último lote confirmado
+"""
+import csv
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import uuid
+import zipfile
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime, timedelta
+
+from sqlalchemy import bindparam
+from sqlalchemy.exc import IntegrityError
+
+from models.planta import db, Planta_medicinal, Imagem, Ficheiro_imagem
+from utils import armazenamento, imagens_conteudo
+from utils.imagens_conteudo import CAMPOS_METADADOS
+from utils.imagens_fila import fila_imagens, UploadRejeitado
+from utils.imagens_processamento import processar_imagem, inicializar_processo
+
+EXTENSOES = {'jpg', 'jpeg', 'png', 'gif', 'webp'}
+LOTE_PADRAO = 200
+LOTE_MAXIMO = 2000
+# Processos PIL por job: um pedido não pode pedir mais do que os CPUs da máquina
+WORKERS_MAXIMO = os.cpu_count() or 2
+MAX_ERROS_GUARDADOS = 100
+
+# 'Ocimum_gratissimum_01.jpg', 'Ocimum gratissimum (2).png' → 'ocimum gratissimum'
+PADRAO_NOME = r'^(?P<nome>[A-Za-z]+[ _-]+[a-z]+)'
+
+# Um job 'em_execucao' sem progresso há mais tempo que isto pode ser retomado
+INATIVO_SEGUNDOS = 600
+
+_SEPARADORES = re.compile(r'[\s_\-]+')
+
+
+class ErroImportacao(ValueError):
+    """Pedido de importação inválido (origem, mapeamento ou job)"""
+
+
+def chave_nome(nome):
+    """Género e epíteto em minúsculas (ignora autor e separadores)"""
+    return ' '.join(_SEPARADORES.split(nome.strip().lower())[:2])
+
+
+# =====================================================
+# ORIGEM E MAPEAMENTO
+# =====================================================
+
+def listar_entradas(origem):
+    """Nomes relativos (ordenados) das imagens de uma pasta ou ZIP"""
+    if os.path.isfile(origem):
+        if not zipfile.is_zipfile(origem):
+            raise ErroImportacao('A origem deve ser uma pasta ou um ficheiro ZIP')
+        with zipfile.ZipFile(origem) as arquivo:
+            nomes = [info.filename for info in arquivo.infolist() if not info.is_dir()]
+    elif os.path.isdir(origem):
+        nomes = []
+        pastas = [origem]
+        while pastas:
+            with os.scandir(pastas.pop()) as entradas:
+                for entrada in entradas:
+                    if entrada.is_dir(follow_symlinks=False):
+                        pastas.append(entrada.path)
+                    elif entrada.is_file(follow_symlinks=False):
+                        nomes.append(os.path.relpath(entrada.path, origem).replace(os.sep, '/'))
+    else:
+        raise ErroImportacao(f'Origem não encontrada: {origem}')
+
+    return sorted(
+        nome for nome in nomes
+        if nome.rsplit('.', 1)[-1].lower() in EXTENSOES
+        and not os.path.basename(nome).startswith('.')
+        and not nome.startswith('__MACOSX/')
+    )
+
+
+class Mapeamento:
+    """Ficheiro → (id_planta, legenda, referencia) por CSV ou padrão no nome"""
+
+    def __init__(self, csv_caminho=None, padrao=None):
+        self.csv_caminho = csv_caminho
+        try:
+            self.padrao = re.compile(padrao or PADRAO_NOME)
+        except re.error as e:
+            raise ErroImportacao(f'Padrão inválido: {e}')
+        if not csv_caminho and not ({'nome', 'id_planta'} & set(self.padrao.groupindex)):
+            raise ErroImportacao('O padrão deve ter um grupo (?P<nome>...) ou (?P<id_planta>...)')
+        self.linhas = {}
+        self.ids = set()
+        self.por_nome = {}
+
+    def carregar(self):
+        """Uma query para todas as plantas + leitura do CSV"""
+        for id_planta, nome_cientifico in db.session.query(
+            Planta_medicinal.id_planta, Planta_medicinal.nome_cientifico
+        ).all():
+            self.ids.add(id_planta)
+            self.por_nome.setdefault(chave_nome(nome_cientifico), id_planta)
+
+        if self.csv_caminho:
+            with open(self.csv_caminho, newline='', encoding='utf-8-sig') as f:
+                leitor = csv.DictReader(f)
+                if 'arquivo' not in (leitor.fieldnames or []):
+                    raise ErroImportacao('O CSV deve ter a coluna "arquivo"')
+                for linha in leitor:
+                    arquivo = (linha.get('arquivo') or '').strip()
+                    if arquivo:
+                        self.linhas[arquivo] = linha
+
+    def _planta(self, id_planta=None, nome=None):
+        if id_planta not in (None, ''):
+            try:
+                id_planta = int(id_planta)
+            except (TypeError, ValueError):
+                return None
+            return id_planta if id_planta in self.ids else None
+        if nome:
+            return self.por_nome.get(chave_nome(nome))
+        return None
+
+    def resolver(self, nome_relativo):
+        """
+        Returns:
+            tuple: (id_planta, legenda, referencia) ou None se sem planta
+        """
+        if self.csv_caminho:
+            linha = self.linhas.get(nome_relativo) or self.linhas.get(os.path.basename(nome_relativo))
+            if linha is None:
+                return None
+            id_planta = self._planta(linha.get('id_planta'), linha.get('nome_cientifico'))
+            if id_planta is None:
+                return None
+            return id_planta, linha.get('legenda') or None, linha.get('referencia') or None
+
+        m = self.padrao.search(os.path.basename(nome_relativo).rsplit('.', 1)[0])
+        if not m:
+            return None
+        grupos = m.groupdict()
+        id_planta = self._planta(grupos.get('id_planta'), grupos.get('nome'))
+        return (id_planta, None, None) if id_planta is not None else None
+
+
+# =====================================================
+# ESTADO DO JOB (ficheiro JSON)
+# =====================================================
+
+def _pasta_estado(app):
+    return app.config['IMAGE_IMPORT_STATE_FOLDER']
+
+
+def _caminho_estado(app, job_id):
+    if not re.match(r'^[0-9a-f]{32}$', job_id or ''):
+        raise ErroImportacao('job_id inválido')
+    return os.path.join(_pasta_estado(app), f'{job_id}.json')
+
+
+def obter_job(app, job_id):
+    try:
+        with open(_caminho_estado(app, job_id), encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, ErroImportacao):
+        return None
+
+
+def _gravar_estado(app, estado):
+    estado['atualizado_em'] = datetime.utcnow().isoformat()
+    pasta = _pasta_estado(app)
+    os.makedirs(pasta, exist_ok=True)
+    fd, temporario = tempfile.mkstemp(dir=pasta, prefix='.tmp-')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(estado, f, ensure_ascii=False)
+    os.replace(temporario, _caminho_estado(app, estado['job_id']))
+
+
+def criar_job(app, origem, csv_caminho=None, padrao=None, lote=LOTE_PADRAO, workers=None):
+    """
+    Validar o pedido e gravar o estado inicial
+
+    Returns:
+        dict: estado do job
+    """
+    origem = os.path.abspath(origem)
+    if csv_caminho:
+        csv_caminho = os.path.abspath(csv_caminho)
+        if not os.path.isfile(csv_caminho):
+            raise ErroImportacao(f'CSV não encontrado: {csv_caminho}')
+    Mapeamento(csv_caminho, padrao)  # valida o padrão
+    listar_entradas(origem)  # valida a origem
+
+    estado = {
+        'job_id': uuid.uuid4().hex,
+        'estado': 'pendente',
+        'origem': origem,
+        'csv': csv_caminho,
+        'padrao': padrao,
+        'lote': max(1, min(int(lote or LOTE_PADRAO), LOTE_MAXIMO)),
+        'workers': max(1, min(int(workers or app.config.get('IMAGE_IMPORT_WORKERS') or 2), WORKERS_MAXIMO)),
+        'total': None,
+        'cursor': 0,
+        'importadas': 0,
+        'duplicadas': 0,
+        'sem_planta': 0,
+        'rejeitadas': 0,
+        'processadas': 0,
+        'falhadas': 0,
+        'progresso': 0.0,
+        'erros': [],
+        'iniciado_em': datetime.utcnow().isoformat(),
+        'terminado_em': None,
+        'erro': None
+    }
+    _gravar_estado(app, estado)
+    return estado
+
+
+def preparar_retoma(app, job_id):
+    """
+    Estado de um job interrompido para continuar do último lote confirmado
+
+    Raises:
+        ErroImportacao: job inexistente, concluído ou ainda ativo
+    """
+    estado = obter_job(app, job_id)
+    if estado is None:
+        raise ErroImportacao(f'Job "{job_id}" não encontrado')
+    if estado['estado'] == 'concluido':
+        raise ErroImportacao('Job já concluído')
+    if estado['estado'] in ('pendente', 'em_execucao'):
+        ultimo = datetime.fromisoformat(estado['atualizado_em'])
+        if datetime.utcnow() - ultimo < timedelta(seconds=INATIVO_SEGUNDOS):
+            raise ErroImportacao('Job ainda em execução noutro processo')
+    estado.update(estado='pendente', erro=None, terminado_em=None)
+    _gravar_estado(app, estado)
+    return estado
+
+
+# =====================================================
+# EXECUÇÃO
+# =====================================================
+
+class ImportacaoImagens:
+    """Executa (ou retoma) um job de importação"""
+
+    def __init__(self, app, estado, ao_progredir=None):
+        self.app = app
+        self.estado = estado
+        self.ao_progredir = ao_progredir
+        self.mapeamento = Mapeamento(estado['csv'], estado['padrao'])
+        self.arquivo_zip = None
+        self.em_curso = {}  # futuro -> (sha256, origem, destino)
+
+    def _erro(self, nome, mensagem, contador):
+        self.estado[contador] += 1
+        if len(self.estado['erros']) < MAX_ERROS_GUARDADOS:
+            self.estado['erros'].append({'arquivo': nome, 'erro': mensagem})
+
+    def _abrir(self, nome):
+        if self.arquivo_zip is not None:
+            return self.arquivo_zip.open(nome)
+        return open(os.path.join(self.estado['origem'], nome), 'rb')
+
+    def _gravar_staging(self, nome):
+        with self._abrir(nome) as entrada, fila_imagens.abrir_staging() as escrita:
+            shutil.copyfileobj(entrada, escrita)
+            return escrita.concluir()
+
+    def importar_lote(self, nomes):
+        """
+        Gravar um lote em staging e criar as linhas com INSERT em bloco
+
+        Returns:
+            list: trabalhos (sha256, staging, destino) de conteúdo novo
+        """
+        itens = []
+        for nome in nomes:
+            planta = self.mapeamento.resolver(nome)
+            if planta is None:
+                self._erro(nome, 'Planta não encontrada', 'sem_planta')
+                continue
+            try:
+                itens.append((nome, *planta, self._gravar_staging(nome)))
+            except (UploadRejeitado, OSError, zipfile.BadZipFile) as e:
+                self._erro(nome, str(e), 'rejeitadas')
+        if not itens:
+            return []
+
+        shas = list({upload.sha256 for *_, upload in itens})
+        # Retoma idempotente: (planta, conteúdo) já importado não se repete
+        existentes = set(db.session.query(Imagem.id_planta, Imagem.sha256).filter(Imagem.sha256.in_(shas)).all())
+        ficheiros = {
+            sha256: [extensao, estado]
+            for sha256, extensao, estado in db.session.query(
+                Ficheiro_imagem.sha256, Ficheiro_imagem.extensao, Ficheiro_imagem.estado
+            ).filter(Ficheiro_imagem.sha256.in_(shas)).all()
+        }
+        metadados = {}
+        prontos = [sha for sha, (_, estado) in ficheiros.items() if estado == 'pronta']
+        if prontos:
+            for linha in db.session.query(Imagem.sha256, *(getattr(Imagem, c) for c in CAMPOS_METADADOS)).filter(
+                Imagem.sha256.in_(prontos), Imagem.largura.isnot(None)
+            ).all():
+                metadados.setdefault(linha[0], dict(zip(CAMPOS_METADADOS, linha[1:])))
+
+        novos_ficheiros, reprocessar, processar = [], [], {}
+        referencias = Counter()
+        linhas = []
+        for nome, id_planta, legenda, referencia, upload in itens:
+            sha256 = upload.sha256
+            if (id_planta, sha256) in existentes:
+                self.estado['duplicadas'] += 1
+                continue
+            existentes.add((id_planta, sha256))
+
+            if sha256 not in ficheiros:
+                ficheiros[sha256] = [upload.extensao, 'pendente']
+                novos_ficheiros.append({
+                    'sha256': sha256, 'extensao': upload.extensao, 'bytes': upload.tamanho,
+                    'referencias': 0, 'estado': 'pendente', 'criado_em': datetime.utcnow()
+                })
+                processar[sha256] = (upload.extensao, upload.caminho)
+            elif ficheiros[sha256][1] == 'erro':
+                ficheiros[sha256][1] = 'pendente'
+                reprocessar.append(sha256)
+                processar[sha256] = (ficheiros[sha256][0], upload.caminho)
+
+            extensao, estado = ficheiros[sha256]
+            referencias[sha256] += 1
+            linhas.append({
+                'id_planta': id_planta,
+                'sha256': sha256,
+                'nome_arquivo': f'{sha256}.{extensao}',
+                'url_armazenamento': imagens_conteudo.url(sha256, extensao),
+                'legenda': legenda,
+                'referencia_img': referencia,
+                'estado': estado,
+                **{c: metadados.get(sha256, {}).get(c) for c in CAMPOS_METADADOS}
+            })
+
+        try:
+            tabela = Ficheiro_imagem.__table__
+            if novos_ficheiros:
+                try:
+                    db.session.execute(tabela.insert(), novos_ficheiros)
+                except IntegrityError:
+                    # Upload igual noutro pedido entretanto: um a um, sem savepoint
+                    for linha in novos_ficheiros:
+                        imagens_conteudo.obter_ou_criar_ficheiro(linha['sha256'], linha['extensao'], linha['bytes'])
+            if reprocessar:
+                db.session.execute(tabela.update().where(tabela.c.sha256.in_(reprocessar)).values(estado='pendente'))
+            if linhas:
+                # Core: os eventos do ORM não correm, a contagem é feita aqui numa executemany
+                db.session.execute(Imagem.__table__.insert(), linhas)
+                db.session.execute(
+                    tabela.update().where(tabela.c.sha256 == bindparam('b_sha256')).values(
+                        referencias=tabela.c.referencias + bindparam('b_total')
+                    ),
+                    [{'b_sha256': sha, 'b_total': total} for sha, total in referencias.items()]
+                )
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            for *_, upload in itens:
+                fila_imagens.descartar(upload)
+            raise
+
+        self.estado['importadas'] += len(linhas)
+
+        # Só o staging de cada conteúdo a processar vai para o pool; o resto (repetidos,
+        # conteúdo pronto ou já na fila com o staging de outro pedido) sai aqui
+        origens = {origem for _, origem in processar.values()}
+        for *_, upload in itens:
+            if upload.caminho not in origens:
+                fila_imagens.descartar(upload)
+
+        return [
+            (sha256, origem, imagens_conteudo.chave(sha256, extensao))
+            for sha256, (extensao, origem) in processar.items()
+        ]
+
+    def _recolher(self, maximo):
+        """Registar os trabalhos terminados até restarem no máximo `maximo`"""
+        while len(self.em_curso) > maximo:
+            terminados, _ = wait(list(self.em_curso), return_when=FIRST_COMPLETED)
+            for futuro in terminados:
+                sha256, origem, destino = self.em_curso.pop(futuro)
+                try:
+                    fila_imagens.registar_resultado(sha256, origem, destino, None, futuro.result())
+                    self.estado['processadas'] += 1
+                except Exception as e:
+                    fila_imagens.registar_resultado(sha256, origem, destino, str(e))
+                    self.estado['falhadas'] += 1
+
+    def _progredir(self):
+        total = self.estado['total'] or 0
+        self.estado['progresso'] = round(self.estado['cursor'] / total * 100, 1) if total else 100.0
+        _gravar_estado(self.app, self.estado)
+        if self.ao_progredir:
+            self.ao_progredir(self.estado)
+
+    def executar(self):
+        estado = self.estado
+        estado['estado'] = 'em_execucao'
+        try:
+            entradas = listar_entradas(estado['origem'])
+            estado['total'] = len(entradas)
+            self.mapeamento.carregar()
+            db.session.commit()  # Não manter a transação de leitura aberta
+            if os.path.isfile(estado['origem']):
+                self.arquivo_zip = zipfile.ZipFile(estado['origem'])
+            self._progredir()
+
+            workers = estado['workers']
+            with ProcessPoolExecutor(max_workers=workers, initializer=inicializar_processo,
+                                     initargs=(self.app.config.get('IMAGE_WORKER_NICE', 10),)) as pool:
+                for inicio in range(estado['cursor'], len(entradas), estado['lote']):
+                    for trabalho in self.importar_lote(entradas[inicio:inicio + estado['lote']]):
+                        self.em_curso[pool.submit(
+                            processar_imagem, trabalho[1], trabalho[2], armazenamento.conteudo
+                        )] = trabalho
+                    # O lote seguinte vai para staging enquanto o pool processa este
+                    self._recolher(maximo=workers * 4)
+                    estado['cursor'] = min(inicio + estado['lote'], len(entradas))
+                    self._progredir()
+                self._recolher(maximo=0)
+
+            estado.update(estado='concluido', progresso=100.0, terminado_em=datetime.utcnow().isoformat())
+        except Exception as e:
+            print(f"❌ Erro na importação de imagens {estado['job_id']}: {e}")
+            estado.update(estado='erro', erro=str(e), terminado_em=datetime.utcnow().isoformat())
+        finally:
+            if self.arquivo_zip is not None:
+                self.arquivo_zip.close()
+            # Trabalhos submetidos e não registados ficam 'pendente' com o staging:
+            # a fila de imagens retoma-os
+            _gravar_estado(self.app, estado)
+        return estado
+
+
+def iniciar_job(app, estado):
+    """
+    Executar a importação numa thread com app context próprio
+
+    Returns:
+        str: job_id para consultar o progresso
+    """
+    def executar():
+        with app.app_context():
+            try:
+                ImportacaoImagens(app, estado).executar()
+            finally:
+                db.session.remove()
+
+    threading.Thread(target=executar, name=f'importar-imagens-{estado["job_id"][:8]}', daemon=True).start()
+    return estado['job_id']
+
+
+def registrar_comando_importacao(app):
+    """Comando `flask importar-imagens` (corre em primeiro plano)"""
+    import click
+
+    @app.cli.command('importar-imagens')
+    @click.argument('origem', required=False)
+    @click.option('--csv', 'csv_caminho', help='CSV com arquivo,id_planta|nome_cientifico[,legenda,referencia]')
+    @click.option('--padrao', help=f'Regex no nome do ficheiro (por omissão {PADRAO_NOME})')
+    @click.option('--lote', default=LOTE_PADRAO, show_default=True, help='Imagens por INSERT/COMMIT')
+    @click.option('--workers', type=int, help='Processos para os derivados (IMAGE_IMPORT_WORKERS)')
+    @click.option('--retomar', 'job_id', help='Continuar um job interrompido')
+    def importar_imagens(origem, csv_caminho, padrao, lote, workers, job_id):
+        """Importar imagens de uma pasta ou ZIP, associadas às plantas pelo nome ou CSV"""
+        try:
+            if job_id:
+                estado = preparar_retoma(app, job_id)
+            elif origem:
+                estado = criar_job(app, origem, csv_caminho, padrao, lote, workers)
+            else:
+                raise click.UsageError('Indique ORIGEM ou --retomar JOB_ID')
+        except ErroImportacao as e:
+            raise click.ClickException(str(e))
+
+        click.echo(f"🖼️ Importação {estado['job_id']} (retomar com --retomar {estado['job_id']})")
+
+        def mostrar(e):
+            click.echo(f"  {e['cursor']}/{e['total']} ({e['progresso']}%) - importadas {e['importadas']}, "
+                       f"duplicadas {e['duplicadas']}, sem planta {e['sem_planta']}, "
+                       f"rejeitadas {e['rejeitadas']}, processadas {e['processadas']}")
+
+        final = ImportacaoImagens(app, estado, ao_progredir=mostrar).executar()
+        mostrar(final)
+        if final['estado'] != 'concluido':
+            raise click.ClickException(final['erro'] or 'Importação interrompida')
+        click.echo('✅ Importação concluída')
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Processamento de Imagens (executado nos processos da fila)
+Só depende do PIL: o módulo é importado pelos processos filhos, que não
+criam a aplicação Flask nem ligam à base de dados
+"""
+import base64
+import io
+import os
+import tempfile
+from contextlib import ExitStack
+
+from PIL import Image as PILImage, features
+
+# Assinaturas (magic bytes) dos formatos aceites
+ASSINATURAS = (
+    (b'\xff\xd8\xff', 'jpg'),
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'GIF87a', 'gif'),
+    (b'GIF89a', 'gif'),
+)
+
+FORMATOS_PIL = {'jpg': 'JPEG', 'jpeg': 'JPEG', 'png': 'PNG', 'gif': 'GIF', 'webp': 'WEBP'}
+
+# Derivados responsivos: variante -> largura máxima (nunca maior que o original)
+VARIANTES = (('thumb', 320), ('medium', 800), ('full', 1600))
+FORMATOS_VARIANTES = ('webp', 'jpg') if features.check('webp') else ('jpg',)
+QUALIDADE_VARIANTES = {'webp': 80, 'jpg': 82}
+
+# Placeholder (LQIP): JPEG minúsculo em data URI, desfocado pelo cliente com CSS
+LADO_LQIP = 16
+QUALIDADE_LQIP = 50
+
+
+def formato_por_assinatura(inicio):
+    """
+    Extensão a partir dos primeiros bytes do ficheiro (None se desconhecido)
+    """
+    for assinatura, ext in ASSINATURAS:
+        if inicio.startswith(assinatura):
+            return ext
+    if inicio[:4] == b'RIFF' and inicio[8:12] == b'WEBP':
+        return 'webp'
+    return None
+
+
+def inicializar_processo(nice=0):
+    """Initializer do pool: baixar a prioridade para não competir com a API"""
+    if nice and hasattr(os, 'nice'):
+        try:
+            os.nice(nice)
+        except OSError:
+            pass
+
+
+def caminho_variante(destino, variante, formato):
+    """<pasta>/<nome sem extensão>.<variante>.<formato>"""
+    return f"{destino.rsplit('.', 1)[0]}.{variante}.{formato}"
+
+
+def _gravar(img, destino, formato, qualidade):
+    """Gravar de forma atómica (nunca se serve meia imagem)"""
+    fd, temporario = tempfile.mkstemp(dir=os.path.dirname(destino), prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            if formato == 'JPEG' and img.mode not in ('RGB', 'L'):
+                img = img.convert('RGB')
+            img.save(f, format=formato, quality=qualidade, optimize=True)
+        os.replace(temporario, destino)
+    except Exception:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+        raise
+    return os.path.getsize(destino)
+
+
+def gerar_variantes(img, destino):
+    """
+    Gravar os derivados thumb/medium/full em todos os formatos
+
+    Cada largura é reduzida a partir da anterior (maior → menor); larguras
+    iguais ao original ou a uma variante já gerada não se repetem
+
+    Returns:
+        list: dicts com variante, formato, largura, altura, bytes
+    """
+    if img.mode not in ('RGB', 'RGBA', 'L'):
+        img = img.convert('RGBA' if 'transparency' in img.info else 'RGB')
+
+    variantes = []
+    atual = img
+    larguras_feitas = set()
+    for variante, largura in reversed(VARIANTES):
+        largura = min(largura, img.width)
+        if largura in larguras_feitas:
+            continue
+        larguras_feitas.add(largura)
+
+        if largura < atual.width:
+            altura = max(1, round(atual.height * largura / atual.width))
+            atual = atual.resize((largura, altura), PILImage.Resampling.LANCZOS)
+
+        for formato in FORMATOS_VARIANTES:
+            tamanho = _gravar(atual, caminho_variante(destino, variante, formato),
+                              FORMATOS_PIL[formato], QUALIDADE_VARIANTES[formato])
+            variantes.append({'variante': variante, 'formato': formato,
+                              'largura': atual.width, 'altura': atual.height, 'bytes': tamanho})
+    return variantes
+
+
+def _sem_transparencia(img):
+    """RGB sobre fundo branco (a transparência não pode ficar preta no JPEG/cor)"""
+    if img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info):
+        img = img.convert('RGBA')
+        fundo = PILImage.new('RGB', img.size, (255, 255, 255))
+        fundo.paste(img, mask=img.getchannel('A'))
+        return fundo
+    return img.convert('RGB')
+
+
+def extrair_metadados(img, caminho):
+    """
+    Metadados guardados em Imagem para os clientes montarem a galeria sem
+    descarregar a imagem
+
+    Returns:
+        dict: largura, altura, formato, bytes, cor_dominante ('#rrggbb'),
+              lqip (data URI JPEG com até 16px de lado)
+    """
+    pequena = img.copy()
+    pequena.thumbnail((64, 64))
+    pequena = _sem_transparencia(pequena)
+
+    # Cor dominante: a mais frequente após reduzir a 5 cores
+    paleta = pequena.quantize(colors=5, method=PILImage.Quantize.MEDIANCUT)
+    _, indice = max(paleta.getcolors())
+    r, g, b = paleta.getpalette()[indice * 3:indice * 3 + 3]
+
+    pequena.thumbnail((LADO_LQIP, LADO_LQIP))
+    buffer = io.BytesIO()
+    pequena.save(buffer, format='JPEG', quality=QUALIDADE_LQIP, optimize=True)
+
+    return {
+        'largura': img.width,
+        'altura': img.height,
+        'formato': (img.format or '').lower() or None,
+        'bytes': os.path.getsize(caminho),
+        'cor_dominante': f'#{r:02x}{g:02x}{b:02x}',
+        'lqip': 'data:image/jpeg;base64,' + base64.b64encode(buffer.getvalue()).decode('ascii'),
+    }
+
+
+def processar_imagem(origem, chave, armazenamento):
+    """
+    Validar uma imagem em staging, gerar os derivados e gravá-la no
+    armazenamento (o ficheiro final é o conteúdo enviado, sem recodificação:
+    o nome é o SHA-256 dos bytes)
+
+    Args:
+        origem: ficheiro em staging
+        chave: chave final endereçada pelo conteúdo ('ab/<sha256>.jpg')
+        armazenamento: backend de destino (utils.armazenamento)
+
+    Returns:
+        dict: metadados (extrair_metadados) e variantes
+    """
+    with ExitStack() as pilha:
+        # Reprocessamento por outro worker: o conteúdo já foi gravado
+        reprocessar = not os.path.exists(origem)
+        if reprocessar:
+            origem = pilha.enter_context(armazenamento.copia_local(chave))
+
+        # Derivados gerados ao lado da origem e depois enviados para o armazenamento
+        pasta = pilha.enter_context(tempfile.TemporaryDirectory(dir=os.path.dirname(origem), prefix='.tmp-'))
+        destino = os.path.join(pasta, os.path.basename(chave))
+        with PILImage.open(origem) as img:
+            img.load()
+            resultado = extrair_metadados(img, origem)
+            resultado['variantes'] = gerar_variantes(img, destino)
+
+        for v in resultado['variantes']:
+            armazenamento.guardar_ficheiro(caminho_variante(chave, v['variante'], v['formato']),
+                                           caminho_variante(destino, v['variante'], v['formato']), mover=True)
+
+    # O original por último: quem o encontra encontra também os derivados
+    if not reprocessar:
+        armazenamento.guardar_ficheiro(chave, origem, mover=True)
+    return resultado
@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Reconciliação do Armazenamento de Imagens
+Compara os ficheiros armazenados com a base de dados, uma pasta de cada vez:
+- 'antigas': <id_planta>/ em armazenamento.antigas ↔ Imagem sem sha256
+  dessa planta
+- 'conteudo': <ab>/ em armazenamento.conteudo ↔ Ficheiro_imagem com
+  sha256 começado por 'ab' (e a contagem de referências contra Imagem)
+
+Cada pasta é listada pelo backend (os.scandir no disco, list_objects_v2
+no S3) e confrontada com UMA query limitada a essa pasta; nada é
+carregado por inteiro. O progresso (última pasta
+concluída e relatório acumulado) fica num ficheiro de checkpoint: cada
+execução trata até `limite` pastas e a seguinte continua daí.
+
+Por omissão só reporta; com aplicar=True apaga ficheiros órfãos (mais
+antigos que ORFAO_IDADE_MINIMA), corrige contagens e remove conteúdos sem
+referências (também só os mais antigos; os ficheiros só depois do commit
+da pasta); com remover_em_falta=True apaga também os registos Imagem
+cujo ficheiro não existe
+"""
+import json
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select
+
+from models.planta import db, Imagem, Imagem_variante, Ficheiro_imagem
+from utils import armazenamento, imagens_conteudo
+from utils.imagens_processamento import caminho_variante, VARIANTES, FORMATOS_VARIANTES
+
+ARVORES = ('antigas', 'conteudo')
+PREFIXOS_CONTEUDO = [f'{i:02x}' for i in range(256)]
+
+# Ficheiros mais recentes podem pertencer a um pedido/worker em curso
+ORFAO_IDADE_MINIMA = 3600
+MAX_EXEMPLOS = 200
+
+CONTADORES = (
+    'pastas', 'ficheiros', 'orfaos', 'orfaos_apagados', 'bytes_orfaos', 'em_falta',
+    'registos_removidos', 'referencias_corrigidas', 'conteudos_removidos'
+)
+
+
+def _relatorio_vazio():
+    return {**{c: 0 for c in CONTADORES}, 'exemplos_orfaos': [], 'exemplos_em_falta': []}
+
+
+def _exemplo(relatorio, chave, valor):
+    if len(relatorio[chave]) < MAX_EXEMPLOS:
+        relatorio[chave].append(valor)
+
+
+def _nomes_derivados(nome):
+    return {os.path.basename(caminho_variante(nome, v, f)) for v, _ in VARIANTES for f in FORMATOS_VARIANTES}
+
+
+def _listar_pasta(backend, prefixo):
+    """{nome: InfoFicheiro} dos ficheiros de uma pasta (vazio se não existir)"""
+    return {info.nome: info for info in backend.listar(prefixo)}
+
+
+class Reconciliacao:
+    """Uma passagem incremental (até `limite` pastas) com checkpoint em ficheiro"""
+
+    def __init__(self, app, aplicar=False, remover_em_falta=False):
+        self.app = app
+        self.aplicar = aplicar
+        self.remover_em_falta = remover_em_falta
+        self.antigas = armazenamento.antigas
+        self.conteudo = armazenamento.conteudo
+        self.caminho_checkpoint = app.config['IMAGE_RECONCILE_STATE_FILE']
+        self.limite_tempo = time.time() - ORFAO_IDADE_MINIMA
+        self.limite_registo = datetime.utcnow() - timedelta(seconds=ORFAO_IDADE_MINIMA)
+        self._apagar_apos_commit = []  # Chaves de conteúdos removidos na pasta atual
+
+    # ---------------- checkpoint ----------------
+
+    def ler_checkpoint(self):
+        try:
+            with open(self.caminho_checkpoint, encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _novo_checkpoint(self, anterior=None):
+        return {
+            'arvore': ARVORES[0],
+            'ultima_pasta': None,
+            'relatorio': _relatorio_vazio(),
+            'iniciado_em': datetime.utcnow().isoformat(),
+            'atualizado_em': None,
+            'ultimo_ciclo': (anterior or {}).get('ultimo_ciclo')
+        }
+
+    def _gravar_checkpoint(self, checkpoint):
+        checkpoint['atualizado_em'] = datetime.utcnow().isoformat()
+        pasta = os.path.dirname(self.caminho_checkpoint)
+        os.makedirs(pasta, exist_ok=True)
+        fd, temporario = tempfile.mkstemp(dir=pasta, prefix='.tmp-')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(checkpoint, f, ensure_ascii=False)
+        os.replace(temporario, self.caminho_checkpoint)
+
+    # ---------------- pastas a visitar ----------------
+
+    def _pastas(self, arvore):
+        """Nomes ordenados das pastas de uma árvore (só o primeiro nível)"""
+        if arvore == 'conteudo':
+            return PREFIXOS_CONTEUDO
+        nomes = {nome for nome in self.antigas.listar_pastas() if nome.isdigit()}
+        # Plantas com imagens antigas mas sem pasta: os ficheiros estão todos em falta
+        nomes.update(str(id_planta) for (id_planta,) in db.session.query(Imagem.id_planta).filter(
+            Imagem.sha256.is_(None)
+        ).distinct())
+        return sorted(nomes, key=int)
+
+    # ---------------- ficheiros órfãos ----------------
+
+    def _tratar_orfao(self, relatorio, backend, chave, info, rotulo):
+        if info.modificado > self.limite_tempo:
+            return
+        relatorio['orfaos'] += 1
+        relatorio['bytes_orfaos'] += info.tamanho
+        _exemplo(relatorio, 'exemplos_orfaos', rotulo)
+        if self.aplicar:
+            backend.apagar(chave)
+            relatorio['orfaos_apagados'] += 1
+
+    def _remover_imagens(self, relatorio, *filtros):
+        """Apagar registos Imagem pelo ORM (a contagem de referências acompanha)"""
+        for imagem in Imagem.query.filter(*filtros).all():
+            db.session.delete(imagem)
+            relatorio['registos_removidos'] += 1
+
+    # ---------------- árvores ----------------
+
+    def _reconciliar_antiga(self, nome_pasta, relatorio):
+        id_planta = int(nome_pasta)
+        ficheiros = _listar_pasta(self.antigas, nome_pasta)
+        relatorio['ficheiros'] += len(ficheiros)
+
+        registos = {
+            nome: id_imagem for id_imagem, nome in db.session.query(Imagem.id_imagem, Imagem.nome_arquivo).filter(
+                Imagem.id_planta == id_planta, Imagem.sha256.is_(None)
+            )
+        }
+        esperados = set(registos)
+        for nome in registos:
+            esperados |= _nomes_derivados(nome)
+
+        for nome, info in ficheiros.items():
+            if nome not in esperados:
+                self._tratar_orfao(relatorio, self.antigas, f'{nome_pasta}/{nome}', info,
+                                   f'antigas/{nome_pasta}/{nome}')
+
+        em_falta = [id_imagem for nome, id_imagem in registos.items() if nome not in ficheiros]
+        for nome, id_imagem in registos.items():
+            if nome not in ficheiros:
+                relatorio['em_falta'] += 1
+                _exemplo(relatorio, 'exemplos_em_falta', {'id_imagem': id_imagem, 'arquivo': f'{nome_pasta}/{nome}'})
+        if em_falta and self.remover_em_falta:
+            self._remover_imagens(relatorio, Imagem.id_imagem.in_(em_falta))
+
+        # Pasta de uma planta apagada que ficou vazia
+        if self.aplicar and not registos:
+            self.antigas.remover_pasta_vazia(nome_pasta)
+
+    def _reconciliar_conteudo(self, prefixo, relatorio):
+        ficheiros = _listar_pasta(self.conteudo, prefixo)
+        relatorio['ficheiros'] += len(ficheiros)
+
+        # Intervalo [ab, ab~) usa o índice da chave primária
+        no_prefixo = (Ficheiro_imagem.sha256 >= prefixo, Ficheiro_imagem.sha256 < prefixo + 'g')
+        conteudos = {
+            sha256: (extensao, estado, referencias, criado_em)
+            for sha256, extensao, estado, referencias, criado_em in db.session.query(
+                Ficheiro_imagem.sha256, Ficheiro_imagem.extensao, Ficheiro_imagem.estado,
+                Ficheiro_imagem.referencias, Ficheiro_imagem.criado_em
+            ).filter(*no_prefixo)
+        }
+        if not conteudos and not ficheiros:
+            return
+        contagens = dict(db.session.query(Imagem.sha256, func.count(Imagem.id_imagem)).filter(
+            Imagem.sha256 >= prefixo, Imagem.sha256 < prefixo + 'g'
+        ).group_by(Imagem.sha256).all())
+
+        esperados = set()
+        for sha256, (extensao, *_) in conteudos.items():
+            nome = f'{sha256}.{extensao}'
+            esperados.add(nome)
+            esperados |= _nomes_derivados(nome)
+
+        for nome, info in ficheiros.items():
+            if nome not in esperados:
+                self._tratar_orfao(relatorio, self.conteudo, f'{prefixo}/{nome}', info,
+                                   f'conteudo/{prefixo}/{nome}')
+
+        tabela = Ficheiro_imagem.__table__
+        for sha256, (extensao, estado, referencias, criado_em) in conteudos.items():
+            total = contagens.get(sha256, 0)
+            if total != referencias:
+                # Apagamentos fora do ORM (SQL direto, cascata na BD) não passam pelos eventos
+                relatorio['referencias_corrigidas'] += 1
+                if self.aplicar:
+                    # Só se `referencias` não mudou desde a leitura (uma imagem criada entretanto
+                    # incrementa-a): senão a correção fica para o próximo ciclo
+                    inalterado = (tabela.c.sha256 == sha256, tabela.c.referencias == referencias)
+                    if total == 0 and criado_em < self.limite_registo:
+                        if self._remover_conteudo(sha256, extensao, inalterado):
+                            relatorio['conteudos_removidos'] += 1
+                            continue
+                    elif total > 0:
+                        db.session.execute(tabela.update().where(*inalterado).values(referencias=total))
+
+            # 'pendente' ainda está em staging
+            if estado == 'pronta' and f'{sha256}.{extensao}' not in ficheiros:
+                relatorio['em_falta'] += 1
+                _exemplo(relatorio, 'exemplos_em_falta', {'sha256': sha256, 'arquivo': f'{prefixo}/{sha256}.{extensao}'})
+                if self.remover_em_falta:
+                    self._remover_imagens(relatorio, Imagem.sha256 == sha256)
+
+    def _remover_conteudo(self, sha256, extensao, inalterado):
+        """
+        Apagar um conteúdo sem referências (registo e variantes); os ficheiros
+        só saem depois do commit, para um rollback não deixar registos sem ficheiro
+
+        Returns:
+            bool: removido (False se `referencias` mudou entretanto)
+        """
+        tabela = Ficheiro_imagem.__table__
+        if db.session.execute(select(tabela.c.sha256).where(*inalterado).with_for_update()).first() is None:
+            return False
+        variantes = Imagem_variante.__table__
+        db.session.execute(variantes.delete().where(variantes.c.sha256 == sha256))
+        if db.session.execute(tabela.delete().where(*inalterado)).rowcount != 1:
+            raise RuntimeError(f'Conteúdo {sha256[:12]} alterado durante a remoção')
+        self._apagar_apos_commit.append(imagens_conteudo.chave(sha256, extensao))
+        return True
+
+    def _concluir_pasta(self):
+        """Commit da pasta e só depois apagar os ficheiros dos conteúdos removidos"""
+        try:
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        finally:
+            chaves, self._apagar_apos_commit = self._apagar_apos_commit, []
+        for chave in chaves:
+            imagens_conteudo.apagar_ficheiros(self.conteudo, chave)
+
+    # ---------------- execução ----------------
+
+    def executar(self, limite=100, reiniciar=False):
+        """
+        Reconciliar até `limite` pastas a partir do checkpoint
+
+        Returns:
+            dict: checkpoint (relatório acumulado do ciclo, 'concluido' no fim)
+        """
+        anterior = self.ler_checkpoint()
+        checkpoint = self._novo_checkpoint(anterior) if reiniciar or anterior is None else anterior
+        relatorio = checkpoint['relatorio']
+
+        processadas = 0
+        while processadas < limite:
+            arvore = checkpoint['arvore']
+            ultima = checkpoint['ultima_pasta']
+            chave = int if arvore == 'antigas' else str
+            pendentes = [p for p in self._pastas(arvore) if ultima is None or chave(p) > chave(ultima)]
+            lote = pendentes[:limite - processadas]
+
+            for nome_pasta in lote:
+                try:
+                    if arvore == 'antigas':
+                        self._reconciliar_antiga(nome_pasta, relatorio)
+                    else:
+                        self._reconciliar_conteudo(nome_pasta, relatorio)
+                except Exception:
+                    db.session.rollback()
+                    self._apagar_apos_commit = []
+                    raise
+                self._concluir_pasta()
+                relatorio['pastas'] += 1
+                processadas += 1
+                checkpoint['ultima_pasta'] = nome_pasta
+                self._gravar_checkpoint(checkpoint)
+
+            if len(lote) < len(pendentes):
+                break
+            indice = ARVORES.index(arvore)
+            if indice + 1 < len(ARVORES):
+                checkpoint['arvore'] = ARVORES[indice + 1]
+                checkpoint['ultima_pasta'] = None
+                continue
+
+            # Ciclo completo: guardar o relatório e recomeçar na próxima execução
+            checkpoint['ultimo_ciclo'] = {
+                'relatorio': relatorio,
+                'iniciado_em': checkpoint['iniciado_em'],
+                'terminado_em': datetime.utcnow().isoformat(),
+                'aplicado': self.aplicar
+            }
+            self._gravar_checkpoint(self._novo_checkpoint(checkpoint))
+            return {**checkpoint, 'concluido': True}
+
+        self._gravar_checkpoint(checkpoint)
+        return {**checkpoint, 'concluido': False}
+
+
+def registrar_comando_reconciliacao(app):
+    """Comando `flask reconciliar-imagens` (uma passagem limitada por execução)"""
+    import click
+
+    @app.cli.command('reconciliar-imagens')
+    @click.option('--aplicar', is_flag=True, help='Apagar órfãos e corrigir contagens (por omissão só reporta)')
+    @click.option('--remover-em-falta', is_flag=True, help='Apagar registos Imagem cujo ficheiro não existe')
+    @click.option('--limite', default=100, show_default=True, help='Pastas a tratar nesta execução')
+    @click.option('--reiniciar', is_flag=True, help='Ignorar o checkpoint e começar do início')
+    def reconciliar_imagens(aplicar, remover_em_falta, limite, reiniciar):
+        """Comparar o disco com a base de dados (continua do último checkpoint)"""
+        resultado = Reconciliacao(app, aplicar, remover_em_falta).executar(limite, reiniciar)
+        relatorio = resultado['relatorio']
+        click.echo(f"🔍 {resultado['arvore']}/{resultado['ultima_pasta'] or '-'}: {relatorio['pastas']} pastas, "
+                   f"{relatorio['ficheiros']} ficheiros, {relatorio['orfaos']} órfãos "
+                   f"({relatorio['bytes_orfaos']} bytes, {relatorio['orfaos_apagados']} apagados), "
+                   f"{relatorio['em_falta']} em falta ({relatorio['registos_removidos']} removidos), "
+                   f"{relatorio['referencias_corrigidas']} contagens erradas")
+        for exemplo in relatorio['exemplos_orfaos'][:20]:
+            click.echo(f'  órfão: {exemplo}')
+        for exemplo in relatorio['exemplos_em_falta'][:20]:
+            click.echo(f'  em falta: {exemplo}')
+        if resultado['concluido']:
+            click.echo('✅ Ciclo completo (a próxima execução recomeça do início)')
+        else:
+            click.echo('🔄 Checkpoint gravado: volte a executar para continuar')
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Servir Ficheiros de Imagem (todas as rotas /uploads/... passam por aqui)
+- IMAGE_SERVE_MODE='flask': send_file condicional - ETag forte,
+  Last-Modified, 304 e pedidos Range (206) sem ler o ficheiro para memória;
+  com armazenamento S3 o objeto é reenviado aos blocos (ETag/304 incluídos)
+- 'x-accel' (nginx) ou 'x-sendfile' (Apache/lighttpd): a resposta só leva
+  o cabeçalho e o servidor web envia o ficheiro, libertando o worker Python
+  (x-sendfile precisa de ficheiros locais; com S3 usa o modo 'flask')
+- 'redirect' (só S3): 302 para um URL assinado, o cliente descarrega do bucket
+
+Exemplo nginx (IMAGE_ACCEL_PREFIX='/_imagens'):
+    location /_imagens/imagens/ {
+        internal;
+        alias /srv/uploads/imagens/;
+    }
+    location /_imagens/plantas_imagens/ {
+        internal;
+        alias /srv/uploads/plantas_imagens/;
+    }
+(com S3, `proxy_pass https://<bucket>.<endpoint>/<IMAGE_S3_PREFIX>/` em vez de alias)
+"""
+import mimetypes
+import os
+
+from flask import current_app, redirect, request, send_file
+from werkzeug.wsgi import wrap_file
+
+from utils.armazenamento import TAMANHO_BLOCO
+
+MODOS = ('flask', 'x-accel', 'x-sendfile', 'redirect')
+
+
+def _cache_control(resposta, max_age, imutavel):
+    resposta.cache_control.public = True
+    resposta.cache_control.max_age = max_age
+    if imutavel:
+        resposta.cache_control.immutable = True
+
+
+def _resposta_vazia(chave, info, etag):
+    """Resposta sem corpo com ETag/Last-Modified (304 se o cliente já tem o ficheiro)"""
+    resposta = current_app.response_class(
+        mimetype=mimetypes.guess_type(chave)[0] or 'application/octet-stream'
+    )
+    resposta.set_etag(etag or info.etag or f'{int(info.modificado)}-{info.tamanho}')
+    resposta.last_modified = int(info.modificado)
+    return resposta.make_conditional(request)
+
+
+def _resposta_delegada(modo, caminho, chave, raiz, info, etag):
+    resposta = _resposta_vazia(chave, info, etag)
+    if modo == 'x-accel':
+        prefixo = current_app.config['IMAGE_ACCEL_PREFIX'].rstrip('/')
+        resposta.headers['X-Accel-Redirect'] = f'{prefixo}/{raiz}/{chave}'
+    else:
+        resposta.headers['X-Sendfile'] = caminho
+    return resposta
+
+
+def _resposta_remota(armazenamento, chave, info, etag):
+    """Corpo lido do backend aos blocos (sem Range: o objeto é enviado inteiro)"""
+    resposta = _resposta_vazia(chave, info, etag)
+    if resposta.status_code == 304:
+        return resposta
+    corpo = armazenamento.abrir(chave)
+    resposta.response = wrap_file(request.environ, corpo, TAMANHO_BLOCO)
+    resposta.direct_passthrough = True
+    resposta.content_length = info.tamanho
+    return resposta
+
+
+def servir_imagem(armazenamento, chave, raiz, imutavel=False, etag=None):
+    """
+    Servir um ficheiro de imagem
+
+    Args:
+        armazenamento: backend (utils.armazenamento.conteudo ou .antigas)
+        chave: chave no armazenamento ('ab/<sha>.webp', '12/x.jpg')
+        raiz: nome da localização interna no servidor web (modo x-accel)
+        imutavel: o URL identifica o conteúdo (Cache-Control immutable)
+        etag: ETag forte fixo (p.ex. o nome com SHA-256); por omissão
+              derivado de mtime/tamanho (ou o ETag do S3)
+
+    Returns:
+        Response, ou None se o ficheiro não existir
+    """
+    info = armazenamento.info(chave)
+    if info is None:
+        return None
+
+    modo = current_app.config.get('IMAGE_SERVE_MODE', 'flask')
+    max_age = (current_app.config['IMAGE_CACHE_MAX_AGE_IMUTAVEL'] if imutavel
+               else current_app.config['IMAGE_CACHE_MAX_AGE'])
+
+    if modo == 'redirect' and not armazenamento.local:
+        # O URL assinado muda a cada pedido: o redirect não vai para cache partilhada
+        return redirect(armazenamento.url_temporario(chave, current_app.config['IMAGE_S3_URL_EXPIRES']))
+
+    caminho = os.path.abspath(armazenamento.caminho_local(chave)) if armazenamento.local else None
+    if modo == 'x-accel' or (modo == 'x-sendfile' and caminho):
+        resposta = _resposta_delegada(modo, caminho, chave, raiz, info, etag)
+    elif caminho:
+        resposta = send_file(caminho, conditional=True, etag=etag if etag else True, max_age=max_age)
+        resposta.headers['Accept-Ranges'] = 'bytes'
+    else:
+        resposta = _resposta_remota(armazenamento, chave, info, etag)
+
+    _cache_control(resposta, max_age, imutavel)
+    return resposta
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+JSON Patch (RFC 6902) - subconjunto usado pelo autosave do wizard
+Operações: add, remove, replace, move, copy, test
+Caminhos em JSON Pointer (RFC 6901): '/imagens/0/legenda', '/nomes_comuns/-'
+"""
+import copy
+
+OPERACOES = ('add', 'remove', 'replace', 'move', 'copy', 'test')
+
+
+class PatchInvalido(ValueError):
+    """Operação mal formada ou caminho inexistente"""
+
+
+def _partes(caminho):
+    if caminho == '':
+        return []
+    if not isinstance(caminho, str) or not caminho.startswith('/'):
+        raise PatchInvalido(f'Caminho inválido: {caminho!r}')
+    return [p.replace('~1', '/').replace('~0', '~') for p in caminho[1:].split('/')]
+
+
+def _indice(lista, parte, permitir_fim=False):
+    if permitir_fim and parte == '-':
+        return len(lista)
+    if not parte.isdigit() or (len(parte) > 1 and parte.startswith('0')):
+        raise PatchInvalido(f'Índice de lista inválido: {parte!r}')
+    indice = int(parte)
+    limite = len(lista) if permitir_fim else len(lista) - 1
+    if indice > limite:
+        raise PatchInvalido(f'Índice fora da lista: {indice}')
+    return indice
+
+
+def _resolver(documento, partes):
+    """Contentor pai e última parte do caminho"""
+    atual = documento
+    for parte in partes[:-1]:
+        if isinstance(atual, list):
+            atual = atual[_indice(atual, parte)]
+        elif isinstance(atual, dict):
+            if parte not in atual:
+                raise PatchInvalido(f'Caminho inexistente: /{"/".join(partes)}')
+            atual = atual[parte]
+        else:
+            raise PatchInvalido(f'Caminho inexistente: /{"/".join(partes)}')
+    return atual, partes[-1]
+
+
+def _obter(documento, partes):
+    if not partes:
+        return documento
+    pai, chave = _resolver(documento, partes)
+    if isinstance(pai, list):
+        return pai[_indice(pai, chave)]
+    if isinstance(pai, dict) and chave in pai:
+        return pai[chave]
+    raise PatchInvalido(f'Caminho inexistente: /{"/".join(partes)}')
+
+
+def _adicionar(documento, partes, valor):
+    if not partes:
+        return valor
+    pai, chave = _resolver(documento, partes)
+    if isinstance(pai, list):
+        pai.insert(_indice(pai, chave, permitir_fim=True), valor)
+    elif isinstance(pai, dict):
+        pai[chave] = valor
+    else:
+        raise PatchInvalido(f'Caminho inexistente: /{"/".join(partes)}')
+    return documento
+
+
+def _remover(documento, partes):
+    if not partes:
+        raise PatchInvalido('Não é possível remover a raiz do documento')
+    pai, chave = _resolver(documento, partes)
+    if isinstance(pai, list):
+        return pai.pop(_indice(pai, chave))
+    if isinstance(pai, dict) and chave in pai:
+        return pai.pop(chave)
+    raise PatchInvalido(f'Caminho inexistente: /{"/".join(partes)}')
+
+
+def aplicar_patch(documento, operacoes):
+    """
+    Aplicar uma lista de operações a `documento` (alterado no lugar)
+
+    Returns:
+        O documento resultante (pode ser outro objeto se a raiz for substituída)
+
+    Raises:
+        PatchInvalido: operação inválida; nada é garantido sobre o documento,
+                       por isso quem chama deve descartá-lo
+    """
+    if not isinstance(operacoes, list):
+        raise PatchInvalido('O patch deve ser uma lista de operações')
+
+    for i, operacao in enumerate(operacoes):
+        if not isinstance(operacao, dict) or operacao.get('op') not in OPERACOES:
+            raise PatchInvalido(f'Operação {i}: "op" deve ser um de {", ".join(OPERACOES)}')
+
+        op = operacao['op']
+        partes = _partes(operacao.get('path'))
+
+        if op in ('add', 'replace', 'test') and 'value' not in operacao:
+            raise PatchInvalido(f'Operação {i}: "value" é obrigatório para "{op}"')
+
+        if op == 'add':
+            documento = _adicionar(documento, partes, operacao['value'])
+        elif op == 'remove':
+            _remover(documento, partes)
+        elif op == 'replace':
+            if not partes:
+                documento = operacao['value']
+            else:
+                _remover(documento, partes)
+                documento = _adicionar(documento, partes, operacao['value'])
+        elif op == 'test':
+            if _obter(documento, partes) != operacao['value']:
+                raise PatchInvalido(f'Operação {i}: teste falhou em {operacao.get("path")}')
+        else:
+            origem = _partes(operacao.get('from'))
+            if op == 'move':
+                if partes[:len(origem)] == origem and len(partes) > len(origem):
+                    raise PatchInvalido(f'Operação {i}: não é possível mover para dentro de si próprio')
+                valor = _remover(documento, origem)
+            else:
+                valor = copy.deepcopy(_obter(documento, origem))
+            documento = _adicionar(documento, partes, valor)
+
+    return documento
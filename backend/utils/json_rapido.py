@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+JSON das Respostas
+- ProviderOrjson: JSONProvider do Flask sobre o orjson (serialização em C,
+  direto para bytes UTF-8). Mesmo JSON que o provider por omissão: chaves
+  ordenadas, datas no formato HTTP do Flask, Decimal como texto
+- ProviderStdlib: json da biblioteca padrão; usado quando o orjson não está
+  instalado e, pelo ProviderOrjson, para argumentos que o orjson não suporta
+  (cls, indent diferente de 2, ensure_ascii=True) ou valores que recusa
+  (inteiros com mais de 64 bits)
+- ensure_ascii=False nos dois: acentos em UTF-8 em vez de \\u00e7 (o
+  JSON_AS_ASCII do Flask 1.x é ignorado pelo Flask 3)
+
+JSON_PROVIDER: 'orjson' (omissão) ou 'stdlib'
+"""
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # Opcional (pip install orjson): sem ele, biblioteca padrão
+    orjson = None
+
+
+class ProviderStdlib(DefaultJSONProvider):
+    """json da biblioteca padrão, sem escapar acentos"""
+
+    ensure_ascii = False
+
+    def serializar(self, obj):
+        """Corpo de uma resposta JSON em bytes (o mesmo de response(); usado por asgi.py)"""
+        return f"{self.dumps(obj, separators=(',', ':'))}\n".encode('utf-8')
+
+
+class ProviderOrjson(ProviderStdlib):
+    """orjson com fallback para ProviderStdlib"""
+
+    def _orjson(self, obj, kwargs, opcoes=0):
+        """
+        Returns:
+            bytes: obj serializado, ou None se o orjson não tem equivalente para kwargs ou recusa obj
+        """
+        if set(kwargs) - {'default', 'sort_keys', 'indent', 'separators', 'ensure_ascii'}:
+            return None
+        if kwargs.get('ensure_ascii', self.ensure_ascii) or kwargs.get('indent') not in (None, 2):
+            return None
+
+        # Datas e dataclasses passam pelo default do Flask (o orjson usaria ISO 8601 nas datas)
+        opcoes |= orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+        if kwargs.get('sort_keys', self.sort_keys):
+            opcoes |= orjson.OPT_SORT_KEYS
+        if kwargs.get('indent') == 2:
+            opcoes |= orjson.OPT_INDENT_2
+        try:
+            return orjson.dumps(obj, default=kwargs.get('default', self.default), option=opcoes)
+        except orjson.JSONEncodeError:
+            return None
+
+    def dumps(self, obj, **kwargs):
+        dados = self._orjson(obj, kwargs)
+        return dados.decode('utf-8') if dados is not None else super().dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if not kwargs:
+            try:
+                return orjson.loads(s)
+            except orjson.JSONDecodeError:
+                pass  # A biblioteca padrão dá a mesma exceção (ValueError), ou aceita (inteiros enormes)
+        return super().loads(s, **kwargs)
+
+    def serializar(self, obj):
+        dados = self._orjson(obj, {}, orjson.OPT_APPEND_NEWLINE)
+        return dados if dados is not None else super().serializar(obj)
+
+    def response(self, *args, **kwargs):
+        """Como DefaultJSONProvider.response, sem passar por str"""
+        obj = self._prepare_response_obj(args, kwargs)
+        indentar = (self.compact is None and self._app.debug) or self.compact is False
+        dados = self._orjson(obj, {'indent': 2} if indentar else {}, orjson.OPT_APPEND_NEWLINE)
+        if dados is None:
+            return super().response(*args, **kwargs)
+        return self._app.response_class(dados, mimetype=self.mimetype)
+
+
+PROVIDERS = {'orjson': ProviderOrjson, 'stdlib': ProviderStdlib}
+
+
+def configurar_json(app):
+    """Instalar o provider indicado em JSON_PROVIDER em app.json (chamado no arranque)"""
+    nome = app.config.get('JSON_PROVIDER', 'orjson')
+    if nome not in PROVIDERS:
+        raise ValueError(f'JSON_PROVIDER desconhecido: {nome}')
+    if nome == 'orjson' and orjson is None:
+        print("⚠️ orjson não instalado (pip install orjson): JSON da biblioteca padrão")
+        nome = 'stdlib'
+    app.json = PROVIDERS[nome](app)
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Migração do Esquema de Bases de Dados Existentes
+O db.create_all() só cria tabelas que faltam: numa base de dados já em uso
+não acrescenta colunas nem índices a tabelas existentes. `flask migrar-bd`
+compara a base de dados com os models e aplica o que falta:
+- tabelas novas (Familia, Taxon, Planta_taxon, Termo_picker,
+  Ficheiro_imagem, Imagem_variante...) com os respetivos índices
+- colunas novas em tabelas existentes (Imagem.sha256, estado,
+  erro_processamento, largura, altura, formato, bytes, cor_dominante, lqip),
+  com a chave estrangeira em MySQL
+- índices declarados nos models que não existem (Autor.nome_autor,
+  Referencia.titulo_referencia, Local_colheita.nome_local...)
+- restrições UNIQUE de uma coluna que o model deixou de declarar
+  (Imagem.url_armazenamento: a mesma imagem pode ser partilhada)
+
+Idempotente: cada passo é decidido pelo estado atual (inspector), por isso
+uma segunda execução não encontra nada a fazer. Por omissão só reporta;
+--aplicar executa. As tabelas derivadas criadas nesta execução (famílias,
+taxonomia, pickers) são preenchidas a seguir
+"""
+from sqlalchemy import MetaData, UniqueConstraint, inspect
+from sqlalchemy.schema import CreateColumn, CreateIndex, CreateTable
+
+from models.planta import db
+
+# Tabelas derivadas: preenchidas a partir das plantas/autores/... quando criadas
+_TABELAS_DERIVADAS = ('Familia', 'Taxon', 'Termo_picker')
+
+
+class Passo:
+    def __init__(self, descricao, sql=None, executar=None, aviso=False):
+        self.descricao = descricao
+        self.sql = sql
+        self.executar = executar
+        self.aviso = aviso  # Não aplicável automaticamente (só reportado)
+
+    def aplicar(self, conexao):
+        if self.executar is not None:
+            self.executar(conexao)
+        elif self.sql is not None:
+            conexao.exec_driver_sql(self.sql)
+
+
+def _unicos_existentes(inspetor, tabela):
+    """
+    Returns:
+        list: (nome, colunas) das restrições/índices UNIQUE (o MySQL reporta os
+        dois com o mesmo nome; as restrições inline do SQLite não têm nome)
+    """
+    unicos = {}
+    for restricao in inspetor.get_unique_constraints(tabela):
+        unicos[restricao.get('name') or tuple(restricao['column_names'])] = restricao['column_names']
+    for indice in inspetor.get_indexes(tabela):
+        if indice.get('unique'):
+            unicos[indice['name']] = indice['column_names']
+    return [(nome if isinstance(nome, str) else None, colunas) for nome, colunas in unicos.items()]
+
+
+def _unico_no_model(tabela, colunas):
+    if len(colunas) == 1 and colunas[0] in tabela.c:
+        coluna = tabela.c[colunas[0]]
+        if coluna.unique or coluna.primary_key:
+            return True
+    return any(
+        indice.unique and [c.name for c in indice.columns] == list(colunas) for indice in tabela.indexes
+    ) or any(
+        isinstance(restricao, UniqueConstraint) and [c.name for c in restricao.columns] == list(colunas)
+        for restricao in tabela.constraints
+    )
+
+
+def _recriar_tabela_sqlite(conexao, tabela):
+    """
+    Recriar uma tabela SQLite com a definição do model, copiando as linhas
+    (o SQLite não remove restrições de tabelas existentes). Cria também os índices
+    """
+    copia = MetaData()
+    for outra in tabela.metadata.sorted_tables:  # Tabelas referenciadas pelas chaves estrangeiras
+        outra.to_metadata(copia)
+    temporaria = tabela.to_metadata(copia, name=f'_{tabela.name}_migracao')
+    existentes = {c['name'] for c in inspect(conexao).get_columns(tabela.name)}
+    colunas = ', '.join(f'"{c.name}"' for c in tabela.columns if c.name in existentes)
+
+    conexao.execute(CreateTable(temporaria))
+    conexao.exec_driver_sql(
+        f'INSERT INTO "{temporaria.name}" ({colunas}) SELECT {colunas} FROM "{tabela.name}"'
+    )
+    conexao.exec_driver_sql(f'DROP TABLE "{tabela.name}"')
+    conexao.exec_driver_sql(f'ALTER TABLE "{temporaria.name}" RENAME TO "{tabela.name}"')
+    for indice in tabela.indexes:
+        indice.create(conexao)
+
+
+def planear_migracao(engine, metadata=None):
+    """
+    Passos para levar a base de dados de engine ao esquema de metadata
+
+    Returns:
+        list: Passo por ordem de execução (vazia se já está atualizada)
+    """
+    metadata = metadata if metadata is not None else db.metadata
+    inspetor = inspect(engine)
+    dialeto = engine.dialect
+    preparador = dialeto.identifier_preparer
+    existentes = set(inspetor.get_table_names())
+    passos = []
+
+    # Tabelas novas (sorted_tables: as referenciadas primeiro); create() cria também os índices
+    for tabela in metadata.sorted_tables:
+        if tabela.name not in existentes:
+            passos.append(Passo(f'criar tabela {tabela.name}',
+                                executar=lambda conexao, t=tabela: t.create(conexao, checkfirst=True)))
+
+    for tabela in metadata.sorted_tables:
+        if tabela.name not in existentes:
+            continue
+        nome_tabela = preparador.format_table(tabela)
+
+        colunas = {c['name'] for c in inspetor.get_columns(tabela.name)}
+        for coluna in tabela.columns:
+            if coluna.name in colunas:
+                continue
+            if not coluna.nullable and coluna.server_default is None:
+                passos.append(Passo(f'{tabela.name}.{coluna.name}: NOT NULL sem server_default, '
+                                    f'acrescentar à mão', aviso=True))
+                continue
+            definicao = CreateColumn(coluna).compile(dialect=dialeto)
+            passos.append(Passo(f'coluna {tabela.name}.{coluna.name}',
+                                sql=f'ALTER TABLE {nome_tabela} ADD COLUMN {definicao}'))
+
+            # O SQLite não acrescenta chaves estrangeiras a tabelas existentes (nem as exige)
+            for fk in coluna.foreign_keys if dialeto.name != 'sqlite' else ():
+                alvo = fk.column
+                nome_fk = preparador.quote(f'fk_{tabela.name}_{coluna.name}'[:64])
+                acao = f' ON DELETE {fk.ondelete}' if fk.ondelete else ''
+                passos.append(Passo(
+                    f'chave estrangeira {tabela.name}.{coluna.name} -> {alvo.table.name}.{alvo.name}',
+                    sql=f'ALTER TABLE {nome_tabela} ADD CONSTRAINT {nome_fk} FOREIGN KEY '
+                        f'({preparador.quote(coluna.name)}) REFERENCES '
+                        f'{preparador.format_table(alvo.table)} ({preparador.quote(alvo.name)}){acao}'
+                ))
+
+        unicos = _unicos_existentes(inspetor, tabela.name)
+        a_remover = [(nome, cols) for nome, cols in unicos if not _unico_no_model(tabela, cols)]
+        if a_remover and dialeto.name == 'sqlite':
+            # Restrições inline só saem recriando a tabela; a cópia já leva todos os índices do model
+            passos.append(Passo(
+                f'recriar {tabela.name} sem UNIQUE ' + '; '.join(', '.join(cols) for _, cols in a_remover),
+                executar=lambda conexao, t=tabela: _recriar_tabela_sqlite(conexao, t)
+            ))
+            continue
+        for nome, colunas_unicas in a_remover:
+            passos.append(Passo(f'remover UNIQUE {nome} ({", ".join(colunas_unicas)}) de {tabela.name}',
+                                sql=f'ALTER TABLE {nome_tabela} DROP INDEX {preparador.quote(nome)}'))
+
+        indices = {i['name'] for i in inspetor.get_indexes(tabela.name)} | {nome for nome, _ in unicos}
+        for indice in sorted(tabela.indexes, key=lambda i: i.name):
+            if indice.name not in indices:
+                passos.append(Passo(f'índice {indice.name}',
+                                    sql=str(CreateIndex(indice).compile(dialect=dialeto))))
+
+    return passos
+
+
+def preencher_derivadas(tabelas):
+    """
+    Preencher as tabelas derivadas acabadas de criar
+
+    Returns:
+        list: (tabela, resumo) do que foi preenchido
+    """
+    from utils.familias_index import indice_familias
+    from utils.picker_index import FONTES, sincronizar_indice
+    from utils.taxonomia import sincronizar_taxonomia
+
+    feitos = []
+    if 'Familia' in tabelas:
+        indice_familias.sincronizar()
+        feitos.append(('Familia', f'{len(indice_familias)} famílias'))
+    if 'Taxon' in tabelas:
+        resultado = sincronizar_taxonomia()
+        feitos.append(('Taxon', f"{resultado['plantas_indexadas']} plantas indexadas"))
+    if 'Termo_picker' in tabelas:
+        for tipo in FONTES:
+            sincronizar_indice(tipo)
+        feitos.append(('Termo_picker', f'{len(FONTES)} tipos indexados'))
+    return feitos
+
+
+def migrar(engine, aplicar=False, metadata=None):
+    """
+    Returns:
+        tuple: (passos planeados, tabelas criadas)
+    """
+    passos = planear_migracao(engine, metadata)
+    if not aplicar:
+        return passos, []
+
+    existentes = set(inspect(engine).get_table_names())
+    # Um passo por transação: em MySQL o DDL faz commit implícito de qualquer forma,
+    # e uma falha a meio deixa os passos anteriores aplicados (a próxima execução continua)
+    for passo in passos:
+        if not passo.aviso:
+            with engine.begin() as conexao:
+                passo.aplicar(conexao)
+    criadas = set(inspect(engine).get_table_names()) - existentes
+    return passos, sorted(criadas)
+
+
+def registrar_comando_migracao(app):
+    """Comando `flask migrar-bd`"""
+    import click
+
+    @app.cli.command('migrar-bd')
+    @click.option('--aplicar', is_flag=True, help='Executar os passos (por omissão só reporta)')
+    @click.option('--sem-preencher', is_flag=True, help='Não preencher as tabelas derivadas criadas')
+    def migrar_bd(aplicar, sem_preencher):
+        """Acrescentar tabelas, colunas e índices em falta (idempotente)"""
+        passos, criadas = migrar(db.engine, aplicar)
+        if not passos:
+            click.echo('✅ Esquema atualizado: nada a fazer')
+            return
+
+        for passo in passos:
+            marca = '⚠️ ' if passo.aviso else ('✅' if aplicar else '•')
+            click.echo(f'{marca} {passo.descricao}')
+            if passo.sql and not aplicar:
+                click.echo(f'    {passo.sql}')
+        if not aplicar:
+            click.echo(f'ℹ️ {len(passos)} passo(s) por aplicar: volte a executar com --aplicar')
+            return
+
+        derivadas = [t for t in _TABELAS_DERIVADAS if t in criadas]
+        if derivadas and not sem_preencher:
+            for tabela, resumo in preencher_derivadas(derivadas):
+                click.echo(f'🌿 {tabela}: {resumo}')
+        click.echo(f'💾 {sum(not p.aviso for p in passos)} passo(s) aplicado(s)')
@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Índice dos Pickers (typeahead) - autores, referências, locais, indicações
+- Termo_picker guarda cada palavra normalizada de cada registo; a busca
+  "flor rox" encontra registos com uma palavra começada por 'flor' E outra
+  começada por 'rox', usando o índice (tipo, termo) em vez de LIKE '%..%'
+- Resultados paginados e reduzidos a value/label/secondary
+- Eventos do ORM mantêm o índice na mesma transação das escritas
+- As buscas só verificam o índice (verificar_indice); a reconstrução é
+  feita em POST /api/pickers/sincronizar ou por `flask migrar-bd`
+"""
+import re
+import threading
+
+from sqlalchemy import case, event, inspect, select
+
+from models.planta import db
+from models.localizacao import Provincia, Local_colheita
+from models.uso_medicinal import Indicacao
+from models.referencia import Autor, Afiliacao, Autor_afiliacao, Referencia, Referencia_autor
+from models.picker import Termo_picker
+from utils.familias_index import normalizar_familia as normalizar
+
+_SEPARADOR = re.compile(r'\W+')
+MAX_TERMO = 50
+MAX_LABEL = 100
+
+# tipo -> (model, coluna id, coluna label, colunas indexadas)
+FONTES = {
+    'autor': (Autor, Autor.id_autor, Autor.nome_autor, (Autor.nome_autor,)),
+    'referencia': (Referencia, Referencia.id_referencia, Referencia.titulo_referencia,
+                   (Referencia.titulo_referencia, Referencia.ano_publicacao)),
+    'local': (Local_colheita, Local_colheita.id_local, Local_colheita.nome_local, (Local_colheita.nome_local,)),
+    'indicacao': (Indicacao, Indicacao.id_uso, Indicacao.descricao_uso, (Indicacao.descricao_uso,)),
+}
+
+
+def tokenizar(*textos):
+    """Palavras normalizadas distintas (sem acentos, minúsculas)"""
+    termos = []
+    for texto in textos:
+        if texto is None:
+            continue
+        for termo in _SEPARADOR.split(normalizar(str(texto)).replace('_', ' ')):
+            termo = termo[:MAX_TERMO]
+            if termo and termo not in termos:
+                termos.append(termo)
+    return termos
+
+
+def _truncar(texto):
+    if texto and len(texto) > MAX_LABEL:
+        return texto[:MAX_LABEL] + '...'
+    return texto
+
+
+# =====================================================
+# BUSCA
+# =====================================================
+
+def buscar(tipo, q='', page=1, per_page=20, provincia_id=None):
+    """
+    Buscar registos de um tipo por prefixo de palavras
+
+    Returns:
+        tuple: (total, [ids na ordem de apresentação])
+    """
+    verificar_indice(tipo)
+    _, col_id, col_label, _ = FONTES[tipo]
+
+    query = db.session.query(col_id)
+    for termo in tokenizar(q):
+        query = query.filter(col_id.in_(
+            select(Termo_picker.id_registo).where(
+                Termo_picker.tipo == tipo,
+                Termo_picker.termo.like(f'{termo}%')
+            )
+        ))
+
+    if tipo == 'local' and provincia_id:
+        query = query.filter(Local_colheita.id_provincia == provincia_id)
+
+    total = query.order_by(None).count()
+
+    # Registos cujo label começa pelo texto digitado aparecem primeiro
+    ordem = [col_label]
+    inicio = (q or '').strip().replace('\\', '').replace('%', '').replace('_', '')
+    if inicio:
+        ordem.insert(0, case((col_label.like(f'{inicio}%'), 0), else_=1))
+
+    ids = [id_ for (id_,) in query.order_by(*ordem).offset((page - 1) * per_page).limit(per_page).all()]
+    return total, ids
+
+
+def itens(tipo, ids):
+    """
+    Itens reduzidos {value, label, secondary} para os ids (na mesma ordem),
+    com no máximo 2 queries
+    """
+    if not ids:
+        return []
+
+    if tipo == 'autor':
+        linhas = db.session.query(Autor.id_autor, Autor.nome_autor).filter(Autor.id_autor.in_(ids)).all()
+        secundario = {}
+        for id_autor, nome, sigla in db.session.query(
+            Autor_afiliacao.id_autor, Afiliacao.nome_afiliacao, Afiliacao.sigla_afiliacao
+        ).join(Afiliacao, Afiliacao.id_afiliacao == Autor_afiliacao.id_afiliacao).filter(
+            Autor_afiliacao.id_autor.in_(ids)
+        ).order_by(Autor_afiliacao.id_autor, Afiliacao.id_afiliacao).all():
+            secundario.setdefault(id_autor, sigla or nome)
+        dados = {id_: (nome, secundario.get(id_)) for id_, nome in linhas}
+
+    elif tipo == 'referencia':
+        linhas = db.session.query(
+            Referencia.id_referencia, Referencia.titulo_referencia, Referencia.ano_publicacao
+        ).filter(Referencia.id_referencia.in_(ids)).all()
+        autores = {}
+        for id_ref, nome in db.session.query(
+            Referencia_autor.id_referencia, Autor.nome_autor
+        ).join(Autor, Autor.id_autor == Referencia_autor.id_autor).filter(
+            Referencia_autor.id_referencia.in_(ids)
+        ).order_by(Referencia_autor.id_referencia, Autor.nome_autor).all():
+            autores.setdefault(id_ref, []).append(nome)
+        dados = {}
+        for id_ref, titulo, ano in linhas:
+            nomes = autores.get(id_ref, [])
+            partes = []
+            if nomes:
+                partes.append(nomes[0] + (' et al.' if len(nomes) > 1 else ''))
+            if ano:
+                partes.append(str(ano))
+            dados[id_ref] = (titulo, ' · '.join(partes) or None)
+
+    elif tipo == 'local':
+        dados = {
+            id_: (nome, provincia)
+            for id_, nome, provincia in db.session.query(
+                Local_colheita.id_local, Local_colheita.nome_local, Provincia.provincia
+            ).outerjoin(Provincia, Provincia.id_provincia == Local_colheita.id_provincia).filter(
+                Local_colheita.id_local.in_(ids)
+            ).all()
+        }
+
+    else:
+        dados = {
+            id_: (descricao, None)
+            for id_, descricao in db.session.query(Indicacao.id_uso, Indicacao.descricao_uso).filter(
+                Indicacao.id_uso.in_(ids)
+            ).all()
+        }
+
+    return [
+        {'value': id_, 'label': _truncar(dados[id_][0]), 'secondary': dados[id_][1]}
+        for id_ in ids if id_ in dados
+    ]
+
+
+# =====================================================
+# SINCRONIZAÇÃO
+# =====================================================
+
+def sincronizar_indice(tipo):
+    """Reconstruir os termos de um tipo a partir da tabela de origem"""
+    _, col_id, _, colunas = FONTES[tipo]
+
+    linhas = []
+    for registo in db.session.query(col_id, *colunas).yield_per(1000):
+        id_registo, textos = registo[0], registo[1:]
+        linhas.extend({'tipo': tipo, 'id_registo': id_registo, 'termo': t} for t in tokenizar(*textos))
+
+    Termo_picker.query.filter(Termo_picker.tipo == tipo).delete(synchronize_session=False)
+    if linhas:
+        db.session.execute(Termo_picker.__table__.insert(), linhas)
+    db.session.commit()
+    print(f"🔎 Índice de pickers sincronizado ({tipo}): {len(linhas)} termos")
+    return len(linhas)
+
+
+def registos_por_indexar(tipo):
+    """
+    Registos com texto indexável sem termos em Termo_picker
+    (registos sem palavras nunca têm termos e não contam como divergência)
+
+    Returns:
+        int: nº de registos em falta no índice
+    """
+    _, col_id, _, colunas = FONTES[tipo]
+    tabela = Termo_picker.__table__
+    sem_termos = db.session.query(col_id, *colunas).filter(
+        ~select(tabela.c.id_registo).where(tabela.c.tipo == tipo, tabela.c.id_registo == col_id).exists()
+    )
+    return sum(1 for registo in sem_termos.yield_per(1000) if tokenizar(*registo[1:]))
+
+
+_verificacao_lock = threading.Lock()
+_verificados = set()
+
+
+def verificar_indice(tipo):
+    """
+    Na primeira busca de cada tipo no processo, avisar se o índice não
+    cobrir os registos (tabela por preencher ou importação direta).
+    Não reconstrói: uma busca não apaga nem reescreve Termo_picker
+    """
+    if tipo in _verificados:
+        return
+    with _verificacao_lock:
+        if tipo in _verificados:
+            return
+        em_falta = registos_por_indexar(tipo)
+        if em_falta:
+            print(f"⚠️ Índice de pickers desatualizado ({tipo}): {em_falta} registos por indexar "
+                  f"(sincronizar em POST /api/pickers/sincronizar)")
+        _verificados.add(tipo)
+
+
+# =====================================================
+# EVENTOS DO ORM
+# =====================================================
+
+_TIPO_POR_MODEL = {fonte[0]: tipo for tipo, fonte in FONTES.items()}
+
+
+def _reindexar(connection, tipo, target, apagar=False):
+    _, col_id, _, colunas = FONTES[tipo]
+    id_registo = getattr(target, col_id.key)
+    tabela = Termo_picker.__table__
+
+    connection.execute(tabela.delete().where(tabela.c.tipo == tipo, tabela.c.id_registo == id_registo))
+    if apagar:
+        return
+    termos = tokenizar(*(getattr(target, c.key) for c in colunas))
+    if termos:
+        connection.execute(tabela.insert(), [
+            {'tipo': tipo, 'id_registo': id_registo, 'termo': t} for t in termos
+        ])
+
+
+def _apos_inserir(mapper, connection, target):
+    _reindexar(connection, _TIPO_POR_MODEL[mapper.class_], target)
+
+
+def _apos_atualizar(mapper, connection, target):
+    tipo = _TIPO_POR_MODEL[mapper.class_]
+    estado = inspect(target)
+    if any(estado.attrs[c.key].history.has_changes() for c in FONTES[tipo][3]):
+        _reindexar(connection, tipo, target)
+
+
+def _apos_apagar(mapper, connection, target):
+    _reindexar(connection, _TIPO_POR_MODEL[mapper.class_], target, apagar=True)
+
+
+def registrar_eventos_picker(app):
+    """Ligar os eventos do ORM ao índice dos pickers (chamado no arranque)"""
+    if event.contains(Autor, 'after_insert', _apos_inserir):
+        return
+
+    for model in _TIPO_POR_MODEL:
+        event.listen(model, 'after_insert', _apos_inserir)
+        event.listen(model, 'after_update', _apos_atualizar)
+        event.listen(model, 'after_delete', _apos_apagar)
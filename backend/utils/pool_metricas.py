@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Métricas do Pool de Ligações à Base de Dados
+- QueuePoolMedido (poolclass dos engines) mede cada checkout - espera por
+  uma ligação livre, criação da ligação e pre-ping - e conta os timeouts
+  (pool_timeout esgotado, que o pedido recebe como erro 500)
+- Eventos do pool medem quanto tempo cada ligação fica emprestada e contam
+  ligações criadas e invalidadas (MySQL que fechou a ligação, pre-ping)
+- Ocupação instantânea e máxima face à capacidade (pool_size + max_overflow)
+
+Os valores são por processo: cada worker do gunicorn tem o seu pool, por
+isso a resposta inclui o pid (somar os workers para ver a BD inteira)
+"""
+import bisect
+import os
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import event, exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+
+from models.planta import db
+
+# Limites superiores (ms) dos intervalos do histograma
+LIMITES_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+# Métricas por engine ('principal' = bind por omissão), deste processo
+_metricas = {}
+
+
+class Histograma:
+    """Contagens por intervalo de LIMITES_MS (o último é +inf)"""
+
+    def __init__(self):
+        self.contagens = [0] * (len(LIMITES_MS) + 1)
+        self.total = 0
+        self.soma_ms = 0.0
+        self.maximo_ms = 0.0
+
+    def registar(self, ms):
+        self.contagens[bisect.bisect_left(LIMITES_MS, ms)] += 1
+        self.total += 1
+        self.soma_ms += ms
+        self.maximo_ms = max(self.maximo_ms, ms)
+
+    def percentil(self, p):
+        """Limite superior do intervalo onde cai o percentil p (aproximado)"""
+        if not self.total:
+            return None
+        alvo, acumulado = p / 100 * self.total, 0
+        for i, contagem in enumerate(self.contagens):
+            acumulado += contagem
+            if acumulado >= alvo:
+                return LIMITES_MS[i] if i < len(LIMITES_MS) else round(self.maximo_ms, 2)
+        return round(self.maximo_ms, 2)
+
+    def to_dict(self):
+        return {
+            'total': self.total,
+            'media_ms': round(self.soma_ms / self.total, 3) if self.total else None,
+            'p50_ms': self.percentil(50),
+            'p95_ms': self.percentil(95),
+            'p99_ms': self.percentil(99),
+            'maximo_ms': round(self.maximo_ms, 3),
+            'histograma': {
+                **{f'<={limite}': c for limite, c in zip(LIMITES_MS, self.contagens)},
+                f'>{LIMITES_MS[-1]}': self.contagens[-1]
+            }
+        }
+
+
+class MetricasPool:
+    """Contadores de um engine (atualizados pelos eventos, sob lock)"""
+
+    def __init__(self, nome, engine, opcoes):
+        self.nome = nome
+        self.engine = engine
+        self.capacidade = (opcoes.get('pool_size', 5) + opcoes.get('max_overflow', 10)
+                           if isinstance(engine.pool, QueuePool) else None)
+        self._lock = threading.Lock()
+        self.reiniciar()
+
+    def reiniciar(self):
+        with self._lock:
+            self.espera = Histograma()
+            self.emprestimo = Histograma()
+            self.timeouts = 0
+            self.ligacoes_criadas = 0
+            self.invalidadas = 0
+            self.em_uso_maximo = 0
+            self.desde = datetime.utcnow().isoformat()
+
+    # ---------------- registo ----------------
+
+    def registar_checkout(self, segundos, em_uso):
+        with self._lock:
+            self.espera.registar(segundos * 1000)
+            self.em_uso_maximo = max(self.em_uso_maximo, em_uso)
+
+    def registar_timeout(self, segundos):
+        with self._lock:
+            self.timeouts += 1
+            self.espera.registar(segundos * 1000)
+
+    def _ao_ligar(self, dbapi_connection, connection_record):
+        with self._lock:
+            self.ligacoes_criadas += 1
+
+    def _ao_emprestar(self, dbapi_connection, connection_record, connection_proxy):
+        connection_record.info['metricas_emprestada_em'] = time.perf_counter()
+
+    def _ao_devolver(self, dbapi_connection, connection_record):
+        inicio = connection_record.info.pop('metricas_emprestada_em', None)
+        if inicio is not None:
+            with self._lock:
+                self.emprestimo.registar((time.perf_counter() - inicio) * 1000)
+
+    def _ao_invalidar(self, dbapi_connection, connection_record, exception):
+        with self._lock:
+            self.invalidadas += 1
+
+    # ---------------- leitura ----------------
+
+    def to_dict(self):
+        pool = self.engine.pool
+        estado = {'classe': type(pool).__name__}
+        if isinstance(pool, QueuePool):
+            em_uso = pool.checkedout()
+            estado.update({
+                'pool_size': pool.size(),
+                'capacidade': self.capacidade,
+                'em_uso': em_uso,
+                'livres': pool.checkedin(),
+                'overflow': pool.overflow(),
+                'timeout_s': pool.timeout(),
+                'saturacao': round(em_uso / self.capacidade, 3) if self.capacidade else None,
+                'saturacao_maxima': round(self.em_uso_maximo / self.capacidade, 3) if self.capacidade else None
+            })
+        with self._lock:
+            return {
+                'engine': self.nome,
+                'pool': estado,
+                'em_uso_maximo': self.em_uso_maximo,
+                'timeouts': self.timeouts,
+                'ligacoes_criadas': self.ligacoes_criadas,
+                'invalidadas': self.invalidadas,
+                'espera_checkout': self.espera.to_dict(),
+                'tempo_emprestada': self.emprestimo.to_dict(),
+                'desde': self.desde
+            }
+
+
+class QueuePoolMedido(QueuePool):
+    """QueuePool que mede o tempo de cada checkout (usado como poolclass)"""
+
+    metricas = None
+
+    def connect(self):
+        inicio = time.perf_counter()
+        try:
+            ligacao = super().connect()
+        except exc.TimeoutError:
+            if self.metricas is not None:
+                self.metricas.registar_timeout(time.perf_counter() - inicio)
+            raise
+        if self.metricas is not None:
+            self.metricas.registar_checkout(time.perf_counter() - inicio, self.checkedout())
+        return ligacao
+
+    def recreate(self):
+        # engine.dispose() troca o pool: as métricas continuam
+        novo = super().recreate()
+        novo.metricas = self.metricas
+        return novo
+
+
+# =====================================================
+# CONFIGURAÇÃO
+# =====================================================
+
+def configurar_pool(app):
+    """
+    Completar SQLALCHEMY_ENGINE_OPTIONS antes de db.init_app: pool medido
+    e, em SQLite em memória (StaticPool), sem as opções de tamanho
+    """
+    opcoes = dict(app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    url = make_url(app.config['SQLALCHEMY_DATABASE_URI'])
+    if url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'):
+        for chave in ('pool_size', 'max_overflow', 'pool_timeout'):
+            opcoes.pop(chave, None)
+    else:
+        opcoes.setdefault('poolclass', QueuePoolMedido)
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = opcoes
+
+
+def registrar_metricas_pool(app):
+    """
+    Ligar as métricas aos engines já criados (chamado depois de db.init_app)
+    Cada create_app tem engines novos: as métricas seguem os da última aplicação
+    """
+    with app.app_context():
+        engines = dict(db.engines)
+
+    for bind, engine in engines.items():
+        nome = bind or 'principal'
+        if nome in _metricas and _metricas[nome].engine is engine:
+            continue
+        metricas = MetricasPool(nome, engine, app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+        if isinstance(engine.pool, QueuePoolMedido):
+            engine.pool.metricas = metricas
+        event.listen(engine, 'connect', metricas._ao_ligar)
+        event.listen(engine, 'checkout', metricas._ao_emprestar)
+        event.listen(engine, 'checkin', metricas._ao_devolver)
+        event.listen(engine, 'invalidate', metricas._ao_invalidar)
+        _metricas[nome] = metricas
+
+
+def metricas_pool(reiniciar=False):
+    """
+    Returns:
+        dict: pid e métricas de cada engine deste processo
+    """
+    resultado = {
+        'pid': os.getpid(),
+        'engines': [m.to_dict() for m in _metricas.values()]
+    }
+    if reiniciar:
+        for m in _metricas.values():
+            m.reiniciar()
+    return resultado
+
+
+def metricas_prometheus():
+    """As mesmas métricas no formato de texto do Prometheus"""
+    linhas = []
+
+    def metrica(nome, tipo, ajuda, valores):
+        linhas.append(f'# HELP {nome} {ajuda}')
+        linhas.append(f'# TYPE {nome} {tipo}')
+        for rotulos, valor in valores:
+            texto = ','.join(f'{k}="{v}"' for k, v in rotulos.items())
+            linhas.append(f'{nome}{{{texto}}} {valor}')
+
+    dados = [(m, m.to_dict()) for m in _metricas.values()]
+
+    def base(m):
+        return {'engine': m.nome, 'pid': os.getpid()}
+
+    metrica('db_pool_em_uso', 'gauge', 'Ligações emprestadas',
+            [(base(m), d['pool'].get('em_uso', 0)) for m, d in dados])
+    metrica('db_pool_capacidade', 'gauge', 'pool_size + max_overflow',
+            [(base(m), d['pool'].get('capacidade') or 0) for m, d in dados])
+    metrica('db_pool_timeouts_total', 'counter', 'Checkouts que esgotaram pool_timeout',
+            [(base(m), d['timeouts']) for m, d in dados])
+    metrica('db_pool_ligacoes_criadas_total', 'counter', 'Ligações novas à BD',
+            [(base(m), d['ligacoes_criadas']) for m, d in dados])
+    metrica('db_pool_invalidadas_total', 'counter', 'Ligações invalidadas',
+            [(base(m), d['invalidadas']) for m, d in dados])
+
+    linhas.append('# HELP db_pool_espera_checkout_ms Tempo de checkout (espera + pre-ping)')
+    linhas.append('# TYPE db_pool_espera_checkout_ms histogram')
+    for m, _ in dados:
+        with m._lock:
+            contagens, total, soma = list(m.espera.contagens), m.espera.total, m.espera.soma_ms
+        rotulos = f'engine="{m.nome}",pid="{os.getpid()}"'
+        acumulado = 0
+        for limite, contagem in zip(LIMITES_MS, contagens):
+            acumulado += contagem
+            linhas.append(f'db_pool_espera_checkout_ms_bucket{{{rotulos},le="{limite}"}} {acumulado}')
+        linhas.append(f'db_pool_espera_checkout_ms_bucket{{{rotulos},le="+Inf"}} {total}')
+        linhas.append(f'db_pool_espera_checkout_ms_sum{{{rotulos}}} {round(soma, 3)}')
+        linhas.append(f'db_pool_espera_checkout_ms_count{{{rotulos}}} {total}')
+    return '\n'.join(linhas) + '\n'
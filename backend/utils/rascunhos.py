@@ -0,0 +1,481 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Armazenamento de Rascunhos do Wizard
+- ArmazemMemoria: dicionário + heap de expiração (um único processo)
+- ArmazemSQLite: ficheiro SQLite partilhado entre workers, coluna
+  expires_at indexada
+- Expiração custa O(expirados), não O(todos); quota de rascunhos por
+  utilizador autenticado e limite de tamanho por rascunho. A quota usa
+  session['id_usuario'], que a API ainda não define (não há login): até
+  lá todos os rascunhos são anónimos e só o TTL e o tamanho os limitam
+- Cada gravação incrementa `version`; autosaves enviam deltas JSON Patch
+  contra essa versão (409 se desatualizada)
+- Dono: cada rascunho recebe na criação um token aleatório (só o hash é
+  guardado); ler, alterar e apagar exigem o token ou o mesmo utilizador
+  autenticado
+"""
+import hashlib
+import heapq
+from abc import ABC, abstractmethod
+import hmac
+import json
+import os
+import secrets
+import sqlite3
+import threading
+import time
+
+from utils.json_patch import aplicar_patch
+from utils.rascunhos_blobs import ArmazemBlobs
+
+
+class ErroRascunho(Exception):
+    """Erro de validação do armazém (mapeado para 4xx nas rotas)"""
+    status = 400
+
+
+class RascunhoNaoEncontrado(ErroRascunho):
+    status = 404
+
+
+class RascunhoDeOutroUtilizador(ErroRascunho):
+    status = 403
+
+
+class ConflitoVersao(ErroRascunho):
+    """A versão de base do delta não é a versão guardada"""
+    status = 409
+
+    def __init__(self, versao_atual):
+        super().__init__(f'Versão do rascunho desatualizada (versão atual: {versao_atual})')
+        self.versao_atual = versao_atual
+
+
+class RascunhoGrandeDemais(ErroRascunho):
+    status = 413
+
+
+class QuotaExcedida(ErroRascunho):
+    status = 429
+
+
+def _iso(timestamp):
+    return time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(timestamp))
+
+
+def hash_token(token):
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+
+class ArmazemRascunhos(ABC):
+    """
+    Interface comum dos armazéns
+
+    Cada rascunho é um dict:
+        {'draft_id', 'user_id', 'data', 'current_step', 'version',
+         'expires_at', 'updated_at', 'tamanho'}
+    (mais 'draft_token' na gravação que o criou sem token)
+
+    Acesso: `user_id` é o utilizador autenticado (None se anónimo) e
+    `token` o token do rascunho; basta um dos dois corresponder ao dono
+
+    Os backends implementam os métodos abstratos; guardar e aplicar_delta
+    são construídos sobre `_atualizar` (ler → alterar → escrever de forma
+    atómica), obter e apagar sobre `_ler` e `_apagar`
+    """
+
+    def __init__(self, ttl_segundos=24 * 3600, max_por_utilizador=10, max_bytes=5 * 1024 * 1024):
+        self.ttl_segundos = ttl_segundos
+        self.max_por_utilizador = max_por_utilizador
+        self.max_bytes = max_bytes
+
+    def _serializar(self, dados):
+        texto = json.dumps(dados, ensure_ascii=False, separators=(',', ':'))
+        tamanho = len(texto.encode('utf-8'))
+        if self.max_bytes and tamanho > self.max_bytes:
+            raise RascunhoGrandeDemais(
+                f'Rascunho com {tamanho} bytes excede o limite de {self.max_bytes} bytes'
+            )
+        return texto, tamanho
+
+    def _registo(self, draft_id, user_id, dados, passo, versao, expira, atualizado, tamanho):
+        return {
+            'draft_id': draft_id,
+            'user_id': user_id,
+            'data': dados,
+            'current_step': passo,
+            'version': versao,
+            'expires_at': _iso(expira),
+            'updated_at': _iso(atualizado),
+            'tamanho': tamanho
+        }
+
+    @staticmethod
+    def _verificar_dono(user_id_dono, token_hash, user_id, token):
+        if token and token_hash and hmac.compare_digest(token_hash, hash_token(token)):
+            return
+        if user_id and user_id == user_id_dono:
+            return
+        raise RascunhoDeOutroUtilizador('Rascunho pertence a outro utilizador ou token do rascunho inválido')
+
+    @staticmethod
+    def _novo_token(token):
+        """
+        Returns:
+            tuple: (hash a guardar, token a devolver ao cliente ou None se foi ele a enviá-lo)
+        """
+        if token:
+            return hash_token(token), None
+        novo = secrets.token_urlsafe(32)
+        return hash_token(novo), novo
+
+    @staticmethod
+    def _verificar_versao(atual, versao_base):
+        if versao_base is None:
+            return
+        versao_atual = atual['version'] if atual else 0
+        if versao_atual != versao_base:
+            raise ConflitoVersao(versao_atual)
+
+    def guardar(self, draft_id, user_id, token, dados, passo=1, versao_base=None):
+        """
+        Criar ou substituir um rascunho completo (renova a expiração)
+        `versao_base` opcional: recusa com 409 se outro save chegou primeiro
+        """
+        def alterar(atual):
+            self._verificar_versao(atual, versao_base)
+            return dados, passo
+        return self._atualizar(draft_id, user_id, token, alterar)
+
+    def aplicar_delta(self, draft_id, user_id, token, versao_base, operacoes, passo=None):
+        """
+        Aplicar operações JSON Patch a um rascunho existente
+
+        Raises:
+            RascunhoNaoEncontrado, ConflitoVersao, PatchInvalido
+        """
+        def alterar(atual):
+            if atual is None:
+                raise RascunhoNaoEncontrado('Rascunho não encontrado ou expirado')
+            self._verificar_versao(atual, versao_base)
+            dados = aplicar_patch(json.loads(atual['texto']), operacoes)
+            return dados, atual['current_step'] if passo is None else passo
+        return self._atualizar(draft_id, user_id, token, alterar)
+
+    def obter(self, draft_id, user_id=None, token=None):
+        """
+        Rascunho não expirado ou None
+
+        Raises:
+            RascunhoDeOutroUtilizador: existe mas user_id/token não são do dono
+        """
+        encontrado = self._ler(draft_id)
+        if encontrado is None:
+            return None
+        registo, token_hash = encontrado
+        self._verificar_dono(registo['user_id'], token_hash, user_id, token)
+        return registo
+
+    def apagar(self, draft_id, user_id=None, token=None):
+        """True se existia (RascunhoDeOutroUtilizador se não é do dono)"""
+        if self.obter(draft_id, user_id, token) is None:
+            return False
+        return self._apagar(draft_id)
+
+    @abstractmethod
+    def _atualizar(self, draft_id, user_id, token, alterar):
+        """
+        Verificar o dono, ler o rascunho atual ({'texto', 'current_step',
+        'version'} ou None), chamar alterar(atual) -> (dados, passo) e gravar
+        com versão + 1
+        """
+
+    @abstractmethod
+    def _ler(self, draft_id):
+        """(registo, hash do token) do rascunho não expirado ou None"""
+
+    @abstractmethod
+    def _apagar(self, draft_id):
+        """True se existia"""
+
+    @abstractmethod
+    def limpar_expirados(self):
+        """Remover rascunhos expirados; devolve quantos foram removidos"""
+
+    @abstractmethod
+    def contar(self):
+        """Rascunhos ativos"""
+
+
+class ArmazemMemoria(ArmazemRascunhos):
+    """
+    Rascunhos em memória do processo
+
+    O heap guarda (expira, draft_id); entradas antigas de rascunhos
+    renovados são ignoradas quando chegam ao topo
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._lock = threading.Lock()
+        self._rascunhos = {}
+        self._por_utilizador = {}
+        self._heap = []
+
+    def _remover(self, draft_id):
+        registo = self._rascunhos.pop(draft_id, None)
+        if registo is not None and registo['_user_id']:
+            ids = self._por_utilizador.get(registo['_user_id'])
+            if ids is not None:
+                ids.discard(draft_id)
+                if not ids:
+                    del self._por_utilizador[registo['_user_id']]
+        return registo is not None
+
+    def _limpar(self, agora):
+        removidos = 0
+        while self._heap and self._heap[0][0] <= agora:
+            expira, draft_id = heapq.heappop(self._heap)
+            registo = self._rascunhos.get(draft_id)
+            if registo is not None and registo['_expira'] == expira:
+                self._remover(draft_id)
+                removidos += 1
+        return removidos
+
+    def _atualizar(self, draft_id, user_id, token, alterar):
+        agora = time.time()
+        expira = agora + self.ttl_segundos
+        novo_token = None
+
+        with self._lock:
+            self._limpar(agora)
+            existente = self._rascunhos.get(draft_id)
+            if existente is not None:
+                self._verificar_dono(existente['_user_id'], existente['_token_hash'], user_id, token)
+                user_id, token_hash = existente['_user_id'], existente['_token_hash']
+            else:
+                ids = self._por_utilizador.get(user_id, set()) if user_id else ()
+                if self.max_por_utilizador and len(ids) >= self.max_por_utilizador:
+                    raise QuotaExcedida(f'Limite de {self.max_por_utilizador} rascunhos por utilizador atingido')
+                token_hash, novo_token = self._novo_token(token)
+
+            atual = None
+            if existente is not None:
+                atual = {'texto': existente['_texto'], 'current_step': existente['_passo'],
+                         'version': existente['_versao']}
+            dados, passo = alterar(atual)
+            texto, tamanho = self._serializar(dados)
+            versao = (atual['version'] if atual else 0) + 1
+
+            # Guardar serializado: o processo não mantém estruturas grandes vivas
+            self._rascunhos[draft_id] = {
+                '_user_id': user_id, '_token_hash': token_hash, '_texto': texto, '_passo': passo,
+                '_versao': versao, '_expira': expira, '_atualizado': agora, '_tamanho': tamanho
+            }
+            if user_id:
+                self._por_utilizador.setdefault(user_id, set()).add(draft_id)
+            heapq.heappush(self._heap, (expira, draft_id))
+
+        registo = self._registo(draft_id, user_id, dados, passo, versao, expira, agora, tamanho)
+        if novo_token:
+            registo['draft_token'] = novo_token
+        return registo
+
+    def _ler(self, draft_id):
+        with self._lock:
+            self._limpar(time.time())
+            r = self._rascunhos.get(draft_id)
+            if r is None:
+                return None
+            return self._registo(draft_id, r['_user_id'], json.loads(r['_texto']), r['_passo'],
+                                 r['_versao'], r['_expira'], r['_atualizado'], r['_tamanho']), r['_token_hash']
+
+    def _apagar(self, draft_id):
+        with self._lock:
+            return self._remover(draft_id)
+
+    def limpar_expirados(self):
+        with self._lock:
+            return self._limpar(time.time())
+
+    def contar(self):
+        with self._lock:
+            self._limpar(time.time())
+            return len(self._rascunhos)
+
+
+class ArmazemSQLite(ArmazemRascunhos):
+    """
+    Rascunhos num ficheiro SQLite (WAL), partilhado por todos os workers
+    da máquina e persistente entre reinícios
+    """
+
+    def __init__(self, caminho, **kwargs):
+        super().__init__(**kwargs)
+        self.caminho = caminho
+        self._local = threading.local()
+        self._esquema_criado = False
+
+    def _conexao(self):
+        # Ligação por thread e por processo: uma ligação herdada no fork
+        # (preload do gunicorn) não é partilhada com o master
+        conexao = getattr(self._local, 'conexao', None)
+        if conexao is None or self._local.pid != os.getpid():
+            pasta = os.path.dirname(os.path.abspath(self.caminho))
+            os.makedirs(pasta, exist_ok=True)
+            conexao = sqlite3.connect(self.caminho, timeout=10, isolation_level=None)
+            conexao.execute('PRAGMA journal_mode=WAL')
+            conexao.execute('PRAGMA synchronous=NORMAL')
+            if not self._esquema_criado:
+                conexao.executescript("""
+                    CREATE TABLE IF NOT EXISTS rascunhos (
+                        draft_id TEXT PRIMARY KEY,
+                        user_id TEXT NOT NULL,  -- '' = anónimo
+                        token_hash TEXT,
+                        dados TEXT NOT NULL,
+                        current_step INTEGER NOT NULL DEFAULT 1,
+                        versao INTEGER NOT NULL DEFAULT 1,
+                        tamanho INTEGER NOT NULL,
+                        expires_at REAL NOT NULL,
+                        updated_at REAL NOT NULL
+                    );
+                    CREATE INDEX IF NOT EXISTS ix_rascunhos_expires ON rascunhos (expires_at);
+                    CREATE INDEX IF NOT EXISTS ix_rascunhos_user ON rascunhos (user_id, expires_at);
+                """)
+                colunas = {linha[1] for linha in conexao.execute('PRAGMA table_info(rascunhos)')}
+                if 'versao' not in colunas:
+                    conexao.execute('ALTER TABLE rascunhos ADD COLUMN versao INTEGER NOT NULL DEFAULT 1')
+                if 'token_hash' not in colunas:
+                    conexao.execute('ALTER TABLE rascunhos ADD COLUMN token_hash TEXT')
+                self._esquema_criado = True
+            self._local.conexao = conexao
+            self._local.pid = os.getpid()
+        return conexao
+
+    def _atualizar(self, draft_id, user_id, token, alterar):
+        agora = time.time()
+        expira = agora + self.ttl_segundos
+        novo_token = None
+        conexao = self._conexao()
+
+        # BEGIN IMMEDIATE: leitura, verificações (quota, versão) e escrita
+        # são atómicas entre processos
+        conexao.execute('BEGIN IMMEDIATE')
+        try:
+            conexao.execute('DELETE FROM rascunhos WHERE expires_at <= ?', (agora,))
+            existente = conexao.execute(
+                'SELECT user_id, token_hash, dados, current_step, versao FROM rascunhos WHERE draft_id = ?',
+                (draft_id,)
+            ).fetchone()
+            if existente is not None:
+                self._verificar_dono(existente[0] or None, existente[1], user_id, token)
+                user_id, token_hash = existente[0] or None, existente[1]
+            else:
+                if user_id and self.max_por_utilizador:
+                    (total,) = conexao.execute(
+                        'SELECT COUNT(*) FROM rascunhos WHERE user_id = ?', (user_id,)
+                    ).fetchone()
+                    if total >= self.max_por_utilizador:
+                        raise QuotaExcedida(
+                            f'Limite de {self.max_por_utilizador} rascunhos por utilizador atingido'
+                        )
+                token_hash, novo_token = self._novo_token(token)
+
+            atual = None
+            if existente is not None:
+                atual = {'texto': existente[2], 'current_step': existente[3], 'version': existente[4]}
+            dados, passo = alterar(atual)
+            texto, tamanho = self._serializar(dados)
+            versao = (atual['version'] if atual else 0) + 1
+
+            conexao.execute(
+                'INSERT OR REPLACE INTO rascunhos '
+                '(draft_id, user_id, token_hash, dados, current_step, versao, tamanho, expires_at, updated_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (draft_id, user_id or '', token_hash, texto, passo, versao, tamanho, expira, agora)
+            )
+            conexao.execute('COMMIT')
+        except Exception:
+            conexao.execute('ROLLBACK')
+            raise
+
+        registo = self._registo(draft_id, user_id, dados, passo, versao, expira, agora, tamanho)
+        if novo_token:
+            registo['draft_token'] = novo_token
+        return registo
+
+    def _ler(self, draft_id):
+        linha = self._conexao().execute(
+            'SELECT user_id, token_hash, dados, current_step, versao, expires_at, updated_at, tamanho '
+            'FROM rascunhos WHERE draft_id = ? AND expires_at > ?',
+            (draft_id, time.time())
+        ).fetchone()
+        if linha is None:
+            return None
+        user_id, token_hash, texto, passo, versao, expira, atualizado, tamanho = linha
+        registo = self._registo(draft_id, user_id or None, json.loads(texto), passo, versao,
+                                expira, atualizado, tamanho)
+        return registo, token_hash
+
+    def _apagar(self, draft_id):
+        cursor = self._conexao().execute(
+            'DELETE FROM rascunhos WHERE draft_id = ? AND expires_at > ?', (draft_id, time.time())
+        )
+        return cursor.rowcount > 0
+
+    def limpar_expirados(self):
+        cursor = self._conexao().execute('DELETE FROM rascunhos WHERE expires_at <= ?', (time.time(),))
+        return cursor.rowcount
+
+    def contar(self):
+        (total,) = self._conexao().execute(
+            'SELECT COUNT(*) FROM rascunhos WHERE expires_at > ?', (time.time(),)
+        ).fetchone()
+        return total
+
+
+# =====================================================
+# CONFIGURAÇÃO
+# =====================================================
+
+_armazem = None
+_blobs = None
+
+
+def criar_armazem(config):
+    """Instanciar o armazém indicado em DRAFT_STORE ('memoria' ou 'sqlite')"""
+    opcoes = {
+        'ttl_segundos': config.get('DRAFT_TTL_SEGUNDOS', 24 * 3600),
+        'max_por_utilizador': config.get('DRAFT_MAX_POR_UTILIZADOR', 10),
+        'max_bytes': config.get('DRAFT_MAX_BYTES', 5 * 1024 * 1024),
+    }
+    tipo = config.get('DRAFT_STORE', 'sqlite')
+    if tipo == 'memoria':
+        return ArmazemMemoria(**opcoes)
+    if tipo == 'sqlite':
+        return ArmazemSQLite(config['DRAFT_SQLITE_PATH'], **opcoes)
+    raise ValueError(f'DRAFT_STORE desconhecido: {tipo}')
+
+
+def configurar_rascunhos(app):
+    """Criar o armazém de rascunhos e a área de blobs a partir da configuração (chamado no arranque)"""
+    global _armazem, _blobs
+    _armazem = criar_armazem(app.config)
+    _blobs = ArmazemBlobs(
+        app.config['DRAFT_BLOB_FOLDER'],
+        max_bytes=app.config.get('DRAFT_BLOB_MAX_BYTES', 5 * 1024 * 1024),
+        ttl_segundos=app.config.get('DRAFT_TTL_SEGUNDOS', 24 * 3600)
+    )
+
+
+def obter_armazem():
+    if _armazem is None:
+        raise RuntimeError('Armazém de rascunhos não configurado (chamar configurar_rascunhos)')
+    return _armazem
+
+
+def obter_blobs():
+    if _blobs is None:
+        raise RuntimeError('Área de blobs não configurada (chamar configurar_rascunhos)')
+    return _blobs
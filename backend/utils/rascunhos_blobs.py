@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Blobs dos Rascunhos do Wizard
+Imagens do passo 5 ficam fora do JSON do rascunho, numa pasta endereçada
+pelo SHA-256 do conteúdo (<pasta>/<2 primeiros hex>/<hash>); o rascunho
+guarda apenas {'blob_hash': ...}. Cada gravação do rascunho (completa ou
+delta) toca os blobs que o documento resultante referencia, e o rascunho
+expira TTL depois da última gravação: blobs não tocados durante o TTL já
+não pertencem a nenhum rascunho vivo e são removidos.
+"""
+import base64
+import binascii
+import hashlib
+import os
+import re
+import tempfile
+import time
+
+HASH_RE = re.compile(r'^[0-9a-f]{64}$')
+
+# 'file_data' em data URL ou base64 maior que isto vai para a área de blobs
+MIN_BYTES_EXTRAIR = 256
+
+
+class BlobInvalido(ValueError):
+    """Conteúdo vazio, grande demais ou base64 inválido"""
+
+
+class ArmazemBlobs:
+    """Pasta local endereçada por conteúdo, partilhada pelos workers"""
+
+    def __init__(self, pasta, max_bytes=5 * 1024 * 1024, ttl_segundos=24 * 3600):
+        self.pasta = pasta
+        self.max_bytes = max_bytes
+        self.ttl_segundos = ttl_segundos
+        self._ultima_limpeza = time.monotonic()
+
+    def caminho(self, blob_hash):
+        if not HASH_RE.match(blob_hash or ''):
+            raise BlobInvalido(f'Hash inválido: {blob_hash!r}')
+        return os.path.join(self.pasta, blob_hash[:2], blob_hash)
+
+    def guardar(self, conteudo):
+        """
+        Guardar bytes (idempotente: o mesmo conteúdo dá o mesmo hash)
+
+        Returns:
+            str: SHA-256 hexadecimal
+        """
+        if not conteudo:
+            raise BlobInvalido('Conteúdo vazio')
+        if self.max_bytes and len(conteudo) > self.max_bytes:
+            raise BlobInvalido(f'Blob com {len(conteudo)} bytes excede o limite de {self.max_bytes} bytes')
+
+        blob_hash = hashlib.sha256(conteudo).hexdigest()
+        destino = self.caminho(blob_hash)
+        if os.path.exists(destino):
+            os.utime(destino)
+            return blob_hash
+
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        fd, temporario = tempfile.mkstemp(dir=os.path.dirname(destino), prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(conteudo)
+            os.replace(temporario, destino)  # Atómico: nunca há blobs meio escritos
+        except Exception:
+            if os.path.exists(temporario):
+                os.remove(temporario)
+            raise
+        return blob_hash
+
+    def guardar_base64(self, texto):
+        """
+        Guardar uma string base64 (aceita prefixo 'data:...;base64,' e quebras
+        de linha; qualquer outro carácter fora do alfabeto é recusado)
+        """
+        if not isinstance(texto, str):
+            raise BlobInvalido('Base64 inválido: esperado texto')
+        if ',' in texto[:100]:
+            texto = texto.split(',', 1)[1]
+        try:
+            conteudo = base64.b64decode(''.join(texto.split()), validate=True)
+        except (binascii.Error, ValueError) as e:
+            raise BlobInvalido(f'Base64 inválido: {e}')
+        return self.guardar(conteudo), len(conteudo)
+
+    def ler(self, blob_hash):
+        """Bytes do blob ou None"""
+        try:
+            with open(self.caminho(blob_hash), 'rb') as f:
+                return f.read()
+        except (FileNotFoundError, BlobInvalido):
+            return None
+
+    def existe(self, blob_hash):
+        try:
+            return os.path.exists(self.caminho(blob_hash))
+        except BlobInvalido:
+            return False
+
+    def tocar(self, blob_hash):
+        """Marcar como referenciado (adia a remoção)"""
+        try:
+            os.utime(self.caminho(blob_hash))
+            return True
+        except (FileNotFoundError, BlobInvalido):
+            return False
+
+    def limpar_antigos(self):
+        """Remover blobs não tocados há mais de ttl_segundos"""
+        limite = time.time() - self.ttl_segundos
+        removidos = 0
+        if not os.path.isdir(self.pasta):
+            return 0
+        with os.scandir(self.pasta) as shards:
+            for shard in shards:
+                if not shard.is_dir():
+                    continue
+                with os.scandir(shard.path) as entradas:
+                    for entrada in entradas:
+                        try:
+                            if entrada.stat().st_mtime < limite:
+                                os.remove(entrada.path)
+                                removidos += 1
+                        except FileNotFoundError:
+                            continue
+        self._ultima_limpeza = time.monotonic()
+        return removidos
+
+    def limpar_se_necessario(self, intervalo_segundos=3600):
+        """Limpeza periódica chamada no caminho dos autosaves"""
+        if time.monotonic() - self._ultima_limpeza > intervalo_segundos:
+            return self.limpar_antigos()
+        return 0
+
+    @staticmethod
+    def _objetos(dados):
+        """Todos os dicts dentro de `dados` (dicts/listas aninhados)"""
+        pendentes = [dados]
+        while pendentes:
+            atual = pendentes.pop()
+            if isinstance(atual, list):
+                pendentes.extend(atual)
+            elif isinstance(atual, dict):
+                yield atual
+                pendentes.extend(v for v in atual.values() if isinstance(v, (dict, list)))
+
+    def extrair_imagens(self, dados):
+        """
+        Mover para a área de blobs todo o 'file_data' base64 encontrado em
+        `dados` (dicts/listas, alterados no lugar) e tocar os blob_hash já
+        referenciados
+
+        Returns:
+            int: número de imagens extraídas
+        """
+        extraidas = 0
+        for atual in self._objetos(dados):
+            file_data = atual.get('file_data')
+            if isinstance(file_data, str) and (file_data.startswith('data:') or
+                                               len(file_data) >= MIN_BYTES_EXTRAIR):
+                atual['blob_hash'], atual['tamanho'] = self.guardar_base64(file_data)
+                del atual['file_data']
+                extraidas += 1
+            elif isinstance(atual.get('blob_hash'), str):
+                self.tocar(atual['blob_hash'])
+        return extraidas
+
+    def tocar_referenciados(self, dados):
+        """
+        Tocar todos os blob_hash de um rascunho gravado (um delta só traz as
+        partes alteradas: sem isto os blobs do resto do documento expiravam)
+
+        Returns:
+            int: blobs tocados
+        """
+        return sum(
+            self.tocar(atual['blob_hash']) for atual in self._objetos(dados)
+            if isinstance(atual.get('blob_hash'), str)
+        )
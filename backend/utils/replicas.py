@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Réplicas de Leitura (MySQL)
+- Cada URL de SQLALCHEMY_REPLICA_URIS vira um bind 'replica_<n>' do
+  Flask-SQLAlchemy (engine e pool próprios, visíveis em /health/pool)
+- SessaoReplicas.get_bind: os SELECT de pedidos GET/HEAD vão para uma
+  réplica saudável (a mesma durante toda a sessão); escritas, SQL textual e
+  todas as leituras da sessão depois de uma escrita vão para o primário
+- Read-your-writes entre pedidos: uma escrita bem-sucedida (POST/PUT/
+  PATCH/DELETE) deixa um cookie e o mesmo cliente lê do primário durante
+  REPLICA_STICKY_SEGUNDOS (maior que REPLICA_LAG_MAX_SEGUNDOS)
+- Atraso medido a cada REPLICA_LAG_INTERVALO_SEGUNDOS (SHOW REPLICA STATUS ou
+  REPLICA_LAG_QUERY, p.ex. uma tabela de heartbeat); acima de
+  REPLICA_LAG_MAX_SEGUNDOS, ou com erro, a réplica sai da rotação e as
+  leituras voltam ao primário até recuperar. Estado em /health/replicas
+
+Sem réplicas configuradas, tudo vai para o primário como antes
+"""
+import itertools
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+
+PREFIXO_BIND = 'replica_'
+COOKIE_PRIMARIO = 'ler_primario'
+METODOS_LEITURA = ('GET', 'HEAD', 'OPTIONS')
+
+# Chaves em session.info
+_CHAVE_REPLICAS = 'replicas_permitidas'
+_CHAVE_ESCOLHIDA = 'replica_escolhida'
+_CHAVE_ESCREVEU = 'replicas_escreveu'
+_CHAVE_PRIMARIO = 'replicas_forcar_primario'
+
+
+def medir_atraso(engine, consulta=None):
+    """
+    Atraso da réplica em segundos
+
+    Raises:
+        RuntimeError: replicação parada ou estado ilegível
+    """
+    with engine.connect() as conexao:
+        if consulta:
+            return float(conexao.execute(text(consulta)).scalar())
+        if engine.dialect.name != 'mysql':
+            return 0.0  # Sem replicação nativa a medir (SQLite em testes)
+
+        # SHOW REPLICA STATUS: MySQL >= 8.0.22; SHOW SLAVE STATUS nas versões anteriores e no MariaDB
+        for comando, coluna in (('SHOW REPLICA STATUS', 'Seconds_Behind_Source'),
+                                ('SHOW SLAVE STATUS', 'Seconds_Behind_Master')):
+            try:
+                linha = conexao.exec_driver_sql(comando).mappings().first()
+            except DBAPIError:
+                continue
+            if linha is None:
+                return 0.0  # Não é uma réplica MySQL (proxy, cluster síncrono)
+            if linha.get(coluna) is None:
+                raise RuntimeError(f'Replicação parada ({coluna} NULL)')
+            return float(linha[coluna])
+        raise RuntimeError('Sem permissão para ler o estado da replicação (REPLICATION CLIENT)')
+
+
+class EstadoReplica:
+    def __init__(self, nome):
+        self.nome = nome
+        self.atraso = None
+        self.erro = None
+        self.verificado_em = None
+        self.saudavel = False
+
+    def to_dict(self, url=None):
+        return {
+            'nome': self.nome,
+            'url': url,
+            'saudavel': self.saudavel,
+            'atraso_segundos': self.atraso,
+            'erro': self.erro,
+            'verificado_ha_segundos': (round(time.monotonic() - self.verificado_em, 1)
+                                       if self.verificado_em is not None else None)
+        }
+
+
+class RoteadorReplicas:
+    """
+    Estado das réplicas deste processo e escolha da réplica de cada sessão
+
+    A verificação do atraso é feita por quem escolhe quando o intervalo
+    expira (uma thread de cada vez; as outras usam o último estado), por
+    isso não há threads de fundo a herdar no fork
+    """
+
+    def __init__(self):
+        self.replicas = []
+        self.atraso_maximo = 5.0
+        self.intervalo = 5.0
+        self.consulta_atraso = None
+        self._lock = threading.Lock()
+        self._ciclo = itertools.count()
+        self.sessoes_replica = 0
+        self.sessoes_primario = 0  # GET sem réplica saudável
+
+    def configurar(self, nomes, atraso_maximo=5.0, intervalo=5.0, consulta_atraso=None):
+        self.replicas = [EstadoReplica(nome) for nome in nomes]
+        self.atraso_maximo = atraso_maximo
+        self.intervalo = intervalo
+        self.consulta_atraso = consulta_atraso
+
+    @property
+    def ativo(self):
+        return bool(self.replicas)
+
+    def verificacao_pendente(self):
+        agora = time.monotonic()
+        return any(r.verificado_em is None or agora - r.verificado_em >= self.intervalo for r in self.replicas)
+
+    def verificar(self, engines):
+        for replica in self.replicas:
+            try:
+                replica.atraso = medir_atraso(engines[replica.nome], self.consulta_atraso)
+                replica.erro = None
+            except Exception as e:
+                replica.atraso = None
+                replica.erro = str(e)[:300]
+            replica.verificado_em = time.monotonic()
+
+            saudavel = replica.erro is None and replica.atraso <= self.atraso_maximo
+            if saudavel != replica.saudavel:
+                if saudavel:
+                    print(f"✅ Réplica {replica.nome} de volta à rotação (atraso {replica.atraso}s)")
+                else:
+                    motivo = replica.erro or f'atraso {replica.atraso}s > {self.atraso_maximo}s'
+                    print(f"⚠️ Réplica {replica.nome} fora da rotação ({motivo}): leituras no primário")
+            replica.saudavel = saudavel
+
+    def escolher(self, engines=None):
+        """
+        Args:
+            engines: db.engines para verificar o atraso se o intervalo expirou
+                (None: usar o último estado conhecido)
+
+        Returns:
+            str: bind da réplica ou None (ler do primário)
+        """
+        if engines is not None and self.verificacao_pendente() and self._lock.acquire(blocking=False):
+            try:
+                self.verificar(engines)
+            finally:
+                self._lock.release()
+
+        saudaveis = [r for r in self.replicas if r.saudavel]
+        if not saudaveis:
+            self.sessoes_primario += 1
+            return None
+        self.sessoes_replica += 1
+        return saudaveis[next(self._ciclo) % len(saudaveis)].nome
+
+
+# Instância única do processo
+roteador = RoteadorReplicas()
+
+
+class SessaoReplicas(Session):
+    """Session do db: escolhe réplica ou primário por statement (ver docstring do módulo)"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self.info.get(_CHAVE_REPLICAS):
+            if clause is None or not getattr(clause, 'is_select', False):
+                self.info[_CHAVE_ESCREVEU] = True  # flush, INSERT/UPDATE/DELETE, SQL textual
+            elif not self.info.get(_CHAVE_ESCREVEU) and not self.info.get(_CHAVE_PRIMARIO):
+                if _CHAVE_ESCOLHIDA not in self.info:
+                    self.info[_CHAVE_ESCOLHIDA] = roteador.escolher(self._db.engines)
+                if self.info[_CHAVE_ESCOLHIDA] is not None:
+                    return self._db.engines[self.info[_CHAVE_ESCOLHIDA]]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@contextmanager
+def ler_do_primario(sessao):
+    """
+    Ler do primário dentro do bloco (caches do processo que são recarregadas
+    porque outro worker acabou de escrever: a réplica pode ainda não ter a escrita)
+    """
+    anterior = sessao.info.get(_CHAVE_PRIMARIO, False)
+    sessao.info[_CHAVE_PRIMARIO] = True
+    try:
+        yield
+    finally:
+        sessao.info[_CHAVE_PRIMARIO] = anterior
+
+
+def pedido_pode_usar_replica():
+    """GET/HEAD sem escrita recente do mesmo cliente"""
+    return roteador.ativo and request.method in ('GET', 'HEAD') and not request.cookies.get(COOKIE_PRIMARIO)
+
+
+# =====================================================
+# CONFIGURAÇÃO
+# =====================================================
+
+def configurar_replicas(app):
+    """Acrescentar as réplicas a SQLALCHEMY_BINDS (chamado antes de db.init_app)"""
+    urls = app.config.get('SQLALCHEMY_REPLICA_URIS') or []
+    binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+    for i, url in enumerate(urls):
+        binds[f'{PREFIXO_BIND}{i}'] = url
+    app.config['SQLALCHEMY_BINDS'] = binds
+
+
+def registrar_replicas(app):
+    """Ligar o encaminhamento aos pedidos (chamado depois de db.init_app)"""
+    db = app.extensions['sqlalchemy']
+    nomes = sorted(k for k in (app.config.get('SQLALCHEMY_BINDS') or {}) if k and k.startswith(PREFIXO_BIND))
+    roteador.configurar(
+        nomes,
+        atraso_maximo=app.config.get('REPLICA_LAG_MAX_SEGUNDOS', 5),
+        intervalo=app.config.get('REPLICA_LAG_INTERVALO_SEGUNDOS', 5),
+        consulta_atraso=app.config.get('REPLICA_LAG_QUERY')
+    )
+    if not nomes:
+        return
+    sticky = app.config.get('REPLICA_STICKY_SEGUNDOS', 10)
+
+    def antes_do_pedido():
+        if pedido_pode_usar_replica():
+            db.session.info[_CHAVE_REPLICAS] = True
+
+    def depois_do_pedido(resposta):
+        if request.method not in METODOS_LEITURA and resposta.status_code < 400:
+            resposta.set_cookie(COOKIE_PRIMARIO, '1', max_age=sticky, httponly=True, samesite='Lax')
+        return resposta
+
+    app.before_request(antes_do_pedido)
+    app.after_request(depois_do_pedido)
+    print(f"🗄️  {len(nomes)} réplica(s) de leitura: atraso máximo {roteador.atraso_maximo}s, sticky {sticky}s")
+
+
+def metricas_replicas(engines=None):
+    """
+    Returns:
+        dict: estado das réplicas deste worker (/health/replicas)
+    """
+    return {
+        'ativo': roteador.ativo,
+        'atraso_maximo_segundos': roteador.atraso_maximo,
+        'sessoes_replica': roteador.sessoes_replica,
+        'sessoes_primario_sem_replica': roteador.sessoes_primario,
+        'replicas': [
+            r.to_dict(engines[r.nome].url.render_as_string(hide_password=True)
+                      if engines and r.nome in engines else None)
+            for r in roteador.replicas
+        ]
+    }
+
+
+def metricas_replicas_prometheus():
+    """Atraso e estado das réplicas no formato de texto do Prometheus"""
+    linhas = []
+    for nome, tipo, ajuda, valor in (
+        ('db_replica_atraso_segundos', 'gauge', 'Último atraso medido (-1: erro)',
+         lambda r: r.atraso if r.atraso is not None else -1),
+        ('db_replica_saudavel', 'gauge', '1 se a réplica está na rotação', lambda r: int(r.saudavel)),
+    ):
+        linhas.append(f'# HELP {nome} {ajuda}')
+        linhas.append(f'# TYPE {nome} {tipo}')
+        for r in roteador.replicas:
+            linhas.append(f'{nome}{{replica="{r.nome}",pid="{os.getpid()}"}} {valor(r)}')
+    for nome, ajuda, valor in (
+        ('db_replica_sessoes_total', 'Sessões de GET servidas por uma réplica', roteador.sessoes_replica),
+        ('db_replica_sessoes_primario_total', 'Sessões de GET no primário sem réplica saudável',
+         roteador.sessoes_primario),
+    ):
+        linhas.append(f'# HELP {nome} {ajuda}')
+        linhas.append(f'# TYPE {nome} counter')
+        linhas.append(f'{nome}{{pid="{os.getpid()}"}} {valor}')
+    return '\n'.join(linhas) + '\n'
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Instrumentação de SQL por Pedido
+- before/after_cursor_execute (em todos os engines) contam as queries e o
+  tempo de BD do pedido atual e guardam as mais lentas
+- Queries com a mesma forma (literais e listas IN normalizadas) repetidas
+  SQL_N_MAIS_1_LIMITE vezes no mesmo pedido são assinaladas como N+1
+  (lazy loads em to_dict, contagens por linha, ...)
+- Cabeçalho Server-Timing (db e app) em todas as respostas: visível nas
+  DevTools do browser sem ferramentas extra
+- Orçamento de queries por endpoint (@orcamento_queries(n) ou
+  SQL_ORCAMENTO_PADRAO): excedido, é registado; com SQL_ORCAMENTO_ESTRITO
+  (testes) o pedido falha com OrcamentoQueriesExcedido
+
+A medição vive numa ContextVar, por isso funciona também fora de pedidos
+(medir_queries() em testes e scripts) e com medições encadeadas
+"""
+import functools
+import re
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+from flask import current_app, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+_medicao = ContextVar('medicao_sql', default=None)
+
+_ESPACOS = re.compile(r'\s+')
+_LISTA_PARAMETROS = re.compile(r'\(\s*(?:\?|%s|%\(\w+\)s|:\w+)(?:\s*,\s*(?:\?|%s|%\(\w+\)s|:\w+))*\s*\)')
+_PARAMETRO_NOMEADO = re.compile(r'%\(\w+\)s|:\w+\b')
+_NUMERO = re.compile(r'(?<![\w.])\d+(?:\.\d+)?(?![\w.])')
+_TEXTO = re.compile(r"'(?:[^']|'')*'")
+
+# Formas N+1 já registadas neste processo (evitar repetir o mesmo aviso)
+_avisados = set()
+
+
+class OrcamentoQueriesExcedido(AssertionError):
+    """Mais queries do que o orçamento do endpoint (SQL_ORCAMENTO_ESTRITO)"""
+
+
+@functools.lru_cache(maxsize=2048)
+def forma_sql(statement):
+    """SQL sem literais nem parâmetros: queries com a mesma forma agrupam-se"""
+    forma = _ESPACOS.sub(' ', statement).strip()
+    forma = _TEXTO.sub('?', forma)
+    forma = _LISTA_PARAMETROS.sub('(?)', forma)
+    forma = _PARAMETRO_NOMEADO.sub('?', forma)
+    return _NUMERO.sub('?', forma)
+
+
+class MedicaoSQL:
+    """Queries de um pedido (ou de um bloco medir_queries)"""
+
+    def __init__(self, pai=None, max_lentas=5):
+        self.pai = pai
+        self.max_lentas = max_lentas
+        self.total = 0
+        self.tempo_ms = 0.0
+        self.formas = Counter()
+        self.lentas = []  # (ms, forma), ordenadas da mais lenta
+        self.inicio = time.perf_counter()
+
+    def registar(self, statement, ms):
+        medicao = self
+        while medicao is not None:
+            medicao._registar(statement, ms)
+            medicao = medicao.pai
+
+    def _registar(self, statement, ms):
+        forma = forma_sql(statement)
+        self.total += 1
+        self.tempo_ms += ms
+        self.formas[forma] += 1
+        if len(self.lentas) < self.max_lentas or ms > self.lentas[-1][0]:
+            self.lentas.append((ms, forma))
+            self.lentas.sort(key=lambda x: -x[0])
+            del self.lentas[self.max_lentas:]
+
+    def repetidas(self, limite):
+        """[(forma, vezes)] das formas executadas pelo menos `limite` vezes"""
+        return [(f, n) for f, n in self.formas.most_common() if n >= limite]
+
+    def resumo(self, limite_n_mais_1=5):
+        return {
+            'queries': self.total,
+            'tempo_db_ms': round(self.tempo_ms, 2),
+            'formas_distintas': len(self.formas),
+            'n_mais_1': [{'sql': f[:300], 'vezes': n} for f, n in self.repetidas(limite_n_mais_1)],
+            'mais_lentas': [{'sql': f[:300], 'ms': round(ms, 2)} for ms, f in self.lentas]
+        }
+
+
+class medir_queries:
+    """
+    Medir as queries de um bloco (testes, scripts, jobs)
+
+    Exemplo:
+        with medir_queries(orcamento=3) as m:
+            client.get('/api/plantas/1')
+        print(m.total, m.resumo())
+    """
+
+    def __init__(self, orcamento=None):
+        self.orcamento = orcamento
+
+    def __enter__(self):
+        self.medicao = MedicaoSQL(pai=_medicao.get())
+        self._token = _medicao.set(self.medicao)
+        return self.medicao
+
+    def __exit__(self, tipo, *exc):
+        _medicao.reset(self._token)
+        if tipo is None and self.orcamento is not None and self.medicao.total > self.orcamento:
+            raise OrcamentoQueriesExcedido(
+                f'{self.medicao.total} queries (orçamento {self.orcamento}): {self.medicao.resumo()}'
+            )
+
+
+def orcamento_queries(limite):
+    """Decorator de rota: número máximo de queries esperado para o endpoint"""
+    def decorador(funcao):
+        funcao.orcamento_queries = limite
+        return funcao
+    return decorador
+
+
+# =====================================================
+# EVENTOS DO SQLALCHEMY
+# =====================================================
+
+def _antes_execucao(conn, cursor, statement, parameters, context, executemany):
+    if _medicao.get() is not None:
+        conn.info.setdefault('sql_inicio', []).append(time.perf_counter())
+
+
+def _depois_execucao(conn, cursor, statement, parameters, context, executemany):
+    medicao = _medicao.get()
+    inicios = conn.info.get('sql_inicio')
+    if medicao is None or not inicios:
+        return
+    medicao.registar(statement, (time.perf_counter() - inicios.pop()) * 1000)
+
+
+# =====================================================
+# PEDIDOS
+# =====================================================
+
+def _orcamento_endpoint(app):
+    funcao = app.view_functions.get(request.endpoint) if request.endpoint else None
+    limite = getattr(funcao, 'orcamento_queries', None)
+    return limite if limite is not None else app.config.get('SQL_ORCAMENTO_PADRAO')
+
+
+def _ao_iniciar_pedido():
+    medicao = MedicaoSQL(pai=_medicao.get(), max_lentas=current_app.config.get('SQL_MAX_LENTAS', 5))
+    request.environ['sql_medicao'] = (medicao, _medicao.set(medicao))
+
+
+def _ao_terminar_pedido(resposta):
+    registo = request.environ.pop('sql_medicao', None)
+    if registo is None:
+        return resposta
+    medicao, token = registo
+    _medicao.reset(token)
+
+    app = current_app
+    total_ms = (time.perf_counter() - medicao.inicio) * 1000
+    resposta.headers.add(
+        'Server-Timing',
+        f'db;dur={medicao.tempo_ms:.1f};desc="{medicao.total} queries", app;dur={total_ms:.1f}'
+    )
+
+    limite_n_mais_1 = app.config.get('SQL_N_MAIS_1_LIMITE', 5)
+    for forma, vezes in medicao.repetidas(limite_n_mais_1):
+        if (request.endpoint, forma) not in _avisados:
+            _avisados.add((request.endpoint, forma))
+            print(f"⚠️ Possível N+1 em {request.endpoint}: {vezes}× {forma[:200]}")
+
+    orcamento = _orcamento_endpoint(app)
+    if orcamento is not None and medicao.total > orcamento:
+        mensagem = f'{request.endpoint}: {medicao.total} queries (orçamento {orcamento})'
+        if app.config.get('SQL_ORCAMENTO_ESTRITO'):
+            raise OrcamentoQueriesExcedido(f'{mensagem}: {medicao.resumo(limite_n_mais_1)}')
+        print(f"⚠️ Orçamento de queries excedido em {mensagem}")
+    return resposta
+
+
+def _ao_desmontar_pedido(erro):
+    # Pedido que terminou com exceção antes de after_request
+    registo = request.environ.pop('sql_medicao', None)
+    if registo is not None:
+        _medicao.reset(registo[1])
+
+
+def registrar_instrumentacao_sql(app):
+    """Ligar a instrumentação aos engines e aos pedidos (SQL_INSTRUMENTACAO)"""
+    if not app.config.get('SQL_INSTRUMENTACAO', True):
+        return
+    if not event.contains(Engine, 'before_cursor_execute', _antes_execucao):
+        event.listen(Engine, 'before_cursor_execute', _antes_execucao)
+        event.listen(Engine, 'after_cursor_execute', _depois_execucao)
+    app.before_request(_ao_iniciar_pedido)
+    app.after_request(_ao_terminar_pedido)
+    app.teardown_request(_ao_desmontar_pedido)
@@ -0,0 +1,407 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Taxonomia - hierarquia família → género → espécie
+- parsear_nome_cientifico: separa género, epíteto específico e
+  infraespecífico (subsp., var., f., cv.) e marca híbridos (×)
+- Tabelas Taxon/Planta_taxon com contagens mantidas na MESMA transação
+  das escritas em Planta_medicinal (eventos do ORM)
+- reindexar_plantas: para UPDATEs em massa (renomear famílias)
+- Leituras só verificam o índice (verificar_taxonomia); a reconstrução é
+  feita em POST /api/taxonomia/sincronizar ou por `flask migrar-bd`
+"""
+import threading
+from collections import Counter
+
+from sqlalchemy import event, inspect, select
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+
+from models.planta import db, Planta_medicinal
+from models.taxonomia import Taxon, Planta_taxon
+from utils.familias_index import normalizar_familia as normalizar
+
+NIVEIS = ('familia', 'genero', 'especie')
+SEM_FAMILIA = 'Sem família'
+
+# Marcadores de categoria infraespecífica -> forma canónica
+MARCADORES_INFRA = {
+    'subsp.': 'subsp.', 'subsp': 'subsp.', 'ssp.': 'subsp.', 'ssp': 'subsp.',
+    'var.': 'var.', 'var': 'var.',
+    'subvar.': 'subvar.',
+    'f.': 'f.', 'fo.': 'f.', 'forma': 'f.',
+    'cv.': 'cv.', 'cv': 'cv.',
+}
+MARCADORES_HIBRIDO = {'×', 'x'}
+INDETERMINADOS = {'sp.', 'sp', 'spp.', 'spp', 'indet.'}
+QUALIFICADORES = {'cf.', 'cf', 'aff.', 'aff'}
+
+
+def parsear_nome_cientifico(nome):
+    """
+    Separar um nome científico nas suas partes
+
+    Exemplos:
+        'Aloe vera (L.) Burm.f.'          -> Aloe / vera
+        'Solanum nigrum var. americanum'  -> Solanum / nigrum / var. americanum
+        'Mentha × piperita L.'            -> Mentha / piperita (híbrido)
+        'Aloe sp.'                        -> Aloe / (indeterminada)
+
+    Args:
+        nome (str): Nome científico (com ou sem autoria)
+
+    Returns:
+        dict: {'genero', 'especie', 'hibrido', 'rank_infra', 'epiteto_infra'}
+              (genero None se o nome não puder ser interpretado)
+    """
+    resultado = {'genero': None, 'especie': None, 'hibrido': False,
+                 'rank_infra': None, 'epiteto_infra': None}
+
+    tokens = (nome or '').replace('×', ' × ').split()
+    if not tokens:
+        return resultado
+
+    i = 0
+    if tokens[0].lower() in MARCADORES_HIBRIDO and len(tokens) > 1:
+        resultado['hibrido'] = True
+        i = 1
+
+    genero = tokens[i].strip('.,;')
+    if not genero.replace('-', '').isalpha():
+        return resultado
+    resultado['genero'] = genero.capitalize()
+    i += 1
+
+    while i < len(tokens) and tokens[i].lower() in QUALIFICADORES:
+        i += 1
+
+    if i < len(tokens) and tokens[i].lower() in MARCADORES_HIBRIDO:
+        resultado['hibrido'] = True
+        i += 1
+
+    if i < len(tokens):
+        token = tokens[i].rstrip(',;')
+        if token.lower() in INDETERMINADOS:
+            i += 1
+        elif token[:1].islower() and token.replace('-', '').isalpha():
+            resultado['especie'] = token.lower()
+            i += 1
+
+    # Epíteto infraespecífico: primeiro marcador reconhecido após a espécie
+    while i < len(tokens):
+        token = tokens[i]
+        if token.startswith(("'", '"')):
+            marcador, inicio = 'cv.', i  # Cultivar sem 'cv.': 'Nome'
+        else:
+            marcador, inicio = MARCADORES_INFRA.get(token.lower()), i + 1
+        if marcador and inicio < len(tokens):
+            epiteto = tokens[inicio]
+            if epiteto.startswith(("'", '"')):
+                # Cultivar entre aspas pode ter várias palavras
+                partes = [epiteto]
+                j = inicio + 1
+                while not partes[-1].endswith(("'", '"')) and j < len(tokens):
+                    partes.append(tokens[j])
+                    j += 1
+                epiteto = ' '.join(partes).strip('\'"')
+            elif marcador != 'cv.':
+                epiteto = epiteto.rstrip(',;').lower()
+            resultado['rank_infra'] = marcador
+            resultado['epiteto_infra'] = epiteto[:100]
+            break
+        i += 1
+
+    return resultado
+
+
+def caminho_taxonomico(nome_cientifico, familia):
+    """
+    Nós (nivel, nome, chave) de uma planta, da família à espécie
+
+    Returns:
+        tuple: (lista de nós, partes do nome) ou (None, partes) se o nome
+               não tiver género reconhecível
+    """
+    partes = parsear_nome_cientifico(nome_cientifico)
+    if not partes['genero']:
+        return None, partes
+
+    nome_familia = (familia or '').strip() or SEM_FAMILIA
+    chave_familia = normalizar(familia)
+    chave_genero = f"{chave_familia}|{normalizar(partes['genero'])}"
+
+    nos = [
+        ('familia', nome_familia, chave_familia),
+        ('genero', partes['genero'], chave_genero),
+    ]
+    if partes['especie']:
+        sinal = '× ' if partes['hibrido'] else ''
+        nome_especie = f"{partes['genero']} {sinal}{partes['especie']}"
+        nos.append(('especie', nome_especie, f"{chave_genero}|{normalizar(sinal + partes['especie'])}"))
+    return nos, partes
+
+
+# =====================================================
+# MANUTENÇÃO (mesma transação da escrita)
+# =====================================================
+
+def _inserir_se_nao_existe(connection, valores):
+    """
+    INSERT do nó que não faz nada se a chave já existe (uma instrução: duas
+    plantas novas no mesmo género ou família não colidem no UNIQUE)
+
+    Returns:
+        int: id do nó inserido, ou None se outra transação já o tinha criado
+    """
+    tabela = Taxon.__table__
+    dialeto = connection.dialect.name
+
+    if dialeto == 'mysql':
+        instrucao = mysql.insert(tabela).values(**valores)
+        instrucao = instrucao.on_duplicate_key_update(chave=instrucao.inserted.chave)
+    elif dialeto in ('sqlite', 'postgresql'):
+        modulo = sqlite if dialeto == 'sqlite' else postgresql
+        instrucao = modulo.insert(tabela).values(**valores).on_conflict_do_nothing(
+            index_elements=[tabela.c.chave]
+        )
+    else:
+        raise NotImplementedError(f'Upsert de taxa não suportado em {dialeto}')
+    resultado = connection.execute(instrucao)
+    return resultado.inserted_primary_key[0] if resultado.rowcount == 1 else None
+
+
+def _garantir_caminho(connection, nos, cache):
+    """IDs dos nós do caminho, criando os que ainda não existem"""
+    tabela = Taxon.__table__
+    consulta = select(tabela.c.id_taxon)
+    ids = []
+    id_pai = None
+    for nivel, nome, chave in nos:
+        id_taxon = cache.get(chave)
+        if id_taxon is None:
+            id_taxon = connection.execute(consulta.where(tabela.c.chave == chave)).scalar()
+            if id_taxon is None:
+                id_taxon = _inserir_se_nao_existe(connection, {
+                    'nivel': nivel, 'nome': nome[:150], 'nome_normalizado': normalizar(nome)[:150],
+                    'chave': chave, 'id_pai': id_pai, 'total_plantas': 0
+                })
+                if id_taxon is None:
+                    # Criado entretanto por outra transação
+                    id_taxon = connection.execute(consulta.where(tabela.c.chave == chave)).scalar_one()
+            cache[chave] = id_taxon
+        ids.append(id_taxon)
+        id_pai = id_taxon
+    return ids
+
+
+def _reindexar(connection, plantas, apagar=False):
+    """
+    Recalcular a posição de várias plantas na hierarquia
+
+    Os deltas de contagem são agregados por nó e aplicados com um UPDATE
+    por valor de delta (um rename de família move N plantas com poucas
+    queries); nós que ficam a zero são removidos (espécie → género → família)
+
+    Args:
+        plantas: lista de (id_planta, nome_cientifico, familia)
+        apagar: apenas remover (planta a ser apagada)
+    """
+    if not plantas:
+        return
+
+    ids_plantas = [p[0] for p in plantas]
+    pt = Planta_taxon.__table__
+    tx = Taxon.__table__
+
+    deltas = Counter()
+    for linha in connection.execute(
+        select(pt.c.id_familia, pt.c.id_genero, pt.c.id_especie).where(pt.c.id_planta.in_(ids_plantas))
+    ):
+        for id_taxon in linha:
+            if id_taxon is not None:
+                deltas[id_taxon] -= 1
+
+    novas = []
+    if not apagar:
+        cache = {}
+        for id_planta, nome_cientifico, familia in plantas:
+            nos, partes = caminho_taxonomico(nome_cientifico, familia)
+            if nos is None:
+                continue
+            ids = _garantir_caminho(connection, nos, cache)
+            for id_taxon in ids:
+                deltas[id_taxon] += 1
+            novas.append({
+                'id_planta': id_planta,
+                'id_familia': ids[0],
+                'id_genero': ids[1],
+                'id_especie': ids[2] if len(ids) > 2 else None,
+                'rank_infra': partes['rank_infra'],
+                'epiteto_infra': partes['epiteto_infra'],
+                'hibrido': partes['hibrido']
+            })
+
+    connection.execute(pt.delete().where(pt.c.id_planta.in_(ids_plantas)))
+    if novas:
+        connection.execute(pt.insert(), novas)
+
+    por_delta = {}
+    for id_taxon, delta in deltas.items():
+        if delta:
+            por_delta.setdefault(delta, []).append(id_taxon)
+    for delta, ids in por_delta.items():
+        connection.execute(
+            tx.update().where(tx.c.id_taxon.in_(ids)).values(total_plantas=tx.c.total_plantas + delta)
+        )
+
+    diminuidos = [id_taxon for id_taxon, delta in deltas.items() if delta < 0]
+    if diminuidos:
+        for nivel in reversed(NIVEIS):
+            connection.execute(tx.delete().where(
+                tx.c.id_taxon.in_(diminuidos), tx.c.nivel == nivel, tx.c.total_plantas <= 0
+            ))
+
+
+def reindexar_plantas(session, ids_plantas):
+    """
+    Atualizar a hierarquia de plantas alteradas por UPDATE em massa
+    (não dispara eventos do ORM). Chamar antes do commit.
+    """
+    ids_plantas = list(ids_plantas)
+    if not ids_plantas:
+        return
+    plantas = session.query(
+        Planta_medicinal.id_planta, Planta_medicinal.nome_cientifico, Planta_medicinal.familia
+    ).filter(Planta_medicinal.id_planta.in_(ids_plantas)).all()
+    _reindexar(session.connection(), [tuple(p) for p in plantas])
+
+
+def sincronizar_taxonomia():
+    """
+    Reconstruir Taxon/Planta_taxon a partir de todas as plantas
+    (uma leitura de Planta_medicinal; inserções em lote por nível)
+
+    Returns:
+        dict: totais por nível
+    """
+    plantas = db.session.query(
+        Planta_medicinal.id_planta, Planta_medicinal.nome_cientifico, Planta_medicinal.familia
+    ).all()
+
+    nos_por_chave = {}
+    contagens = Counter()
+    posicoes = []
+    for id_planta, nome_cientifico, familia in plantas:
+        nos, partes = caminho_taxonomico(nome_cientifico, familia)
+        if nos is None:
+            continue
+        pai = None
+        for nivel, nome, chave in nos:
+            nos_por_chave.setdefault(chave, (nivel, nome, pai))
+            contagens[chave] += 1
+            pai = chave
+        posicoes.append((id_planta, [c for _, _, c in nos], partes))
+
+    Planta_taxon.query.delete()
+    for nivel in reversed(NIVEIS):
+        Taxon.query.filter(Taxon.nivel == nivel).delete()
+
+    ids = {}
+    for nivel in NIVEIS:
+        linhas = [{
+            'nivel': nivel, 'nome': nome[:150], 'nome_normalizado': normalizar(nome)[:150],
+            'chave': chave, 'id_pai': ids.get(pai), 'total_plantas': contagens[chave]
+        } for chave, (n, nome, pai) in nos_por_chave.items() if n == nivel]
+        if linhas:
+            db.session.execute(Taxon.__table__.insert(), linhas)
+            ids.update(db.session.query(Taxon.chave, Taxon.id_taxon).filter(Taxon.nivel == nivel).all())
+
+    if posicoes:
+        db.session.execute(Planta_taxon.__table__.insert(), [{
+            'id_planta': id_planta,
+            'id_familia': ids[chaves[0]],
+            'id_genero': ids[chaves[1]],
+            'id_especie': ids[chaves[2]] if len(chaves) > 2 else None,
+            'rank_infra': partes['rank_infra'],
+            'epiteto_infra': partes['epiteto_infra'],
+            'hibrido': partes['hibrido']
+        } for id_planta, chaves, partes in posicoes])
+    db.session.commit()
+
+    totais = Counter(nivel for nivel, _, _ in nos_por_chave.values())
+    print(f"🌳 Taxonomia sincronizada: {totais['familia']} famílias, "
+          f"{totais['genero']} géneros, {totais['especie']} espécies")
+    return {
+        'familias': totais['familia'],
+        'generos': totais['genero'],
+        'especies': totais['especie'],
+        'plantas_indexadas': len(posicoes)
+    }
+
+
+def plantas_por_indexar():
+    """
+    Plantas com género reconhecível sem posição em Planta_taxon
+    (só se leem os nomes das plantas sem posição: as de nome não
+    interpretável nunca são indexadas e não contam como divergência)
+
+    Returns:
+        int: nº de plantas em falta no índice
+    """
+    sem_posicao = db.session.query(Planta_medicinal.nome_cientifico).filter(
+        ~select(Planta_taxon.id_planta).where(Planta_taxon.id_planta == Planta_medicinal.id_planta).exists()
+    )
+    return sum(1 for (nome,) in sem_posicao.yield_per(1000) if parsear_nome_cientifico(nome)['genero'])
+
+
+_verificacao_lock = threading.Lock()
+_verificado = False
+
+
+def verificar_taxonomia():
+    """
+    Na primeira leitura do processo, avisar se a hierarquia não cobre as
+    plantas (tabela por preencher ou importação direta). Não reconstrói:
+    um GET não apaga nem reescreve Taxon/Planta_taxon
+    """
+    global _verificado
+    if _verificado:
+        return
+    with _verificacao_lock:
+        if _verificado:
+            return
+        em_falta = plantas_por_indexar()
+        if em_falta:
+            print(f"⚠️ Taxonomia desatualizada: {em_falta} plantas por indexar "
+                  f"(sincronizar em POST /api/taxonomia/sincronizar)")
+        _verificado = True
+
+
+# =====================================================
+# EVENTOS DO ORM
+# =====================================================
+
+def _apos_inserir(mapper, connection, target):
+    _reindexar(connection, [(target.id_planta, target.nome_cientifico, target.familia)])
+
+
+def _apos_atualizar(mapper, connection, target):
+    estado = inspect(target)
+    if not (estado.attrs.nome_cientifico.history.has_changes() or
+            estado.attrs.familia.history.has_changes()):
+        return
+    _reindexar(connection, [(target.id_planta, target.nome_cientifico, target.familia)])
+
+
+def _antes_apagar(mapper, connection, target):
+    # Antes do DELETE da planta: Planta_taxon referencia Planta_medicinal
+    _reindexar(connection, [(target.id_planta, None, None)], apagar=True)
+
+
+def registrar_eventos_taxonomia(app):
+    """Ligar os eventos do ORM à hierarquia taxonómica (chamado no arranque)"""
+    if event.contains(Planta_medicinal, 'after_insert', _apos_inserir):
+        return
+
+    event.listen(Planta_medicinal, 'after_insert', _apos_inserir)
+    event.listen(Planta_medicinal, 'after_update', _apos_atualizar)
+    event.listen(Planta_medicinal, 'before_delete', _antes_apagar)
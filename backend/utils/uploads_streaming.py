@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Receção de Uploads em Streaming
+- multipart: cada ficheiro é escrito em staging à medida que o corpo
+  chega (sem o ficheiro temporário do werkzeug nem .read() completo)
+- JSON com imagens base64: o corpo é lido aos blocos; as strings dos
+  campos de imagem ('image_base64', 'file_data') são decodificadas de
+  forma incremental diretamente para staging e o resto do JSON (pequeno)
+  é interpretado no fim com json.loads
+
+A memória por upload fica limitada a um bloco, qualquer que seja o
+tamanho da imagem; tamanho e magic bytes são verificados no primeiro
+bloco (EscritaStaging)
+"""
+import base64
+import binascii
+import json
+import re
+import secrets
+
+from flask import current_app, request
+from werkzeug.formparser import FormDataParser
+
+from utils.imagens_conteudo import Upload
+from utils.imagens_fila import UploadRejeitado
+
+TAMANHO_BLOCO = 64 * 1024
+
+_ESPACOS = b' \t\r\n'
+_ESPECIAL = re.compile(rb'["\\]')
+_MAX_CHAVE = 64
+
+
+class DecodificadorBase64:
+    """base64 incremental (aceita prefixo 'data:...;base64,') escrito num destino"""
+
+    def __init__(self, destino):
+        self.destino = destino
+        self.resto = b''
+        self.inicio = b''
+        self.em_prefixo = True
+
+    def alimentar(self, texto):
+        texto = texto.translate(None, _ESPACOS)
+        if self.em_prefixo:
+            # A vírgula não pertence ao alfabeto base64: tudo antes dela é o prefixo
+            self.inicio += texto
+            virgula = self.inicio.find(b',')
+            if virgula < 0 and len(self.inicio) < 256:
+                return
+            texto = self.inicio[virgula + 1:]
+            self.inicio = b''
+            self.em_prefixo = False
+
+        dados = self.resto + texto
+        corte = len(dados) - len(dados) % 4
+        self.resto = dados[corte:]
+        if corte:
+            self._escrever(dados[:corte])
+
+    def terminar(self):
+        if self.em_prefixo:
+            self.em_prefixo = False
+            virgula = self.inicio.find(b',')
+            self.resto, self.inicio = self.inicio[virgula + 1:], b''
+        if self.resto:
+            self._escrever(self.resto + b'=' * (-len(self.resto) % 4))
+            self.resto = b''
+
+    def _escrever(self, dados):
+        try:
+            conteudo = base64.b64decode(dados, validate=True)
+        except binascii.Error:
+            raise UploadRejeitado('base64 inválido')
+        self.destino.write(conteudo)
+
+
+# =====================================================
+# JSON
+# =====================================================
+
+def _marcador(prefixo, indice):
+    """String JSON que ocupa o lugar de uma imagem no esqueleto"""
+    return b'"\\u0000%s%d"' % (prefixo.encode(), indice)
+
+
+def _substituir_marcadores(valor, campos, marcadores):
+    """
+    Trocar os marcadores pelos resultados. Só valem strings geradas nesta
+    leitura (prefixo aleatório, procuradas no dicionário): um campo de
+    imagem com outro valor (chave escrita com escapes, que não passou
+    pelo decodificador) fica recusado em vez de ser interpretado. Cada
+    marcador usado sai de `marcadores` (os que sobram não chegaram ao JSON)
+    """
+    if isinstance(valor, dict):
+        for chave, item in valor.items():
+            if chave in campos and item is not None:
+                if isinstance(item, str) and item in marcadores:
+                    valor[chave] = marcadores.pop(item)
+                else:
+                    valor[chave] = UploadRejeitado('base64 inválido')
+            else:
+                _substituir_marcadores(item, campos, marcadores)
+    elif isinstance(valor, list):
+        for item in valor:
+            _substituir_marcadores(item, campos, marcadores)
+    return valor
+
+
+def uploads_em(valor):
+    """Os Upload (em staging) contidos no resultado de ler_json, em qualquer nível"""
+    if isinstance(valor, Upload):
+        yield valor
+    elif isinstance(valor, dict):
+        for item in valor.values():
+            yield from uploads_em(item)
+    elif isinstance(valor, list):
+        for item in valor:
+            yield from uploads_em(item)
+
+
+def _descartar(fila, uploads):
+    for upload in uploads:
+        fila.descartar(upload)
+
+
+def ler_json(fila, campos, stream=None, max_esqueleto=None):
+    """
+    Ler um corpo JSON decodificando os campos base64 diretamente para staging
+
+    Args:
+        fila: FilaImagens (destino dos uploads)
+        campos: nomes dos campos com imagens base64 (em qualquer nível)
+        stream: corpo do pedido (por omissão request.stream)
+        max_esqueleto: limite do JSON sem as imagens (UPLOAD_JSON_MAX_BYTES)
+
+    Returns:
+        dict: o JSON com cada campo de imagem substituído pelo Upload em
+              staging, pelo UploadRejeitado se essa imagem foi recusada
+              ou por None se a string estava vazia. Os Upload que o
+              pedido não agendar têm de ser descartados (uploads_em)
+
+    Raises:
+        UploadRejeitado: JSON inválido ou grande demais
+    """
+    if stream is None:
+        stream = request.stream
+    if max_esqueleto is None:
+        max_esqueleto = current_app.config.get('UPLOAD_JSON_MAX_BYTES', 1024 * 1024)
+    campos = set(campos)
+    campos_bytes = {c.encode() for c in campos}
+    prefixo = secrets.token_hex(8) + ':'  # Imprevisível: o cliente não consegue forjar um marcador
+
+    esqueleto = bytearray()
+    resultados = []
+    segmento = bytearray()   # texto fora de strings desde a última string
+    chave = bytearray()      # conteúdo da string atual (até _MAX_CHAVE)
+    ultima_string = None
+    estado = 'fora'          # 'fora', 'texto', 'base64', 'ignorar'
+    escape = False
+    escrita = decodificador = None
+
+    try:
+        for bloco in iter(lambda: stream.read(TAMANHO_BLOCO), b''):
+            i, n = 0, len(bloco)
+            while i < n:
+                if estado == 'fora':
+                    j = bloco.find(b'"', i)
+                    fim = n if j < 0 else j
+                    segmento += bloco[i:fim]
+                    esqueleto += bloco[i:fim]
+                    if j < 0:
+                        break
+                    i = j + 1
+                    if ultima_string in campos_bytes and segmento.strip() == b':':
+                        escrita = fila.abrir_staging()
+                        decodificador = DecodificadorBase64(escrita)
+                        estado = 'base64'
+                    else:
+                        esqueleto += b'"'
+                        chave = bytearray()
+                        estado = 'texto'
+                    segmento = bytearray()
+                    ultima_string = None
+                    continue
+
+                if escape:
+                    # Caractere escapado (pode vir no início do bloco seguinte)
+                    c = bloco[i:i + 1]
+                    i += 1
+                    escape = False
+                    if estado == 'texto':
+                        esqueleto += c
+                        chave += c
+                    elif estado == 'base64':
+                        # Só '\/' (alguns encoders escapam a barra) e quebras de linha
+                        if c not in b'/nrt':
+                            escrita.cancelar()
+                            resultados.append(UploadRejeitado('base64 inválido'))
+                            estado = 'ignorar'
+                        elif c == b'/':
+                            decodificador.alimentar(b'/')
+                    continue
+
+                m = _ESPECIAL.search(bloco, i)
+                fim = m.start() if m else n
+                parte = bloco[i:fim]
+                if estado == 'texto':
+                    esqueleto += parte
+                    chave += parte[:_MAX_CHAVE + 1]
+                elif estado == 'base64':
+                    try:
+                        decodificador.alimentar(parte)
+                    except UploadRejeitado as e:
+                        escrita.cancelar()
+                        resultados.append(e)
+                        estado = 'ignorar'
+                if not m:
+                    break
+
+                i = fim + 1
+                if bloco[fim:fim + 1] == b'\\':
+                    escape = True
+                    if estado == 'texto':
+                        esqueleto += b'\\'
+                        chave += b'\\'
+                    continue
+
+                # Fim da string
+                if estado == 'texto':
+                    esqueleto += b'"'
+                    ultima_string = bytes(chave) if len(chave) <= _MAX_CHAVE else None
+                else:
+                    if estado == 'base64':
+                        try:
+                            decodificador.terminar()
+                            if escrita.tamanho == 0:
+                                escrita.cancelar()
+                                resultados.append(None)
+                            else:
+                                resultados.append(escrita.concluir())
+                        except UploadRejeitado as e:
+                            escrita.cancelar()
+                            resultados.append(e)
+                    esqueleto += _marcador(prefixo, len(resultados) - 1)
+                    escrita = decodificador = None
+                estado = 'fora'
+
+            if len(esqueleto) > max_esqueleto:
+                raise UploadRejeitado('JSON grande demais', 413)
+
+        if estado != 'fora':
+            raise UploadRejeitado('JSON inválido (incompleto)')
+        try:
+            dados = json.loads(bytes(esqueleto))
+        except ValueError:
+            raise UploadRejeitado('JSON inválido')
+    except Exception:
+        _descartar(fila, resultados)
+        raise
+    finally:
+        if escrita is not None:
+            escrita.cancelar()
+
+    marcadores = {f'\x00{prefixo}{i}': resultado for i, resultado in enumerate(resultados)}
+    dados = _substituir_marcadores(dados, campos, marcadores)
+    _descartar(fila, marcadores.values())  # Ex.: chave repetida, o json.loads fica com a última
+    return dados
+
+
+# =====================================================
+# MULTIPART
+# =====================================================
+
+def ler_multipart(fila, extensoes=None):
+    """
+    Ler um pedido multipart escrevendo cada ficheiro diretamente em staging
+    (usar em vez de request.files/request.form, que já não podem ser lidos)
+
+    Args:
+        extensoes: extensões aceites; um nome com outra extensão é recusado
+                   antes de receber o ficheiro
+
+    Returns:
+        tuple: (form, {campo: (Upload, nome original)}) - ficheiros sem nome
+               (nenhum selecionado) não aparecem; os que o pedido não
+               agendar têm de ser descartados
+
+    Raises:
+        UploadRejeitado: extensão, formato ou tamanho
+    """
+    escritas = []
+
+    def stream_factory(total_content_length, content_type, filename, content_length=None):
+        if filename and extensoes is not None:
+            ext = filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
+            if ext not in extensoes:
+                raise UploadRejeitado('Tipo de arquivo não permitido')
+        escrita = fila.abrir_staging(exigir_formato=bool(filename))
+        escritas.append(escrita)
+        return escrita
+
+    parser = FormDataParser(
+        stream_factory=stream_factory,
+        max_content_length=current_app.config.get('MAX_CONTENT_LENGTH'),
+        silent=False
+    )
+    uploads = {}
+    try:
+        _, form, files = parser.parse_from_environ(request.environ)
+        for campo, ficheiro in files.items():
+            if ficheiro.filename:
+                uploads[campo] = (ficheiro.stream.concluir(), ficheiro.filename)
+        return form, uploads
+    except Exception:
+        _descartar(fila, (upload for upload, _ in uploads.values()))
+        raise
+    finally:
+        for escrita in escritas:
+            escrita.cancelar()
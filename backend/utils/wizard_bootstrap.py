@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Bootstrap do Wizard - todos os dados auxiliares num único payload
+- Cada lista é carregada com UMA query (relações com selectinload)
+- O payload serializado fica em cache até alguma tabela auxiliar mudar
+  (geração 'bootstrap' do estado partilhado, incrementada após commit por
+  qualquer worker) ou o TTL expirar (alterações feitas fora da aplicação)
+- ETag forte = hash do corpo, para respostas 304
+"""
+import hashlib
+import json
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session, selectinload
+
+from models.planta import db
+from models.localizacao import Provincia, Local_colheita
+from models.uso_medicinal import Parte_usada, Indicacao, Metodo_preparacao_trad, Metodo_extraccao_cientif
+from models.referencia import Autor, Afiliacao, Autor_afiliacao, Referencia, Referencia_autor
+from utils.estado_partilhado import obter_estado
+from utils.familias_index import indice_familias
+from utils.replicas import ler_do_primario
+
+# Alterações nestes models invalidam o bootstrap
+MODELS_AUXILIARES = (
+    Provincia, Local_colheita, Parte_usada, Indicacao,
+    Metodo_preparacao_trad, Metodo_extraccao_cientif,
+    Autor, Afiliacao, Autor_afiliacao, Referencia, Referencia_autor,
+)
+
+_CHAVE_SUJO = 'bootstrap_sujo'
+
+
+# =====================================================
+# CARREGAMENTO EM LOTE (partilhado com /api/wizard/data/*)
+# =====================================================
+
+def carregar_familias():
+    indice_familias.garantir_atualizado()
+    _, familias = indice_familias.listar()
+    return [
+        {
+            'id': idx + 1,
+            'nome_familia': familia['nome_familia'],
+            'label': familia['nome_familia'],
+            'value': familia['nome_familia']
+        }
+        for idx, familia in enumerate(familias)
+    ]
+
+
+def carregar_provincias():
+    return [p.to_dict() for p in Provincia.query.order_by(Provincia.provincia).all()]
+
+
+def carregar_locais(provincia_id=None):
+    """Locais com o nome da província por JOIN (sem lazy load por local)"""
+    query = db.session.query(
+        Local_colheita.id_local, Local_colheita.nome_local,
+        Local_colheita.id_provincia, Provincia.provincia
+    ).outerjoin(Provincia, Provincia.id_provincia == Local_colheita.id_provincia)
+    if provincia_id:
+        query = query.filter(Local_colheita.id_provincia == provincia_id)
+    return [
+        {'id_local': id_local, 'nome_local': nome, 'id_provincia': id_provincia, 'provincia': provincia}
+        for id_local, nome, id_provincia, provincia in query.order_by(Local_colheita.nome_local).all()
+    ]
+
+
+def carregar_partes_usadas():
+    return [p.to_dict() for p in Parte_usada.query.order_by(Parte_usada.nome_parte).all()]
+
+
+def carregar_indicacoes():
+    return [i.to_dict() for i in Indicacao.query.order_by(Indicacao.descricao_uso).all()]
+
+
+def carregar_metodos_preparacao():
+    metodos = Metodo_preparacao_trad.query.order_by(Metodo_preparacao_trad.descricao_metodo_preparacao).all()
+    return [
+        {
+            'id_preparacao': m.id_metodo_preparacao,
+            'descricao': m.descricao_metodo_preparacao,
+            'label': m.descricao_metodo_preparacao,
+            'value': m.id_metodo_preparacao
+        }
+        for m in metodos
+    ]
+
+
+def carregar_metodos_extracao():
+    metodos = Metodo_extraccao_cientif.query.order_by(Metodo_extraccao_cientif.descricao_metodo_extraccao).all()
+    return [
+        {
+            'id_extraccao': m.id_metodo_extraccao,
+            'descricao': m.descricao_metodo_extraccao,
+            'label': m.descricao_metodo_extraccao,
+            'value': m.id_metodo_extraccao
+        }
+        for m in metodos
+    ]
+
+
+def carregar_autores():
+    """Autores + afiliações com selectinload (3 queries no total)"""
+    autores = Autor.query.options(
+        selectinload(Autor.afiliacoes).selectinload(Autor_afiliacao.afiliacao)
+    ).order_by(Autor.nome_autor).all()
+    return [a.to_dict() for a in autores]
+
+
+def carregar_referencias():
+    """Referências + autores com selectinload (em vez de N+1 sobre autores_relacao)"""
+    referencias = Referencia.query.options(
+        selectinload(Referencia.autores_relacao).selectinload(Referencia_autor.autor)
+    ).order_by(
+        Referencia.ano_publicacao.desc(),
+        Referencia.titulo_referencia
+    ).all()
+    return [
+        {
+            'id_referencia': r.id_referencia,
+            'titulo': r.titulo_referencia,
+            'ano': r.ano_publicacao,
+            'link': r.link_referencia,
+            'autores': [
+                {'id_autor': ra.autor.id_autor, 'nome_autor': ra.autor.nome_autor}
+                for ra in r.autores_relacao if ra.autor
+            ],
+            'label': f"{r.titulo_referencia} ({r.ano_publicacao})",
+            'value': r.id_referencia
+        }
+        for r in referencias
+    ]
+
+
+# =====================================================
+# CACHE
+# =====================================================
+
+class CacheBootstrap:
+    """
+    Corpo JSON já serializado + ETag
+
+    Válido enquanto (geração partilhada, versão do dicionário de famílias)
+    não mudarem e o TTL não expirar
+    """
+
+    def __init__(self, ttl_segundos=300):
+        self.ttl_segundos = ttl_segundos
+        self._lock = threading.Lock()
+        self._corpo = None
+        self._etag = None
+        self._chave = None
+        self._criado_em = None
+
+    def invalidar(self):
+        """Reconstruir no próximo pedido, neste e nos outros workers"""
+        obter_estado().incrementar('bootstrap')
+
+    def obter(self):
+        """
+        Returns:
+            tuple: (corpo em bytes, etag)
+        """
+        indice_familias.garantir_atualizado()
+        chave = (obter_estado().geracao('bootstrap'), indice_familias.versao)
+        if self._valido(chave):
+            return self._corpo, self._etag
+
+        with self._lock:
+            chave = (obter_estado().geracao('bootstrap'), indice_familias.versao)
+            if not self._valido(chave):
+                self._construir(chave)
+            return self._corpo, self._etag
+
+    def _valido(self, chave):
+        return (self._corpo is not None and self._chave == chave and
+                (not self.ttl_segundos or time.monotonic() - self._criado_em < self.ttl_segundos))
+
+    def _construir(self, chave):
+        with ler_do_primario(db.session):  # Reconstruída depois de escritas: a réplica pode estar atrasada
+            dados = {
+                'familias': carregar_familias(),
+                'provincias': carregar_provincias(),
+                'locais': carregar_locais(),
+                'partes_usadas': carregar_partes_usadas(),
+                'indicacoes': carregar_indicacoes(),
+                'metodos_preparacao': carregar_metodos_preparacao(),
+                'metodos_extracao': carregar_metodos_extracao(),
+                'autores': carregar_autores(),
+                'referencias': carregar_referencias(),
+            }
+        # A versão depende só do conteúdo: workers diferentes dão o mesmo ETag
+        conteudo = json.dumps(dados, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+        versao = hashlib.sha1(conteudo.encode('utf-8')).hexdigest()[:16]
+
+        payload = {'version': versao, 'gerado_em': datetime.utcnow().isoformat(), **dados}
+        self._corpo = json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        self._etag = versao
+        self._chave = chave
+        self._criado_em = time.monotonic()
+
+
+cache_bootstrap = CacheBootstrap()
+
+
+# =====================================================
+# INVALIDAÇÃO
+# =====================================================
+
+def _marcar_sujo(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info[_CHAVE_SUJO] = True
+
+
+def _apos_commit(session):
+    if session.info.pop(_CHAVE_SUJO, False):
+        cache_bootstrap.invalidar()
+
+
+def _apos_rollback(session):
+    session.info.pop(_CHAVE_SUJO, None)
+
+
+def registrar_eventos_bootstrap(app):
+    """Invalidar o bootstrap quando tabelas auxiliares mudam (chamado no arranque)"""
+    cache_bootstrap.ttl_segundos = app.config.get('WIZARD_BOOTSTRAP_TTL_SEGUNDOS', 300)
+
+    if event.contains(Session, 'after_commit', _apos_commit):
+        return
+
+    for model in MODELS_AUXILIARES:
+        for nome in ('after_insert', 'after_update', 'after_delete'):
+            event.listen(model, nome, _marcar_sujo)
+    event.listen(Session, 'after_commit', _apos_commit)
+    event.listen(Session, 'after_rollback', _apos_rollback)
@@ -0,0 +1,13 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Ponto de entrada WSGI para produção
+
+    pip install gunicorn
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+(afinação de workers/threads em gunicorn.conf.py)
+"""
+from app import create_app
+
+app = create_app()